@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+ADB客户端 - 直接通过ADB服务器协议（127.0.0.1:5037）执行adb命令
+每条adb命令不再启动adb进程和shell，连接不上ADB服务器时退回subprocess方式
+"""
+
+import socket
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+
+ADB_SERVER_HOST = "127.0.0.1"
+ADB_SERVER_PORT = 5037
+
+# shell v2协议的数据包类型
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+
+
+class AdbError(Exception):
+    """ADB服务器返回FAIL"""
+    pass
+
+
+class AdbServerUnavailable(OSError):
+    """连不上ADB服务器（命令尚未发出，可以改用adb进程执行）"""
+    pass
+
+
+@dataclass
+class AdbResult:
+    """adb命令结果（字段与subprocess.CompletedProcess一致，便于替换原有调用）"""
+    args: List[str]
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    transport: str = "socket"  # socket / subprocess
+
+
+@dataclass
+class AdbDevice:
+    """adb devices 中的一行"""
+    serial: str
+    state: str
+    properties: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_online(self) -> bool:
+        return self.state == "device"
+
+
+class AdbClient:
+    """
+    ADB服务器协议客户端
+
+    请求格式为4位十六进制长度+命令，服务器回复OKAY或FAIL+错误信息。
+    设备命令先发送 host:transport:<serial> 切换到设备，再发送 shell:/exec: 服务。
+    ADB服务器在每个服务结束后关闭连接，因此每条命令使用一个本地socket
+    （本机TCP连接约0.1ms），省去的是adb进程和shell的启动开销。
+
+    用法:
+        adb = get_adb_client(adb_path)
+        result = adb.run(["devices"])          # 与 adb devices 输出一致
+        result = adb.shell("127.0.0.1:59700", "pm list packages cn.damai")
+    """
+
+    def __init__(self, adb_path: Union[str, Path] = "adb", host: str = ADB_SERVER_HOST,
+                 port: int = ADB_SERVER_PORT, timeout: float = 10, log_func=None):
+        """
+        初始化ADB客户端
+
+        Args:
+            adb_path: adb可执行文件路径（启动服务器和subprocess后备时使用）
+            host: ADB服务器地址
+            port: ADB服务器端口
+            timeout: 默认超时（秒）
+            log_func: 日志函数
+        """
+        self.adb_path = str(adb_path)
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.log = log_func if log_func else print
+
+        self._features: Dict[str, set] = {}
+        self._start_lock = threading.Lock()
+        self.stats = {'socket': 0, 'subprocess': 0, 'server_starts': 0}
+
+    # ========== 协议基础 ==========
+
+    def _open(self, timeout: float) -> socket.socket:
+        """连接ADB服务器，服务器未运行时自动启动一次；仍连不上时抛出AdbServerUnavailable"""
+        try:
+            try:
+                return socket.create_connection((self.host, self.port), timeout=timeout)
+            except ConnectionRefusedError:
+                self.start_server()
+                return socket.create_connection((self.host, self.port), timeout=timeout)
+        except socket.timeout:
+            raise
+        except OSError as e:
+            raise AdbServerUnavailable(f"无法连接ADB服务器 {self.host}:{self.port}: {e}") from e
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("ADB服务器关闭了连接")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _recv_all(sock: socket.socket) -> bytes:
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def _send_request(self, sock: socket.socket, request: str):
+        """发送请求并检查OKAY/FAIL"""
+        payload = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(payload) + payload)
+        status = self._recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbError(self._read_length_prefixed(sock).decode("utf-8", errors="replace"))
+        raise AdbError(f"ADB服务器回复未知状态: {status!r}")
+
+    def _read_length_prefixed(self, sock: socket.socket) -> bytes:
+        length = int(self._recv_exact(sock, 4), 16)
+        return self._recv_exact(sock, length)
+
+    def _query(self, request: str, timeout: Optional[float] = None, reply: bool = True) -> str:
+        """执行一次host服务请求，返回带长度前缀的回复内容"""
+        with self._open(timeout or self.timeout) as sock:
+            self._send_request(sock, request)
+            if not reply:
+                return ""
+            return self._read_length_prefixed(sock).decode("utf-8", errors="replace")
+
+    def open_host_stream(self, request: str, timeout: Optional[float] = None) -> socket.socket:
+        """
+        打开长连接的host服务（如 host:track-devices），之后用 read_message 读取推送
+
+        不会自动启动ADB服务器，服务器未运行时抛出OSError
+        """
+        sock = socket.create_connection((self.host, self.port), timeout=timeout or self.timeout)
+        try:
+            self._send_request(sock, request)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def read_message(self, sock: socket.socket) -> str:
+        """读取一条带长度前缀的消息"""
+        return self._read_length_prefixed(sock).decode("utf-8", errors="replace")
+
+    def _open_device_service(self, serial: Optional[str], service: str, timeout: float) -> socket.socket:
+        """切换到设备并打开服务，返回已就绪的socket"""
+        sock = self._open(timeout)
+        try:
+            self._send_request(sock, f"host:transport:{serial}" if serial else "host:transport-any")
+            self._send_request(sock, service)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # ========== 服务器命令 ==========
+
+    def server_running(self) -> bool:
+        """ADB服务器是否在监听"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def start_server(self) -> bool:
+        """启动ADB服务器（只能通过adb进程启动）"""
+        with self._start_lock:
+            if self.server_running():
+                return True
+            self.stats['server_starts'] += 1
+            try:
+                subprocess.run([self.adb_path, "start-server"], capture_output=True, timeout=15)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                self.log(f"[ADB] 启动ADB服务器失败: {e}")
+                return False
+            return self.server_running()
+
+    def kill_server(self) -> bool:
+        """停止ADB服务器"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=self.timeout) as sock:
+                self._send_request(sock, "host:kill")
+        except ConnectionRefusedError:
+            return True  # 本来就没有运行
+        self._features.clear()
+        return True
+
+    def version(self) -> int:
+        """ADB服务器内部版本号（如41）"""
+        return int(self._query("host:version"), 16)
+
+    def devices(self, long: bool = False) -> List[AdbDevice]:
+        """设备列表"""
+        output = self._query("host:devices-l" if long else "host:devices")
+        return self.parse_devices(output)
+
+    @staticmethod
+    def parse_devices(output: str) -> List[AdbDevice]:
+        devices = []
+        for line in output.splitlines():
+            parts = line.split()
+            # 跳过命令行输出的标题行和 "* daemon started" 等提示
+            if len(parts) < 2 or line.startswith(("List of devices", "*")):
+                continue
+            properties = dict(p.split(":", 1) for p in parts[2:] if ":" in p)
+            devices.append(AdbDevice(serial=parts[0], state=parts[1], properties=properties))
+        return devices
+
+    def connect(self, address: str, timeout: Optional[float] = None) -> Tuple[bool, str]:
+        """
+        连接网络设备
+
+        Returns:
+            (是否已连接, adb返回的信息)
+        """
+        message = self._query(f"host:connect:{address}", timeout=timeout).strip()
+        return "connected to" in message, message
+
+    def disconnect(self, address: str = "") -> str:
+        """断开网络设备（不传地址则断开全部）"""
+        return self._query(f"host:disconnect:{address}").strip()
+
+    def reconnect(self, serial: str) -> str:
+        """让ADB服务器断开并重建某个设备的传输（adb -s serial reconnect），不影响其他设备"""
+        self._features.pop(serial, None)
+        return self._query(f"host-serial:{serial}:reconnect").strip()
+
+    def features(self, serial: str) -> set:
+        """设备支持的特性（shell_v2等），按序列号缓存"""
+        if serial not in self._features:
+            try:
+                self._features[serial] = set(self._query(f"host-serial:{serial}:features").strip().split(","))
+            except (AdbError, OSError):
+                return set()
+        return self._features[serial]
+
+    # ========== 设备命令 ==========
+
+    def shell(self, serial: Optional[str], command: str, timeout: Optional[float] = None) -> AdbResult:
+        """
+        执行 adb shell 命令
+
+        设备支持shell_v2时可以分开stdout/stderr并取得退出码，否则退出码固定为0（与旧版adb一致）
+        """
+        timeout = timeout or self.timeout
+        args = ["-s", serial, "shell", command] if serial else ["shell", command]
+        if serial and "shell_v2" in self.features(serial):
+            stdout, stderr, code = [], [], 0
+            with self._open_device_service(serial, f"shell,v2,raw:{command}", timeout) as sock:
+                while True:
+                    try:
+                        header = self._recv_exact(sock, 5)
+                    except ConnectionError:
+                        break
+                    packet_id, length = struct.unpack("<BI", header)
+                    data = self._recv_exact(sock, length)
+                    if packet_id == SHELL_V2_STDOUT:
+                        stdout.append(data)
+                    elif packet_id == SHELL_V2_STDERR:
+                        stderr.append(data)
+                    elif packet_id == SHELL_V2_EXIT:
+                        code = data[0] if data else 0
+                        break
+            return AdbResult(args, code,
+                             b"".join(stdout).decode("utf-8", errors="replace"),
+                             b"".join(stderr).decode("utf-8", errors="replace"))
+
+        with self._open_device_service(serial, f"shell:{command}", timeout) as sock:
+            output = self._recv_all(sock).decode("utf-8", errors="replace")
+        return AdbResult(args, 0, output)
+
+    def shell_stream(self, serial: Optional[str], command: str,
+                     timeout: Optional[float] = None) -> Iterator[str]:
+        """逐行返回shell输出（适合logcat、getevent等持续输出的命令）"""
+        sock = self._open_device_service(serial, f"shell:{command}", timeout or self.timeout)
+        sock.settimeout(timeout)
+        buffer = b""
+        try:
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    yield line.rstrip(b"\r").decode("utf-8", errors="replace")
+            if buffer:
+                yield buffer.decode("utf-8", errors="replace")
+        finally:
+            sock.close()
+
+    def exec_out(self, serial: Optional[str], command: str, timeout: Optional[float] = None) -> bytes:
+        """adb exec-out：原样返回二进制输出（如 screencap -p）"""
+        with self._open_device_service(serial, f"exec:{command}", timeout or self.timeout) as sock:
+            return self._recv_all(sock)
+
+    # ========== 与adb命令行兼容的入口 ==========
+
+    def run(self, args: List[str], timeout: Optional[float] = None) -> AdbResult:
+        """
+        按adb命令行参数执行，输出格式与adb命令行一致
+
+        支持 devices [-l] / version / connect / disconnect / kill-server / start-server /
+        [-s serial] shell / exec-out，其余命令或连不上ADB服务器时退回subprocess。
+        命令发出后连接中断（可能已在设备上执行）不再用subprocess重复执行，按失败返回。
+        超时抛出 subprocess.TimeoutExpired，与原有调用的异常处理保持一致。
+
+        Args:
+            args: adb之后的参数，如 ["-s", "127.0.0.1:59700", "shell", "getprop"]
+            timeout: 超时（秒）
+        """
+        timeout = timeout or self.timeout
+        args = [str(a) for a in args]
+        try:
+            result = self._run_socket(args, timeout)
+        except socket.timeout:
+            raise subprocess.TimeoutExpired([self.adb_path] + args, timeout)
+        except AdbError as e:
+            self.stats['socket'] += 1
+            return AdbResult(args, 1, "", f"adb: error: {e}\n")
+        except AdbServerUnavailable:
+            result = None  # 命令尚未发出，改用adb进程
+        except OSError as e:
+            self.stats['socket'] += 1
+            return AdbResult(args, 1, "", f"adb: error: 连接中断: {e}\n")
+        if result is not None:
+            self.stats['socket'] += 1
+            return result
+        return self._run_subprocess(args, timeout)
+
+    def _run_socket(self, args: List[str], timeout: float) -> Optional[AdbResult]:
+        """用协议执行命令，不支持的命令返回None"""
+        serial = None
+        if len(args) >= 2 and args[0] == "-s":
+            serial, args = args[1], args[2:]
+        if not args:
+            return None
+        command, rest = args[0], args[1:]
+        full_args = (["-s", serial] if serial else []) + args
+
+        if serial is None:
+            if command == "devices":
+                long = rest == ["-l"]
+                if rest and not long:
+                    return None
+                output = self._query("host:devices-l" if long else "host:devices", timeout)
+                return AdbResult(full_args, 0, f"List of devices attached\n{output}\n")
+            if command == "version" and not rest:
+                version = int(self._query("host:version", timeout), 16)
+                return AdbResult(full_args, 0,
+                                 f"Android Debug Bridge version 1.0.{version}\nInstalled as {self.adb_path}\n")
+            if command == "connect" and len(rest) == 1:
+                ok, message = self.connect(rest[0], timeout)
+                return AdbResult(full_args, 0, message + "\n")  # 与adb命令行一致，结果看输出
+            if command == "disconnect" and len(rest) <= 1:
+                message = self._query(f"host:disconnect:{rest[0] if rest else ''}", timeout).strip()
+                return AdbResult(full_args, 0, message + "\n")
+            if command == "kill-server" and not rest:
+                self.kill_server()
+                return AdbResult(full_args, 0)
+            if command == "start-server" and not rest:
+                started = self.start_server()
+                return AdbResult(full_args, 0 if started else 1)
+
+        if command == "shell" and rest:
+            result = self.shell(serial, " ".join(rest), timeout)
+            result.args = full_args
+            return result
+        if command == "exec-out" and rest:
+            output = self.exec_out(serial, " ".join(rest), timeout)
+            return AdbResult(full_args, 0, output.decode("utf-8", errors="replace"))
+        return None
+
+    def _run_subprocess(self, args: List[str], timeout: float) -> AdbResult:
+        """后备方式：启动adb进程执行"""
+        self.stats['subprocess'] += 1
+        result = subprocess.run(
+            [self.adb_path] + args,
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=timeout
+        )
+        return AdbResult(args, result.returncode, result.stdout or "", result.stderr or "", "subprocess")
+
+    # ========== 性能测试 ==========
+
+    def benchmark(self, serial: Optional[str] = None, rounds: int = 10) -> Dict[str, Dict[str, float]]:
+        """
+        对比协议方式与subprocess方式的单条命令耗时
+
+        Args:
+            serial: 设备序列号（提供时额外测试shell命令）
+            rounds: 每条命令的执行次数
+
+        Returns:
+            {命令: {'socket': 中位数毫秒, 'subprocess': 中位数毫秒}}
+        """
+        commands = [["devices"], ["version"]]
+        if serial:
+            commands.append(["-s", serial, "shell", "echo ok"])
+
+        report = {}
+        for args in commands:
+            timings = {}
+            for name, runner in (("socket", self.run), ("subprocess", self._run_subprocess)):
+                samples = []
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    try:
+                        runner(args, self.timeout)
+                    except Exception:
+                        continue
+                    samples.append((time.perf_counter() - started) * 1000)
+                samples.sort()
+                timings[name] = samples[len(samples) // 2] if samples else float("nan")
+            report[" ".join(args)] = timings
+        return report
+
+
+_adb_client_instance = None
+_adb_path_given = False  # 全局实例的adb路径是否由调用方提供（否则为默认的"adb"）
+
+
+def get_adb_client(adb_path: Union[str, Path, None] = None) -> AdbClient:
+    """
+    获取全局ADB客户端（所有调用共用一个实例，不因adb路径不同而重建）
+
+    Args:
+        adb_path: adb可执行文件路径，只用于启动服务器和subprocess后备；
+                  以第一次提供的路径为准，之后传入的其他路径被忽略
+    """
+    global _adb_client_instance, _adb_path_given
+    if _adb_client_instance is None:
+        _adb_client_instance = AdbClient(adb_path or "adb")
+    elif adb_path is not None and not _adb_path_given:
+        _adb_client_instance.adb_path = str(adb_path)
+    _adb_path_given = _adb_path_given or adb_path is not None
+    return _adb_client_instance
+
+
+# 测试代码
+if __name__ == "__main__":
+    import sys
+
+    serial = sys.argv[1] if len(sys.argv) > 1 else None
+    client = get_adb_client()
+    print(client.run(["devices", "-l"]).stdout)
+
+    print(f"{'命令':<30}{'socket(ms)':>12}{'subprocess(ms)':>16}")
+    for command, timings in client.benchmark(serial).items():
+        print(f"{command:<30}{timings['socket']:>12.1f}{timings['subprocess']:>16.1f}")
@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+ADB设备状态跟踪 - 订阅ADB服务器的 track-devices 推送
+设备上线、离线、未授权等状态变化由ADB服务器立即推送，维护一份内存设备表并派发变化事件，
+取代反复执行 adb devices 轮询
+"""
+
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from adb_client import AdbClient, AdbError, get_adb_client
+
+
+# 设备已移除（不在设备列表中）时事件里的状态
+STATE_GONE = ""
+
+
+@dataclass
+class DeviceEvent:
+    """设备状态变化事件"""
+    serial: str
+    old_state: str  # 空字符串表示之前不在列表中
+    new_state: str  # 空字符串表示已从列表中移除
+    timestamp: datetime = field(default_factory=datetime.now)
+
+    @property
+    def went_offline(self) -> bool:
+        """从可用变为不可用（离线、未授权或移除）"""
+        return self.old_state == "device" and self.new_state != "device"
+
+    @property
+    def came_online(self) -> bool:
+        return self.old_state != "device" and self.new_state == "device"
+
+
+class DeviceTracker:
+    """
+    设备状态跟踪器
+
+    后台线程保持一条 host:track-devices 连接，ADB服务器在设备列表变化时推送完整列表。
+    连接断开（如kill-server）时 is_live 变为False，调用方应退回轮询，跟踪器按退避间隔自动重连。
+
+    用法:
+        tracker = get_device_tracker(adb)
+        tracker.add_listener(lambda event: print(event))
+        if tracker.is_live:
+            state = tracker.state("127.0.0.1:59700")
+    """
+
+    def __init__(self, adb: Optional[AdbClient] = None, log_func=None,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 10):
+        """
+        初始化跟踪器
+
+        Args:
+            adb: ADB客户端
+            log_func: 日志函数
+            reconnect_delay: 连接断开后的首次重连间隔（秒）
+            max_reconnect_delay: 最大重连间隔（秒）
+        """
+        self.adb = adb or get_adb_client()
+        self.log = log_func if log_func else print
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.listeners: List[Callable[[DeviceEvent], None]] = []
+        self._table: Dict[str, str] = {}
+        self._condition = threading.Condition()
+        self._live = False
+        self._sock: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self.stats = {'updates': 0, 'events': 0, 'reconnects': 0, 'last_update': 0.0}
+
+    # ========== 查询 ==========
+
+    @property
+    def is_live(self) -> bool:
+        """设备表是否与ADB服务器保持同步"""
+        return self._live
+
+    def devices(self) -> Dict[str, str]:
+        """当前设备表 {序列号: 状态}"""
+        with self._condition:
+            return dict(self._table)
+
+    def state(self, serial: str) -> Optional[str]:
+        """设备状态（device/offline/unauthorized...），不在列表中返回None"""
+        with self._condition:
+            return self._table.get(serial)
+
+    def wait_for_state(self, serial: str, states=("device",), timeout: float = 10) -> bool:
+        """
+        等待设备进入指定状态
+
+        Returns:
+            是否在超时前进入该状态（跟踪器未同步时立即返回False）
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            while self._table.get(serial) not in states:
+                remaining = deadline - time.time()
+                if remaining <= 0 or not self._live:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def add_listener(self, listener: Callable[[DeviceEvent], None]):
+        if listener not in self.listeners:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[DeviceEvent], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    # ========== 跟踪线程 ==========
+
+    def start(self):
+        """启动后台跟踪（已在运行时忽略）"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True, name="AdbDeviceTracker")
+        self._thread.start()
+
+    def stop(self):
+        """停止跟踪"""
+        self._stop_event.set()
+        sock = self._sock
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            try:
+                with self.adb.open_host_stream("host:track-devices", timeout=5) as sock:
+                    self._sock = sock
+                    sock.settimeout(None)  # 推送连接长期阻塞读取
+                    delay = self.reconnect_delay
+                    while not self._stop_event.is_set():
+                        self._apply(self.adb.read_message(sock))
+            except (OSError, AdbError, ValueError):
+                pass  # ADB服务器未运行或连接断开
+            finally:
+                self._sock = None
+
+            if self._live:
+                self.log("[设备跟踪] 与ADB服务器的连接断开，等待重连")
+            with self._condition:
+                self._live = False
+                self._condition.notify_all()
+            if self._stop_event.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+            self.stats['reconnects'] += 1
+
+    def _apply(self, payload: str):
+        """用推送的完整设备列表更新设备表，派发变化事件"""
+        table = {d.serial: d.state for d in AdbClient.parse_devices(payload)}
+        with self._condition:
+            previous = self._table
+            self._table = table
+            self._live = True
+            self.stats['updates'] += 1
+            self.stats['last_update'] = time.time()
+            self._condition.notify_all()
+
+        events = [
+            DeviceEvent(serial, previous.get(serial, STATE_GONE), table.get(serial, STATE_GONE))
+            for serial in sorted(set(previous) | set(table))
+            if previous.get(serial) != table.get(serial)
+        ]
+        for event in events:
+            self.stats['events'] += 1
+            for listener in list(self.listeners):
+                try:
+                    listener(event)
+                except Exception as e:
+                    self.log(f"[设备跟踪] 回调错误: {e}")
+
+
+_tracker_instance = None
+
+
+def get_device_tracker(adb: Optional[AdbClient] = None) -> DeviceTracker:
+    """
+    获取全局设备跟踪器（首次调用时启动）
+
+    Args:
+        adb: 仅在首次调用、创建跟踪器时使用；之后的调用忽略该参数，始终返回已有的跟踪器
+             （需要另一个ADB服务器的设备表时直接创建 DeviceTracker）
+    """
+    global _tracker_instance
+    if _tracker_instance is None:
+        _tracker_instance = DeviceTracker(adb)
+        _tracker_instance.start()
+    return _tracker_instance
+
+
+def current_device_states(adb: Optional[AdbClient] = None, timeout: float = 10) -> Dict[str, str]:
+    """
+    当前设备表 {序列号: 状态}
+
+    跟踪器已同步时直接读内存设备表，否则（如ADB服务器刚重启）查询一次设备列表
+    """
+    tracker = get_device_tracker(adb)
+    if tracker.is_live:
+        return tracker.devices()
+    result = tracker.adb.run(["devices"], timeout=timeout)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "无法获取设备列表")
+    return {d.serial: d.state for d in AdbClient.parse_devices(result.stdout)}
+
+
+# 测试代码
+if __name__ == "__main__":
+    tracker = get_device_tracker()
+    tracker.add_listener(lambda e: print(f"{e.timestamp:%H:%M:%S.%f} {e.serial}: "
+                                         f"{e.old_state or '(无)'} -> {e.new_state or '(移除)'}"))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        tracker.stop()
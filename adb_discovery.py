@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+ADB端口发现 - 并发探测常用端口，只对有响应的端口执行adb connect
+先用非阻塞TCP连接同时探测所有候选端口（每个未开放端口只花一次短超时），
+再并行连接有响应的端口，结果按历史命中次数和延迟排序并缓存到下次启动
+"""
+
+import errno
+import json
+import selectors
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from adb_client import AdbClient, get_adb_client
+
+
+# 常用ADB端口
+COMMON_ADB_PORTS = [
+    # 红手指常用端口
+    59700, 59701, 59702, 53709,
+    # MuMu模拟器
+    16384, 16416, 16448,
+    # 夜神模拟器
+    62001, 62025, 62026,
+    # 雷电模拟器
+    5555, 5557, 5559,
+    # 其他常见端口
+    52056, 50366, 51527, 58526, 56644
+]
+
+# 同时打开的探测socket上限
+PROBE_BATCH_SIZE = 256
+
+
+@dataclass
+class DiscoveredDevice:
+    """发现的设备"""
+    address: str
+    port: int
+    probe_ms: float  # TCP握手耗时
+    connected: bool = False
+    state: str = ""  # adb devices 中的状态
+    message: str = ""  # adb connect 输出
+    hits: int = 0  # 历史发现次数（含本次）
+
+
+class AdbPortDiscovery:
+    """
+    ADB端口发现
+
+    用法:
+        discovery = AdbPortDiscovery(get_adb_client(adb_path))
+        devices = discovery.discover()
+        if devices:
+            udid = devices[0].address
+    """
+
+    def __init__(self, adb: Optional[AdbClient] = None, host: str = "127.0.0.1",
+                 ports: Optional[Iterable[int]] = None,
+                 port_ranges: Optional[List[Tuple[int, int]]] = None,
+                 probe_timeout: float = 0.3, connect_timeout: float = 5,
+                 cache_path=None, log_func=None):
+        """
+        初始化端口发现
+
+        Args:
+            adb: ADB客户端
+            host: 设备主机地址
+            ports: 候选端口（默认COMMON_ADB_PORTS）
+            port_ranges: 额外扫描的端口范围 [(起始, 结束)]，包含两端
+            probe_timeout: TCP探测超时（秒）
+            connect_timeout: adb connect超时（秒）
+            cache_path: 排名缓存文件，默认为程序目录下的adb_ports_cache.json
+            log_func: 日志函数
+        """
+        self.adb = adb or get_adb_client()
+        self.host = host
+        self.ports = list(ports) if ports is not None else list(COMMON_ADB_PORTS)
+        self.port_ranges = list(port_ranges or [])
+        self.probe_timeout = probe_timeout
+        self.connect_timeout = connect_timeout
+        self.cache_path = Path(cache_path) if cache_path else Path(__file__).parent / "adb_ports_cache.json"
+        self.log = log_func if log_func else print
+
+    # ========== 缓存 ==========
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                return json.load(f).get('devices', {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache: Dict[str, Dict]):
+        try:
+            with open(self.cache_path, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': time.time(), 'devices': cache}, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.log(f"[端口发现] 保存缓存失败: {e}")
+
+    def cached_ranking(self) -> List[str]:
+        """上次缓存的设备地址（按排名）"""
+        cache = self._load_cache()
+        return sorted(cache, key=lambda a: cache[a].get('rank', 999))
+
+    # ========== 探测 ==========
+
+    def candidate_ports(self) -> List[int]:
+        """候选端口：缓存中的端口优先，其次常用端口和配置的范围"""
+        ports = []
+        for address in self.cached_ranking():
+            host, _, port = address.rpartition(':')
+            if host == self.host and port.isdigit():
+                ports.append(int(port))
+        ports.extend(self.ports)
+        for start, end in self.port_ranges:
+            ports.extend(range(start, end + 1))
+        return list(dict.fromkeys(ports))
+
+    def probe(self, ports: List[int]) -> Dict[int, float]:
+        """
+        并发TCP探测
+
+        所有socket非阻塞发起连接，用selectors等待握手结果，总耗时约为一次探测超时。
+
+        Returns:
+            {开放端口: 握手耗时毫秒}
+        """
+        open_ports = {}
+        for i in range(0, len(ports), PROBE_BATCH_SIZE):
+            open_ports.update(self._probe_batch(ports[i:i + PROBE_BATCH_SIZE]))
+        return open_ports
+
+    def _probe_batch(self, ports: List[int]) -> Dict[int, float]:
+        selector = selectors.DefaultSelector()
+        started = time.perf_counter()
+        open_ports = {}
+        try:
+            for port in ports:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                code = sock.connect_ex((self.host, port))
+                if code in (0, errno.EINPROGRESS, errno.EWOULDBLOCK, getattr(errno, 'WSAEWOULDBLOCK', -1)):
+                    selector.register(sock, selectors.EVENT_WRITE, port)
+                else:
+                    sock.close()
+
+            deadline = started + self.probe_timeout
+            while selector.get_map():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                for key, _ in selector.select(remaining):
+                    sock = key.fileobj
+                    if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                        open_ports[key.data] = (time.perf_counter() - started) * 1000
+                    selector.unregister(sock)
+                    sock.close()
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+            selector.close()
+        return open_ports
+
+    # ========== 连接 ==========
+
+    def _connect(self, port: int, probe_ms: float) -> DiscoveredDevice:
+        address = f"{self.host}:{port}"
+        device = DiscoveredDevice(address=address, port=port, probe_ms=probe_ms)
+        try:
+            result = self.adb.run(["connect", address], timeout=self.connect_timeout)
+            device.message = result.stdout.strip()
+            output = device.message.lower()
+            device.connected = "connected" in output and "failed" not in output and "cannot" not in output
+        except Exception as e:
+            device.message = str(e)
+        return device
+
+    def discover(self) -> List[DiscoveredDevice]:
+        """
+        发现所有可用设备
+
+        Returns:
+            已连接且状态为device的设备，按排名排序（历史命中多的优先，其次握手延迟低的）
+        """
+        ports = self.candidate_ports()
+        started = time.perf_counter()
+        open_ports = self.probe(ports)
+        self.log(f"[端口发现] 探测 {len(ports)} 个端口，{len(open_ports)} 个有响应 "
+                 f"({(time.perf_counter() - started) * 1000:.0f}ms)")
+        if not open_ports:
+            return []
+
+        with ThreadPoolExecutor(max_workers=min(16, len(open_ports)), thread_name_prefix="AdbConnect") as executor:
+            devices = list(executor.map(lambda item: self._connect(*item), open_ports.items()))
+
+        # adb connect成功不代表设备可用（可能是offline/unauthorized），以设备列表为准
+        try:
+            states = {d.serial: d.state for d in self.adb.devices()}
+        except Exception:
+            states = {}
+        for device in devices:
+            device.state = states.get(device.address, "")
+            if states:
+                device.connected = device.state == "device"
+
+        live = [d for d in devices if d.connected]
+        cache = self._load_cache()
+        for device in live:
+            device.hits = cache.get(device.address, {}).get('hits', 0) + 1
+        live.sort(key=lambda d: (-d.hits, d.probe_ms))
+
+        for rank, device in enumerate(live):
+            entry = asdict(device)
+            entry.update(rank=rank, last_seen=time.time())
+            cache[device.address] = entry
+        # 本次未发现的设备排到后面，保留命中次数
+        live_addresses = {d.address for d in live}
+        missing = sorted((a for a in cache if a not in live_addresses), key=lambda a: cache[a].get('rank', 999))
+        for rank, address in enumerate(missing, start=len(live)):
+            cache[address]['rank'] = rank
+        self._save_cache(cache)
+
+        self.log(f"[端口发现] 可用设备: {', '.join(d.address for d in live) or '无'} "
+                 f"(总耗时 {(time.perf_counter() - started) * 1000:.0f}ms)")
+        return live
+
+
+# 测试代码
+if __name__ == "__main__":
+    for found in AdbPortDiscovery().discover():
+        print(f"{found.address}  状态: {found.state}  握手: {found.probe_ms:.1f}ms  命中: {found.hits}")
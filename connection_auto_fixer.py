@@ -8,9 +8,14 @@
 import subprocess
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional, List
-from dataclasses import dataclass
+from typing import Dict, Tuple, Optional, List
+from dataclasses import dataclass, field
+
+from adb_client import get_adb_client
+from adb_discovery import AdbPortDiscovery
+from adb_device_tracker import current_device_states, get_device_tracker
 
 
 @dataclass
@@ -32,6 +37,53 @@ class ConnectionStatus:
         return self.appium_running and self.adb_connected
 
 
+@dataclass
+class RepairRung:
+    """修复阶梯中的一级"""
+    name: str
+    targets: List[str]  # 要修复的设备
+    disrupted: List[str] = field(default_factory=list)  # 受影响的正常设备
+    recovered: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    downtime: Dict[str, float] = field(default_factory=dict)  # 每台设备从断开到恢复的时间（秒）
+    elapsed: float = 0.0
+    error: str = ""  # 本级未能执行完的原因（如ADB命令超时）
+
+    @property
+    def success(self) -> bool:
+        return not self.failed and not self.error
+
+    @property
+    def max_downtime(self) -> float:
+        return max(self.downtime.values(), default=0.0)
+
+
+@dataclass
+class ZombieRepairReport:
+    """僵尸连接修复报告"""
+    targets: List[str] = field(default_factory=list)
+    rungs: List[RepairRung] = field(default_factory=list)
+    unauthorized: List[str] = field(default_factory=list)  # 未授权设备（需在设备上确认，重连/重启无效）
+
+    @property
+    def success(self) -> bool:
+        return not self.unauthorized and (not self.rungs or self.rungs[-1].success)
+
+    def lines(self) -> List[str]:
+        """每级的耗时和停机时间"""
+        result = []
+        if self.unauthorized:
+            result.append(f"未授权设备(需在设备上允许USB调试): {', '.join(self.unauthorized)}")
+        for i, rung in enumerate(self.rungs, 1):
+            status = "成功" if rung.success else f"失败({rung.error or ', '.join(rung.failed)})"
+            line = (f"第{i}级 {rung.name}: {status}, 耗时 {rung.elapsed:.1f}秒, "
+                    f"最长停机 {rung.max_downtime:.1f}秒")
+            if rung.disrupted:
+                line += f", 波及正常设备 {len(rung.disrupted)} 台"
+            result.append(line)
+        return result
+
+
 class ConnectionAutoFixer:
     """连接自动修复器 - 一键修复所有连接问题"""
 
@@ -46,6 +98,8 @@ class ConnectionAutoFixer:
         self.logger = logger
         self.adb_port = adb_port
         self.adb_path = self._find_adb()
+        self.adb = get_adb_client(self.adb_path)
+        self.last_repair_report: Optional[ZombieRepairReport] = None
         self.appium_url = "http://127.0.0.1:4723"
 
     def _find_adb(self) -> Path:
@@ -149,37 +203,24 @@ class ConnectionAutoFixer:
             如果check_offline=False: 返回设备是否正常连接
         """
         try:
-            result = subprocess.run(
-                f'"{self.adb_path}" devices',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
-
-            if result.returncode == 0:
-                output = result.stdout
-                # 检查设备是否在列表中且状态正常
-                for line in output.split('\n'):
-                    if udid in line:
-                        if '\tdevice' in line or ' device' in line:
-                            if not check_offline:
-                                self._log(f"✓ ADB设备已连接: {udid}", "INFO")
-                            return False if check_offline else True
-                        elif 'offline' in line:
-                            if check_offline:
-                                return True
-                            else:
-                                self._log(f"✗ ADB设备离线: {udid}", "WARNING")
-                                return False
-                        elif 'unauthorized' in line:
-                            self._log(f"✗ ADB设备未授权: {udid}", "WARNING")
-                            return False
-
+            # 检查设备是否在设备表中且状态正常
+            state = current_device_states(self.adb).get(udid)
+            if state == 'device':
                 if not check_offline:
-                    self._log(f"✗ ADB设备未找到: {udid}", "WARNING")
+                    self._log(f"✓ ADB设备已连接: {udid}", "INFO")
+                return False if check_offline else True
+            elif state == 'offline':
+                if check_offline:
+                    return True
+                else:
+                    self._log(f"✗ ADB设备离线: {udid}", "WARNING")
+                    return False
+            elif state == 'unauthorized':
+                self._log(f"✗ ADB设备未授权: {udid}", "WARNING")
                 return False
 
+            if not check_offline:
+                self._log(f"✗ ADB设备未找到: {udid}", "WARNING")
             return False
 
         except Exception as e:
@@ -188,128 +229,179 @@ class ConnectionAutoFixer:
 
     def clear_zombie_connections(self, max_retries: int = 3) -> bool:
         """
-        清除ADB僵尸连接（智能版）
+        清除ADB僵尸连接（分级修复）
 
         清理策略：
-        1. 先检测是否有僵尸连接
-        2. 如果有，才执行清理：断开所有ADB连接
-        3. 重启ADB服务器
-        4. 等待网络连接完全释放
+        1. 先检测是否有僵尸连接（offline），未授权设备只报告
+        2. 只断开并重连离线设备，验证恢复
+        3. 仍未恢复才重启ADB服务器，并重连之前的所有网络设备
 
         Args:
-            max_retries: 最大重试次数
+            max_retries: 重启ADB服务器的最大次数
 
         Returns:
             是否成功清除
         """
         self._log("开始清除ADB僵尸连接...", "INFO")
+        return self.repair_zombie_connections(max_restarts=max_retries).success
 
-        # 优化：先检测是否真的有僵尸连接
-        try:
-            result = subprocess.run(
-                f'"{self.adb_path}" devices',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=5
-            )
-
-            offline_count = 0
-            unauthorized_count = 0
-            if result.returncode == 0 and result.stdout:
-                for line in result.stdout.split('\n'):
-                    if 'offline' in line:
-                        offline_count += 1
-                    elif 'unauthorized' in line:
-                        unauthorized_count += 1
-
-            if offline_count == 0 and unauthorized_count == 0:
-                self._log("✓ 未检测到僵尸连接，跳过清理", "INFO")
-                return True
-
-            self._log(f"检测到 {offline_count + unauthorized_count} 个异常连接（离线:{offline_count}, 未授权:{unauthorized_count}），开始清理...", "INFO")
-        except Exception as e:
-            self._log(f"检测异常连接时出错: {e}，继续执行清理", "WARNING")
-
-        try:
-            for attempt in range(max_retries):
-                if attempt > 0:
-                    self._log(f"  重试 {attempt + 1}/{max_retries}...", "INFO")
-
-                # 1. 断开所有设备
-                self._log("  [1/3] 断开所有ADB设备...", "INFO")
-                result = subprocess.run(
-                    f'"{self.adb_path}" devices',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=10
-                )
-
-                if result.returncode == 0 and result.stdout:
-                    for line in result.stdout.split('\n'):
-                        if '127.0.0.1:' in line:
-                            parts = line.split()
-                            if parts:
-                                device_id = parts[0]
-                                subprocess.run(
-                                    f'"{self.adb_path}" disconnect {device_id}',
-                                    capture_output=True,
-                                    shell=True,
-                                    timeout=5
-                                )
-
-                time.sleep(1)
-
-                # 2. 重启ADB服务器
-                self._log("  [2/3] 重启ADB服务器...", "INFO")
-                subprocess.run(
-                    f'"{self.adb_path}" kill-server',
-                    capture_output=True,
-                    shell=True,
-                    timeout=10
-                )
-                time.sleep(2)
+    def repair_zombie_connections(self, serials: Optional[List[str]] = None, max_restarts: int = 2,
+                                  verify_timeout: float = 5) -> ZombieRepairReport:
+        """
+        分级修复僵尸连接，记录每一级的停机时间
 
-                # 启动服务器
-                subprocess.run(
-                    f'"{self.adb_path}" start-server',
-                    capture_output=True,
-                    shell=True,
-                    timeout=10
-                )
-                time.sleep(1)
+        未授权(unauthorized)设备要在设备上确认调试授权，重连和重启ADB服务器都无法修复，
+        只记入报告，不参与修复
 
-                # 3. 验证清理结果
-                self._log("  [3/3] 验证清理结果...", "INFO")
-                result = subprocess.run(
-                    f'"{self.adb_path}" devices',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=10
-                )
+        Args:
+            serials: 要修复的设备（None表示所有offline设备）
+            max_restarts: 重启ADB服务器的最大次数
+            verify_timeout: 每台设备恢复的等待时间（秒）
 
-                # 检查是否还有设备连接
-                connected_devices = 0
-                if result.returncode == 0 and result.stdout:
-                    for line in result.stdout.split('\n'):
-                        if '127.0.0.1:' in line and 'device' in line:
-                            connected_devices += 1
+        Returns:
+            ZombieRepairReport
+        """
+        report = ZombieRepairReport()
+        self.last_repair_report = report
 
-                if connected_devices == 0:
-                    self._log("✓ ADB僵尸连接已清除", "SUCCESS")
+        try:
+            states = current_device_states(self.adb, timeout=5)
+        except Exception as e:
+            self._log(f"检测异常连接时出错: {e}，直接重启ADB服务器", "WARNING")
+            states = {}
+            serials = serials or []
+
+        candidates = serials if serials is not None else list(states)
+        report.unauthorized = [s for s in candidates if states.get(s) == 'unauthorized']
+        for serial in report.unauthorized:
+            self._log(f"✗ 设备未授权: {serial}，请在设备上允许USB调试（重连/重启ADB无法修复）", "WARNING")
+
+        if serials is None:
+            serials = [s for s, state in states.items() if state == 'offline']
+            if not serials:
+                if not report.unauthorized:
+                    self._log("✓ 未检测到僵尸连接，跳过清理", "INFO")
+                return report
+            self._log(f"检测到 {len(serials)} 个离线连接，开始清理...", "INFO")
+        else:
+            serials = [s for s in serials if s not in report.unauthorized]
+            if not serials and report.unauthorized:
+                return report
+        report.targets = list(serials)
+
+        # 第1级：只重连异常设备
+        if serials:
+            rung = self._repair_rung_reconnect(serials, verify_timeout)
+            report.rungs.append(rung)
+            self._log_rung(rung)
+            if rung.success:
+                self._log("✓ ADB僵尸连接已清除（未重启ADB服务器）", "SUCCESS")
+                return report
+            serials = rung.failed
+
+        # 第2级：重启ADB服务器（会中断所有设备，重启后恢复之前的网络设备）
+        healthy = [s for s, state in states.items() if state == 'device' and ':' in s and s not in serials]
+        for attempt in range(max_restarts):
+            if attempt > 0:
+                self._log(f"  重试 {attempt + 1}/{max_restarts}...", "INFO")
+            rung = self._repair_rung_restart(serials, healthy, verify_timeout)
+            report.rungs.append(rung)
+            self._log_rung(rung)
+            if rung.success:
+                self._log("✓ ADB僵尸连接已清除", "SUCCESS")
+                return report
+            healthy = [s for s in healthy if s in rung.recovered]
+            serials = rung.failed
+
+        self._log("✗ 清除僵尸连接失败（达到最大重试次数）", "ERROR")
+        return report
+
+    def _wait_device_online(self, serial: str, deadline: float) -> bool:
+        """等待设备恢复为device状态（设备表同步时等推送，否则轮询）"""
+        tracker = get_device_tracker(self.adb)
+        while time.time() < deadline:
+            try:
+                if current_device_states(self.adb, timeout=5).get(serial) == 'device':
                     return True
-                else:
-                    self._log(f"  仍有 {connected_devices} 个设备连接", "WARNING")
-                    time.sleep(2)
-
-            self._log("✗ 清除僵尸连接失败（达到最大重试次数）", "ERROR")
-            return False
+            except Exception:
+                pass
+            if tracker.is_live:
+                tracker.wait_for_state(serial, timeout=min(0.5, max(0.0, deadline - time.time())))
+            else:
+                time.sleep(0.2)
+        return False
 
+    def _reconnect_serial(self, serial: str, verify_timeout: float) -> Tuple[str, bool, float]:
+        """断开并重连单台设备，返回 (设备, 是否恢复, 停机时间)"""
+        started = time.time()
+        try:
+            if ':' in serial:
+                self.adb.run(["disconnect", serial], timeout=5)
+                self.adb.run(["connect", serial], timeout=10)
+            else:
+                # USB/模拟器设备不能disconnect，让ADB服务器重建该设备的传输
+                self.adb.reconnect(serial)
         except Exception as e:
-            self._log(f"✗ 清除僵尸连接时出错: {e}", "ERROR")
-            return False
+            self._log(f"  重连 {serial} 出错: {e}", "WARNING")
+        ok = self._wait_device_online(serial, started + verify_timeout)
+        return serial, ok, time.time() - started
+
+    def _repair_rung_reconnect(self, serials: List[str], verify_timeout: float) -> RepairRung:
+        """第1级：并行断开并重连异常设备，不影响其他设备"""
+        self._log(f"  [第1级] 重连异常设备: {', '.join(serials)}", "INFO")
+        rung = RepairRung(name="重连异常设备", targets=list(serials))
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=min(8, len(serials))) as executor:
+            for serial, ok, downtime in executor.map(lambda s: self._reconnect_serial(s, verify_timeout), serials):
+                rung.downtime[serial] = downtime
+                (rung.recovered if ok else rung.failed).append(serial)
+        rung.elapsed = time.time() - started
+        return rung
+
+    def _connect_quietly(self, serial: str):
+        """重连网络设备，超时等错误只记录日志（是否恢复由之后的状态检查判断）"""
+        try:
+            self.adb.run(["connect", serial], timeout=10)
+        except Exception as e:
+            self._log(f"  重连 {serial} 出错: {e}", "WARNING")
+
+    def _repair_rung_restart(self, serials: List[str], healthy: List[str], verify_timeout: float) -> RepairRung:
+        """第2级：重启ADB服务器，再重连异常设备和之前正常的网络设备"""
+        self._log(f"  [第2级] 重启ADB服务器（将中断 {len(healthy)} 台正常设备）...", "INFO")
+        rung = RepairRung(name="重启ADB服务器", targets=list(serials), disrupted=list(healthy))
+        started = time.time()
+
+        devices = list(dict.fromkeys(serials + healthy))
+        for command in ("kill-server", "start-server"):
+            try:
+                self.adb.run([command], timeout=10)
+            except subprocess.TimeoutExpired:
+                rung.error = f"adb {command} 超时"
+                rung.failed = devices
+                rung.elapsed = time.time() - started
+                self._log(f"  ✗ {rung.error}", "ERROR")
+                return rung
+
+        network = [s for s in devices if ':' in s]
+        if network:
+            with ThreadPoolExecutor(max_workers=min(8, len(network))) as executor:
+                list(executor.map(self._connect_quietly, network))
+
+        deadline = time.time() + verify_timeout
+        for serial in devices:
+            ok = self._wait_device_online(serial, deadline)
+            rung.downtime[serial] = time.time() - started
+            (rung.recovered if ok else rung.failed).append(serial)
+        rung.elapsed = time.time() - started
+        return rung
+
+    def _log_rung(self, rung: RepairRung):
+        for serial in rung.recovered:
+            self._log(f"    ✓ {serial} 已恢复，停机 {rung.downtime[serial]:.1f}秒", "INFO")
+        for serial in rung.failed:
+            self._log(f"    ✗ {serial} 未恢复", "WARNING")
+        self._log(f"  {rung.name}: 耗时 {rung.elapsed:.1f}秒，最长停机 {rung.max_downtime:.1f}秒"
+                  + (f"，波及正常设备 {len(rung.disrupted)} 台" if rung.disrupted else ""), "INFO")
 
     def fix_offline_device(self, udid: str) -> bool:
         """修复离线的ADB设备（优化版）"""
@@ -332,35 +424,11 @@ class ConnectionAutoFixer:
                 return False  # 提前返回，不浪费时间执行修复流程
 
         try:
-            # 1. 先尝试清除僵尸连接
-            self._log("  [1/4] 清除僵尸连接...", "INFO")
-            self.clear_zombie_connections(max_retries=2)
-
-            # 2. 断开连接
-            self._log("  [2/4] 断开设备连接...", "INFO")
-            subprocess.run(
-                f'"{self.adb_path}" disconnect {udid}',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
-            time.sleep(1)
-
-            # 3. 杀死ADB服务器
-            self._log("  [3/4] 重启ADB服务器...", "INFO")
-            subprocess.run(
-                f'"{self.adb_path}" kill-server',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
-            time.sleep(2)
-
-            # 4. 重新连接
-            self._log("  [4/4] 重新连接设备...", "INFO")
-            if self.connect_adb_device(udid):
+            # 先只重连该设备，失败才重启ADB服务器
+            report = self.repair_zombie_connections(serials=[udid], max_restarts=1)
+            for line in report.lines():
+                self._log(f"  {line}", "INFO")
+            if report.success:
                 self._log(f"✓ 设备修复成功: {udid}", "SUCCESS")
                 return True
             else:
@@ -444,13 +512,7 @@ class ConnectionAutoFixer:
                 # 继续尝试连接，因为有时socket检测不准确
 
         try:
-            result = subprocess.run(
-                f'"{self.adb_path}" connect {udid}',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10  # 优化: 从30秒降低到10秒，快速失败
-            )
+            result = self.adb.run(["connect", udid], timeout=10)  # 优化: 从30秒降低到10秒，快速失败
 
             if result.returncode == 0:
                 # 修复：安全处理 stdout，避免 NoneType 错误
@@ -473,28 +535,27 @@ class ConnectionAutoFixer:
             self._log(f"✗ ADB连接失败: {e}", "ERROR")
             return False
 
-    def auto_scan_adb_ports(self) -> Optional[str]:
-        """自动扫描常用ADB端口"""
+    def auto_scan_adb_ports(self, port_ranges: Optional[List[Tuple[int, int]]] = None) -> Optional[str]:
+        """
+        自动扫描常用ADB端口
+
+        并发探测所有候选端口，只对有响应的端口并行执行adb connect，返回排名第一的设备。
+
+        Args:
+            port_ranges: 额外扫描的端口范围 [(起始, 结束)]
+        """
         self._log("开始扫描常用ADB端口...", "INFO")
 
-        common_ports = [
-            # 红手指常用端口
-            59700, 59701, 59702, 53709,
-            # MuMu模拟器
-            16384, 16416, 16448,
-            # 夜神模拟器
-            62001, 62025, 62026,
-            # 雷电模拟器
-            5555, 5557, 5559,
-        ]
-
-        for port in common_ports:
-            device_address = f"127.0.0.1:{port}"
-            self._log(f"  尝试端口 {port}...", "INFO")
-
-            if self.connect_adb_device(device_address):
-                self._log(f"✓ 找到可用设备: {device_address}", "SUCCESS")
-                return device_address
+        discovery = AdbPortDiscovery(self.adb, port_ranges=port_ranges,
+                                     log_func=lambda msg: self._log(msg, "INFO"))
+        devices = discovery.discover()
+
+        if devices:
+            device_address = devices[0].address
+            self._log(f"✓ 找到可用设备: {device_address}", "SUCCESS")
+            if len(devices) > 1:
+                self._log(f"  其他可用设备: {', '.join(d.address for d in devices[1:])}", "INFO")
+            return device_address
 
         self._log("✗ 未找到可用的ADB设备", "WARNING")
         return None
@@ -7,14 +7,17 @@
 
 import subprocess
 import time
+import threading
 import requests
 import psutil
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from typing import Tuple, Optional, List, Dict, Any
+from typing import Tuple, Optional, List, Dict, Any, Callable
 from dataclasses import dataclass, field
 from enum import Enum
 
 from connection_auto_fixer import ConnectionAutoFixer
+from adb_client import get_adb_client
 
 
 class ProblemSeverity(Enum):
@@ -47,12 +50,23 @@ class DiagnosticReport:
     system_status: Dict[str, Any] = field(default_factory=dict)
     start_time: float = 0
     end_time: float = 0
+    phase_timings: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # 各项诊断的开始时刻、耗时和结果
 
     @property
     def duration(self) -> float:
         """诊断耗时（秒）"""
         return self.end_time - self.start_time if self.end_time > 0 else 0
 
+    @property
+    def sequential_seconds(self) -> float:
+        """各项诊断耗时之和（串行执行所需时间）"""
+        return sum(t['elapsed'] for t in self.phase_timings.values())
+
+    @property
+    def time_saved(self) -> float:
+        """并行执行节省的时间（秒）"""
+        return max(0.0, self.sequential_seconds - self.duration)
+
     @property
     def critical_issues(self) -> List[DiagnosticIssue]:
         """严重问题列表"""
@@ -74,6 +88,16 @@ class DiagnosticReport:
         return len(self.issues) == 0
 
 
+@dataclass
+class DiagnosticPhase:
+    """诊断阶段"""
+    name: str  # 与DiagnosticIssue.category一致
+    run: Callable[[DiagnosticReport], None]
+    status_attr: str  # 该阶段写入的状态字段
+    depends_on: Tuple[str, ...] = ()  # 前置阶段（完成或超时后才开始）
+    deadline: float = 10.0  # 时限（秒）
+
+
 class ConnectionFirstAid:
     """连接急救箱 - 全面体检 + 针对性修复"""
 
@@ -90,8 +114,13 @@ class ConnectionFirstAid:
         self.adb_port = adb_port
         self.appium_url = appium_url
         self.adb_path = self._find_adb()
+        self.adb = get_adb_client(self.adb_path)
         self.auto_fixer = ConnectionAutoFixer(logger=logger, adb_port=adb_port)
 
+        # 并行诊断时各阶段的日志先缓存，阶段结束后整块输出，避免交错
+        self._log_buffer = threading.local()
+        self._log_lock = threading.Lock()
+
     def _find_adb(self) -> Path:
         """查找ADB工具路径"""
         # 标准Android SDK路径
@@ -113,6 +142,11 @@ class ConnectionFirstAid:
 
     def _log(self, message: str, level: str = "INFO"):
         """记录日志"""
+        lines = getattr(self._log_buffer, 'lines', None)
+        if lines is not None:
+            lines.append((message, level))
+            return
+
         if self.logger:
             log_method = getattr(self.logger, level.lower(), None)
             if log_method:
@@ -124,13 +158,17 @@ class ConnectionFirstAid:
 
     # ========== 体检功能 ==========
 
-    def diagnose_all(self, udid: Optional[str] = None, driver=None) -> DiagnosticReport:
+    def diagnose_all(self, udid: Optional[str] = None, driver=None, parallel: bool = True) -> DiagnosticReport:
         """
         全面体检 - 检测所有可能的问题
 
+        互不依赖的诊断并行执行（Appium、ADB、系统资源同时开始），
+        WebDriver诊断在Appium诊断结束后立即开始，网络诊断在Appium和ADB诊断结束后开始。
+
         Args:
             udid: 设备UDID，如果为None则使用self.adb_port
             driver: WebDriver实例（可选，如果提供则进行详细健康检测）
+            parallel: 是否并行执行（False时按原顺序逐项执行）
 
         Returns:
             DiagnosticReport: 详细的诊断报告
@@ -146,20 +184,25 @@ class ConnectionFirstAid:
         self._log("="*80, "INFO")
         self._log("", "INFO")
 
-        # 1. Appium服务诊断
-        self._diagnose_appium(report)
-
-        # 2. ADB诊断
-        self._diagnose_adb(report, udid)
-
-        # 3. WebDriver诊断（如果提供driver则进行详细检测）
-        self._diagnose_webdriver_basic(report, driver=driver)
-
-        # 4. 网络诊断
-        self._diagnose_network(report, udid)
-
-        # 5. 系统资源诊断
-        self._diagnose_system(report)
+        phases = [
+            # 1. Appium服务诊断
+            DiagnosticPhase("Appium", self._diagnose_appium, 'appium_status', deadline=8),
+            # 2. ADB诊断
+            DiagnosticPhase("ADB", lambda r: self._diagnose_adb(r, udid), 'adb_status', deadline=20),
+            # 3. WebDriver诊断（如果提供driver则进行详细检测）
+            DiagnosticPhase("WebDriver", lambda r: self._diagnose_webdriver_basic(r, driver=driver),
+                            'webdriver_status', depends_on=("Appium",), deadline=15),
+            # 4. 网络诊断（复用Appium和ADB的结论，避免重复报告）
+            DiagnosticPhase("Network", lambda r: self._diagnose_network(r, udid),
+                            'network_status', depends_on=("Appium", "ADB"), deadline=6),
+            # 5. 系统资源诊断
+            DiagnosticPhase("System", self._diagnose_system, 'system_status', deadline=6),
+        ]
+        self._run_phases(phases, report, parallel)
+
+        # 问题按诊断顺序排列
+        order = {phase.name: i for i, phase in enumerate(phases)}
+        report.issues.sort(key=lambda issue: order.get(issue.category, len(order)))
 
         report.end_time = time.time()
 
@@ -168,6 +211,109 @@ class ConnectionFirstAid:
 
         return report
 
+    def _run_phases(self, phases: List[DiagnosticPhase], report: DiagnosticReport, parallel: bool):
+        """
+        按依赖关系执行诊断阶段
+
+        每个阶段写入独立的报告副本，按时完成才合并到总报告；超时的阶段不再等待，
+        其结果和日志丢弃（线程无法强制结束，阶段内的子进程仍按各自超时退出）。
+        时限从阶段在工作线程中实际开始时计算（顺序模式下排在超时阶段之后的不会因排队而超时）。
+        """
+        executor = ThreadPoolExecutor(max_workers=len(phases) if parallel else 1,
+                                      thread_name_prefix="FirstAid")
+        origin = time.perf_counter()
+        pending = list(phases)
+        running = {}  # future -> (阶段, 副本, 已有问题数, {'started': 实际开始时刻})
+        resolved = set()
+
+        def launch(phase: DiagnosticPhase):
+            shard = DiagnosticReport(
+                issues=list(report.issues),
+                appium_status=dict(report.appium_status),
+                adb_status=dict(report.adb_status),
+                webdriver_status=dict(report.webdriver_status),
+                network_status=dict(report.network_status),
+                system_status=dict(report.system_status)
+            )
+            seeded = len(shard.issues)
+            clock = {}
+            future = executor.submit(self._run_phase, phase, shard, clock)
+            running[future] = (phase, shard, seeded, clock)
+
+        try:
+            while pending or running:
+                for phase in list(pending):
+                    if not parallel and running:
+                        break
+                    if all(dep in resolved for dep in phase.depends_on):
+                        pending.remove(phase)
+                        launch(phase)
+
+                if not running:
+                    # 依赖无法满足（不应发生），避免死循环
+                    break
+
+                now = time.perf_counter()
+                deadlines = [clock['started'] + phase.deadline
+                             for phase, _, _, clock in running.values() if 'started' in clock]
+                if len(deadlines) < len(running):
+                    deadlines.append(now + 0.1)  # 还在排队的阶段开始后才计时
+                done, _ = wait(list(running), timeout=max(0.0, min(deadlines) - now), return_when=FIRST_COMPLETED)
+
+                now = time.perf_counter()
+                for future in list(running):
+                    phase, shard, seeded, clock = running[future]
+                    started = clock.get('started')
+                    if future in done:
+                        lines, error, finished = future.result()
+                        report.issues.extend(shard.issues[seeded:])
+                        getattr(report, phase.status_attr).update(getattr(shard, phase.status_attr))
+                        status = "error" if error else "ok"
+                        with self._log_lock:
+                            for message, level in lines:
+                                self._log(message, level)
+                    elif started is not None and now >= started + phase.deadline:
+                        future.cancel()
+                        status = "timeout"
+                        report.issues.append(DiagnosticIssue(
+                            category=phase.name,
+                            severity=ProblemSeverity.WARNING,
+                            title=f"{phase.name}诊断超时",
+                            description=f"超过{phase.deadline}秒未完成，结果未计入报告",
+                            possible_causes=["设备或服务响应缓慢", "命令卡住"],
+                            fix_suggestions=["稍后重新体检"],
+                            auto_fixable=False
+                        ))
+                        self._log(f"  ✗ {phase.name}诊断超时（{phase.deadline}秒）", "WARNING")
+                    else:
+                        continue
+
+                    del running[future]
+                    resolved.add(phase.name)
+                    report.phase_timings[phase.name] = {
+                        "start": started - origin,
+                        "elapsed": (finished if status != "timeout" else now) - started,
+                        "deadline": phase.deadline,
+                        "status": status
+                    }
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_phase(self, phase: DiagnosticPhase, shard: DiagnosticReport, clock: dict):
+        """在工作线程中执行一个阶段（开始时刻写入clock），返回 (缓存的日志, 异常, 结束时刻)"""
+        clock['started'] = time.perf_counter()
+        self._log_buffer.lines = []
+        error = None
+        try:
+            phase.run(shard)
+        except Exception as e:
+            error = e
+            self._log(f"  ✗ {phase.name}诊断异常: {e}", "ERROR")
+        finally:
+            lines = self._log_buffer.lines
+            self._log_buffer.lines = None
+        return lines, error, time.perf_counter()
+
     def _diagnose_appium(self, report: DiagnosticReport):
         """诊断Appium服务"""
         self._log("━"*80, "INFO")
@@ -297,13 +443,7 @@ class ConnectionFirstAid:
             # 检测2: ADB服务器状态
             self._log("  [2.2] 检测 ADB 服务器状态...", "INFO")
             try:
-                result = subprocess.run(
-                    f'"{self.adb_path}" version',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=5
-                )
+                result = self.adb.run(["version"], timeout=5)
                 if result.returncode == 0:
                     version_line = result.stdout.split('\n')[0]
                     report.adb_status['version'] = version_line
@@ -316,13 +456,7 @@ class ConnectionFirstAid:
             # 检测3: 设备列表
             self._log("  [2.3] 检测 ADB 设备连接...", "INFO")
             try:
-                result = subprocess.run(
-                    f'"{self.adb_path}" devices -l',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=10
-                )
+                result = self.adb.run(["devices", "-l"], timeout=10)
 
                 if result.returncode == 0:
                     devices_output = result.stdout
@@ -759,6 +893,12 @@ class ConnectionFirstAid:
         self._log("="*80, "INFO")
         self._log("", "INFO")
         self._log(f"⏱️ 诊断耗时: {report.duration:.2f}秒", "INFO")
+        if report.phase_timings:
+            status_text = {"ok": "", "error": " (异常)", "timeout": " (超时)"}
+            for name, timing in sorted(report.phase_timings.items(), key=lambda kv: kv[1]['start']):
+                self._log(f"   {name}: {timing['elapsed']:.2f}秒 (开始于+{timing['start']:.2f}秒)"
+                          f"{status_text.get(timing['status'], '')}", "INFO")
+            self._log(f"   并行节省: {report.time_saved:.2f}秒 (逐项合计{report.sequential_seconds:.2f}秒)", "INFO")
         self._log("", "INFO")
 
         if report.is_healthy:
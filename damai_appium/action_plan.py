@@ -0,0 +1,238 @@
+# -*- coding: UTF-8 -*-
+"""
+W3C动作计划 - 将多次点击和等待编译为一次 actions 请求
+预先根据当前页面快照校验坐标，发送时只需一次HTTP往返，点击间隔由设备端精确执行
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, Dict, Any
+
+from selenium.webdriver.remote.command import Command
+
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+# 服务端在执行前就拒绝请求的错误（设备未执行任何动作，可以安全地换方式重发）
+_REJECTED_ERRORS = ("invalid argument", "unknown command", "unknown method", "unsupported operation",
+                    "not implemented", "invalid session id")
+_REJECTED_TYPES = ("InvalidArgumentException", "UnknownMethodException", "InvalidSessionIdException")
+
+
+def _rejected_before_execution(error: BaseException) -> bool:
+    """请求是否在执行前被拒绝（读超时、连接中断等无法确定设备是否已执行的错误返回False）"""
+    if type(error).__name__ in _REJECTED_TYPES:
+        return True
+    message = str(error).lower()
+    return any(pattern in message for pattern in _REJECTED_ERRORS)
+
+
+def checked_state(page_source: str, text: str) -> Optional[bool]:
+    """
+    读取某行文字对应的勾选状态（如观演人列表中的复选框）
+
+    从文字节点向上找到只包含一个可勾选元素的最近容器，返回该元素的checked/selected；
+    无法确定时返回None
+
+    Args:
+        page_source: 当前页面XML
+        text: 行内文字（如观演人姓名）
+    """
+    try:
+        root = ET.fromstring(page_source)
+    except ET.ParseError:
+        return None
+    parents = {child: parent for parent in root.iter() for child in parent}
+    for node in root.iter():
+        if node.get('text') != text:
+            continue
+        container = node
+        while container is not None:
+            boxes = [n for n in container.iter() if n.get('checkable') == 'true']
+            if len(boxes) == 1:
+                return boxes[0].get('checked') == 'true' or boxes[0].get('selected') == 'true'
+            if boxes:
+                break  # 已扩展到包含多行的容器
+            container = parents.get(container)
+    return None
+
+
+@dataclass
+class ActionStep:
+    """动作步骤"""
+    kind: str  # 'tap' 或 'wait'
+    x: int = 0
+    y: int = 0
+    duration_ms: int = 0  # tap: 按下时长; wait: 等待时长
+    name: str = ""
+    require_clickable: bool = False  # 校验时要求命中可点击元素
+    expect_text: Optional[str] = None  # 校验时要求命中元素包含的文字
+
+
+class ActionPlan:
+    """
+    动作计划构建器
+
+    用法:
+        plan = ActionPlan().tap(209, 435, "场次").wait(500).tap(169, 659, "票档")
+        ok, errors = plan.validate(driver.page_source)
+        if ok:
+            plan.dispatch(driver)
+    """
+
+    def __init__(self, pointer_id: str = "finger1"):
+        self.pointer_id = pointer_id
+        self.steps: List[ActionStep] = []
+        self.rejected = False  # 最近一次dispatch是否在执行前被拒绝（设备未执行任何动作）
+
+    def tap(self, x: int, y: int, name: str = "", press_ms: int = 50,
+            require_clickable: bool = False, expect_text: Optional[str] = None) -> "ActionPlan":
+        """添加一次点击"""
+        self.steps.append(ActionStep(
+            kind='tap', x=int(x), y=int(y), duration_ms=int(press_ms), name=name or f"({x}, {y})",
+            require_clickable=require_clickable, expect_text=expect_text
+        ))
+        return self
+
+    def wait(self, ms: int) -> "ActionPlan":
+        """添加一次等待（毫秒）"""
+        if ms > 0:
+            self.steps.append(ActionStep(kind='wait', duration_ms=int(ms)))
+        return self
+
+    @property
+    def tap_count(self) -> int:
+        """点击次数"""
+        return sum(1 for step in self.steps if step.kind == 'tap')
+
+    @property
+    def total_duration_ms(self) -> int:
+        """计划执行总时长（毫秒）"""
+        return sum(step.duration_ms for step in self.steps)
+
+    # ========== 校验 ==========
+
+    @staticmethod
+    def _parse_bounds(bounds: str) -> Optional[Tuple[int, int, int, int]]:
+        match = _BOUNDS_PATTERN.match(bounds or "")
+        if not match:
+            return None
+        return tuple(int(v) for v in match.groups())
+
+    def _hit_test(self, root: ET.Element, x: int, y: int) -> List[ET.Element]:
+        """返回包含该点的元素链（从外到内）"""
+        chain = []
+        node = root
+        while True:
+            hit = None
+            for child in node:
+                rect = self._parse_bounds(child.get('bounds', ''))
+                if rect and rect[0] <= x < rect[2] and rect[1] <= y < rect[3]:
+                    hit = child  # 后出现的兄弟元素在上层，取最后一个
+            if hit is None:
+                return chain
+            chain.append(hit)
+            node = hit
+
+    def validate(self, page_source: str, screen_size: Optional[Tuple[int, int]] = None) -> Tuple[bool, List[str]]:
+        """
+        根据当前页面快照校验计划
+
+        Args:
+            page_source: 当前页面XML
+            screen_size: 屏幕尺寸 (宽, 高)，为None时从XML根节点读取
+
+        Returns:
+            (是否通过, 问题列表)
+        """
+        errors = []
+        try:
+            root = ET.fromstring(page_source)
+        except ET.ParseError as e:
+            return False, [f"页面XML解析失败: {e}"]
+
+        if screen_size is None and root.get('width') and root.get('height'):
+            screen_size = (int(root.get('width')), int(root.get('height')))
+
+        for step in self.steps:
+            if step.kind != 'tap':
+                continue
+
+            if screen_size and not (0 <= step.x < screen_size[0] and 0 <= step.y < screen_size[1]):
+                errors.append(f"{step.name}: 坐标({step.x}, {step.y})超出屏幕{screen_size}")
+                continue
+
+            chain = self._hit_test(root, step.x, step.y)
+            if not chain:
+                errors.append(f"{step.name}: 坐标({step.x}, {step.y})未命中任何元素")
+                continue
+
+            if step.require_clickable and not any(node.get('clickable') == 'true' for node in chain):
+                errors.append(f"{step.name}: 坐标({step.x}, {step.y})处没有可点击元素")
+
+            if step.expect_text:
+                texts = ''.join(node.get('text', '') + node.get('content-desc', '') for node in chain)
+                if step.expect_text not in texts:
+                    errors.append(f"{step.name}: 坐标({step.x}, {step.y})处未找到'{step.expect_text}'")
+
+        return len(errors) == 0, errors
+
+    # ========== 编译与发送 ==========
+
+    def compile(self) -> Dict[str, Any]:
+        """编译为W3C actions请求体"""
+        actions = []
+        for step in self.steps:
+            if step.kind == 'tap':
+                actions.extend([
+                    {"type": "pointerMove", "duration": 0, "x": step.x, "y": step.y, "origin": "viewport"},
+                    {"type": "pointerDown", "button": 0},
+                    {"type": "pause", "duration": step.duration_ms},
+                    {"type": "pointerUp", "button": 0},
+                ])
+            else:
+                actions.append({"type": "pause", "duration": step.duration_ms})
+
+        return {
+            "actions": [{
+                "type": "pointer",
+                "id": self.pointer_id,
+                "parameters": {"pointerType": "touch"},
+                "actions": actions
+            }]
+        }
+
+    def dispatch(self, driver, page_source: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        一次请求发送整个计划
+
+        Args:
+            driver: Appium driver
+            page_source: 提供时先校验，校验失败则不发送
+
+        Returns:
+            (是否成功, 消息)；失败时 rejected 表示设备是否确定未执行
+        """
+        self.rejected = True
+        if not self.steps:
+            return False, "动作计划为空"
+
+        if page_source is not None:
+            ok, errors = self.validate(page_source)
+            if not ok:
+                return False, "; ".join(errors)
+
+        try:
+            driver.execute(Command.W3C_ACTIONS, self.compile())
+        except Exception as e:
+            self.rejected = _rejected_before_execution(e)
+            return False, f"发送动作计划失败: {e}"
+        finally:
+            try:
+                driver.execute(Command.W3C_CLEAR_ACTIONS)
+            except Exception:
+                pass
+
+        self.rejected = False
+        return True, f"已发送 {self.tap_count} 次点击 (计划时长 {self.total_duration_ms}ms)"
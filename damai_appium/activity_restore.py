@@ -0,0 +1,267 @@
+# -*- coding: UTF-8 -*-
+"""
+Activity级状态恢复 - 会话重建后直接回到掉线前的页面
+掉线时通过 dumpsys activity 记录前台Activity及其Intent（action/data/flags/extras），
+新会话建立后用 mobile: startActivity 重新打开该页面，并用页面快照验证确实回到了原页面；
+恢复失败时才退回从首页导航
+
+用法:
+    state = capture_activity_state(driver, shell_func=lambda cmd: adb.shell(serial, cmd).stdout)
+    ... 重建会话 ...
+    result = restore_activity_state(new_driver, state, drop_time=drop_time)
+    if not result.success:
+        navigate_from_home()
+"""
+
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+try:
+    from .snapshot_service import get_snapshot_service, Snapshot
+except ImportError:
+    from snapshot_service import get_snapshot_service, Snapshot
+
+
+# dumpsys中前台Activity的几种写法（不同Android版本）
+_RESUMED_PATTERNS = (
+    re.compile(r'topResumedActivity=ActivityRecord\{(\w+) u\d+ (\S+?/\S+?)[ }]'),
+    re.compile(r'mResumedActivity: ActivityRecord\{(\w+) u\d+ (\S+?/\S+?)[ }]'),
+    re.compile(r'ResumedActivity: ActivityRecord\{(\w+) u\d+ (\S+?/\S+?)[ }]'),
+)
+_INTENT_PATTERN = re.compile(r'(?:Intent \{|intent=\{)([^\n]*?)\}')
+_BUNDLE_PATTERN = re.compile(r'Bundle\[\{([^\n]*?)\}\]')
+_TEXT_PATTERN = re.compile(r'text="([^"]{2,30})"')
+
+# 页面标志文字数量上限（用于验证恢复后的页面）
+MAX_PAGE_MARKERS = 12
+
+
+@dataclass
+class ActivityState:
+    """掉线前的前台页面"""
+    package: str
+    activity: str  # 如 .projectdetail.ui.ProjectDetailActivity
+    action: Optional[str] = None
+    data: Optional[str] = None
+    flags: Optional[str] = None
+    extras: List[Tuple[str, str, str]] = field(default_factory=list)  # [(类型, 键, 值)]，mobile: startActivity格式
+    page_markers: List[str] = field(default_factory=list)  # 页面上的稳定文字
+    source: str = "driver"  # dumpsys / driver
+    captured_at: float = field(default_factory=time.time)
+
+    @property
+    def component(self) -> str:
+        return f"{self.package}/{self.activity}"
+
+    def matches_activity(self, current_activity: Optional[str]) -> bool:
+        """当前Activity是否就是记录的页面（兼容完整类名和简写）"""
+        if not current_activity:
+            return False
+        short = self.activity.lstrip('.').split('.')[-1]
+        return current_activity.lstrip('.').split('.')[-1] == short
+
+
+@dataclass
+class RestoreResult:
+    """页面恢复结果"""
+    success: bool
+    method: str  # current（已在原页面） / activity / deeplink / navigation / none
+    restore_seconds: float = 0.0  # 恢复步骤本身的耗时
+    time_to_resume: float = 0.0  # 从掉线到回到原页面的总耗时
+    detail: str = ""
+
+
+def _typed_extra(key: str, value: str) -> Tuple[str, str, str]:
+    """
+    dump中的extra一律按字符串重放
+
+    Bundle[{...}] 只打印值不打印类型，看起来像数字的ID也常按getStringExtra读取，
+    按值猜成i/l/z会让App读不到；没有类型信息时不做推断
+    """
+    return ("s", key, value)
+
+
+def parse_resumed_activity(dumpsys_output: str) -> Optional[ActivityState]:
+    """
+    从 dumpsys activity activities 输出中解析前台Activity及其Intent
+
+    extras只有系统在dump中打印了 Bundle[{...}] 时才能取得；显示为 (has extras) 时只恢复组件和data
+    """
+    record_id = component = None
+    for pattern in _RESUMED_PATTERNS:
+        match = pattern.search(dumpsys_output)
+        if match:
+            record_id, component = match.group(1), match.group(2)
+            break
+    if not component:
+        return None
+
+    package, activity = component.split('/', 1)
+    state = ActivityState(package=package, activity=activity, source="dumpsys")
+
+    # 找到该ActivityRecord的详细段落（Hist条目），读取其Intent；找不到时只恢复组件
+    match = re.search(r'\* Hist #\d+: ActivityRecord\{' + re.escape(record_id), dumpsys_output)
+    if not match:
+        return state
+    end = dumpsys_output.find("* Hist #", match.end())
+    section = dumpsys_output[match.start():end if end != -1 else None]
+
+    intent = _INTENT_PATTERN.search(section)
+    if intent:
+        text = intent.group(1)
+        for name, attr in (("act", "action"), ("dat", "data"), ("flg", "flags")):
+            found = re.search(name + r'=(\S+)', text)
+            if found:
+                setattr(state, attr, found.group(1))
+        # dumpsys出于隐私会截断data（含"..."），截断后的URI无法使用
+        if state.data and "..." in state.data:
+            state.data = None
+
+    bundle = _BUNDLE_PATTERN.search(section)
+    if bundle:
+        for item in bundle.group(1).split(', '):
+            if '=' in item:
+                key, value = item.split('=', 1)
+                state.extras.append(_typed_extra(key.strip(), value.strip()))
+    return state
+
+
+def page_markers(page_source: str) -> List[str]:
+    """提取页面上的稳定文字（排除含数字的倒计时、价格等易变内容）"""
+    markers = []
+    for text in _TEXT_PATTERN.findall(page_source):
+        if any(c.isdigit() for c in text) or text in markers:
+            continue
+        markers.append(text)
+        if len(markers) >= MAX_PAGE_MARKERS:
+            break
+    return markers
+
+
+def capture_activity_state(driver=None, shell_func: Optional[Callable[[str], str]] = None,
+                           snapshot: Optional[Snapshot] = None) -> Optional[ActivityState]:
+    """
+    记录当前前台页面
+
+    优先用adb dumpsys（不依赖WebDriver会话，会话已断开时也能记录），
+    否则用driver.current_activity；页面标志文字取自最近的快照（不额外请求设备）
+
+    Args:
+        driver: 当前WebDriver（可能已失效）
+        shell_func: 执行adb shell命令并返回输出的函数
+        snapshot: 最近的页面快照
+    """
+    state = None
+    if shell_func is not None:
+        try:
+            state = parse_resumed_activity(shell_func("dumpsys activity activities"))
+        except Exception:
+            state = None
+
+    if state is None and driver is not None:
+        try:
+            activity = driver.current_activity
+            package = driver.current_package
+            if activity and package:
+                state = ActivityState(package=package, activity=activity)
+        except Exception:
+            return None
+
+    if state is not None:
+        if snapshot is None and driver is not None:
+            try:
+                snapshot = get_snapshot_service(driver).peek(max_age=30)
+            except Exception:
+                snapshot = None
+        if snapshot is not None:
+            state.page_markers = page_markers(snapshot.page_source)
+    return state
+
+
+def _start_activity(driver, state: ActivityState, use_deeplink: bool):
+    if use_deeplink:
+        params = {"action": state.action or "android.intent.action.VIEW", "uri": state.data,
+                  "package": state.package, "wait": True}
+    else:
+        params = {"intent": state.component, "wait": True}
+        if state.action:
+            params["action"] = state.action
+        if state.data:
+            params["uri"] = state.data
+        if state.flags:
+            params["flags"] = state.flags
+        if state.extras:
+            params["extras"] = [list(extra) for extra in state.extras]
+    driver.execute_script("mobile: startActivity", params)
+
+
+def verify_activity_state(driver, state: ActivityState, timeout: float = 6) -> bool:
+    """确认当前就是记录的页面：Activity一致，且至少一半页面标志文字出现在新快照中"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            if state.matches_activity(driver.current_activity):
+                break
+        except Exception:
+            pass
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.3)
+
+    if not state.page_markers:
+        return True
+    needed = max(1, len(state.page_markers) // 2)
+    snapshot = get_snapshot_service(driver).wait_until(
+        lambda snap: sum(1 for m in state.page_markers if m in snap.page_source) >= needed,
+        timeout=max(0.5, deadline - time.time())
+    )
+    return snapshot is not None
+
+
+def restore_activity_state(driver, state: ActivityState, drop_time: Optional[float] = None,
+                           timeout: float = 6, log_func=None, precheck_timeout: float = 0.5) -> RestoreResult:
+    """
+    重新打开掉线前的页面并验证
+
+    设备仍停留在原页面时（如切换备用设备、只重连了ADB）不重新启动；
+    否则先按组件+Intent启动，组件未导出（Permission Denial）且有data时改用deeplink。
+
+    Args:
+        driver: 新建的WebDriver
+        state: capture_activity_state 记录的页面
+        drop_time: 掉线时刻（time.time），用于计算恢复总耗时
+        timeout: 验证超时（秒）
+        log_func: 日志函数
+        precheck_timeout: 启动前确认是否已在原页面的超时（秒），0表示不确认
+    """
+    log = log_func if log_func else print
+    started = time.time()
+    drop_time = drop_time or started
+    if precheck_timeout > 0 and verify_activity_state(driver, state, precheck_timeout):
+        now = time.time()
+        return RestoreResult(True, "current", now - started, now - drop_time,
+                             f"仍在 {state.activity}，无需重新启动")
+
+    attempts = [("activity", False)]
+    if state.data:
+        attempts.append(("deeplink", True))
+
+    detail = ""
+    for method, use_deeplink in attempts:
+        try:
+            _start_activity(driver, state, use_deeplink)
+        except Exception as e:
+            detail = str(e).split('\n')[0][:200]
+            log(f"[页面恢复] {method}方式启动失败: {detail}")
+            continue
+        if verify_activity_state(driver, state, timeout):
+            now = time.time()
+            return RestoreResult(True, method, now - started, now - drop_time,
+                                 f"已回到 {state.activity}")
+        detail = f"启动后未回到 {state.activity}"
+        log(f"[页面恢复] {detail}")
+
+    now = time.time()
+    return RestoreResult(False, "none", now - started, now - drop_time, detail)
@@ -0,0 +1,264 @@
+# -*- coding: UTF-8 -*-
+"""
+异步Driver门面 - 并发执行互不依赖的只读查询
+基于asyncio + 连接池直接调用Appium HTTP协议，返回可await的结果
+
+UiAutomator2端点并行情况（Appium UiAutomator2 driver）：
+    - current_activity / current_package: 由Appium服务端通过adb执行
+      dumpsys获取，不经过设备上的UiAutomator2 server，
+      可与 page_source / screenshot 完全重叠
+    - page_source: 转发到设备上的UiAutomator2 server，需要遍历无障碍树，
+      通常是最慢的查询，决定并发查询的总耗时
+    - screenshot: 同样转发到UiAutomator2 server，与page_source在设备端
+      共用UiAutomation，只能部分重叠
+    - window_rect / status: 开销很小，可任意并行
+    写操作（点击、输入）不适合并发，本门面只提供只读查询。
+    转发到UiAutomator2 server的查询与driver命令一样经过命令调度器，
+    按调用线程的优先级排队（抢票阶段后台查询暂停）。
+"""
+
+import asyncio
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.common.exceptions import WebDriverException
+
+try:
+    from .command_scheduler import current_priority, get_command_scheduler
+    from .trace_events import get_trace_recorder
+except ImportError:
+    from command_scheduler import current_priority, get_command_scheduler
+    from trace_events import get_trace_recorder
+
+
+class AsyncDriverFacade:
+    """
+    异步Driver门面
+
+    用法:
+        facade = AsyncDriverFacade.from_driver(driver)
+        activity, source = await asyncio.gather(
+            facade.current_activity(), facade.page_source()
+        )
+    """
+
+    def __init__(self, server_url: str, session_id: str, pool_size: int = 4, timeout: float = 30):
+        """
+        初始化异步门面
+
+        Args:
+            server_url: Appium服务器地址（如 http://127.0.0.1:4723）
+            session_id: WebDriver会话ID
+            pool_size: 连接池大小（同时也是最大并发数）
+            timeout: 单次请求超时（秒）
+        """
+        self.server_url = server_url.rstrip('/')
+        self.session_id = session_id
+        self.timeout = timeout
+
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._http.mount('http://', adapter)
+        self._http.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="AsyncDriver")
+
+    @classmethod
+    def from_driver(cls, driver, **kwargs) -> "AsyncDriverFacade":
+        """从已有的WebDriver实例创建门面（复用同一会话）"""
+        executor = driver.command_executor
+        server_url = getattr(executor, '_url', None)
+        if server_url is None:
+            # selenium >= 4.26 将地址放在 ClientConfig 中
+            server_url = executor._client_config.remote_server_addr
+        return cls(server_url, driver.session_id, **kwargs)
+
+    def _request(self, method: str, path: str) -> Any:
+        """同步执行HTTP请求并解析W3C响应"""
+        url = f"{self.server_url}{path}"
+        with get_trace_recorder().span(f"{method} {path.replace(self._session_path(''), '')}", "driver", source="async"):
+            response = self._http.request(method, url, timeout=self.timeout)
+        try:
+            payload = response.json()
+        except ValueError:
+            raise WebDriverException(f"无法解析响应 (HTTP {response.status_code}): {response.text[:200]}")
+
+        value = payload.get('value')
+        if isinstance(value, dict) and 'error' in value:
+            raise WebDriverException(f"{value.get('error')}: {value.get('message', '')}")
+        return value
+
+    async def _call(self, method: str, path: str, scheduled: bool = False) -> Any:
+        """
+        在线程池中执行请求，返回可await结果
+
+        Args:
+            scheduled: 是否经过命令调度器（转发到UiAutomator2 server的查询），
+                       优先级取发起调用的线程，而不是线程池线程
+        """
+        loop = asyncio.get_running_loop()
+        if not scheduled:
+            return await loop.run_in_executor(self._executor, self._request, method, path)
+        priority = current_priority()
+        label = f"{method} {path.replace(self._session_path(''), '')}"
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: get_command_scheduler().run(self._request, method, path, priority=priority, label=label)
+        )
+
+    def _session_path(self, suffix: str) -> str:
+        return f"/session/{self.session_id}{suffix}"
+
+    # ========== 只读查询 ==========
+
+    async def status(self) -> Dict[str, Any]:
+        """Appium服务状态"""
+        return await self._call('GET', '/status')
+
+    async def current_activity(self) -> str:
+        """当前Activity"""
+        return await self._call('GET', self._session_path('/appium/device/current_activity'))
+
+    async def current_package(self) -> str:
+        """当前包名"""
+        return await self._call('GET', self._session_path('/appium/device/current_package'))
+
+    async def page_source(self) -> str:
+        """页面XML"""
+        return await self._call('GET', self._session_path('/source'), scheduled=True)
+
+    async def screenshot_png(self) -> bytes:
+        """截图（PNG字节）"""
+        encoded = await self._call('GET', self._session_path('/screenshot'), scheduled=True)
+        return base64.b64decode(encoded)
+
+    async def window_rect(self) -> Dict[str, int]:
+        """窗口尺寸"""
+        return await self._call('GET', self._session_path('/window/rect'), scheduled=True)
+
+    async def gather_state(self, include_source: bool = True, include_screenshot: bool = False) -> Dict[str, Any]:
+        """
+        并发获取页面状态
+
+        单项失败不影响其他项，失败项的值为对应的异常对象。
+
+        Returns:
+            {'activity', 'package', 'page_source', 'screenshot'} 中请求的各项
+        """
+        names: List[str] = ['activity', 'package']
+        tasks = [self.current_activity(), self.current_package()]
+        if include_source:
+            names.append('page_source')
+            tasks.append(self.page_source())
+        if include_screenshot:
+            names.append('screenshot')
+            tasks.append(self.screenshot_png())
+
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return dict(zip(names, results))
+
+    # ========== 基准测试 ==========
+
+    async def benchmark(self, rounds: int = 5, include_screenshot: bool = True) -> Dict[str, float]:
+        """
+        对比串行与并发查询的端到端耗时
+
+        Args:
+            rounds: 测试轮数
+            include_screenshot: 是否包含截图
+
+        Returns:
+            串行/并发平均耗时（秒）和加速比
+        """
+        queries = [self.current_activity, self.current_package, self.page_source]
+        if include_screenshot:
+            queries.append(self.screenshot_png)
+
+        sequential_total = 0.0
+        concurrent_total = 0.0
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for query in queries:
+                await query()
+            sequential_total += time.perf_counter() - start
+
+            start = time.perf_counter()
+            await asyncio.gather(*(query() for query in queries))
+            concurrent_total += time.perf_counter() - start
+
+        sequential_avg = sequential_total / rounds
+        concurrent_avg = concurrent_total / rounds
+        return {
+            "rounds": rounds,
+            "sequential_avg": sequential_avg,
+            "concurrent_avg": concurrent_avg,
+            "saved_avg": sequential_avg - concurrent_avg,
+            "speedup": sequential_avg / concurrent_avg if concurrent_avg > 0 else 0.0
+        }
+
+    def close(self):
+        """释放连接池和线程池"""
+        self._executor.shutdown(wait=False)
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# 全局门面实例（按会话复用连接池）
+_facade_instance = None
+
+
+def get_async_facade(driver) -> AsyncDriverFacade:
+    """获取与driver当前会话绑定的门面实例（会话变化时自动重建）"""
+    global _facade_instance
+    if _facade_instance is None or _facade_instance.session_id != driver.session_id:
+        if _facade_instance is not None:
+            _facade_instance.close()
+        _facade_instance = AsyncDriverFacade.from_driver(driver)
+    return _facade_instance
+
+
+def gather_state_sync(driver, include_source: bool = True, include_screenshot: bool = False) -> Dict[str, Any]:
+    """
+    在普通线程中并发获取页面状态的便捷方法
+
+    Args:
+        driver: WebDriver实例
+        include_source: 是否获取page_source
+        include_screenshot: 是否获取截图
+
+    Returns:
+        同 AsyncDriverFacade.gather_state
+    """
+    facade = get_async_facade(driver)
+    return asyncio.run(facade.gather_state(include_source, include_screenshot))
+
+
+# 基准测试
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python async_driver.py <session_id> [server_url]")
+        sys.exit(1)
+
+    session_id = sys.argv[1]
+    server_url = sys.argv[2] if len(sys.argv) > 2 else "http://127.0.0.1:4723"
+
+    with AsyncDriverFacade(server_url, session_id) as facade:
+        result = asyncio.run(facade.benchmark(rounds=5))
+
+    print("=" * 60)
+    print("异步查询基准测试")
+    print("=" * 60)
+    print(f"串行平均耗时: {result['sequential_avg']:.3f}秒")
+    print(f"并发平均耗时: {result['concurrent_avg']:.3f}秒")
+    print(f"平均节省: {result['saved_avg']:.3f}秒 (加速比 {result['speedup']:.2f}x)")
+    print("=" * 60)
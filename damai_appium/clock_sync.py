@@ -0,0 +1,167 @@
+# -*- coding: UTF-8 -*-
+"""
+设备时钟校准 - 估计Android设备时钟与本机时钟的偏差
+App内显示的开票倒计时以设备时钟为准，云手机的时钟可能与本机相差数秒。
+通过adb多次读取设备时间，按NTP方式用往返时间估计偏差和误差范围
+"""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional, Tuple
+
+
+@dataclass
+class ClockOffsetEstimate:
+    """时钟偏差估计"""
+    offset: float  # 设备时钟 - 本机时钟（秒）
+    uncertainty: float  # 误差范围 ±秒（最佳样本往返时间的一半）
+    rtt: float  # 最佳样本往返时间（秒）
+    samples: int  # 有效样本数
+    method: str  # 采样方式: socket(ADB服务器协议)
+    measured_at: datetime = field(default_factory=datetime.now)
+
+    def describe(self) -> str:
+        """可读描述"""
+        return f"{self.offset * 1000:+.0f}ms ±{self.uncertainty * 1000:.0f}ms"
+
+
+class DeviceClockCalibrator:
+    """
+    设备时钟校准器
+
+    用法:
+        calibrator = DeviceClockCalibrator("127.0.0.1:59700", get_adb_client(adb_path))
+        estimate = calibrator.calibrate()
+        timer = CountdownTimer(target, clock_offset=estimate.offset)
+        manager.follow_clock(calibrator)  # 之后的校准结果推送到所有倒计时
+    """
+
+    DATE_COMMAND = "date +%s.%N"
+
+    def __init__(self, serial: str, adb, samples: int = 8, log_func=None):
+        """
+        初始化校准器
+
+        Args:
+            serial: 设备序列号（如 127.0.0.1:59700）
+            adb: ADB客户端（adb_client.get_adb_client()）
+            samples: 每次校准的采样次数
+            log_func: 日志函数
+        """
+        self.serial = serial
+        self.adb = adb
+        self.samples = samples
+        self.log = log_func if log_func else print
+
+        self.latest: Optional[ClockOffsetEstimate] = None
+        self.listeners: List[Callable[[ClockOffsetEstimate], None]] = []
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _parse_device_time(output: str) -> Optional[float]:
+        """解析 date +%s.%N 输出，不支持%N时退化为整秒"""
+        text = output.strip()
+        try:
+            return float(text)
+        except ValueError:
+            head = text.split('.')[0]
+            return float(head) if head.isdigit() else None
+
+    def _sample(self) -> List[Tuple[float, float, float]]:
+        """经ADB服务器协议逐次读取设备时间（不启动adb进程，往返时间接近常驻shell）"""
+        samples = []
+        for _ in range(self.samples):
+            try:
+                t0 = time.time()
+                result = self.adb.shell(self.serial, self.DATE_COMMAND, timeout=5)
+                t1 = time.time()
+            except Exception:  # 超时、设备离线等，跳过该样本
+                continue
+            device_time = self._parse_device_time(result.stdout)
+            if result.returncode == 0 and device_time is not None:
+                samples.append((t0, device_time, t1))
+        return samples
+
+    def calibrate(self) -> Optional[ClockOffsetEstimate]:
+        """
+        校准一次
+
+        每个样本: 偏差 = 设备时间 - (发送时刻 + 接收时刻) / 2，误差 = 往返时间 / 2。
+        取往返时间最短的样本（排队和调度干扰最少）。
+
+        Returns:
+            ClockOffsetEstimate，失败返回None
+        """
+        samples = self._sample()
+
+        if not samples:
+            self.log(f"[时钟校准] 无法读取设备时间: {self.serial}")
+            return None
+
+        t0, device_time, t1 = min(samples, key=lambda s: s[2] - s[0])
+        rtt = t1 - t0
+        uncertainty = rtt / 2
+        if device_time == int(device_time) and all(d == int(d) for _, d, _ in samples):
+            uncertainty += 1.0  # 设备不支持%N，只有整秒精度
+
+        estimate = ClockOffsetEstimate(
+            offset=device_time - (t0 + t1) / 2,
+            uncertainty=uncertainty,
+            rtt=rtt,
+            samples=len(samples),
+            method="socket"
+        )
+        self.latest = estimate
+        self.log(f"[时钟校准] 设备时钟偏差 {estimate.describe()} (往返{rtt * 1000:.0f}ms)")
+
+        for listener in list(self.listeners):
+            try:
+                listener(estimate)
+            except Exception as e:
+                self.log(f"[时钟校准] 回调错误: {e}")
+        return estimate
+
+    def device_to_host(self, device_time: datetime) -> datetime:
+        """把设备时钟的时刻换算为本机时钟"""
+        if self.latest is None:
+            return device_time
+        return device_time - timedelta(seconds=self.latest.offset)
+
+    def start_auto_refresh(self, interval: float = 300):
+        """后台定期校准（立即校准一次）"""
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            return
+        self._stop_event.clear()
+
+        def loop():
+            while not self._stop_event.is_set():
+                try:
+                    self.calibrate()
+                except Exception as e:
+                    self.log(f"[时钟校准] 校准失败: {e}")
+                self._stop_event.wait(interval)
+
+        self._refresh_thread = threading.Thread(target=loop, daemon=True, name="ClockCalibrator")
+        self._refresh_thread.start()
+
+    def stop(self):
+        """停止后台校准"""
+        self._stop_event.set()
+
+
+# 测试代码
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from adb_client import get_adb_client
+
+    serial = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1:59700"
+    calibrator = DeviceClockCalibrator(serial, get_adb_client())
+    result = calibrator.calibrate()
+    if result:
+        print(f"偏差: {result.describe()}, 样本: {result.samples}, 方式: {result.method}")
@@ -0,0 +1,268 @@
+# -*- coding: UTF-8 -*-
+"""
+Driver命令调度器 - 按优先级协调多个线程对同一driver的访问
+抢票关键命令优先于交互命令，交互命令优先于后台轮询；抢票阶段暂停后台命令，
+并统计各优先级的排队延迟
+
+UiAutomator2 server按到达顺序串行处理命令，后台弹窗检测若先到达，
+抢票点击只能排在其后。调度器在客户端按优先级放行，避免这种排队。
+"""
+
+import time
+import heapq
+import threading
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from typing import Callable, Dict, Any, Optional
+
+try:
+    from .trace_events import get_trace_recorder
+except ImportError:
+    from trace_events import get_trace_recorder
+
+
+class CommandPriority(Enum):
+    """命令优先级（数值越小越优先）"""
+    GRAB_CRITICAL = 0  # 抢票关键路径
+    INTERACTIVE = 1  # 用户操作、普通流程
+    BACKGROUND = 2  # 后台轮询（截图监控、弹窗检测、诊断监控）
+
+
+_thread_state = threading.local()
+
+
+def current_priority() -> CommandPriority:
+    """当前线程的命令优先级（未设置时为INTERACTIVE）"""
+    return getattr(_thread_state, 'priority', CommandPriority.INTERACTIVE)
+
+
+def set_thread_priority(priority: CommandPriority):
+    """设置当前线程的命令优先级（用于整个线程都是同一类命令的轮询循环）"""
+    _thread_state.priority = priority
+
+
+@contextmanager
+def thread_priority(priority: CommandPriority):
+    """在代码块内临时设置当前线程的命令优先级"""
+    previous = getattr(_thread_state, 'priority', None)
+    _thread_state.priority = priority
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _thread_state.priority
+        else:
+            _thread_state.priority = previous
+
+
+class PriorityStats:
+    """单个优先级的排队统计"""
+
+    def __init__(self, window: int = 200):
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.paused_count = 0  # 因抢票阶段被暂停的次数
+        self.recent_waits = deque(maxlen=window)
+
+    def record(self, wait: float, paused: bool):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+        if paused:
+            self.paused_count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        recent = sorted(self.recent_waits)
+        p95 = recent[int(len(recent) * 0.95) - 1] if len(recent) >= 20 else (recent[-1] if recent else 0.0)
+        return {
+            "count": self.count,
+            "avg_wait_ms": self.total_wait / self.count * 1000 if self.count else 0.0,
+            "p95_wait_ms": p95 * 1000,
+            "max_wait_ms": self.max_wait * 1000,
+            "paused": self.paused_count
+        }
+
+
+class DriverCommandScheduler:
+    """
+    Driver命令调度器
+
+    用法:
+        scheduler = install_command_scheduler(driver)  # 所有driver命令经过调度器
+        set_thread_priority(CommandPriority.BACKGROUND)  # 在后台轮询线程中
+        with scheduler.grab_phase():                    # 抢票阶段，后台命令暂停
+            ...
+    """
+
+    def __init__(self, max_inflight: int = 1):
+        """
+        初始化调度器
+
+        Args:
+            max_inflight: 同时发往服务器的命令数（UiAutomator2串行处理，默认1）
+        """
+        self.max_inflight = max_inflight
+        self._cond = threading.Condition()
+        self._waiting = []  # 堆: (优先级, 序号)
+        self._seq = 0
+        self._inflight = 0
+        self._grab_depth = 0
+        self.stats: Dict[CommandPriority, PriorityStats] = {p: PriorityStats() for p in CommandPriority}
+        self.last_success_time = 0.0  # 最近一次命令成功完成的时间 (time.time)，供健康监控判断设备是否正常
+        self.last_error_time = 0.0  # 最近一次命令失败的时间
+
+    # ========== 抢票阶段 ==========
+
+    @property
+    def grab_active(self) -> bool:
+        """是否处于抢票阶段"""
+        return self._grab_depth > 0
+
+    def begin_grab(self):
+        """进入抢票阶段：后台命令暂停，直到end_grab"""
+        with self._cond:
+            self._grab_depth += 1
+
+    def end_grab(self):
+        """退出抢票阶段"""
+        with self._cond:
+            self._grab_depth = max(0, self._grab_depth - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def grab_phase(self):
+        """抢票阶段上下文：当前线程命令为GRAB_CRITICAL，后台命令暂停"""
+        self.begin_grab()
+        try:
+            with thread_priority(CommandPriority.GRAB_CRITICAL):
+                yield self
+        finally:
+            self.end_grab()
+
+    # ========== 调度 ==========
+
+    def _can_start(self, ticket, priority: CommandPriority) -> bool:
+        if self._inflight >= self.max_inflight or self._waiting[0] != ticket:
+            return False
+        return not (priority is CommandPriority.BACKGROUND and self.grab_active)
+
+    def run(self, func: Callable, *args, priority: Optional[CommandPriority] = None,
+            label: str = "", **kwargs):
+        """
+        按优先级执行一个driver命令
+
+        Args:
+            func: 要执行的函数
+            priority: 优先级，默认取当前线程的优先级
+            label: 命令名称（用于trace时间线）
+        """
+        # 同一线程嵌套调用时直接执行，避免自身死锁
+        if getattr(_thread_state, 'holding', False):
+            return func(*args, **kwargs)
+
+        priority = priority or current_priority()
+        submitted = time.perf_counter()
+        paused = False
+
+        with self._cond:
+            self._seq += 1
+            ticket = (priority.value, self._seq)
+            heapq.heappush(self._waiting, ticket)
+            while not self._can_start(ticket, priority):
+                if priority is CommandPriority.BACKGROUND and self.grab_active:
+                    paused = True
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._inflight += 1
+            started = time.perf_counter()
+            self.stats[priority].record(started - submitted, paused)
+
+        recorder = get_trace_recorder()
+        label = label or getattr(func, '__name__', 'command')
+        if started - submitted > 0.0005:
+            recorder.complete(f"排队 {label}", "queue", submitted, started - submitted,
+                              {"priority": priority.name, "paused": paused})
+
+        _thread_state.holding = True
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _thread_state.holding = False
+            recorder.complete(label, "driver", started, time.perf_counter() - started, {"priority": priority.name})
+            with self._cond:
+                self._inflight -= 1
+                if failed:
+                    self.last_error_time = time.time()
+                else:
+                    self.last_success_time = time.time()
+                self._cond.notify_all()
+
+    def install(self, driver):
+        """
+        接管driver的全部命令（替换实例的execute方法，元素操作也经过这里）
+
+        Returns:
+            driver本身
+        """
+        if getattr(driver, '_command_scheduler', None) is self:
+            return driver
+
+        original_execute = driver.execute
+
+        def scheduled_execute(driver_command, params=None):
+            label = driver_command
+            if isinstance(params, dict) and isinstance(params.get('script'), str):
+                label = f"{driver_command} {params['script']}"  # mobile: 命令
+            return self.run(original_execute, driver_command, params, label=label)
+
+        driver.execute = scheduled_execute
+        driver._command_scheduler = self
+        return driver
+
+    # ========== 报告 ==========
+
+    def get_report(self) -> Dict[str, Any]:
+        """各优先级的排队延迟统计"""
+        with self._cond:
+            return {
+                "grab_active": self.grab_active,
+                "waiting": len(self._waiting),
+                "classes": {p.name: self.stats[p].to_dict() for p in CommandPriority}
+            }
+
+    def log_report(self, log_func=None):
+        """输出排队延迟报告"""
+        log = log_func if log_func else print
+        report = self.get_report()
+        log("命令排队延迟统计:")
+        for name, stats in report["classes"].items():
+            if stats["count"] == 0:
+                continue
+            log(f"  {name}: {stats['count']}次, 平均{stats['avg_wait_ms']:.1f}ms, "
+                f"P95 {stats['p95_wait_ms']:.1f}ms, 最大{stats['max_wait_ms']:.1f}ms, 暂停{stats['paused']}次")
+
+
+# 全局调度器实例（同一设备的多个driver会话共用，抢票阶段状态在重连后保持）
+_scheduler_instance = None
+
+
+def get_command_scheduler() -> DriverCommandScheduler:
+    """获取全局调度器实例"""
+    global _scheduler_instance
+    if _scheduler_instance is None:
+        _scheduler_instance = DriverCommandScheduler()
+    return _scheduler_instance
+
+
+def install_command_scheduler(driver) -> DriverCommandScheduler:
+    """让driver的命令经过全局调度器"""
+    scheduler = get_command_scheduler()
+    scheduler.install(driver)
+    return scheduler
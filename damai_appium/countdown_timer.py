@@ -5,12 +5,52 @@
 """
 
 import time
+import heapq
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Callable, Optional
+from typing import Callable, Optional, List, Dict
 from enum import Enum
 
 
+FINE_WINDOW = 0.05  # 最后50ms改用短睡眠逼近
+SPIN_WINDOW = 0.002  # 最后2ms忙等
+
+
+def precise_wait_until(deadline: float, stop_event: Optional[threading.Event] = None) -> bool:
+    """
+    等待到perf_counter时刻deadline
+
+    先粗粒度睡眠到截止前FINE_WINDOW，再用逐次减半的短睡眠逼近，最后SPIN_WINDOW忙等
+
+    Args:
+        deadline: 截止时刻 (time.perf_counter)
+        stop_event: 停止事件，置位时提前返回
+
+    Returns:
+        bool: 是否等到了截止时刻（False表示被停止）
+    """
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return True
+        if stop_event is not None and stop_event.is_set():
+            return False
+
+        if remaining > FINE_WINDOW:
+            wait = remaining - FINE_WINDOW
+            if stop_event is not None:
+                stop_event.wait(wait)
+            else:
+                time.sleep(wait)
+        elif remaining > SPIN_WINDOW:
+            time.sleep((remaining - SPIN_WINDOW) / 2)
+        else:
+            while time.perf_counter() < deadline:
+                pass
+            return True
+
+
 class CountdownState(Enum):
     """倒计时状态"""
     IDLE = "idle"  # 空闲
@@ -31,7 +71,8 @@ class CountdownTimer:
                  on_countdown_update: Optional[Callable[[int], None]] = None,
                  on_prepare: Optional[Callable[[], None]] = None,
                  on_start: Optional[Callable[[], None]] = None,
-                 on_complete: Optional[Callable[[], None]] = None):
+                 on_complete: Optional[Callable[[], None]] = None,
+                 clock_offset: float = 0.0):
         """
         初始化倒计时器
 
@@ -42,6 +83,7 @@ class CountdownTimer:
             on_prepare: 准备阶段回调
             on_start: 开始抢票回调
             on_complete: 完成回调
+            clock_offset: 设备时钟相对本机的偏差（秒，设备 - 本机），目标时间按设备时钟计
         """
         self.target_time = target_time
         self.prepare_seconds = prepare_seconds
@@ -55,6 +97,62 @@ class CountdownTimer:
         self.stop_flag = threading.Event()
 
         self.prepare_time = target_time - timedelta(seconds=prepare_seconds)
+        self.clock_offset = clock_offset
+
+        # 启动时把目标时间换算为单调时钟截止时刻，之后不受系统时间调整影响
+        self._deadline: Optional[float] = None
+        self._prepare_deadline: Optional[float] = None
+        self.fire_log: List[Dict] = []  # 每次触发的误差记录
+
+        # 由CountdownManager管理时，共用调度线程而不单独起线程
+        self._scheduler: Optional["TimerScheduler"] = None
+        self._generation = 0  # 截止时刻变化时递增，调度器丢弃旧条目
+
+    def _compute_deadlines(self):
+        """将目标时间换算为perf_counter截止时刻（设备时钟快offset秒，本机提前offset秒到点）"""
+        now_wall = datetime.now()
+        now_mono = time.perf_counter()
+        self._deadline = now_mono + (self.target_time - now_wall).total_seconds() - self.clock_offset
+        self._prepare_deadline = now_mono + (self.prepare_time - now_wall).total_seconds() - self.clock_offset
+
+    def set_clock_offset(self, offset: float):
+        """
+        更新设备时钟偏差（运行中也可调用，截止时刻随之平移）
+
+        Args:
+            offset: 设备时钟 - 本机时钟（秒）
+        """
+        delta = offset - self.clock_offset
+        self.clock_offset = offset
+        if self._deadline is not None:
+            self._deadline -= delta
+            self._prepare_deadline -= delta
+            print(f"[倒计时] 设备时钟偏差更新为 {offset * 1000:+.0f}ms")
+            if self._scheduler is not None and self.is_active():
+                self._scheduler.schedule(self)
+
+    def _record_fire(self, event: str, deadline: Optional[float]):
+        """记录触发误差（实际 - 目标）"""
+        if deadline is None:
+            return
+        error = time.perf_counter() - deadline
+        self.fire_log.append({
+            "event": event,
+            "error_ms": error * 1000,
+            "fired_at": datetime.now()
+        })
+        print(f"[倒计时] {event} 触发误差: {error * 1000:+.2f}ms")
+
+    def get_trigger_stats(self) -> Dict:
+        """触发误差统计（毫秒）"""
+        errors = [f["error_ms"] for f in self.fire_log if f["event"] == "start"]
+        if not errors:
+            return {"fires": 0, "last_error_ms": None, "max_error_ms": None}
+        return {
+            "fires": len(errors),
+            "last_error_ms": errors[-1],
+            "max_error_ms": max(errors, key=abs)
+        }
 
     def start(self):
         """启动倒计时"""
@@ -62,8 +160,8 @@ class CountdownTimer:
             print(f"[倒计时] 当前状态为 {self.state.value}，无法启动")
             return False
 
-        # 检查目标时间
-        now = datetime.now()
+        # 检查目标时间（换算到设备时钟）
+        now = datetime.now() + timedelta(seconds=self.clock_offset)
         if now >= self.target_time:
             print(f"[倒计时] 目标时间已过，立即执行")
             self._trigger_start()
@@ -71,10 +169,14 @@ class CountdownTimer:
 
         self.state = CountdownState.WAITING
         self.stop_flag.clear()
+        self._compute_deadlines()
 
-        # 启动倒计时线程
-        self.countdown_thread = threading.Thread(target=self._countdown_loop, daemon=True)
-        self.countdown_thread.start()
+        if self._scheduler is not None:
+            self._scheduler.schedule(self)
+        else:
+            # 启动倒计时线程
+            self.countdown_thread = threading.Thread(target=self._countdown_loop, daemon=True)
+            self.countdown_thread.start()
 
         print(f"[倒计时] 已启动，目标时间: {self.target_time.strftime('%Y-%m-%d %H:%M:%S')}")
         return True
@@ -83,6 +185,8 @@ class CountdownTimer:
         """停止倒计时"""
         self.stop_flag.set()
         self.state = CountdownState.CANCELLED
+        if self._scheduler is not None:
+            self._scheduler.unschedule(self)
         print(f"[倒计时] 已取消")
 
     def _countdown_loop(self):
@@ -90,21 +194,25 @@ class CountdownTimer:
         prepare_triggered = False
 
         while not self.stop_flag.is_set():
-            now = datetime.now()
+            now = time.perf_counter()
+
+            # 检查是否进入准备阶段
+            if not prepare_triggered and now >= self._prepare_deadline:
+                # 准备回调在单独线程中执行，耗时再长也不推迟开始时刻
+                threading.Thread(target=self._trigger_prepare, daemon=True,
+                                 name="CountdownPrepare").start()
+                prepare_triggered = True
+                continue
 
             # 计算剩余时间
-            remaining = (self.target_time - now).total_seconds()
+            remaining = self._deadline - now
 
-            if remaining <= 0:
-                # 时间到，开始抢票
-                self._trigger_start()
+            if remaining <= FINE_WINDOW:
+                # 最后阶段精确等待，时间到开始抢票
+                if precise_wait_until(self._deadline, self.stop_flag):
+                    self._trigger_start()
                 break
 
-            # 检查是否进入准备阶段
-            if not prepare_triggered and now >= self.prepare_time:
-                self._trigger_prepare()
-                prepare_triggered = True
-
             # 更新倒计时显示
             if self.on_countdown_update:
                 self.on_countdown_update(int(remaining))
@@ -112,23 +220,36 @@ class CountdownTimer:
             # 根据剩余时间调整更新频率
             if remaining > 60:
                 # 大于1分钟，每秒更新
-                time.sleep(1)
+                interval = 1
             elif remaining > 10:
                 # 10秒-1分钟，每0.5秒更新
-                time.sleep(0.5)
+                interval = 0.5
             else:
                 # 最后10秒，每0.1秒更新
-                time.sleep(0.1)
+                interval = 0.1
+
+            # 不越过准备时刻和精确等待阶段
+            wake = min(interval, remaining - FINE_WINDOW)
+            if not prepare_triggered:
+                wake = min(wake, self._prepare_deadline - time.perf_counter())
+            self.stop_flag.wait(max(wake, 0))
 
         # 倒计时结束
+        self._finish()
+
+    def _finish(self):
+        """抢票回调结束后标记完成"""
         if not self.stop_flag.is_set():
             self.state = CountdownState.COMPLETED
             if self.on_complete:
                 self.on_complete()
 
     def _trigger_prepare(self):
-        """触发准备阶段"""
+        """触发准备阶段（开始回调已执行时不再进入准备阶段）"""
+        if self.state != CountdownState.WAITING:
+            return
         self.state = CountdownState.PREPARING
+        self._record_fire("prepare", self._prepare_deadline)
         print(f"[倒计时] 进入准备阶段（提前 {self.prepare_seconds} 秒）")
 
         if self.on_prepare:
@@ -139,9 +260,17 @@ class CountdownTimer:
 
     def _trigger_start(self):
         """触发开始抢票"""
+        self._mark_start()
+        self._run_start_callback()
+
+    def _mark_start(self):
+        """进入抢票状态并记录触发误差（在开始回调即将执行时调用，误差包含排队时间）"""
         self.state = CountdownState.RUNNING
+        self._record_fire("start", self._deadline)
         print(f"[倒计时] 时间到！开始抢票")
 
+    def _run_start_callback(self):
+        """执行开始抢票回调"""
         if self.on_start:
             try:
                 self.on_start()
@@ -150,8 +279,10 @@ class CountdownTimer:
 
     def get_remaining_time(self) -> timedelta:
         """获取剩余时间"""
-        now = datetime.now()
-        remaining = self.target_time - now
+        if self._deadline is not None:
+            remaining = timedelta(seconds=self._deadline - time.perf_counter())
+        else:
+            remaining = self.target_time - datetime.now() - timedelta(seconds=self.clock_offset)
 
         if remaining.total_seconds() < 0:
             return timedelta(0)
@@ -185,20 +316,290 @@ class CountdownTimer:
         return self.state in [CountdownState.WAITING, CountdownState.PREPARING]
 
 
+class TimerScheduler:
+    """
+    倒计时调度器 - 一个线程驱动任意数量的倒计时
+
+    准备/开始时刻放在最小堆中，线程用条件变量睡到最近的截止时刻前FINE_WINDOW，
+    再精确等待触发；没有倒计时时线程无限期等待，不占CPU。
+    倒计时显示更新按统一节拍批量计算，所有更新回调共用每秒调用次数上限。
+    准备回调和开始回调分别在两个固定大小的线程池中执行：开始回调不排在准备回调之后，
+    准备回调超时未结束也不推迟开抢；触发误差在开始回调真正执行时记录。
+    """
+
+    def __init__(self, max_updates_per_second: float = 10,
+                 on_batch_update: Optional[Callable[[Dict[str, int]], None]] = None,
+                 max_workers: int = 4):
+        """
+        初始化调度器
+
+        Args:
+            max_updates_per_second: 所有倒计时更新回调每秒合计最多调用次数
+            on_batch_update: 批量更新回调 ({名称: 剩余秒数})，每个节拍最多一次，适合GUI
+            max_workers: 执行准备回调、开始回调的线程数上限（各一个线程池）
+        """
+        self.max_updates_per_second = max_updates_per_second
+        self.on_batch_update = on_batch_update
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="CountdownPrepare")
+        self._start_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="CountdownStart")
+
+        self._cond = threading.Condition()
+        self._heap = []  # (截止时刻, 序号, 代数, 倒计时, 事件)
+        self._seq = 0
+        self._active: Dict[int, CountdownTimer] = {}  # id(timer) -> timer
+        self._names: Dict[int, str] = {}
+        self._last_values: Dict[int, int] = {}  # 上次送出的剩余秒数
+        self._last_delivered: Dict[int, float] = {}
+        self._dirty: Dict[int, int] = {}  # 尚未送给单个倒计时回调的剩余秒数
+        self._dirty_batch = set()  # 尚未送给批量回调的倒计时
+
+        self._tick_interval = 0.1  # 显示精度0.1秒（与原单线程最后10秒的刷新频率一致）
+        self._next_tick = 0.0
+        self._tokens = float(max_updates_per_second)
+        self._last_refill = time.perf_counter()
+
+        self._running = True
+        self.stats = {"fired": 0, "updates": 0, "throttled": 0, "wakeups": 0}
+        self._thread = threading.Thread(target=self._run, daemon=True, name="CountdownScheduler")
+        self._thread.start()
+
+    # ========== 注册 ==========
+
+    def attach(self, name: str, timer: CountdownTimer):
+        """由调度器驱动该倒计时（之后调用timer.start()即加入调度）"""
+        timer._scheduler = self
+        with self._cond:
+            self._names[id(timer)] = name
+
+    def detach(self, timer: CountdownTimer):
+        """解除调度"""
+        self.unschedule(timer)
+        with self._cond:
+            self._names.pop(id(timer), None)
+        timer._scheduler = None
+
+    def schedule(self, timer: CountdownTimer):
+        """按倒计时当前的截止时刻加入（或重新加入）堆"""
+        with self._cond:
+            timer._generation += 1
+            key = id(timer)
+            self._active[key] = timer
+            self._last_values.pop(key, None)
+            if timer.state == CountdownState.WAITING:
+                self._push(timer._prepare_deadline, timer, "prepare")
+            self._push(timer._deadline, timer, "start")
+            self._cond.notify()
+
+    def unschedule(self, timer: CountdownTimer):
+        """移除倒计时（堆中的条目在出堆时丢弃）"""
+        with self._cond:
+            timer._generation += 1
+            key = id(timer)
+            self._active.pop(key, None)
+            self._dirty.pop(key, None)
+            self._dirty_batch.discard(key)
+            self._last_values.pop(key, None)
+            self._last_delivered.pop(key, None)
+            self._cond.notify()
+
+    def _push(self, deadline: float, timer: CountdownTimer, event: str):
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, timer._generation, timer, event))
+
+    def _drop_stale(self):
+        """丢弃已取消或截止时刻已变化的堆顶条目（需持有锁）"""
+        while self._heap:
+            _, _, generation, timer, _ = self._heap[0]
+            if generation == timer._generation and id(timer) in self._active:
+                return
+            heapq.heappop(self._heap)
+
+    def _wants_updates(self) -> bool:
+        if not self._active:
+            return False
+        return self.on_batch_update is not None or any(
+            t.on_countdown_update for t in self._active.values())
+
+    # ========== 调度线程 ==========
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                self._drop_stale()
+                now = time.perf_counter()
+                event_at = self._heap[0][0] if self._heap else None
+                tick_at = self._next_tick if self._wants_updates() else None
+
+                wake = None
+                if event_at is not None:
+                    wake = event_at - FINE_WINDOW
+                if tick_at is not None:
+                    wake = tick_at if wake is None else min(wake, tick_at)
+
+                if wake is None:
+                    self._cond.wait()
+                    self.stats["wakeups"] += 1
+                    continue
+                if wake > now:
+                    self._cond.wait(wake - now)
+                    self.stats["wakeups"] += 1
+                    continue
+
+            if event_at is not None and event_at - FINE_WINDOW <= now:
+                precise_wait_until(event_at)
+                self._fire_due()
+            if tick_at is not None and tick_at <= time.perf_counter():
+                self._tick()
+
+    def _fire_due(self):
+        """触发所有已到期的事件；回调在独立线程中执行，不阻塞其他倒计时"""
+        due = []
+        with self._cond:
+            now = time.perf_counter()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, generation, timer, event = heapq.heappop(self._heap)
+                if generation != timer._generation or id(timer) not in self._active:
+                    continue
+                if event == "start":
+                    key = id(timer)
+                    self._active.pop(key, None)
+                    self._dirty.pop(key, None)
+                    self._dirty_batch.discard(key)
+                    self._last_values.pop(key, None)
+                    self._last_delivered.pop(key, None)
+                due.append((timer, event))
+
+        for timer, event in due:
+            if timer.stop_flag.is_set():
+                continue
+            self.stats["fired"] += 1
+            if event == "prepare":
+                self._pool.submit(self._run_prepare, timer)
+            else:
+                self._start_pool.submit(self._run_start, timer)
+
+    @staticmethod
+    def _run_prepare(timer: CountdownTimer):
+        try:
+            timer._trigger_prepare()
+        except Exception as e:
+            print(f"[倒计时] 回调错误: {e}")
+
+    @staticmethod
+    def _run_start(timer: CountdownTimer):
+        if timer.stop_flag.is_set():
+            return
+        timer._mark_start()  # 回调真正开始时记录，误差包含排队时间
+        try:
+            timer._run_start_callback()
+            timer._finish()
+        except Exception as e:
+            print(f"[倒计时] 回调错误: {e}")
+
+    def _tick(self):
+        """计算剩余秒数变化，按令牌桶限制回调次数（超出上限的更新留到下个节拍）"""
+        now = time.perf_counter()
+        deliveries = []
+        with self._cond:
+            self._next_tick = now + self._tick_interval
+            rate = self.max_updates_per_second
+            self._tokens = min(float(rate), self._tokens + (now - self._last_refill) * rate)
+            self._last_refill = now
+
+            for key, timer in self._active.items():
+                value = timer.get_remaining_seconds()
+                if self._last_values.get(key) != value:
+                    self._last_values[key] = value
+                    if self.on_batch_update is not None:
+                        self._dirty_batch.add(key)
+                    if timer.on_countdown_update:
+                        self._dirty[key] = value
+
+            if self._dirty_batch and self._tokens >= 1:
+                self._tokens -= 1
+                batch = {self._names.get(key, str(key)): self._last_values[key] for key in self._dirty_batch}
+                self._dirty_batch.clear()
+                deliveries.append((self.on_batch_update, batch))
+
+            # 最久未送出的优先
+            for key in sorted(self._dirty, key=lambda k: self._last_delivered.get(k, 0.0)):
+                if self._tokens < 1:
+                    self.stats["throttled"] += len(self._dirty)
+                    break
+                self._tokens -= 1
+                self._last_delivered[key] = now
+                deliveries.append((self._active[key].on_countdown_update, self._dirty.pop(key)))
+
+        for callback, value in deliveries:
+            self.stats["updates"] += 1
+            try:
+                callback(value)
+            except Exception as e:
+                print(f"[倒计时] 更新回调错误: {e}")
+
+    def shutdown(self):
+        """停止调度线程"""
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._pool.shutdown(wait=False)
+        self._start_pool.shutdown(wait=False)
+
+
 class CountdownManager:
-    """倒计时管理器（支持多个倒计时任务）"""
+    """倒计时管理器（支持多个倒计时任务，共用一个调度线程）"""
+
+    def __init__(self, max_updates_per_second: float = 10,
+                 on_countdown_update: Optional[Callable[[Dict[str, int]], None]] = None):
+        """
+        初始化管理器
 
-    def __init__(self):
+        Args:
+            max_updates_per_second: 倒计时更新回调每秒合计最多调用次数（与倒计时数量无关）
+            on_countdown_update: 批量更新回调 ({名称: 剩余秒数})
+        """
         self.timers: dict[str, CountdownTimer] = {}
+        self.scheduler = TimerScheduler(max_updates_per_second, on_countdown_update)
+        self.clock_offset: Optional[float] = None  # 最近一次校准的设备时钟偏差，None表示未校准
 
     def add_timer(self, name: str, timer: CountdownTimer):
-        """添加倒计时器"""
+        """添加倒计时器（调用timer.start()后由共用调度线程驱动；已校准时按当前设备时钟偏差修正）"""
+        if name in self.timers:
+            self.remove_timer(name)
+        if self.clock_offset is not None:
+            timer.set_clock_offset(self.clock_offset)
         self.timers[name] = timer
+        self.scheduler.attach(name, timer)
+
+    def set_clock_offset(self, offset: float):
+        """
+        更新所有倒计时的设备时钟偏差（之后添加的倒计时也使用该偏差）
+
+        Args:
+            offset: 设备时钟 - 本机时钟（秒）
+        """
+        self.clock_offset = offset
+        for timer in list(self.timers.values()):
+            timer.set_clock_offset(offset)
+
+    def follow_clock(self, calibrator):
+        """
+        跟随设备时钟校准器：已有校准结果立即生效，之后每次校准都推送到所有倒计时
+
+        Args:
+            calibrator: DeviceClockCalibrator
+        """
+        calibrator.listeners.append(lambda estimate: self.set_clock_offset(estimate.offset))
+        if calibrator.latest is not None:
+            self.set_clock_offset(calibrator.latest.offset)
 
     def remove_timer(self, name: str):
         """移除倒计时器"""
         if name in self.timers:
             self.timers[name].stop()
+            self.scheduler.detach(self.timers[name])
             del self.timers[name]
 
     def get_timer(self, name: str) -> Optional[CountdownTimer]:
@@ -214,6 +615,11 @@ class CountdownManager:
         for timer in self.timers.values():
             timer.stop()
 
+    def shutdown(self):
+        """停止所有倒计时和调度线程"""
+        self.stop_all()
+        self.scheduler.shutdown()
+
 
 def parse_datetime(time_str: str) -> Optional[datetime]:
     """
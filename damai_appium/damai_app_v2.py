@@ -6,6 +6,7 @@ __Description__ = "大麦app抢票自动化 - 优化版"
 __Created__ = 2025/09/13 19:27
 """
 
+import re
 import time
 import logging
 from datetime import datetime
@@ -19,8 +20,20 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 try:
     from .config import Config
+    from .action_plan import ActionPlan, checked_state
+    from .command_scheduler import install_command_scheduler
+    from .snapshot_service import get_snapshot_service
+    from .sleep_accounting import accounted_sleep
 except ImportError:
     from config import Config
+    from action_plan import ActionPlan, checked_state
+    from command_scheduler import install_command_scheduler
+    from snapshot_service import get_snapshot_service
+    from sleep_accounting import accounted_sleep
+
+
+# UiSelector中的文字，如 new UiSelector().text("张三")
+_SELECTOR_TEXT = re.compile(r'text\("(.+?)"\)')
 
 
 class BotLogger:
@@ -182,6 +195,8 @@ class DamaiBot:
             BotLogger.info("  [1/3] 正在建立WebDriver连接...")
 
             self.driver = webdriver.Remote(self.config.server_url, options=device_app_info)
+            # 多线程共用driver，命令按优先级调度
+            install_command_scheduler(self.driver)
 
             connect_time = time.time() - connect_start
             BotLogger.success(f"  [1/3] WebDriver连接成功! (耗时: {connect_time:.2f}秒)")
@@ -201,28 +216,18 @@ class DamaiBot:
                 BotLogger.info("尝试清理并重启UiAutomator2服务器...")
 
                 try:
-                    # 清理UiAutomator2服务器进程
-                    import subprocess
+                    # 清理UiAutomator2服务器进程（经ADB服务器协议执行，不启动adb进程）
+                    from adb_client import get_adb_client
+                    adb = get_adb_client()
                     device_udid = f"127.0.0.1:{self.config.adb_port}"
 
                     BotLogger.info(f"  - 停止UiAutomator2服务器进程 (设备: {device_udid})")
-                    subprocess.run(
-                        f'adb -s {device_udid} shell "am force-stop io.appium.uiautomator2.server"',
-                        shell=True,
-                        timeout=10,
-                        capture_output=True
-                    )
+                    adb.shell(device_udid, "am force-stop io.appium.uiautomator2.server", timeout=10)
 
                     BotLogger.info(f"  - 停止UiAutomator2测试进程")
-                    subprocess.run(
-                        f'adb -s {device_udid} shell "am force-stop io.appium.uiautomator2.server.test"',
-                        shell=True,
-                        timeout=10,
-                        capture_output=True
-                    )
+                    adb.shell(device_udid, "am force-stop io.appium.uiautomator2.server.test", timeout=10)
 
-                    import time
-                    time.sleep(2)
+                    accounted_sleep(2)
                     BotLogger.success("UiAutomator2服务器已清理，请重新点击连接按钮")
 
                 except Exception as cleanup_error:
@@ -265,7 +270,7 @@ class DamaiBot:
         try:
             self.driver.press_keycode(4)  # KEYCODE_BACK
             BotLogger.info("已按返回键退回上一步")
-            time.sleep(0.5)
+            accounted_sleep(0.5)
             return True
         except Exception as e:
             BotLogger.warning("按返回键失败", e)
@@ -303,7 +308,7 @@ class DamaiBot:
 
             # ========== 第一步：选择有票的场次 ==========
             BotLogger.info("步骤1: 识别并点击有票的场次")
-            time.sleep(2)  # 等待页面加载
+            accounted_sleep(2)  # 等待页面加载
 
             # 查找"无票"标记
             BotLogger.info("查找所有'无票'标记...")
@@ -396,7 +401,7 @@ class DamaiBot:
 
             # 等待票档弹出（关键！不要退出，继续在同一页面操作）
             BotLogger.wait("等待票档弹出...")
-            time.sleep(2)
+            accounted_sleep(2)
 
             # ========== 第二步：在同一页面上选择有票的票档 ==========
             BotLogger.info("步骤2: 识别并点击有票的票档")
@@ -532,7 +537,7 @@ class DamaiBot:
                 BotLogger.error("点击票档失败", e)
                 return False
 
-            time.sleep(2)
+            accounted_sleep(2)
 
             # 验证是否进入下一步
             BotLogger.info("验证是否进入下一步...")
@@ -588,7 +593,7 @@ class DamaiBot:
         for by, value in elements_info:
             if self.ultra_fast_click(by, value):
                 if delay > 0:
-                    time.sleep(delay)
+                    accounted_sleep(delay)
             else:
                 print(f"点击失败: {value}")
 
@@ -611,7 +616,41 @@ class DamaiBot:
             except Exception as e:
                 print(f"查找用户失败 {value}: {e}")
         print(f"成功找到 {len(coordinates)} 个用户")
-        # 快速连续点击
+        if not coordinates:
+            return
+
+        # 编译为一次W3C actions请求，点击间隔由设备端执行
+        plan = ActionPlan()
+        for i, (x, y, value) in enumerate(coordinates):
+            plan.tap(x, y, value, press_ms=30)
+            if i < len(coordinates) - 1:
+                plan.wait(10)
+        success, message = plan.dispatch(self.driver)
+        if success:
+            for _, _, value in coordinates:
+                print(f"点击用户: {value}")
+            return
+        if not plan.rejected:
+            # 请求可能已在设备上执行（如读超时），重新点击会把已选中的观演人取消，只补点仍未选中的
+            print(f"动作计划结果未知，核对选中状态后补点: {message}")
+            try:
+                page_source = get_snapshot_service(self.driver).get(max_age=0).page_source
+            except Exception as e:
+                print(f"读取选中状态失败，不再补点: {e}")
+                return
+            pending = []
+            for x, y, value in coordinates:
+                match = _SELECTOR_TEXT.search(value)
+                state = checked_state(page_source, match.group(1) if match else value)
+                if state is False:
+                    pending.append((x, y, value))
+                elif state is None:
+                    print(f"无法确定是否已选中，不补点: {value}")
+            coordinates = pending
+        else:
+            print(f"动作计划被拒绝，改为逐个点击: {message}")
+
+        # 回退: 逐个点击
         for i, (x, y, value) in enumerate(coordinates):
             self.driver.execute_script("mobile: clickGesture", {
                 "x": x,
@@ -619,7 +658,7 @@ class DamaiBot:
                 "duration": 30
             })
             if i < len(coordinates) - 1:
-                time.sleep(0.01)
+                accounted_sleep(0.01)
             print(f"点击用户: {value}")
 
     def smart_wait_and_click(self, by, value, backup_selectors=None, timeout=1.5):
@@ -653,12 +692,12 @@ class DamaiBot:
             try:
                 BotLogger.info("关闭大麦APP...")
                 self.driver.terminate_app("cn.damai")
-                time.sleep(2)
+                accounted_sleep(2)
                 BotLogger.success("大麦APP已关闭")
 
                 BotLogger.info("启动大麦APP...")
                 self.driver.activate_app("cn.damai")
-                time.sleep(2)
+                accounted_sleep(2)
                 BotLogger.success("大麦APP已重新启动")
             except Exception as e:
                 BotLogger.warning("重启APP时出现异常，继续执行", e)
@@ -667,7 +706,7 @@ class DamaiBot:
             BotLogger.step(3, "等待大麦APP完全启动")
             max_wait_time = 10  # 最多等待10秒
             for i in range(max_wait_time):
-                time.sleep(1)
+                accounted_sleep(1)
                 current_activity = self.driver.current_activity
                 BotLogger.info(f"检测当前Activity: {current_activity} ({i+1}/{max_wait_time}秒)")
 
@@ -682,7 +721,7 @@ class DamaiBot:
 
             # 再等待1秒确保页面完全加载
             BotLogger.wait("等待页面完全加载...")
-            time.sleep(2)
+            accounted_sleep(2)
 
             # 关闭可能出现的广告弹窗
             BotLogger.step(4, "检测并关闭广告弹窗")
@@ -746,7 +785,7 @@ class DamaiBot:
 
                 if ad_closed:
                     BotLogger.wait("等待广告关闭动画...")
-                    time.sleep(1)  # 等待广告关闭动画
+                    accounted_sleep(1)  # 等待广告关闭动画
                 else:
                     BotLogger.info("未检测到广告弹窗，继续...")
 
@@ -853,12 +892,12 @@ class DamaiBot:
                     return False
 
                 BotLogger.wait("等待搜索框就绪...")
-                time.sleep(1)  # 等待搜索框打开
+                accounted_sleep(1)  # 等待搜索框打开
 
                 # 0.1.5 处理位置权限弹窗（关键步骤！）
                 BotLogger.step(6, "处理位置权限弹窗")
                 BotLogger.wait("等待可能的权限弹窗显示...")
-                time.sleep(1.5)  # 等待弹窗显示
+                accounted_sleep(1.5)  # 等待弹窗显示
 
                 try:
                     permission_handled = False
@@ -874,7 +913,7 @@ class DamaiBot:
                             buttons[0].click()
                             permission_handled = True
                             BotLogger.success("方式1成功: 点击了'立即开启'按钮")
-                            time.sleep(1)
+                            accounted_sleep(1)
                     except Exception as e:
                         BotLogger.debug(f"方式1失败: {e}")
 
@@ -890,7 +929,7 @@ class DamaiBot:
                                 buttons[0].click()
                                 permission_handled = True
                                 BotLogger.success("方式2成功: 点击了'下次再说'按钮")
-                                time.sleep(1)
+                                accounted_sleep(1)
                         except Exception as e:
                             BotLogger.debug(f"方式2失败: {e}")
 
@@ -910,7 +949,7 @@ class DamaiBot:
                                         btn.click()
                                         permission_handled = True
                                         BotLogger.success(f"方式3成功: 点击了 {text}")
-                                        time.sleep(1)
+                                        accounted_sleep(1)
                                         break
                                     except:
                                         continue
@@ -929,7 +968,7 @@ class DamaiBot:
                                 buttons[0].click()
                                 permission_handled = True
                                 BotLogger.success("方式4成功: 点击了拒绝按钮")
-                                time.sleep(1)
+                                accounted_sleep(1)
                         except:
                             pass
 
@@ -942,7 +981,7 @@ class DamaiBot:
                     BotLogger.warning("权限弹窗处理过程出现异常", e)
 
                 BotLogger.wait("确保弹窗完全关闭...")
-                time.sleep(1)  # 确保弹窗完全关闭
+                accounted_sleep(1)  # 确保弹窗完全关闭
 
                 # 0.2 输入搜索关键词 - 重新查找输入框
                 print(f"输入关键词: {self.config.keyword}")
@@ -952,7 +991,7 @@ class DamaiBot:
                         try:
                             # 先清空
                             self.driver.press_keycode(123)  # KEYCODE_DEL
-                            time.sleep(0.2)
+                            accounted_sleep(0.2)
 
                             # 输入关键词
                             search_inputs = self.driver.find_elements(By.CLASS_NAME, "android.widget.EditText")
@@ -960,13 +999,13 @@ class DamaiBot:
                                 search_inputs[0].send_keys(self.config.keyword)
                                 print("输入成功")
                                 break
-                            time.sleep(0.5)
+                            accounted_sleep(0.5)
                         except Exception as e:
                             print(f"输入尝试失败: {e}")
                             if _ == 2:  # 最后一次尝试
                                 raise
 
-                    time.sleep(1)
+                    accounted_sleep(1)
                 except Exception as e:
                     print(f"输入关键词失败: {e}")
                     # 尝试备用方案：使用 ADB 输入
@@ -976,7 +1015,7 @@ class DamaiBot:
                             'command': 'input',
                             'args': ['text', self.config.keyword]
                         })
-                        time.sleep(0.5)
+                        accounted_sleep(0.5)
                     except Exception as e2:
                         print(f"ADB输入也失败: {e2}")
                         return False
@@ -984,13 +1023,14 @@ class DamaiBot:
                 # 0.3 执行搜索
                 print("执行搜索...")
                 self.driver.press_keycode(66)  # KEYCODE_ENTER
-                time.sleep(3)  # 等待搜索结果加载
+                accounted_sleep(3, "等待搜索结果加载", condition=lambda: self.config.keyword[:2] in
+                                get_snapshot_service(self.driver).peek(max_age=0.5).page_source, probe_interval=0.5)
 
             # 0.4 点击第一个搜索结果（如果需要）
             if need_click_result:
                 print("选择搜索结果...")
                 print(f"搜索关键词: {self.config.keyword}")
-                time.sleep(2)  # 等待搜索结果完全加载
+                accounted_sleep(2)  # 等待搜索结果完全加载
                 try:
                     # 尝试多种方式找到搜索结果
                     result_clicked = False
@@ -1071,7 +1111,7 @@ class DamaiBot:
                         return False
 
                     BotLogger.wait("等待进入演出详情页...")
-                    time.sleep(3)  # 等待进入详情页
+                    accounted_sleep(3)  # 等待进入详情页
 
                     # 验证是否进入了正确的详情页
                     BotLogger.info("验证是否进入演出详情页...")
@@ -1092,11 +1132,11 @@ class DamaiBot:
                                 if retry < 1:  # 还有重试机会
                                     BotLogger.info("按返回键退回...")
                                     self.press_back()
-                                    time.sleep(1)
+                                    accounted_sleep(1)
                                     # 重新点击搜索结果
                                     BotLogger.info("重新点击搜索结果...")
                                     if result_clicked:
-                                        time.sleep(2)
+                                        accounted_sleep(2)
                         except Exception as e:
                             BotLogger.debug(f"验证详情页时出错: {e}")
 
@@ -1186,7 +1226,7 @@ class DamaiBot:
                 return False
 
             BotLogger.wait("等待进入场次选择页面...")
-            time.sleep(2)  # 等待进入选票页面
+            accounted_sleep(2)  # 等待进入选票页面
 
             # 关闭可能出现的"服务说明"弹窗
             BotLogger.step(7, "检测并关闭服务说明弹窗")
@@ -1217,7 +1257,7 @@ class DamaiBot:
                                     img.click()
                                     service_popup_closed = True
                                     BotLogger.success(f"方式1成功: 点击了服务说明右侧的×按钮")
-                                    time.sleep(0.5)
+                                    accounted_sleep(0.5)
                                     break
                             except:
                                 continue
@@ -1236,7 +1276,7 @@ class DamaiBot:
                             close_buttons[0].click()
                             service_popup_closed = True
                             BotLogger.success("方式2成功: 点击了关闭按钮")
-                            time.sleep(0.5)
+                            accounted_sleep(0.5)
                     except:
                         pass
 
@@ -1251,7 +1291,7 @@ class DamaiBot:
                         self.driver.execute_script('mobile: clickGesture', {'x': x, 'y': y})
                         service_popup_closed = True
                         BotLogger.success(f"方式3成功: 点击了右上角位置")
-                        time.sleep(0.5)
+                        accounted_sleep(0.5)
                     except:
                         pass
 
@@ -1276,7 +1316,7 @@ class DamaiBot:
                     BotLogger.warning("未发现选票页面的典型元素，可能点击了错误按钮")
                     BotLogger.info("尝试按返回键并重新点击购票按钮...")
                     self.press_back()
-                    time.sleep(1)
+                    accounted_sleep(1)
                     # 这里可以添加重试逻辑，但为了避免无限循环，先记录警告
                     BotLogger.warning("请检查是否需要手动干预")
             except Exception as e:
@@ -1343,12 +1383,12 @@ class DamaiBot:
                             )
                             if search_elements:
                                 search_elements[0].click()
-                                time.sleep(1)
+                                accounted_sleep(1)
                                 # 输入影城名称
                                 edit_texts = self.driver.find_elements(By.CLASS_NAME, "android.widget.EditText")
                                 if edit_texts:
                                     edit_texts[0].send_keys(cinema_name)
-                                    time.sleep(1)
+                                    accounted_sleep(1)
                                     # 点击搜索结果
                                     results = self.driver.find_elements(
                                         AppiumBy.ANDROID_UIAUTOMATOR,
@@ -1362,7 +1402,7 @@ class DamaiBot:
                         print(f"影城选择出错: {e}")
 
                     if cinema_found:
-                        time.sleep(2)  # 等待进入场次选择
+                        accounted_sleep(2)  # 等待进入场次选择
                     else:
                         print("未找到指定影城，继续...")
                 else:
@@ -1407,7 +1447,7 @@ class DamaiBot:
                             'percent': 0.6,
                             'speed': 800
                         })
-                        time.sleep(1)
+                        accounted_sleep(1)
                     except Exception as e:
                         print(f"  缩放失败(可忽略): {e}")
 
@@ -1438,7 +1478,7 @@ class DamaiBot:
                                 'y': y,
                                 'duration': 80
                             })
-                            time.sleep(0.8)
+                            accounted_sleep(0.8)
 
                             # 检查底部按钮文本是否变化
                             buttons = self.driver.find_elements(
@@ -1472,14 +1512,14 @@ class DamaiBot:
                                 'y': 300,  # 固定在300的y坐标
                                 'duration': 100
                             })
-                            time.sleep(1)
+                            accounted_sleep(1)
                             print("  执行了备用点击")
                         except:
                             pass
 
                     # 步骤3：点击底部确认按钮（不管是否成功选座都尝试）
                     print("步骤3: 点击确认按钮...")
-                    time.sleep(1)
+                    accounted_sleep(1)
                     try:
                         buttons = self.driver.find_elements(
                             AppiumBy.ANDROID_UIAUTOMATOR,
@@ -1509,7 +1549,7 @@ class DamaiBot:
                     except Exception as e:
                         print(f"  点击确认按钮失败: {e}")
 
-                    time.sleep(2)
+                    accounted_sleep(2)
                     print("=== 选座流程完成 ===")
                 else:
                     print("未检测到选座页面，跳过")
@@ -1525,7 +1565,7 @@ class DamaiBot:
 
                 # 先勾选协议（在弹窗中）
                 print("勾选用户协议...")
-                time.sleep(1)  # 等待弹窗完全显示
+                accounted_sleep(1)  # 等待弹窗完全显示
                 try:
                     agreement_checked = False
 
@@ -1590,7 +1630,7 @@ class DamaiBot:
                             print(f"方式3失败: {e}")
 
                     if agreement_checked:
-                        time.sleep(0.5)  # 等待复选框状态更新
+                        accounted_sleep(0.5)  # 等待复选框状态更新
                     else:
                         print("未找到协议复选框，尝试继续...")
 
@@ -1620,7 +1660,7 @@ class DamaiBot:
                     if not continue_clicked:
                         print("未找到继续购票按钮，尝试继续...")
 
-                    time.sleep(2)  # 等待进入支付页面
+                    accounted_sleep(2)  # 等待进入支付页面
                 except Exception as e:
                     print(f"点击继续购票失败: {e}")
 
@@ -1656,7 +1696,7 @@ class DamaiBot:
                         payment_clicked = True
                         print(f"点击了右下角位置 ({x}, {y})")
 
-                    time.sleep(1)
+                    accounted_sleep(1)
                 except Exception as e:
                     print(f"点击立即付款失败: {e}")
 
@@ -1711,7 +1751,7 @@ class DamaiBot:
                                 "y": y,
                                 "duration": 50
                             })
-                            time.sleep(0.02)
+                            accounted_sleep(0.02)
                     except Exception as e:
                         print(f"快速点击加号失败: {e}")
 
@@ -1749,7 +1789,7 @@ class DamaiBot:
             print(f"抢票过程发生错误: {e}")
             return False
         finally:
-            time.sleep(1)  # 给最后的操作一点时间
+            accounted_sleep(1)  # 给最后的操作一点时间
             self.driver.quit()
 
     def run_with_retry(self, max_retries=3):
@@ -1763,7 +1803,7 @@ class DamaiBot:
                 print(f"第 {attempt + 1} 次尝试失败")
                 if attempt < max_retries - 1:
                     print("2秒后重试...")
-                    time.sleep(2)
+                    accounted_sleep(2)
                     # 重新初始化驱动
                     try:
                         self.driver.quit()
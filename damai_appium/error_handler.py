@@ -12,6 +12,11 @@ from enum import Enum
 from dataclasses import dataclass, field
 from functools import wraps
 
+try:
+    from .retry_policy import RetryRule, get_retry_policy
+except ImportError:
+    from retry_policy import RetryRule, get_retry_policy
+
 
 class ErrorCategory(Enum):
     """错误类别枚举"""
@@ -191,22 +196,25 @@ class GlobalErrorHandler:
         if auto_recover and category in self.recovery_strategies:
             self.log(f"尝试自动恢复...", "WARNING")
 
-            for attempt in range(max_recovery_attempts):
-                record.recovery_attempts += 1
-
-                try:
-                    self.log(f"  恢复尝试 {attempt + 1}/{max_recovery_attempts}", "INFO")
-                    self.recovery_strategies[category]()
-
-                    self.log(f"✓ 自动恢复成功", "SUCCESS")
-                    recovered = True
-                    record.auto_recovered = True
-                    break
-
-                except Exception as e:
-                    self.log(f"  恢复失败: {str(e)}", "WARNING")
-                    if attempt < max_recovery_attempts - 1:
-                        time.sleep(2 ** attempt)  # 指数退避
+            # 恢复动作的失败按恢复策略退避重试，且不会超出调用方剩余的时间
+            policy = get_retry_policy("recovery", log_func=lambda msg: self.log(f"  {msg}", "INFO"))
+            policy.default = RetryRule(max_attempts=max_recovery_attempts, base_delay=1, backoff=2, max_delay=4)
+            with policy.session(f"error_handler.{category.value}") as retry:
+                while True:
+                    record.recovery_attempts += 1
+                    try:
+                        self.log(f"  恢复尝试 {retry.attempt}/{max_recovery_attempts}", "INFO")
+                        self.recovery_strategies[category]()
+
+                        self.log(f"✓ 自动恢复成功", "SUCCESS")
+                        recovered = True
+                        record.auto_recovered = True
+                        break
+
+                    except Exception as e:
+                        self.log(f"  恢复失败: {str(e)}", "WARNING")
+                        if not retry.backoff(e):
+                            break
 
         # 记录错误
         self.statistics.add_record(record)
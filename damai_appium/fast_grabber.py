@@ -9,6 +9,17 @@ import hashlib
 from typing import Optional, Callable, Tuple
 from dataclasses import dataclass
 
+try:
+    from .action_plan import ActionPlan
+    from .snapshot_service import get_snapshot_service
+    from .command_scheduler import get_command_scheduler
+    from .warmup_pipeline import WarmupContext, WarmupReport, build_default_pipeline
+except ImportError:
+    from action_plan import ActionPlan
+    from snapshot_service import get_snapshot_service
+    from command_scheduler import get_command_scheduler
+    from warmup_pipeline import WarmupContext, WarmupReport, build_default_pipeline
+
 
 @dataclass
 class GrabConfig:
@@ -22,6 +33,8 @@ class GrabConfig:
     click_interval: float = 0.1  # 点击间隔（秒）
     max_clicks: int = 100  # 最大点击次数
     page_check_interval: int = 5  # 每N次点击检查一次页面
+    use_action_plan: bool = True  # 场次+票档编译为一次动作请求
+    select_wait_ms: int = 500  # 场次/票档点击后的等待（毫秒）
 
 
 class FastGrabber:
@@ -38,6 +51,7 @@ class FastGrabber:
             "buy_button_clicked": 0,
             "page_changed": False
         }
+        self.warmup: Optional[WarmupContext] = None  # 准备阶段的预热结果
 
     def log(self, msg: str, level: str = "INFO"):
         """统一日志输出"""
@@ -50,9 +64,8 @@ class FastGrabber:
     def get_page_hash(self) -> str:
         """获取当前页面的哈希值（用于检测页面变化）"""
         try:
-            # 方式1: 使用page_source
-            page_source = self.driver.page_source
-            return hashlib.md5(page_source.encode()).hexdigest()
+            # 方式1: 使用page_source（点击后必须是新获取的快照）
+            return get_snapshot_service(self.driver).get(max_age=0).digest
         except Exception as e:
             self.log(f"获取页面哈希失败: {e}", "WARNING")
             # 方式2: 使用截图
@@ -119,6 +132,81 @@ class FastGrabber:
 
         return success
 
+    def prepare(self, config: GrabConfig, ocr_loader: Optional[Callable] = None,
+                budget: Optional[float] = None) -> WarmupReport:
+        """
+        准备阶段预热（倒计时on_prepare中调用）
+
+        确认页面、解析坐标并缓存已校验的动作计划，开票时start_grab直接使用。
+
+        Args:
+            config: 抢票配置
+            ocr_loader: OCR加载函数，None时不加载
+            budget: 总预算（秒），通常为距开票的剩余时间减去余量
+
+        Returns:
+            WarmupReport: 各阶段通过/不通过报告
+        """
+        context = WarmupContext(self.driver, config)
+        pipeline = build_default_pipeline(ocr_loader, log_func=lambda msg: self.log(msg, "INFO"))
+        report = pipeline.run(context, budget)
+        self.warmup = context
+        return report
+
+    def _take_warmup(self, config: GrabConfig) -> Optional[WarmupContext]:
+        """取出与配置一致的预热结果（只用一次，页面随后会变化）"""
+        warmup, self.warmup = self.warmup, None
+        if warmup is None or warmup.config is not config:
+            return None
+        if warmup.snapshot is not None and warmup.snapshot.age > 120:
+            self.log("预热结果已超过2分钟，不再使用", "WARNING")
+            return None
+        return warmup
+
+    def select_session_and_price(self, config: GrabConfig,
+                                 plan: Optional[ActionPlan] = None) -> Tuple[bool, str]:
+        """
+        场次+票档一次请求完成（动作计划）
+
+        先用当前页面快照校验两个坐标，再编译为单个W3C actions请求发送。
+
+        Args:
+            config: 抢票配置
+            plan: 预热阶段编译的计划，提供时省去编译，但同样先按当前快照重新校验
+                （预热快照可能已是2分钟前的页面）
+
+        Returns:
+            (success, message): 是否成功和消息
+        """
+        self.log("=" * 60, "INFO")
+        self.log("步骤1-2: 选择场次和票档（动作计划）", "INFO")
+        self.log("=" * 60, "INFO")
+
+        if plan is None:
+            plan = (ActionPlan()
+                    .tap(config.session_x, config.session_y, "场次")
+                    .wait(config.select_wait_ms)
+                    .tap(config.price_x, config.price_y, "票档")
+                    .wait(config.select_wait_ms))
+
+        try:
+            page_source = get_snapshot_service(self.driver).get(max_age=0.5).page_source
+        except Exception as e:
+            return False, f"无法获取页面快照: {e}"
+
+        start_time = time.perf_counter()
+        success, message = plan.dispatch(self.driver, page_source)
+        if not success:
+            self.log(f"✗ {message}", "WARNING")
+            return False, message
+
+        elapsed = time.perf_counter() - start_time
+        self.grab_stats["total_clicks"] += plan.tap_count
+        self.grab_stats["session_selected"] = True
+        self.grab_stats["price_selected"] = True
+        self.log(f"✓ 场次和票档选择完成 ({elapsed:.3f}秒, 计划时长{plan.total_duration_ms}ms)", "SUCCESS")
+        return True, message
+
     def fast_click_buy_button(self,
                              x: int,
                              y: int,
@@ -208,40 +296,55 @@ class FastGrabber:
             if on_progress:
                 on_progress(msg)
 
-        try:
-            # 步骤1: 选择场次
-            progress("正在选择场次...")
-            if not self.select_session(config.session_x, config.session_y):
-                return False, "场次选择失败"
-
-            # 步骤2: 选择票档
-            progress("正在选择票档...")
-            if not self.select_price(config.price_x, config.price_y):
-                return False, "票档选择失败"
-
-            # 步骤3: 快速点击购票按钮
-            progress("正在快速点击购票按钮...")
-            success, message = self.fast_click_buy_button(
-                config.buy_x,
-                config.buy_y,
-                config.max_clicks,
-                config.click_interval,
-                config.page_check_interval
-            )
-
-            if success:
-                progress("抢票成功！")
-            else:
-                progress(f"抢票失败: {message}")
-
-            return success, message
-
-        except Exception as e:
-            self.log(f"抢票过程出错: {e}", "ERROR")
-            return False, f"抢票过程出错: {str(e)}"
-
-        finally:
-            self.is_grabbing = False
+        # 抢票阶段：本线程命令优先，后台轮询暂停
+        scheduler = get_command_scheduler()
+        warmup = self._take_warmup(config)
+        buy_x, buy_y = config.buy_x, config.buy_y
+        if warmup:
+            buy_x, buy_y = warmup.coordinates.get("buy", (buy_x, buy_y))
+        with scheduler.grab_phase():
+            try:
+                planned = False
+                if config.use_action_plan:
+                    progress("正在选择场次和票档...")
+                    planned, _ = self.select_session_and_price(config, warmup.action_plan if warmup else None)
+                    if not planned:
+                        self.log("动作计划未执行，改为逐步点击", "WARNING")
+
+                if not planned:
+                    # 步骤1: 选择场次
+                    progress("正在选择场次...")
+                    if not self.select_session(config.session_x, config.session_y):
+                        return False, "场次选择失败"
+
+                    # 步骤2: 选择票档
+                    progress("正在选择票档...")
+                    if not self.select_price(config.price_x, config.price_y):
+                        return False, "票档选择失败"
+
+                # 步骤3: 快速点击购票按钮
+                progress("正在快速点击购票按钮...")
+                success, message = self.fast_click_buy_button(
+                    buy_x,
+                    buy_y,
+                    config.max_clicks,
+                    config.click_interval,
+                    config.page_check_interval
+                )
+
+                if success:
+                    progress("抢票成功！")
+                else:
+                    progress(f"抢票失败: {message}")
+
+                return success, message
+
+            except Exception as e:
+                self.log(f"抢票过程出错: {e}", "ERROR")
+                return False, f"抢票过程出错: {str(e)}"
+
+            finally:
+                self.is_grabbing = False
 
     def stop_grab(self):
         """停止抢票"""
@@ -268,6 +371,7 @@ class FastGrabber:
         self.log(f"票档已选择: {'是' if stats['price_selected'] else '否'}", "INFO")
         self.log(f"购票按钮点击: {stats['buy_button_clicked']}次", "INFO")
         self.log(f"页面已变化: {'是' if stats['page_changed'] else '否'}", "INFO")
+        get_command_scheduler().log_report(lambda msg: self.log(msg, "INFO"))
         self.log("=" * 60, "INFO")
 
 
@@ -0,0 +1,325 @@
+# -*- coding: UTF-8 -*-
+"""
+恢复动作规划 - 按错误类型从低成本动作开始逐级恢复
+维护恢复动作目录（重新探测、重新查询、返回键、关闭弹窗、重建会话、重启UiAutomator2、
+重启App、重连ADB），记录每个动作在每类错误下的实测耗时和成功率，
+按“预期恢复成本”（耗时/成功率）排序依次尝试，排序随历史数据自动调整
+
+用法:
+    planner = RecoveryPlanner(log_func=print)
+    planner.register(RecoveryAction("re_probe", "重新探测", probe, ALL_ERROR_CLASSES, cost=0.3))
+    outcome = planner.recover(error_msg, verify=probe)
+    ... 重试原操作 ...
+    planner.confirm(outcome, retry_ok)
+"""
+
+import json
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, Optional, Tuple, Union
+
+
+class ErrorClass(Enum):
+    """错误类型"""
+    TRANSIENT = "transient"  # 元素未找到/已失效等页面级错误
+    OBSTRUCTED = "obstructed"  # 点击被遮挡（弹窗）
+    SESSION_LOST = "session_lost"  # WebDriver会话失效
+    UIA2_CRASH = "uia2_crash"  # UiAutomator2进程崩溃
+    DEVICE_OFFLINE = "device_offline"  # ADB设备断开
+    CONNECTION = "connection"  # 与Appium/设备通信超时或断开
+    UNKNOWN = "unknown"
+
+
+ALL_ERROR_CLASSES = tuple(ErrorClass)
+
+# 需要重建会话级别恢复的错误类型
+SESSION_ERROR_CLASSES = (ErrorClass.SESSION_LOST, ErrorClass.UIA2_CRASH,
+                         ErrorClass.DEVICE_OFFLINE, ErrorClass.CONNECTION)
+
+# 异常类型（selenium/urllib3/requests的类名），优先于错误信息判断
+_ERROR_TYPES: Dict[str, ErrorClass] = {
+    'NoSuchElementException': ErrorClass.TRANSIENT,
+    'StaleElementReferenceException': ErrorClass.TRANSIENT,
+    'InvalidSelectorException': ErrorClass.TRANSIENT,
+    'ElementNotInteractableException': ErrorClass.TRANSIENT,
+    'TimeoutException': ErrorClass.TRANSIENT,  # WebDriverWait等待元素超时
+    'ElementClickInterceptedException': ErrorClass.OBSTRUCTED,
+    'InvalidSessionIdException': ErrorClass.SESSION_LOST,
+    'NoSuchDriverException': ErrorClass.SESSION_LOST,
+    'MaxRetryError': ErrorClass.CONNECTION,
+    'NewConnectionError': ErrorClass.CONNECTION,
+    'ProtocolError': ErrorClass.CONNECTION,
+    'ReadTimeoutError': ErrorClass.CONNECTION,
+    'ConnectionError': ErrorClass.CONNECTION,
+    'ConnectionRefusedError': ErrorClass.CONNECTION,
+    'ConnectionResetError': ErrorClass.CONNECTION,
+}
+
+# 错误信息关键词（小写，按顺序匹配，先匹配到的优先）
+# 只用完整短语：selenium的错误信息末尾附带文档链接（.../webdriver/troubleshooting/errors#...）
+# 和Appium堆栈，泛泛的 "session"/"webdriver" 会把元素未找到误判为会话失效
+_ERROR_PATTERNS: List[Tuple[ErrorClass, Tuple[str, ...]]] = [
+    (ErrorClass.UIA2_CRASH, ("instrumentation process is not running", "probably crashed",
+                             "uiautomator2 server", "uiautomator exited")),
+    (ErrorClass.DEVICE_OFFLINE, ("could not find a connected android device", "device offline",
+                                 "device not found", "adb设备不可用", "device unauthorized")),
+    (ErrorClass.TRANSIENT, ("no such element", "stale element", "could not be located",
+                            "does not exist in dom anymore", "unable to locate element", "invalid selector",
+                            "could not parse selector", "未找到元素", "找不到元素")),
+    (ErrorClass.OBSTRUCTED, ("would receive the click", "click intercepted", "not clickable", "弹窗")),
+    (ErrorClass.SESSION_LOST, ("invalid session id", "session not found", "no such session",
+                               "session is either terminated", "session deleted", "会话已失效")),
+    (ErrorClass.CONNECTION, ("connection refused", "connection reset", "connection aborted",
+                             "max retries exceeded", "read timed out", "remote end closed connection",
+                             "获取截图失败")),
+]
+
+_URL_PATTERN = re.compile(r'https?://\S+')
+
+# 成功率先验的权重（相当于几次虚拟尝试）
+PRIOR_WEIGHT = 2.0
+# 耗时EWMA系数
+COST_ALPHA = 0.3
+
+
+def classify_error(error: Union[str, BaseException]) -> ErrorClass:
+    """
+    判断错误类型
+
+    Args:
+        error: 异常对象（优先按异常类型判断）或错误信息
+    """
+    if isinstance(error, BaseException):
+        for cls in type(error).__mro__:
+            if cls.__name__ in _ERROR_TYPES:
+                return _ERROR_TYPES[cls.__name__]
+        error = str(error)
+
+    # 只看错误信息本身：去掉文档链接和服务端堆栈
+    text = (error or "").lower().split("stacktrace:")[0]
+    text = _URL_PATTERN.sub("", text)
+    for error_class, keywords in _ERROR_PATTERNS:
+        if any(keyword in text for keyword in keywords):
+            return error_class
+    return ErrorClass.UNKNOWN
+
+
+@dataclass
+class RecoveryAction:
+    """恢复动作"""
+    name: str
+    label: str
+    run: Callable[[str], bool]  # 参数为错误信息，返回动作是否执行成功
+    error_classes: Tuple[ErrorClass, ...]  # 适用的错误类型
+    cost: float  # 预估耗时（秒），没有历史数据时使用
+    prior_success: float = 0.5  # 预估成功率，没有历史数据时使用
+    enabled: Optional[Callable[[], bool]] = None  # 当前是否可用（如抢票进行中不重启App），不可用时跳过且不计入统计
+
+
+@dataclass
+class ActionStats:
+    """某类错误下某个动作的历史表现"""
+    attempts: int = 0
+    successes: int = 0
+    cost: Optional[float] = None  # 耗时EWMA（秒）
+
+    def success_rate(self, prior: float) -> float:
+        return (self.successes + prior * PRIOR_WEIGHT) / (self.attempts + PRIOR_WEIGHT)
+
+    def record(self, seconds: float, success: bool):
+        self.attempts += 1
+        if success:
+            self.successes += 1
+        self.cost = seconds if self.cost is None else self.cost + COST_ALPHA * (seconds - self.cost)
+
+
+@dataclass
+class RecoveryOutcome:
+    """一次恢复的结果"""
+    error_class: ErrorClass
+    success: bool
+    action: str = ""  # 成功的动作
+    steps: List[Tuple[str, bool, float]] = field(default_factory=list)  # [(动作, 是否成功, 耗时)]
+    elapsed: float = 0.0
+    timestamp: float = field(default_factory=time.time)
+
+
+class RecoveryPlanner:
+    """
+    恢复动作规划器
+
+    按“预期恢复成本”排序：耗时 / 成功率。依次尝试时，这一排序使平均恢复时间最短；
+    成功率使用带先验的估计，新动作或数据少的动作不会因一两次失败就被排到最后。
+    """
+
+    def __init__(self, store_path=None, log_func=None):
+        """
+        初始化规划器
+
+        Args:
+            store_path: 历史数据文件，默认为程序目录下的recovery_stats.json
+            log_func: 日志函数
+        """
+        self.store_path = Path(store_path) if store_path else Path(__file__).parent / "recovery_stats.json"
+        self.log = log_func if log_func else print
+        self.actions: Dict[str, RecoveryAction] = {}
+        self.stats: Dict[Tuple[ErrorClass, str], ActionStats] = {}
+        self.history: deque = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self._recover_lock = threading.Lock()
+        self._load()
+
+    # ========== 历史数据 ==========
+
+    def _load(self):
+        try:
+            with open(self.store_path, 'r', encoding='utf-8') as f:
+                data = json.load(f).get('stats', {})
+        except (OSError, ValueError):
+            return
+        for key, entry in data.items():
+            class_name, _, action = key.partition('/')
+            try:
+                error_class = ErrorClass(class_name)
+            except ValueError:
+                continue
+            self.stats[(error_class, action)] = ActionStats(
+                entry.get('attempts', 0), entry.get('successes', 0), entry.get('cost'))
+
+    def _save(self):
+        with self._lock:
+            data = {f"{error_class.value}/{action}": {'attempts': s.attempts, 'successes': s.successes,
+                                                      'cost': round(s.cost, 3) if s.cost is not None else None}
+                    for (error_class, action), s in self.stats.items()}
+        try:
+            with open(self.store_path, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': time.time(), 'stats': data}, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            self.log(f"[恢复规划] 保存历史数据失败: {e}")
+
+    def _stats(self, error_class: ErrorClass, action: str) -> ActionStats:
+        key = (error_class, action)
+        if key not in self.stats:
+            self.stats[key] = ActionStats()
+        return self.stats[key]
+
+    # ========== 规划 ==========
+
+    def register(self, action: RecoveryAction):
+        """注册恢复动作（同名覆盖）"""
+        self.actions[action.name] = action
+
+    def expected_cost(self, error_class: ErrorClass, action: RecoveryAction) -> float:
+        """预期恢复成本：平均耗时 / 成功率"""
+        with self._lock:
+            stats = self.stats.get((error_class, action.name), ActionStats())
+        cost = stats.cost if stats.cost is not None else action.cost
+        return max(cost, 0.01) / max(stats.success_rate(action.prior_success), 0.01)
+
+    def plan(self, error_class: ErrorClass) -> List[RecoveryAction]:
+        """该错误类型下的恢复动作，按预期成本从低到高"""
+        candidates = [a for a in self.actions.values()
+                      if error_class in a.error_classes and (a.enabled is None or a.enabled())]
+        return sorted(candidates, key=lambda a: self.expected_cost(error_class, a))
+
+    def recover(self, error_msg: str, verify: Optional[Callable[[], bool]] = None,
+                error_class: Optional[ErrorClass] = None, budget: Optional[float] = None,
+                exclude: Optional[Collection[str]] = None) -> RecoveryOutcome:
+        """
+        逐级恢复，直到某个动作成功
+
+        Args:
+            error_msg: 错误信息（用于分类，并传给动作）
+            verify: 动作执行后的验证函数，返回是否已恢复（None表示以动作返回值为准）
+            error_class: 错误类型（None时按错误信息判断）
+            budget: 总耗时上限（秒），超过后不再尝试后续动作
+            exclude: 本次不再尝试的动作名（调用方逐次恢复时传入已试过的动作）
+
+        Returns:
+            恢复结果
+        """
+        error_class = error_class or classify_error(error_msg)
+        with self._recover_lock:
+            started = time.time()
+            outcome = RecoveryOutcome(error_class=error_class, success=False)
+            ladder = [a for a in self.plan(error_class) if not exclude or a.name not in exclude]
+            self.log(f"[恢复规划] 错误类型: {error_class.value}，恢复顺序: "
+                     f"{' → '.join(a.label for a in ladder) or '无可用动作'}")
+
+            for action in ladder:
+                if budget is not None and time.time() - started >= budget:
+                    self.log(f"[恢复规划] 已用完恢复时间预算({budget:.0f}秒)，停止尝试")
+                    break
+                action_started = time.time()
+                try:
+                    ok = bool(action.run(error_msg))
+                    if ok and verify is not None:
+                        ok = bool(verify())
+                except Exception as e:
+                    ok = False
+                    self.log(f"[恢复规划] {action.label}出错: {str(e)[:150]}")
+                seconds = time.time() - action_started
+                with self._lock:
+                    self._stats(error_class, action.name).record(seconds, ok)
+                outcome.steps.append((action.name, ok, seconds))
+                self.log(f"[恢复规划] {action.label}: {'成功' if ok else '未恢复'} ({seconds:.2f}秒)")
+                if ok:
+                    outcome.success = True
+                    outcome.action = action.name
+                    break
+
+            outcome.elapsed = time.time() - started
+            self.history.append(outcome)
+        self._save()
+        return outcome
+
+    def confirm(self, outcome: RecoveryOutcome, success: bool):
+        """
+        反馈恢复后重试原操作的结果
+
+        动作本身报告成功但原操作仍然失败时，把这次记为该动作失败，使排序不被“假恢复”误导
+        """
+        if success or not outcome.success or not outcome.action:
+            return
+        with self._lock:
+            stats = self._stats(outcome.error_class, outcome.action)
+            stats.successes = max(0, stats.successes - 1)
+        outcome.success = False
+        self._save()
+
+    # ========== 报告 ==========
+
+    def mean_time_to_recover(self, error_class: Optional[ErrorClass] = None) -> Optional[float]:
+        """成功恢复的平均耗时（秒），没有记录时返回None"""
+        times = [o.elapsed for o in self.history
+                 if o.success and (error_class is None or o.error_class == error_class)]
+        return sum(times) / len(times) if times else None
+
+    def get_report(self) -> Dict:
+        """各错误类型下的恢复顺序、动作表现和平均恢复时间"""
+        report = {}
+        for error_class in ErrorClass:
+            ladder = self.plan(error_class)
+            if not ladder:
+                continue
+            actions = []
+            for action in ladder:
+                with self._lock:
+                    stats = self.stats.get((error_class, action.name), ActionStats())
+                actions.append({
+                    'action': action.name,
+                    'attempts': stats.attempts,
+                    'success_rate': round(stats.success_rate(action.prior_success), 3),
+                    'cost': round(stats.cost if stats.cost is not None else action.cost, 3),
+                    'expected_cost': round(self.expected_cost(error_class, action), 3),
+                })
+            report[error_class.value] = {
+                'actions': actions,
+                'mean_time_to_recover': self.mean_time_to_recover(error_class),
+            }
+        return report
@@ -0,0 +1,336 @@
+# -*- coding: UTF-8 -*-
+"""
+统一重试策略 - 退避、抖动、按错误类型的重试规则和向内传递的截止时间
+每次带重试的调用都在一个截止时间内进行：嵌套调用的截止时间不会晚于外层剩余时间，
+内层重试等不及外层剩余时间时立即放弃，不再层层叠加等待；
+预算耗尽按调用位置统计，便于找出拖慢流程的重试
+
+用法:
+    policy = get_retry_policy("click")
+    with policy.session("click_stable_coord") as retry:
+        while True:
+            try:
+                driver.tap([(x, y)])
+                break
+            except Exception as e:
+                if not retry.backoff(e):
+                    raise
+
+    # 为一段流程设定总时限，其中所有重试共享这一预算
+    with deadline_scope(30, "抢票流程"):
+        ...
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Any
+
+try:
+    from .recovery_planner import ErrorClass, classify_error
+    from .sleep_accounting import accounted_sleep
+except ImportError:
+    from recovery_planner import ErrorClass, classify_error
+    from sleep_accounting import accounted_sleep
+
+
+# ========== 截止时间 ==========
+
+@dataclass
+class Deadline:
+    """截止时间（time.monotonic）"""
+    expires_at: float  # float('inf') 表示不限时
+    site: str = ""  # 设定该截止时间的调用位置
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+_local = threading.local()
+
+
+def current_deadline() -> Optional[Deadline]:
+    """当前线程生效的截止时间（None表示不限时）"""
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+def remaining_time(default: Optional[float] = None) -> Optional[float]:
+    """
+    当前截止时间前的剩余秒数
+
+    Args:
+        default: 不限时时的返回值
+
+    Returns:
+        剩余秒数，不限时返回default
+    """
+    deadline = current_deadline()
+    return deadline.remaining() if deadline else default
+
+
+def clamp_timeout(timeout: float) -> float:
+    """把内层操作的超时收紧到当前剩余时间以内（用于WebDriverWait等）"""
+    remaining = remaining_time()
+    return timeout if remaining is None else min(timeout, remaining)
+
+
+class deadline_scope:
+    """
+    截止时间作用域（线程内生效，可嵌套）
+
+    嵌套作用域的截止时间取自身时限与外层剩余时间中较早者。
+    """
+
+    def __init__(self, timeout: Optional[float], site: str = ""):
+        self.timeout = timeout
+        self.site = site
+        self.deadline: Optional[Deadline] = None
+
+    def __enter__(self) -> Deadline:
+        parent = current_deadline()
+        expires_at = time.monotonic() + self.timeout if self.timeout is not None else float('inf')
+        if parent and parent.expires_at <= expires_at:
+            self.deadline = Deadline(parent.expires_at, parent.site)
+        else:
+            self.deadline = Deadline(expires_at, self.site)
+        if not hasattr(_local, 'stack'):
+            _local.stack = []
+        _local.stack.append(self.deadline)
+        return self.deadline
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _local.stack.pop()
+        return False
+
+
+# ========== 重试规则 ==========
+
+@dataclass
+class RetryRule:
+    """某类错误的重试规则"""
+    max_attempts: int = 3  # 总尝试次数（含首次）
+    base_delay: float = 1.0  # 首次重试前的等待（秒）
+    backoff: float = 2.0  # 退避倍数
+    max_delay: float = 10.0  # 单次等待上限（秒）
+    jitter: float = 0.2  # 抖动比例，等待时间在 ±jitter 内随机
+    retry: bool = True  # 该类错误是否重试
+
+    def delay(self, retry_index: int) -> float:
+        """第retry_index次重试（从1开始）前的等待时间"""
+        delay = min(self.max_delay, self.base_delay * self.backoff ** (retry_index - 1))
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(0.0, delay)
+
+
+@dataclass
+class SiteStats:
+    """单个调用位置的重试统计"""
+    calls: int = 0
+    attempts: int = 0
+    successes: int = 0
+    backoff_seconds: float = 0.0  # 退避等待总时长
+    attempts_exhausted: int = 0  # 次数用尽
+    budget_exhausted: int = 0  # 截止时间不够再等一次
+    not_retryable: int = 0  # 错误类型不重试
+    last_budget_owner: str = ""  # 最近一次耗尽的是哪个调用位置设定的预算
+
+
+class RetryStats:
+    """按调用位置汇总重试情况"""
+
+    def __init__(self):
+        self.sites: Dict[str, SiteStats] = {}
+        self._lock = threading.Lock()
+
+    def site(self, name: str) -> SiteStats:
+        with self._lock:
+            if name not in self.sites:
+                self.sites[name] = SiteStats()
+            return self.sites[name]
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: dict(vars(stats)) for name, stats in self.sites.items()}
+
+    def print_report(self, log_func=None):
+        log = log_func if log_func else print
+        log("=" * 60)
+        log("重试统计（按调用位置）")
+        log("=" * 60)
+        for name, s in sorted(self.report().items(), key=lambda item: -item[1]['backoff_seconds']):
+            log(f"{name}: 调用{s['calls']} 尝试{s['attempts']} 成功{s['successes']} "
+                f"退避{s['backoff_seconds']:.1f}秒 预算耗尽{s['budget_exhausted']} 次数用尽{s['attempts_exhausted']}")
+        log("=" * 60)
+
+
+_retry_stats_instance = None
+
+
+def get_retry_stats() -> RetryStats:
+    """获取全局重试统计"""
+    global _retry_stats_instance
+    if _retry_stats_instance is None:
+        _retry_stats_instance = RetryStats()
+    return _retry_stats_instance
+
+
+class RetrySession:
+    """一次带重试的调用（由 RetryPolicy.session 创建）"""
+
+    def __init__(self, policy: 'RetryPolicy', site: str, timeout: Optional[float]):
+        self.policy = policy
+        self.site = site
+        self.stats = get_retry_stats().site(site)
+        self.attempt = 1  # 当前是第几次尝试
+        self.last_error: Optional[BaseException] = None
+        self.exhausted = ""  # 放弃原因：attempts / budget / not_retryable
+        self._scope = deadline_scope(timeout, site)
+        self.deadline: Optional[Deadline] = None
+
+    def __enter__(self) -> 'RetrySession':
+        self.deadline = self._scope.__enter__()
+        self.stats.calls += 1
+        self.stats.attempts += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None and not self.exhausted:
+            self.stats.successes += 1
+        return self._scope.__exit__(exc_type, exc_val, exc_tb)
+
+    def remaining(self) -> float:
+        return self.deadline.remaining() if self.deadline else float('inf')
+
+    def backoff(self, error: BaseException) -> bool:
+        """
+        失败后决定是否重试，需要重试时按规则等待
+
+        Returns:
+            是否应该再试一次（False时调用方应放弃并上报错误）
+        """
+        self.last_error = error
+        error_class = self.policy.classify(error)
+        rule = self.policy.rule_for(error_class)
+
+        if not rule.retry:
+            return self._give_up("not_retryable", f"{error_class.value}类错误不重试")
+        if self.attempt >= rule.max_attempts:
+            return self._give_up("attempts", f"已尝试{self.attempt}次")
+
+        delay = rule.delay(self.attempt)
+        remaining = self.remaining()
+        if remaining <= delay:
+            owner = self.deadline.site if self.deadline else ""
+            self.stats.last_budget_owner = owner
+            return self._give_up("budget", f"剩余时间{remaining:.2f}秒不够再等{delay:.2f}秒"
+                                           + (f"（预算来自 {owner}）" if owner and owner != self.site else ""))
+
+        self.policy.log(f"[重试] {self.site}: 第{self.attempt}次失败({error_class.value})，"
+                        f"{delay:.2f}秒后重试 {self.attempt + 1}/{rule.max_attempts}")
+        if delay > 0:
+            accounted_sleep(delay, f"重试退避: {self.site}")
+        self.stats.backoff_seconds += delay
+        self.attempt += 1
+        self.stats.attempts += 1
+        return True
+
+    def _give_up(self, reason: str, detail: str) -> bool:
+        self.exhausted = reason
+        if reason == "budget":
+            self.stats.budget_exhausted += 1
+        elif reason == "attempts":
+            self.stats.attempts_exhausted += 1
+        else:
+            self.stats.not_retryable += 1
+        self.policy.log(f"[重试] {self.site}: 放弃重试，{detail}")
+        return False
+
+
+@dataclass
+class RetryPolicy:
+    """
+    重试策略
+
+    default 为未单独配置的错误类型使用的规则；timeout 为每次调用的总时限
+    （与外层剩余时间取较早者），None表示只受外层截止时间约束。
+    """
+    name: str
+    default: RetryRule = field(default_factory=RetryRule)
+    rules: Dict[ErrorClass, RetryRule] = field(default_factory=dict)
+    timeout: Optional[float] = None
+    classifier: Callable[[BaseException], ErrorClass] = classify_error
+    log_func: Optional[Callable[[str], None]] = None
+
+    def log(self, msg: str):
+        if self.log_func:
+            self.log_func(msg)
+
+    def classify(self, error: BaseException) -> ErrorClass:
+        try:
+            return self.classifier(error)
+        except Exception:
+            return ErrorClass.UNKNOWN
+
+    def rule_for(self, error_class: ErrorClass) -> RetryRule:
+        return self.rules.get(error_class, self.default)
+
+    def session(self, site: str, timeout: Optional[float] = None) -> RetrySession:
+        """开始一次带重试的调用（timeout覆盖策略默认时限）"""
+        return RetrySession(self, site, timeout if timeout is not None else self.timeout)
+
+    def call(self, func: Callable[[], Any], site: str, timeout: Optional[float] = None) -> Any:
+        """执行func，失败时按策略重试，放弃后抛出最后一次的异常"""
+        with self.session(site, timeout) as retry:
+            while True:
+                try:
+                    return func()
+                except Exception as e:
+                    if not retry.backoff(e):
+                        raise
+
+
+# 会话已失效时原样重试没有意义，交给会话恢复处理
+_NO_RETRY = RetryRule(retry=False)
+_SESSION_NO_RETRY = {ErrorClass.SESSION_LOST: _NO_RETRY, ErrorClass.UIA2_CRASH: _NO_RETRY,
+                     ErrorClass.DEVICE_OFFLINE: _NO_RETRY}
+
+# 预设策略
+_PRESETS: Dict[str, Callable[[], RetryPolicy]] = {
+    # 单个点击/查找策略：快速重试，页面未就绪时短暂退避
+    "strategy": lambda: RetryPolicy("strategy", RetryRule(max_attempts=4, base_delay=0.5, backoff=1.5, max_delay=3),
+                                    dict(_SESSION_NO_RETRY)),
+    # 坐标点击
+    "click": lambda: RetryPolicy("click", RetryRule(max_attempts=3, base_delay=0.5, backoff=2, max_delay=2),
+                                 dict(_SESSION_NO_RETRY)),
+    # 通用操作包装（失败之间由恢复规划器处理，不额外退避）
+    "operation": lambda: RetryPolicy("operation", RetryRule(max_attempts=3, base_delay=0, jitter=0), timeout=30),
+    # 错误恢复动作
+    "recovery": lambda: RetryPolicy("recovery", RetryRule(max_attempts=2, base_delay=1, backoff=2, max_delay=4)),
+    # WebDriver重连：设备离线时等待更久
+    "reconnect": lambda: RetryPolicy("reconnect", RetryRule(max_attempts=3, base_delay=1, backoff=2, max_delay=10),
+                                     {ErrorClass.DEVICE_OFFLINE: RetryRule(max_attempts=3, base_delay=3,
+                                                                           backoff=2, max_delay=10)}),
+}
+
+
+def get_retry_policy(name: str, log_func=None, **overrides) -> RetryPolicy:
+    """
+    获取预设重试策略（每次返回新实例，可按调用方修改）
+
+    Args:
+        name: strategy / click / operation / recovery / reconnect
+        log_func: 日志函数
+        **overrides: 覆盖RetryPolicy字段，如 timeout=10
+    """
+    policy = _PRESETS[name]()
+    policy.log_func = log_func
+    for key, value in overrides.items():
+        setattr(policy, key, value)
+    return policy
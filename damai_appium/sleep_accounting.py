@@ -0,0 +1,260 @@
+# -*- coding: UTF-8 -*-
+"""
+等待统计 - 记录每次固定等待的位置、时长和原因
+按位置汇总空等时间，并标记"条件早已满足仍在等待"的位置，为删除固定等待提供依据
+"""
+
+import os
+import sys
+import time
+import linecache
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Optional, Dict, List, Any, Tuple
+
+try:
+    from .trace_events import get_trace_recorder
+except ImportError:
+    from trace_events import get_trace_recorder
+
+
+@dataclass
+class SleepRecord:
+    """单次等待记录"""
+    site: str  # 调用位置 "文件:行号 函数名"
+    requested: float  # 请求时长（秒）
+    actual: float  # 实际时长（秒）
+    reason: str  # 等待原因（未提供时取该行代码的注释）
+    thread: str  # 线程名
+    started: float  # 开始时间 (time.perf_counter)
+    condition_met_at: Optional[float] = None  # 条件首次满足时已等待的秒数
+
+
+class SiteStats:
+    """单个位置的汇总"""
+
+    def __init__(self, site: str, reason: str):
+        self.site = site
+        self.reason = reason
+        self.count = 0
+        self.total_requested = 0.0
+        self.total_actual = 0.0
+        self.met_early_count = 0  # 条件提前满足的次数
+        self.avoidable = 0.0  # 条件满足后继续等待的总时长
+
+    def add(self, record: SleepRecord):
+        self.count += 1
+        self.total_requested += record.requested
+        self.total_actual += record.actual
+        if not self.reason and record.reason:
+            self.reason = record.reason
+        if record.condition_met_at is not None and record.condition_met_at < record.actual:
+            self.met_early_count += 1
+            self.avoidable += record.actual - record.condition_met_at
+
+
+class SleepAccountant:
+    """
+    等待统计器
+
+    用法:
+        accounted_sleep(2)  # 替代 time.sleep(2)，自动记录调用位置
+        accounted_sleep(5, "等待App加载", condition=lambda: app_ready())  # 探测条件何时满足
+        get_sleep_accountant().print_report()
+    """
+
+    def __init__(self, max_records: int = 2000):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.records: deque = deque(maxlen=max_records)
+        self.run_name = ""
+        self.run_started = time.perf_counter()
+        self.listeners: List[Callable[[SleepRecord], None]] = []
+
+    def begin_run(self, name: str = ""):
+        """开始新一轮统计（清空之前的记录）"""
+        with self._lock:
+            self.records.clear()
+            self.run_name = name
+            self.run_started = time.perf_counter()
+
+    @staticmethod
+    def _describe_site(frame) -> Tuple[str, str]:
+        """返回调用位置和该行的注释"""
+        filename = frame.f_code.co_filename
+        lineno = frame.f_lineno
+        site = f"{os.path.basename(filename)}:{lineno} {frame.f_code.co_name}"
+        line = linecache.getline(filename, lineno)
+        comment = line.split('#', 1)[1].strip() if '#' in line else ""
+        return site, comment
+
+    def sleep(self, seconds: float, reason: str = "", condition: Optional[Callable[[], bool]] = None,
+              probe_interval: float = 0.2, stop_early: bool = False, _depth: int = 1) -> float:
+        """
+        记录并执行一次等待
+
+        Args:
+            seconds: 等待时长
+            reason: 等待原因
+            condition: 等待期间定期探测的条件，记录其首次满足的时刻（应避免访问设备，如只查看已有快照）
+            probe_interval: 探测间隔
+            stop_early: 条件满足时提前结束等待
+            _depth: 调用栈深度（用于包装函数）
+
+        Returns:
+            float: 实际等待时长
+        """
+        if seconds <= 0:
+            return 0.0
+        if not self.enabled:
+            time.sleep(seconds)
+            return seconds
+
+        site, comment = self._describe_site(sys._getframe(_depth))
+        start = time.perf_counter()
+        met_at = None
+
+        if condition is None:
+            time.sleep(seconds)
+        else:
+            deadline = start + seconds
+            probe_cost = 0.0  # 上次探测耗时，剩余时间不够再探测一次时只等待不探测
+            while True:
+                if met_at is None and probe_cost < deadline - time.perf_counter():
+                    probe_start = time.perf_counter()
+                    try:
+                        if condition():
+                            met_at = time.perf_counter() - start
+                            if stop_early:
+                                break
+                    except Exception:
+                        pass
+                    probe_cost = time.perf_counter() - probe_start
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(probe_interval, remaining))
+
+        actual = time.perf_counter() - start
+        record = SleepRecord(
+            site=site,
+            requested=seconds,
+            actual=actual,
+            reason=reason or comment,
+            thread=threading.current_thread().name,
+            started=start,
+            condition_met_at=met_at
+        )
+
+        with self._lock:
+            self.records.append(record)
+            listeners = list(self.listeners)
+
+        get_trace_recorder().complete(f"sleep {record.reason or site}", "sleep", start, actual, {
+            "site": site,
+            "requested": seconds,
+            "condition_met_at": met_at
+        })
+
+        for listener in listeners:
+            try:
+                listener(record)
+            except Exception:
+                pass
+        return actual
+
+    def get_report(self, thread: Optional[str] = None, top: int = 20) -> Dict[str, Any]:
+        """
+        生成本轮统计报告
+
+        Args:
+            thread: 只统计该线程（None为全部线程）
+            top: 返回空等时间最多的前N个位置
+
+        Returns:
+            run_name, elapsed, total_sleep, sleep_ratio, sites(按总时长排序), flagged(可由条件替代的位置)
+        """
+        with self._lock:
+            records = [r for r in self.records if thread is None or r.thread == thread]
+            elapsed = time.perf_counter() - self.run_started
+
+        sites: Dict[str, SiteStats] = {}
+        for record in records:
+            stats = sites.get(record.site)
+            if stats is None:
+                stats = sites[record.site] = SiteStats(record.site, record.reason)
+            stats.add(record)
+
+        total_sleep = sum(r.actual for r in records)
+        ranked = sorted(sites.values(), key=lambda s: s.total_actual, reverse=True)
+        return {
+            "run_name": self.run_name,
+            "elapsed": elapsed,
+            "total_sleep": total_sleep,
+            "sleep_ratio": total_sleep / elapsed if elapsed > 0 else 0.0,
+            "sites": [{
+                "site": s.site,
+                "reason": s.reason,
+                "count": s.count,
+                "total_seconds": s.total_actual,
+                "avg_seconds": s.total_actual / s.count,
+            } for s in ranked[:top]],
+            "flagged": [{
+                "site": s.site,
+                "reason": s.reason,
+                "met_early": s.met_early_count,
+                "count": s.count,
+                "avoidable_seconds": s.avoidable
+            } for s in sorted(ranked, key=lambda s: s.avoidable, reverse=True) if s.avoidable > 0]
+        }
+
+    def print_report(self, log_func=None, thread: Optional[str] = None, top: int = 10):
+        """输出本轮统计报告"""
+        log = log_func if log_func else print
+        report = self.get_report(thread, top)
+        log("=" * 60)
+        log(f"等待统计 {report['run_name']}")
+        log("=" * 60)
+        log(f"总耗时: {report['elapsed']:.2f}秒, 固定等待: {report['total_sleep']:.2f}秒 "
+            f"({report['sleep_ratio']:.0%})")
+        log("-" * 60)
+        for item in report["sites"]:
+            log(f"  {item['total_seconds']:6.2f}秒  {item['count']:3d}次  {item['site']}  {item['reason']}")
+        if report["flagged"]:
+            log("-" * 60)
+            log("条件提前满足的等待（可替换为条件等待）:")
+            for item in report["flagged"]:
+                log(f"  可省 {item['avoidable_seconds']:.2f}秒 ({item['met_early']}/{item['count']}次)  "
+                    f"{item['site']}  {item['reason']}")
+        log("=" * 60)
+
+
+# 全局统计器实例
+_sleep_accountant_instance = None
+
+
+def get_sleep_accountant() -> SleepAccountant:
+    """获取全局等待统计器"""
+    global _sleep_accountant_instance
+    if _sleep_accountant_instance is None:
+        _sleep_accountant_instance = SleepAccountant()
+    return _sleep_accountant_instance
+
+
+def accounted_sleep(seconds: float, reason: str = "", condition: Optional[Callable[[], bool]] = None,
+                    probe_interval: float = 0.2, stop_early: bool = False) -> float:
+    """
+    time.sleep 的替代，记录调用位置、时长和原因
+
+    Args:
+        seconds: 等待时长
+        reason: 等待原因（未提供时取该行代码的注释）
+        condition: 等待期间探测的条件，用于发现可由条件等待替代的固定等待
+        probe_interval: 探测间隔
+        stop_early: 条件满足时提前结束
+
+    Returns:
+        float: 实际等待时长
+    """
+    return get_sleep_accountant().sleep(seconds, reason, condition, probe_interval, stop_early, _depth=2)
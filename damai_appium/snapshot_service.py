@@ -0,0 +1,423 @@
+# -*- coding: UTF-8 -*-
+"""
+页面快照服务 - 统一管理 page_source 获取
+多个线程在新鲜度窗口内的请求合并为一次获取，并支持订阅"新快照"和"条件成立"事件，
+替代各线程各自按定时器轮询同一台设备
+"""
+
+import time
+import hashlib
+import threading
+import weakref
+from dataclasses import dataclass, field
+from typing import Callable, Optional, Dict, Any
+
+try:
+    from .command_scheduler import CommandPriority, current_priority, set_thread_priority
+except ImportError:
+    from command_scheduler import CommandPriority, current_priority, set_thread_priority
+
+
+@dataclass
+class Snapshot:
+    """页面快照"""
+    page_source: str
+    timestamp: float  # 开始获取的时间 (time.time)，页面内容不早于此刻
+    fetch_seconds: float  # 获取耗时
+    seq: int  # 递增序号，序号相同即为同一份快照
+    _digest: Optional[str] = field(default=None, repr=False)
+
+    @property
+    def age(self) -> float:
+        """快照年龄（秒）"""
+        return time.time() - self.timestamp
+
+    @property
+    def digest(self) -> str:
+        """页面内容MD5"""
+        if self._digest is None:
+            self._digest = hashlib.md5(self.page_source.encode()).hexdigest()
+        return self._digest
+
+
+class _Watch:
+    """条件订阅"""
+
+    def __init__(self, predicate: Callable[[Snapshot], bool], callback: Callable[[Snapshot], None], once: bool):
+        self.predicate = predicate
+        self.callback = callback
+        self.once = once
+        self.last_result = False
+
+
+class SnapshotService:
+    """
+    页面快照服务
+
+    用法:
+        service = get_snapshot_service(driver)
+        snap = service.get(max_age=0.5)           # 0.5秒内的快照直接复用
+        token = service.subscribe(on_snapshot)     # 每份新快照回调
+        service.watch(lambda s: '确认' in s.page_source, on_confirm)  # 条件由假变真时回调
+    """
+
+    def __init__(self, driver, default_max_age: float = 0.3, log_func=None):
+        """
+        初始化快照服务
+
+        Args:
+            driver: Appium driver
+            default_max_age: 默认新鲜度窗口（秒）
+            log_func: 日志函数
+        """
+        # 弱引用：服务按driver登记，driver释放后服务随之失效，不因服务而常驻
+        self._driver_ref = weakref.ref(driver)
+        self.default_max_age = default_max_age
+        self.log = log_func if log_func else print
+
+        self._cond = threading.Condition()
+        self._latest: Optional[Snapshot] = None
+        self._seq = 0
+        self._fetching = False
+        self._fetch_started = 0.0
+        self._fetch_priority = CommandPriority.INTERACTIVE
+        self._last_error: Optional[Exception] = None
+
+        self._subscribers: Dict[int, Callable[[Snapshot], None]] = {}
+        self._watches: Dict[int, _Watch] = {}
+        self._poll_intervals: Dict[int, float] = {}
+        self._next_token = 0
+
+        self._poll_thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self.created_at = time.time()
+        self.stats = {
+            "requests": 0,  # get()调用次数
+            "fetches": 0,  # 实际访问设备次数
+            "coalesced": 0,  # 合并到其他线程获取结果的次数
+            "cache_hits": 0,  # 直接复用已有快照的次数
+            "published": 0,  # 外部发布的快照数
+            "errors": 0,
+            "fetch_seconds": 0.0
+        }
+
+    @property
+    def driver(self):
+        """绑定的driver（已释放时为None）"""
+        return self._driver_ref()
+
+    # ========== 获取快照 ==========
+
+    def peek(self, max_age: Optional[float] = None) -> Optional[Snapshot]:
+        """返回足够新的已有快照，不访问设备"""
+        max_age = self.default_max_age if max_age is None else max_age
+        with self._cond:
+            if self._latest is not None and self._latest.age <= max_age:
+                return self._latest
+        return None
+
+    def get(self, max_age: Optional[float] = None, timeout: float = 30) -> Snapshot:
+        """
+        获取快照
+
+        已有快照不超过max_age时直接返回；其他线程正在获取且开始时间在窗口内时等待其结果；
+        否则由当前线程获取。
+
+        Args:
+            max_age: 可接受的快照年龄（秒），0表示必须是调用之后开始获取的快照
+            timeout: 等待其他线程获取的超时（秒）
+
+        Returns:
+            Snapshot
+
+        Raises:
+            获取失败时抛出driver的异常
+        """
+        max_age = self.default_max_age if max_age is None else max_age
+        request_time = time.time()
+        deadline = request_time + timeout
+
+        with self._cond:
+            self.stats["requests"] += 1
+            waited = False
+            shared = True
+            while True:
+                latest = self._latest
+                if latest is not None and latest.timestamp >= request_time - max_age:
+                    self.stats["coalesced" if waited else "cache_hits"] += 1
+                    return latest
+
+                if not self._fetching:
+                    break
+
+                if self._fetch_priority.value > current_priority().value:
+                    # 正在进行的是低优先级获取（抢票阶段可能被暂停），不等待，单独获取
+                    shared = False
+                    break
+
+                if self._fetch_started >= request_time - max_age:
+                    # 正在进行的获取满足新鲜度要求，等待其结果
+                    seq_before = self._seq
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise TimeoutError("等待页面快照超时")
+                    self._cond.wait(remaining)
+                    waited = True
+                    if self._seq == seq_before and not self._fetching and self._last_error is not None:
+                        raise self._last_error
+                    continue
+
+                # 正在进行的获取太旧，等它结束后重新获取
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError("等待页面快照超时")
+                self._cond.wait(remaining)
+
+            if shared:
+                self._fetching = True
+                self._fetch_started = time.time()
+                self._fetch_priority = current_priority()
+
+        return self._fetch(shared)
+
+    def _fetch(self, shared: bool = True) -> Snapshot:
+        """
+        由当前线程访问设备获取快照
+
+        Args:
+            shared: 是否作为其他线程可合并的获取
+        """
+        start = time.time()
+        try:
+            driver = self.driver
+            if driver is None:
+                raise RuntimeError("快照服务绑定的driver已释放")
+            page_source = driver.page_source
+        except Exception as e:
+            with self._cond:
+                if shared:
+                    self._fetching = False
+                    self._last_error = e
+                self.stats["errors"] += 1
+                self._cond.notify_all()
+            raise
+
+        elapsed = time.time() - start
+        with self._cond:
+            if shared:
+                self._fetching = False
+                self._last_error = None
+            self.stats["fetches"] += 1
+            self.stats["fetch_seconds"] += elapsed
+            snapshot = self._store(page_source, start, elapsed)
+
+        self._dispatch(snapshot)
+        return snapshot
+
+    def publish(self, page_source: str, fetch_seconds: float = 0.0) -> Snapshot:
+        """
+        发布由其他途径获取的page_source（如并发查询结果），供其他线程复用
+
+        Returns:
+            Snapshot
+        """
+        with self._cond:
+            self.stats["published"] += 1
+            snapshot = self._store(page_source, time.time() - fetch_seconds, fetch_seconds)
+        self._dispatch(snapshot)
+        return snapshot
+
+    def _store(self, page_source: str, started: float, fetch_seconds: float) -> Snapshot:
+        """保存新快照（需持有锁）"""
+        if self._latest is not None and started < self._latest.timestamp:
+            # 比已有快照更旧的结果不覆盖
+            return self._latest
+        self._seq += 1
+        snapshot = Snapshot(page_source=page_source, timestamp=started,
+                            fetch_seconds=fetch_seconds, seq=self._seq)
+        self._latest = snapshot
+        self._cond.notify_all()
+        return snapshot
+
+    def wait_for_new(self, after_seq: int, timeout: float) -> Optional[Snapshot]:
+        """等待序号大于after_seq的快照（不主动获取），超时返回None"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._latest is None or self._latest.seq <= after_seq:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._latest
+
+    def wait_until(self, predicate: Callable[[Snapshot], bool], timeout: float = 5,
+                   interval: float = 0.3) -> Optional[Snapshot]:
+        """
+        等待条件成立
+
+        优先复用其他线程获取的快照，窗口内没有新快照时才自行获取。
+
+        Returns:
+            条件成立时的快照，超时返回None
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                snapshot = self.get(max_age=interval)
+                if predicate(snapshot):
+                    return snapshot
+                self.wait_for_new(snapshot.seq, min(interval, max(0, deadline - time.time())))
+            except Exception:
+                time.sleep(min(interval, max(0, deadline - time.time())))
+        return None
+
+    # ========== 订阅 ==========
+
+    def subscribe(self, callback: Callable[[Snapshot], None], poll_interval: Optional[float] = None) -> int:
+        """
+        订阅新快照
+
+        Args:
+            callback: 回调函数，参数为Snapshot（在获取快照的线程中调用，应尽快返回）
+            poll_interval: 希望至少多久有一份新快照，提供时由后台线程补充获取
+
+        Returns:
+            订阅令牌，用于取消订阅
+        """
+        with self._cond:
+            token = self._new_token()
+            self._subscribers[token] = callback
+            if poll_interval:
+                self._poll_intervals[token] = poll_interval
+        if poll_interval:
+            self._ensure_poller()
+        return token
+
+    def watch(self, predicate: Callable[[Snapshot], bool], callback: Callable[[Snapshot], None],
+              once: bool = True, poll_interval: Optional[float] = None) -> int:
+        """
+        订阅"条件成立"事件：条件由假变真时回调
+
+        Args:
+            predicate: 条件函数
+            callback: 回调函数
+            once: 触发一次后自动取消
+            poll_interval: 同subscribe
+
+        Returns:
+            订阅令牌
+        """
+        with self._cond:
+            token = self._new_token()
+            self._watches[token] = _Watch(predicate, callback, once)
+            if poll_interval:
+                self._poll_intervals[token] = poll_interval
+        if poll_interval:
+            self._ensure_poller()
+        return token
+
+    def unsubscribe(self, token: int):
+        """取消订阅"""
+        with self._cond:
+            self._subscribers.pop(token, None)
+            self._watches.pop(token, None)
+            self._poll_intervals.pop(token, None)
+
+    def _new_token(self) -> int:
+        self._next_token += 1
+        return self._next_token
+
+    def _dispatch(self, snapshot: Snapshot):
+        """通知订阅者"""
+        with self._cond:
+            subscribers = list(self._subscribers.values())
+            watches = list(self._watches.items())
+
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                self.log(f"[快照] 订阅回调出错: {e}")
+
+        for token, watch in watches:
+            try:
+                result = bool(watch.predicate(snapshot))
+            except Exception:
+                result = False
+            fired = result and not watch.last_result
+            watch.last_result = result
+            if not fired:
+                continue
+            if watch.once:
+                self.unsubscribe(token)
+            try:
+                watch.callback(snapshot)
+            except Exception as e:
+                self.log(f"[快照] 条件回调出错: {e}")
+
+    # ========== 后台补充获取 ==========
+
+    def _ensure_poller(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._poll_thread = threading.Thread(target=self._poll_loop, daemon=True, name="SnapshotPoller")
+            self._poll_thread.start()
+
+    def _poll_loop(self):
+        """按订阅者要求的最短间隔补充获取，窗口内已有其他线程获取的快照则跳过"""
+        set_thread_priority(CommandPriority.BACKGROUND)
+        while True:
+            with self._cond:
+                if not self._running or not self._poll_intervals:
+                    self._running = False
+                    return
+                interval = min(self._poll_intervals.values())
+            try:
+                self.get(max_age=interval)
+                failed = False
+            except Exception:
+                failed = True
+
+            with self._cond:
+                latest = self._latest
+                wait = interval if failed or latest is None else interval - latest.age
+                if wait > 0 and self._running:
+                    self._cond.wait(wait)
+
+    def stop(self):
+        """停止后台获取并清除所有订阅"""
+        with self._cond:
+            self._subscribers.clear()
+            self._watches.clear()
+            self._poll_intervals.clear()
+            self._running = False
+            self._cond.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取统计信息"""
+        with self._cond:
+            stats = dict(self.stats)
+        uptime = max(time.time() - self.created_at, 1e-6)
+        fetches = stats["fetches"]
+        stats["fetches_per_second"] = fetches / uptime
+        stats["avg_fetch_seconds"] = stats["fetch_seconds"] / fetches if fetches else 0.0
+        stats["saved_fetches"] = stats["coalesced"] + stats["cache_hits"]
+        return stats
+
+
+# 每个driver一个快照服务（会话重建后新旧driver的服务互不影响，旧服务上的订阅不会被清除）
+_snapshot_service_instances: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_snapshot_service_lock = threading.Lock()
+
+
+def get_snapshot_service(driver) -> SnapshotService:
+    """获取与driver绑定的快照服务实例"""
+    with _snapshot_service_lock:
+        service = _snapshot_service_instances.get(driver)
+        if service is None:
+            service = SnapshotService(driver)
+            _snapshot_service_instances[driver] = service
+        return service
@@ -2,15 +2,25 @@
 """
 多策略抢票系统 - 提升抢票成功率
 支持：坐标点击 + XPath查找 + OCR识别 + UiAutomator
+按页面/按钮记录各策略的成功率和耗时，自适应调整尝试顺序，持续失败的策略自动熔断
 """
 
+import json
+import random
+import threading
 import time
-from typing import Optional, Callable, List, Dict, Any
+from pathlib import Path
+from typing import Optional, Callable, List, Dict, Any, Tuple
 from enum import Enum
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
 
+try:
+    from .retry_policy import RetryPolicy, RetryRule, deadline_scope, clamp_timeout, remaining_time, get_retry_policy
+except ImportError:
+    from retry_policy import RetryPolicy, RetryRule, deadline_scope, clamp_timeout, remaining_time, get_retry_policy
+
 
 class StrategyType(Enum):
     """策略类型枚举"""
@@ -33,19 +43,196 @@ class StrategyResult:
 
 class RetryConfig:
     """重试配置"""
-    def __init__(self, max_retries: int = 3, retry_delay: float = 1.0, backoff_factor: float = 1.5):
+    def __init__(self, max_retries: int = 3, retry_delay: float = 1.0, backoff_factor: float = 1.5,
+                 jitter: float = 0.2):
         self.max_retries = max_retries
         self.retry_delay = retry_delay
         self.backoff_factor = backoff_factor  # 指数退避因子
+        self.jitter = jitter  # 退避抖动比例
+
+    def to_policy(self) -> RetryPolicy:
+        """转换为统一重试策略（会话级错误不在策略内重试）"""
+        policy = get_retry_policy("strategy")
+        policy.default = RetryRule(max_attempts=self.max_retries + 1, base_delay=self.retry_delay,
+                                   backoff=self.backoff_factor, max_delay=10, jitter=self.jitter)
+        return policy
+
+
+# 耗时EWMA系数
+LATENCY_ALPHA = 0.3
+# 没有耗时数据时的预估（秒）
+DEFAULT_LATENCY = 1.0
+
+
+@dataclass
+class StrategyRecord:
+    """某个页面/按钮上某个策略的历史表现"""
+    attempts: int = 0
+    successes: int = 0
+    success_latency: Optional[float] = None  # 成功时耗时EWMA（秒，含重试）
+    fail_latency: Optional[float] = None  # 失败时耗时EWMA（秒，含重试）
+    consecutive_failures: int = 0
+    opened_at: float = 0.0  # 熔断开始时间，0表示未熔断
+    trips: int = 0  # 连续熔断次数（决定冷却时长）
+    last_used: float = 0.0
+
+    @property
+    def success_rate(self) -> float:
+        """成功率（Beta(1,1)先验，没有数据时为0.5）"""
+        return (self.successes + 1) / (self.attempts + 2)
+
+    def expected_time_to_success(self) -> float:
+        """
+        预期成功耗时：单次尝试的期望耗时 / 成功率
+
+        依次尝试多个策略时，按该值从小到大排序可使平均完成时间最短
+        """
+        p = self.success_rate
+        ok = self.success_latency if self.success_latency is not None else DEFAULT_LATENCY
+        fail = self.fail_latency if self.fail_latency is not None else ok
+        return (p * ok + (1 - p) * fail) / p
+
+    def record(self, success: bool, seconds: float):
+        self.attempts += 1
+        self.last_used = time.time()
+        if success:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.opened_at = 0.0
+            self.trips = 0
+            self.success_latency = seconds if self.success_latency is None else \
+                self.success_latency + LATENCY_ALPHA * (seconds - self.success_latency)
+        else:
+            self.consecutive_failures += 1
+            self.fail_latency = seconds if self.fail_latency is None else \
+                self.fail_latency + LATENCY_ALPHA * (seconds - self.fail_latency)
+
+
+class StrategyStatsStore:
+    """
+    策略历史表现（按 页面/按钮 键 + 策略标签 存储，跨运行保留）
+
+    熔断：连续失败达到 breaker_threshold 次后熔断，冷却期内不参与排序；
+    冷却结束后进入半开状态，作为探测再试一次，成功则恢复，失败则冷却时间加倍。
+    冷却中（所有策略都已熔断时）的失败不重新计时。
+    """
+
+    def __init__(self, path=None, breaker_threshold: int = 3, breaker_cooldown: float = 60,
+                 max_cooldown: float = 900, save_interval: float = 5):
+        """
+        Args:
+            path: 存储文件，默认为程序目录下的strategy_stats.json
+            breaker_threshold: 连续失败多少次后熔断
+            breaker_cooldown: 首次熔断的冷却时间（秒），之后每次加倍
+            max_cooldown: 冷却时间上限（秒）
+            save_interval: 最短保存间隔（秒），避免在抢票路径上频繁写文件
+        """
+        self.path = Path(path) if path else Path(__file__).parent / "strategy_stats.json"
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.max_cooldown = max_cooldown
+        self.save_interval = save_interval
+        self.records: Dict[str, Dict[str, StrategyRecord]] = {}
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._dirty = False
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f).get('keys', {})
+        except (OSError, ValueError):
+            return
+        fields = StrategyRecord.__dataclass_fields__
+        for key, strategies in data.items():
+            self.records[key] = {label: StrategyRecord(**{k: v for k, v in entry.items() if k in fields})
+                                 for label, entry in strategies.items()}
+
+    def flush(self):
+        """写入文件"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {key: {label: asdict(record) for label, record in strategies.items()}
+                    for key, strategies in self.records.items()}
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'updated_at': time.time(), 'keys': data}, f, ensure_ascii=False, indent=2)
+        except OSError:
+            pass
+
+    def get(self, key: str, label: str) -> StrategyRecord:
+        with self._lock:
+            return self.records.setdefault(key, {}).setdefault(label, StrategyRecord())
+
+    def cooldown(self, record: StrategyRecord) -> float:
+        return min(self.max_cooldown, self.breaker_cooldown * 2 ** max(0, record.trips - 1))
+
+    def breaker_state(self, record: StrategyRecord) -> str:
+        """closed（正常）/ open（熔断冷却中）/ half_open（冷却结束，可探测）"""
+        if not record.opened_at:
+            return "closed"
+        if time.time() - record.opened_at < self.cooldown(record):
+            return "open"
+        return "half_open"
+
+    def record(self, key: str, label: str, success: bool, seconds: float) -> StrategyRecord:
+        with self._lock:
+            record = self.records.setdefault(key, {}).setdefault(label, StrategyRecord())
+            state = self.breaker_state(record)
+            record.record(success, seconds)
+            if not success and (state == "half_open" or (
+                    state == "closed" and record.consecutive_failures >= self.breaker_threshold)):
+                record.opened_at = time.time()
+                record.trips += 1
+            self._dirty = True
+            due = time.time() - self._last_save >= self.save_interval
+        if due:
+            self.flush()
+        return record
+
+
+_strategy_stats_instance = None
+
+
+def get_strategy_stats_store() -> StrategyStatsStore:
+    """获取全局策略统计（各TicketStrategy实例共享）"""
+    global _strategy_stats_instance
+    if _strategy_stats_instance is None:
+        _strategy_stats_instance = StrategyStatsStore()
+    return _strategy_stats_instance
 
 
 class TicketStrategy:
-    """多策略抢票管理器"""
+    """
+    多策略抢票管理器
+
+    提供 key（页面/按钮标识）时按历史表现自适应排序：预期成功耗时短的策略先试，
+    连续失败的策略熔断跳过，冷却后以 probe_rate 的概率提前探测；成功率低或探测中的策略不重试。
+    """
 
-    def __init__(self, driver, logger=None):
+    def __init__(self, driver, logger=None, adaptive: bool = True,
+                 stats_store: Optional[StrategyStatsStore] = None,
+                 probe_rate: float = 0.1, retry_min_rate: float = 0.3):
+        """
+        Args:
+            driver: Appium driver
+            logger: 日志记录器
+            adaptive: 是否按历史表现自适应排序（False时按传入顺序）
+            stats_store: 策略历史表现存储（默认全局共享）
+            probe_rate: 半开状态的策略被提前到最前探测的概率
+            retry_min_rate: 成功率低于该值且还有其他策略可试时，该策略不重试
+        """
         self.driver = driver
         self.logger = logger
         self.retry_config = RetryConfig()
+        self.adaptive = adaptive
+        self.stats_store = stats_store or get_strategy_stats_store()
+        self.probe_rate = probe_rate
+        self.retry_min_rate = retry_min_rate
         self.strategy_stats = {
             StrategyType.COORDINATE: {"success": 0, "fail": 0},
             StrategyType.XPATH: {"success": 0, "fail": 0},
@@ -64,7 +251,9 @@ class TicketStrategy:
     def execute_with_retry(self,
                           strategies: List[Callable],
                           strategy_names: List[StrategyType],
-                          task_name: str = "操作") -> StrategyResult:
+                          task_name: str = "操作",
+                          timeout: Optional[float] = None,
+                          key: Optional[str] = None) -> StrategyResult:
         """
         执行多策略并自动重试
 
@@ -72,21 +261,79 @@ class TicketStrategy:
             strategies: 策略函数列表（优先级从高到低）
             strategy_names: 策略名称列表
             task_name: 任务名称（用于日志）
+            timeout: 整个任务的时限（秒），所有策略的重试共享；None时只受外层截止时间约束
+            key: 页面/按钮标识，用于自适应排序和历史统计（None时使用task_name）
 
         Returns:
             StrategyResult: 执行结果
         """
         self.log(f"开始执行任务: {task_name}", "INFO")
+        key = key or task_name
+        labels = self._strategy_labels(strategies, strategy_names)
+        plan = self.plan(key, labels) if self.adaptive else [(i, "closed") for i in range(len(strategies))]
+        with deadline_scope(timeout, f"ticket_strategy:{task_name}"):
+            return self._execute_strategies(strategies, strategy_names, labels, plan, task_name, key)
+
+    @staticmethod
+    def _strategy_labels(strategies: List[Callable], strategy_names: List[StrategyType]) -> List[str]:
+        """策略标签：click_by_* 生成的策略带有描述标签，其他按类型和序号区分"""
+        labels = []
+        for idx, (func, strategy_type) in enumerate(zip(strategies, strategy_names)):
+            labels.append(getattr(func, "strategy_label", None) or f"{strategy_type.value}#{idx}")
+        return labels
+
+    def plan(self, key: str, labels: List[str]) -> List[Tuple[int, str]]:
+        """
+        自适应尝试顺序
 
-        for idx, (strategy_func, strategy_type) in enumerate(zip(strategies, strategy_names), 1):
-            self.log(f"尝试策略 {idx}/{len(strategies)}: {strategy_type.value}", "INFO")
+        Returns:
+            [(策略下标, 熔断状态)]，按预期成功耗时排序；熔断冷却中的策略不参与，
+            只有全部策略都在冷却中时才按原顺序各试一次
+        """
+        entries = []
+        for idx, label in enumerate(labels):
+            record = self.stats_store.get(key, label)
+            state = self.stats_store.breaker_state(record)
+            entries.append((idx, state, record.expected_time_to_success()))
+
+        available = [e for e in entries if e[1] != "open"]
+        if not available:
+            return [(idx, state) for idx, state, _ in entries]
+
+        ranked = sorted(available, key=lambda e: (e[2], e[0]))
+        # 偶尔把冷却结束的策略提前探测，使其有机会恢复
+        probes = [e for e in ranked if e[1] == "half_open"]
+        if probes and random.random() < self.probe_rate:
+            probe = probes[0]
+            ranked.remove(probe)
+            ranked.insert(0, probe)
+        return [(idx, state) for idx, state, _ in ranked]
+
+    def _execute_strategies(self, strategies: List[Callable], strategy_names: List[StrategyType],
+                            labels: List[str], plan: List[Tuple[int, str]],
+                            task_name: str, key: str) -> StrategyResult:
+        for order, (idx, state) in enumerate(plan, 1):
+            strategy_func, strategy_type, label = strategies[idx], strategy_names[idx], labels[idx]
+            if remaining_time() == 0:
+                self.log(f"任务 {task_name} 时限已用完，跳过剩余策略", "WARNING")
+                break
+            record = self.stats_store.get(key, label)
+            note = {"open": "，熔断中", "half_open": "，探测"}.get(state, "")
+            self.log(f"尝试策略 {order}/{len(plan)}: {strategy_type.value} "
+                     f"(成功率 {record.success_rate:.0%}{note})", "INFO")
+
+            # 熔断中的策略只尝试一次；成功率低或探测中的策略，在还有其他策略可试时只尝试一次
+            single_attempt = self.adaptive and (state == "open" or order < len(plan) and (
+                state != "closed" or record.success_rate < self.retry_min_rate))
 
             # 带重试的策略执行
             result = self._execute_single_strategy_with_retry(
                 strategy_func,
                 strategy_type,
-                task_name
+                task_name,
+                max_attempts=1 if single_attempt else None
             )
+            record = self.stats_store.record(key, label, result.success, result.execution_time)
 
             if result.success:
                 self.strategy_stats[strategy_type]["success"] += 1
@@ -95,6 +342,9 @@ class TicketStrategy:
             else:
                 self.strategy_stats[strategy_type]["fail"] += 1
                 self.log(f"✗ 策略 {strategy_type.value} 执行失败: {result.error_msg}", "WARNING")
+                if record.opened_at and state == "closed":
+                    self.log(f"  策略 {label} 连续失败{record.consecutive_failures}次，熔断"
+                             f"{self.stats_store.cooldown(record):.0f}秒", "WARNING")
 
         # 所有策略都失败
         self.log(f"所有策略均失败，任务 {task_name} 执行失败", "ERROR")
@@ -107,60 +357,47 @@ class TicketStrategy:
     def _execute_single_strategy_with_retry(self,
                                            strategy_func: Callable,
                                            strategy_type: StrategyType,
-                                           task_name: str) -> StrategyResult:
+                                           task_name: str,
+                                           max_attempts: Optional[int] = None) -> StrategyResult:
         """
-        执行单个策略并重试
+        执行单个策略并重试（退避、抖动和截止时间由统一重试策略控制）
+
+        Args:
+            max_attempts: 覆盖重试配置的总尝试次数
         """
         start_time = time.time()
-        retry_count = 0
-        current_delay = self.retry_config.retry_delay
-
-        for attempt in range(self.retry_config.max_retries + 1):
-            try:
-                retry_count = attempt
-
-                if attempt > 0:
-                    self.log(f"  重试 {attempt}/{self.retry_config.max_retries} (延迟 {current_delay:.1f}s)", "WAIT")
-                    time.sleep(current_delay)
-                    current_delay *= self.retry_config.backoff_factor  # 指数退避
-
-                # 执行策略
-                strategy_func()
-
-                execution_time = time.time() - start_time
-                return StrategyResult(
-                    success=True,
-                    strategy_type=strategy_type,
-                    retry_count=retry_count,
-                    execution_time=execution_time
-                )
-
-            except Exception as e:
-                error_msg = f"{type(e).__name__}: {str(e)}"
-
-                if attempt == self.retry_config.max_retries:
-                    # 达到最大重试次数
-                    execution_time = time.time() - start_time
+        policy = self.retry_config.to_policy()
+        if max_attempts is not None:
+            policy.default.max_attempts = max_attempts
+        policy.log_func = lambda msg: self.log(f"  {msg}", "WAIT")
+
+        with policy.session(f"ticket_strategy.{strategy_type.value}") as retry:
+            while True:
+                try:
+                    # 执行策略
+                    strategy_func()
                     return StrategyResult(
-                        success=False,
+                        success=True,
                         strategy_type=strategy_type,
-                        error_msg=error_msg,
-                        retry_count=retry_count,
-                        execution_time=execution_time
+                        retry_count=retry.attempt - 1,
+                        execution_time=time.time() - start_time
                     )
-
-        # 不应该到达这里
-        return StrategyResult(
-            success=False,
-            strategy_type=strategy_type,
-            error_msg="未知错误"
-        )
+                except Exception as e:
+                    if not retry.backoff(e):
+                        return StrategyResult(
+                            success=False,
+                            strategy_type=strategy_type,
+                            error_msg=f"{type(e).__name__}: {str(e)}",
+                            retry_count=retry.attempt - 1,
+                            execution_time=time.time() - start_time
+                        )
 
     def click_by_coordinate(self, x: int, y: int) -> Callable:
         """坐标点击策略"""
         def _click():
             self.driver.tap([(x, y)])
             time.sleep(0.5)
+        _click.strategy_label = "coordinate"
         return _click
 
     def click_by_xpath(self, xpath: str, timeout: float = 5.0) -> Callable:
@@ -169,11 +406,12 @@ class TicketStrategy:
             from selenium.webdriver.support.ui import WebDriverWait
             from selenium.webdriver.support import expected_conditions as EC
 
-            element = WebDriverWait(self.driver, timeout).until(
+            element = WebDriverWait(self.driver, clamp_timeout(timeout)).until(
                 EC.presence_of_element_located((By.XPATH, xpath))
             )
             element.click()
             time.sleep(0.5)
+        _click.strategy_label = f"xpath:{xpath}"
         return _click
 
     def click_by_uiautomator(self, selector: str) -> Callable:
@@ -183,6 +421,7 @@ class TicketStrategy:
             element = self.driver.find_element(AppiumBy.ANDROID_UIAUTOMATOR, selector)
             element.click()
             time.sleep(0.5)
+        _click.strategy_label = f"uiautomator:{selector}"
         return _click
 
     def click_by_text(self, text: str, partial: bool = False) -> Callable:
@@ -214,6 +453,7 @@ class TicketStrategy:
 
     def print_statistics(self):
         """打印统计信息"""
+        self.stats_store.flush()
         stats = self.get_statistics()
         self.log("=" * 60, "INFO")
         self.log("多策略抢票统计信息", "INFO")
@@ -234,7 +474,7 @@ class TicketStrategy:
 
 
 class StrategyPresets:
-    """预设策略组合"""
+    """预设策略组合（列出的优先级为没有历史数据时的初始顺序）"""
 
     @staticmethod
     def click_button_strategies(driver, button_text: str, x: int = None, y: int = None):
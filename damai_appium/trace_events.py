@@ -0,0 +1,146 @@
+# -*- coding: UTF-8 -*-
+"""
+时间线追踪 - 以Chrome trace-event格式记录步骤、driver命令、OCR和等待
+导出的JSON可直接用 chrome://tracing 或 https://ui.perfetto.dev 打开，
+查看各线程的重叠情况和抢票流程的关键路径
+"""
+
+import os
+import json
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+
+class TraceRecorder:
+    """
+    Trace事件记录器
+
+    用法:
+        recorder = get_trace_recorder()
+        with recorder.span("搜索演出", "step", keyword="周杰伦"):
+            ...
+        recorder.export("traces/grab.json")
+    """
+
+    def __init__(self, max_events: int = 200000):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self.events: deque = deque(maxlen=max_events)
+        self._thread_names: Dict[int, str] = {}
+        self._origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def reset(self):
+        """清空事件，时间轴从当前时刻重新开始"""
+        with self._lock:
+            self.events.clear()
+            self._thread_names = {}
+            self._origin = time.perf_counter()
+
+    def _ts(self, perf_time: float) -> float:
+        """perf_counter时间 -> 时间轴微秒"""
+        return (perf_time - self._origin) * 1e6
+
+    def _thread_id(self) -> int:
+        thread = threading.current_thread()
+        tid = thread.ident or 0
+        if tid not in self._thread_names:
+            self._thread_names[tid] = thread.name
+        return tid
+
+    def complete(self, name: str, category: str, start: float, duration: float,
+                 args: Optional[Dict[str, Any]] = None):
+        """
+        记录一个完整事件（ph=X）
+
+        Args:
+            name: 事件名称
+            category: 类别（step/driver/ocr/sleep/queue）
+            start: 开始时间 (time.perf_counter)
+            duration: 持续时间（秒）
+            args: 附加参数
+        """
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": self._ts(start),
+            "dur": duration * 1e6,
+            "pid": self.pid,
+            "tid": self._thread_id(),
+        }
+        if args:
+            event["args"] = {k: v if isinstance(v, (int, float, bool, str)) or v is None else str(v)
+                             for k, v in args.items()}
+        with self._lock:
+            self.events.append(event)
+
+    def instant(self, name: str, category: str, args: Optional[Dict[str, Any]] = None):
+        """记录一个瞬时事件（ph=i）"""
+        if not self.enabled:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "i",
+            "s": "t",
+            "ts": self._ts(time.perf_counter()),
+            "pid": self.pid,
+            "tid": self._thread_id(),
+        }
+        if args:
+            event["args"] = {k: str(v) for k, v in args.items()}
+        with self._lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name: str, category: str, **args):
+        """记录代码块的耗时，异常时在参数中标记error"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            args["error"] = str(e)[:200]
+            raise
+        finally:
+            self.complete(name, category, start, time.perf_counter() - start, args)
+
+    def export(self, path) -> str:
+        """
+        导出为Chrome/Perfetto可读的JSON文件
+
+        Returns:
+            str: 文件路径
+        """
+        with self._lock:
+            events = list(self.events)
+            thread_names = dict(self._thread_names)
+
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0,
+                     "args": {"name": "damai"}}]
+        metadata.extend({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                         "args": {"name": name}} for tid, name in thread_names.items())
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return str(path)
+
+
+# 全局记录器实例
+_trace_recorder_instance = None
+
+
+def get_trace_recorder() -> TraceRecorder:
+    """获取全局trace记录器"""
+    global _trace_recorder_instance
+    if _trace_recorder_instance is None:
+        _trace_recorder_instance = TraceRecorder()
+    return _trace_recorder_instance
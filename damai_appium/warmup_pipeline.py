@@ -0,0 +1,341 @@
+# -*- coding: UTF-8 -*-
+"""
+准备阶段预热流水线 - 在倒计时准备窗口内完成耗时的准备工作
+确认详情页、解析并缓存坐标、加载OCR、验证driver会话，每个阶段限时并给出通过/不通过结论，
+开票后的第一秒只剩发送点击
+
+用法:
+    grabber = FastGrabber(driver)
+    timer = CountdownTimer(target, prepare_seconds=30,
+                           on_prepare=lambda: grabber.prepare(config, ocr_loader=get_ocr),
+                           on_start=lambda: grabber.start_grab(config))
+"""
+
+import re
+import time
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, Optional, Dict, List, Any, Tuple
+
+try:
+    from .action_plan import ActionPlan
+    from .snapshot_service import get_snapshot_service, Snapshot
+    from .trace_events import get_trace_recorder
+except ImportError:
+    from action_plan import ActionPlan
+    from snapshot_service import get_snapshot_service, Snapshot
+    from trace_events import get_trace_recorder
+
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+# 详情页/场次票档页标志文字（与页面识别规则一致）
+DETAIL_PAGE_MARKERS = ("立即购票", "立即购买", "立即预订", "立即抢购", "特惠选座", "选座购买",
+                       "演出详情", "选择场次", "票档")
+# 购票按钮文字
+BUY_BUTTON_TEXTS = ("立即购票", "立即购买", "立即预订", "立即抢购", "特惠选座", "选座购买", "确定")
+# 购票按钮吸附距离（像素）：配置坐标附近有购票按钮时改用按钮中心
+BUY_SNAP_DISTANCE = 150
+
+
+class StageStatus(Enum):
+    """阶段结论"""
+    GO = "go"  # 通过
+    NO_GO = "no_go"  # 不通过
+    TIMEOUT = "timeout"  # 超过阶段时限
+    SKIPPED = "skipped"  # 依赖阶段未通过或预算用完
+
+
+@dataclass
+class StageResult:
+    """单个阶段的结果"""
+    name: str
+    status: StageStatus
+    elapsed: float  # 秒
+    deadline: float  # 时限（秒）
+    message: str = ""
+    critical: bool = True  # 不通过时整体为NO-GO
+
+
+@dataclass
+class WarmupReport:
+    """预热报告"""
+    results: List[StageResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def go(self) -> bool:
+        """所有关键阶段都通过"""
+        return all(r.status == StageStatus.GO for r in self.results if r.critical)
+
+    def get(self, name: str) -> Optional[StageResult]:
+        for result in self.results:
+            if result.name == name:
+                return result
+        return None
+
+    def lines(self) -> List[str]:
+        """可读报告"""
+        marks = {StageStatus.GO: "GO", StageStatus.NO_GO: "NO-GO",
+                 StageStatus.TIMEOUT: "超时", StageStatus.SKIPPED: "跳过"}
+        lines = [f"预热{'完成: GO' if self.go else '未通过: NO-GO'} (耗时{self.elapsed:.2f}秒)"]
+        for r in self.results:
+            optional = "" if r.critical else " [可选]"
+            lines.append(f"  {marks[r.status]:6s} {r.name}{optional}  {r.elapsed:.2f}/{r.deadline:.1f}秒  {r.message}")
+        return lines
+
+
+class WarmupContext:
+    """阶段之间共享的数据"""
+
+    def __init__(self, driver, config=None):
+        self.driver = driver
+        self.config = config
+        self.snapshot: Optional[Snapshot] = None
+        self.screen_size: Optional[Tuple[int, int]] = None
+        self.coordinates: Dict[str, Tuple[int, int]] = {}  # 已解析的坐标
+        self.action_plan: Optional[ActionPlan] = None  # 已校验的场次+票档计划
+        self.data: Dict[str, Any] = {}
+
+
+@dataclass
+class WarmupStage:
+    """预热阶段"""
+    name: str
+    func: Callable[[WarmupContext], Tuple[bool, str]]  # 返回 (是否通过, 说明)
+    deadline: float  # 时限（秒）
+    critical: bool = True
+    background: bool = False  # 与其他阶段并行执行（如OCR加载这类CPU密集、不访问设备的阶段）
+    depends_on: Tuple[str, ...] = ()
+
+
+class WarmupPipeline:
+    """
+    预热流水线
+
+    前台阶段按顺序执行，后台阶段一开始就并行启动，结束时按各自时限等待。
+    阶段超过时限即判为超时（线程无法中止，超时阶段在后台跑完但结果不再采用）。
+    """
+
+    def __init__(self, log_func=None):
+        self.log = log_func if log_func else print
+        self.stages: List[WarmupStage] = []
+        self.last_report: Optional[WarmupReport] = None
+
+    def add_stage(self, name: str, func: Callable[[WarmupContext], Tuple[bool, str]], deadline: float,
+                  critical: bool = True, background: bool = False,
+                  depends_on: Tuple[str, ...] = ()) -> "WarmupPipeline":
+        """添加阶段（按添加顺序执行）"""
+        self.stages.append(WarmupStage(name, func, deadline, critical, background, tuple(depends_on)))
+        return self
+
+    def _launch(self, stage: WarmupStage, context: WarmupContext):
+        """在独立线程中执行阶段，返回 (线程, 结果容器, 开始时间)"""
+        box: Dict[str, Any] = {}
+
+        def target():
+            try:
+                with get_trace_recorder().span(f"预热 {stage.name}", "warmup"):
+                    box["result"] = stage.func(context)
+            except Exception as e:
+                box["result"] = (False, f"异常: {e}")
+
+        thread = threading.Thread(target=target, daemon=True, name=f"Warmup-{stage.name}")
+        started = time.perf_counter()
+        thread.start()
+        return thread, box, started
+
+    @staticmethod
+    def _collect(stage: WarmupStage, thread: threading.Thread, box: Dict[str, Any],
+                 started: float, deadline: float) -> StageResult:
+        """等待阶段结束（最多到deadline），生成结果"""
+        thread.join(max(0.0, started + deadline - time.perf_counter()))
+        elapsed = time.perf_counter() - started
+        if thread.is_alive() or "result" not in box:
+            return StageResult(stage.name, StageStatus.TIMEOUT, elapsed, deadline,
+                               f"超过{deadline:.1f}秒未完成", stage.critical)
+        ok, message = box["result"]
+        return StageResult(stage.name, StageStatus.GO if ok else StageStatus.NO_GO,
+                           elapsed, deadline, message, stage.critical)
+
+    def run(self, context: WarmupContext, budget: Optional[float] = None) -> WarmupReport:
+        """
+        执行流水线
+
+        Args:
+            context: 共享数据
+            budget: 总预算（秒），通常为距开票的剩余时间减去余量；阶段时限不超过剩余预算
+
+        Returns:
+            WarmupReport
+        """
+        start = time.perf_counter()
+        end = start + budget if budget is not None else None
+        results: Dict[str, StageResult] = {}
+
+        def allowed(stage: WarmupStage) -> float:
+            if end is None:
+                return stage.deadline
+            return max(0.0, min(stage.deadline, end - time.perf_counter()))
+
+        def skip_reason(stage: WarmupStage) -> str:
+            for dep in stage.depends_on:
+                dep_result = results.get(dep)
+                if dep_result is None or dep_result.status != StageStatus.GO:
+                    return f"依赖阶段'{dep}'未通过"
+            if end is not None and end - time.perf_counter() <= 0:
+                return "预算已用完"
+            return ""
+
+        # 后台阶段立即启动
+        background = []
+        for stage in self.stages:
+            if stage.background:
+                deadline = allowed(stage)
+                background.append((stage, deadline, *self._launch(stage, context)))
+
+        for stage in self.stages:
+            if stage.background:
+                continue
+            reason = skip_reason(stage)
+            if reason:
+                results[stage.name] = StageResult(stage.name, StageStatus.SKIPPED, 0.0,
+                                                  stage.deadline, reason, stage.critical)
+                continue
+            deadline = allowed(stage)
+            thread, box, started = self._launch(stage, context)
+            results[stage.name] = self._collect(stage, thread, box, started, deadline)
+
+        for stage, deadline, thread, box, started in background:
+            results[stage.name] = self._collect(stage, thread, box, started, deadline)
+
+        report = WarmupReport(results=[results[s.name] for s in self.stages],
+                              elapsed=time.perf_counter() - start)
+        self.last_report = report
+        for line in report.lines():
+            self.log(line)
+        return report
+
+
+# ========== 默认阶段 ==========
+
+def _parse_bounds(bounds: str) -> Optional[Tuple[int, int, int, int]]:
+    match = _BOUNDS_PATTERN.match(bounds or "")
+    return tuple(int(v) for v in match.groups()) if match else None
+
+
+def stage_driver_probe(context: WarmupContext) -> Tuple[bool, str]:
+    """用一次轻量命令确认driver会话可用，同时取得屏幕尺寸"""
+    if not getattr(context.driver, 'session_id', None):
+        return False, "没有driver会话"
+    start = time.perf_counter()
+    size = context.driver.get_window_size()
+    context.screen_size = (int(size['width']), int(size['height']))
+    return True, f"会话可用，往返{(time.perf_counter() - start) * 1000:.0f}ms"
+
+
+def stage_detail_page(context: WarmupContext, markers: Tuple[str, ...] = DETAIL_PAGE_MARKERS,
+                      timeout: float = 5.0) -> Tuple[bool, str]:
+    """确认当前在演出详情页"""
+    service = get_snapshot_service(context.driver)
+    snapshot = service.wait_until(lambda s: any(m in s.page_source for m in markers),
+                                  timeout=timeout, interval=0.5)
+    if snapshot is None:
+        return False, "未检测到详情页标志"
+    context.snapshot = snapshot
+    found = next(m for m in markers if m in snapshot.page_source)
+    return True, f"检测到'{found}'"
+
+
+def stage_resolve_coordinates(context: WarmupContext,
+                              buy_texts: Tuple[str, ...] = BUY_BUTTON_TEXTS) -> Tuple[bool, str]:
+    """
+    用最新快照解析并缓存坐标
+
+    购票按钮取配置坐标附近文字匹配的可点击元素中心（找不到时沿用配置坐标）；
+    场次和票档坐标用动作计划命中测试校验，通过后缓存已校验的计划，开票时直接发送，不再获取快照。
+    """
+    config = context.config
+    if config is None:
+        return False, "没有抢票配置"
+
+    snapshot = get_snapshot_service(context.driver).get(max_age=0)
+    context.snapshot = snapshot
+    root = ET.fromstring(snapshot.page_source)
+    if context.screen_size is None and root.get('width') and root.get('height'):
+        context.screen_size = (int(root.get('width')), int(root.get('height')))
+
+    # 购票按钮
+    buy = None
+    best_distance = BUY_SNAP_DISTANCE
+    for node in root.iter():
+        label = (node.get('text', '') or node.get('content-desc', '')).strip()
+        if not label or not any(label.startswith(text) for text in buy_texts):
+            continue
+        rect = _parse_bounds(node.get('bounds', ''))
+        if not rect:
+            continue
+        cx, cy = (rect[0] + rect[2]) // 2, (rect[1] + rect[3]) // 2
+        distance = ((cx - config.buy_x) ** 2 + (cy - config.buy_y) ** 2) ** 0.5
+        if distance <= best_distance:
+            best_distance = distance
+            buy = (cx, cy, label)
+    if buy:
+        context.coordinates["buy"] = (buy[0], buy[1])
+        buy_message = f"购票按钮'{buy[2]}'({buy[0]}, {buy[1]})"
+    else:
+        context.coordinates["buy"] = (config.buy_x, config.buy_y)
+        buy_message = f"购票按钮沿用配置坐标({config.buy_x}, {config.buy_y})"
+
+    # 场次+票档
+    plan = (ActionPlan()
+            .tap(config.session_x, config.session_y, "场次")
+            .wait(config.select_wait_ms)
+            .tap(config.price_x, config.price_y, "票档")
+            .wait(config.select_wait_ms))
+    ok, errors = plan.validate(snapshot.page_source, context.screen_size)
+    context.coordinates["session"] = (config.session_x, config.session_y)
+    context.coordinates["price"] = (config.price_x, config.price_y)
+    if not ok:
+        context.action_plan = None
+        return False, f"{buy_message}; " + "; ".join(errors)
+
+    plan.compile()  # 提前确认可编译
+    context.action_plan = plan
+    return True, f"{buy_message}; 场次/票档计划已校验"
+
+
+def make_ocr_stage(ocr_loader: Callable[[], Any]) -> Callable[[WarmupContext], Tuple[bool, str]]:
+    """OCR模型加载阶段"""
+    def stage_load_ocr(context: WarmupContext) -> Tuple[bool, str]:
+        start = time.perf_counter()
+        ocr = ocr_loader()
+        if ocr is None:
+            return False, "OCR加载失败"
+        context.data["ocr"] = ocr
+        return True, f"已加载 ({time.perf_counter() - start:.1f}秒)"
+    return stage_load_ocr
+
+
+def build_default_pipeline(ocr_loader: Optional[Callable[[], Any]] = None, log_func=None,
+                           driver_deadline: float = 3.0, page_deadline: float = 6.0,
+                           coords_deadline: float = 4.0, ocr_deadline: float = 25.0) -> WarmupPipeline:
+    """
+    默认预热流水线: driver探测 -> 详情页确认 -> 坐标解析，OCR加载并行
+
+    Args:
+        ocr_loader: OCR加载函数（返回OCR实例，失败返回None），None时不加载OCR
+        log_func: 日志函数
+        *_deadline: 各阶段时限（秒）
+    """
+    pipeline = WarmupPipeline(log_func)
+    if ocr_loader is not None:
+        pipeline.add_stage("OCR加载", make_ocr_stage(ocr_loader), ocr_deadline,
+                           critical=False, background=True)
+    pipeline.add_stage("driver会话", stage_driver_probe, driver_deadline)
+    pipeline.add_stage("详情页", lambda c: stage_detail_page(c, timeout=page_deadline - 0.5), page_deadline,
+                       depends_on=("driver会话",))
+    pipeline.add_stage("坐标解析", stage_resolve_coordinates, coords_deadline, depends_on=("详情页",))
+    return pipeline
@@ -6,10 +6,25 @@ WebDriver健康监控和自动重连系统
 
 import time
 import threading
-from typing import Optional, Callable, Any
+import statistics
+from collections import deque
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Optional, Callable, Any, List, Dict
 from datetime import datetime
+
+import requests
 from appium import webdriver
 from appium.options.common.base import AppiumOptions
+
+try:
+    from .command_scheduler import CommandPriority, set_thread_priority
+    from .activity_restore import ActivityState, RestoreResult, capture_activity_state, restore_activity_state
+    from .retry_policy import RetryRule, get_retry_policy
+except ImportError:
+    from command_scheduler import CommandPriority, set_thread_priority
+    from activity_restore import ActivityState, RestoreResult, capture_activity_state, restore_activity_state
+    from retry_policy import RetryRule, get_retry_policy
 from selenium.common.exceptions import (
     WebDriverException,
     InvalidSessionIdException,
@@ -46,6 +61,107 @@ class SessionState:
         self.session_start_time = time.time()
 
 
+class ProbeTier(Enum):
+    """探测层级（开销递增）"""
+    SESSION = 1  # 本地检查session_id，无网络开销
+    SERVER = 2  # Appium /status，只到服务器，不经过adb和设备
+    DEVICE = 3  # current_activity，经adb到设备的完整往返
+
+
+@dataclass
+class ProbeSample:
+    """单次探测记录"""
+    timestamp: float  # time.time
+    tier: ProbeTier
+    latency: float  # 秒
+    ok: bool
+
+
+class ProbeSeries:
+    """探测延迟滚动序列，按层级比较近期与基线的中位数，发现延迟上升趋势"""
+
+    def __init__(self, maxlen: int = 500, recent: int = 5, baseline: int = 30,
+                 warn_ratio: float = 3.0, warn_floor: float = 0.1):
+        """
+        Args:
+            maxlen: 保留的探测记录数
+            recent: 近期窗口（次）
+            baseline: 基线窗口（次，在近期窗口之前）
+            warn_ratio: 近期中位数超过基线的倍数时预警
+            warn_floor: 近期中位数至少超过基线多少秒才预警（避免毫秒级抖动误报）
+        """
+        self.samples: deque = deque(maxlen=maxlen)
+        self.recent = recent
+        self.baseline = baseline
+        self.warn_ratio = warn_ratio
+        self.warn_floor = warn_floor
+
+    def add(self, tier: ProbeTier, latency: float, ok: bool) -> ProbeSample:
+        sample = ProbeSample(time.time(), tier, latency, ok)
+        self.samples.append(sample)
+        return sample
+
+    def latencies(self, tier: ProbeTier) -> List[float]:
+        return [s.latency for s in self.samples if s.tier == tier and s.ok]
+
+    def trend(self, tier: ProbeTier) -> Optional[Dict[str, float]]:
+        """
+        近期与基线中位数对比
+
+        Returns:
+            {"recent": 秒, "baseline": 秒, "ratio": 倍数, "warning": 是否预警}，样本不足时返回None
+        """
+        values = self.latencies(tier)
+        if len(values) < self.recent + 5:
+            return None
+        recent = statistics.median(values[-self.recent:])
+        baseline = statistics.median(values[-(self.recent + self.baseline):-self.recent])
+        ratio = recent / baseline if baseline > 0 else float('inf')
+        warning = ratio >= self.warn_ratio and recent - baseline >= self.warn_floor
+        return {"recent": recent, "baseline": baseline, "ratio": ratio, "warning": warning}
+
+    def to_list(self, tier: Optional[ProbeTier] = None) -> List[Dict[str, Any]]:
+        """导出为时间序列"""
+        return [{"timestamp": s.timestamp, "tier": s.tier.name, "latency_ms": s.latency * 1000, "ok": s.ok}
+                for s in self.samples if tier is None or s.tier == tier]
+
+
+class StandbyStats:
+    """热备会话成本统计"""
+    def __init__(self):
+        self.spawn_count = 0  # 成功创建备用会话次数
+        self.spawn_failures = 0  # 创建失败次数
+        self.total_spawn_seconds = 0.0  # 创建备用会话累计耗时
+        self.keepalive_count = 0  # 保活探测次数
+        self.keepalive_failures = 0  # 保活失败次数（备用会话被丢弃）
+        self.total_held_seconds = 0.0  # 已结束的备用会话累计持有时间
+        self.failover_count = 0  # 通过热备完成的切换次数
+        self.total_failover_seconds = 0.0  # 切换累计耗时
+        self.ready_since: Optional[float] = None  # 当前备用会话就绪时间
+
+    def record_spawn(self, seconds: float):
+        """记录一次成功创建"""
+        self.spawn_count += 1
+        self.total_spawn_seconds += seconds
+        self.ready_since = time.time()
+
+    def record_release(self):
+        """记录备用会话结束持有（被使用或被丢弃）"""
+        if self.ready_since is not None:
+            self.total_held_seconds += time.time() - self.ready_since
+            self.ready_since = None
+
+    @property
+    def avg_spawn_seconds(self) -> float:
+        """平均创建耗时"""
+        return self.total_spawn_seconds / self.spawn_count if self.spawn_count else 0.0
+
+    @property
+    def avg_failover_seconds(self) -> float:
+        """平均切换耗时"""
+        return self.total_failover_seconds / self.failover_count if self.failover_count else 0.0
+
+
 class WebDriverHealthMonitor:
     """
     WebDriver健康监控器
@@ -54,18 +170,32 @@ class WebDriverHealthMonitor:
     1. 自动检测WebDriver会话健康状态
     2. 会话失败时自动重连
     3. 支持重连重试和指数退避
-    4. 保留会话状态（当前Activity等）
+    4. 重连后回到掉线前的页面（重新打开原Activity并验证，失败时导航）
     5. 提供详细的健康报告
+    6. 可选热备模式：预先创建并验证备用会话，故障时直接切换
+
+    热备说明：
+        UiAutomator2在同一设备上同一时间只能运行一个instrumentation，
+        用同一设备的能力集再创建会话会顶掉当前会话。因此备用会话必须来自
+        独立的 standby_factory（例如另一台Appium服务器或另一台设备）。
     """
 
     def __init__(
         self,
         driver_factory: Callable[[], webdriver.Remote],
         logger=None,
-        health_check_interval: int = 30,  # 健康检查间隔（秒）
+        health_check_interval: int = 30,  # 健康检查最大间隔（秒，设备正常时）
+        min_check_interval: float = 2,  # 健康检查最小间隔（秒，出错后）
+        device_probe_max_age: float = 300,  # 超过该时间没有设备往返证据时做一次设备探测（秒）
         max_reconnect_attempts: int = 3,  # 最大重连次数
-        reconnect_timeout: int = 60,  # 重连超时（秒）
-        auto_monitor: bool = True  # 是否自动启动监控
+        reconnect_timeout: int = 60,  # 重连超时（秒，含所有重试）
+        auto_monitor: bool = True,  # 是否自动启动监控
+        standby_factory: Optional[Callable[[], webdriver.Remote]] = None,  # 热备会话工厂
+        standby_keepalive_interval: int = 60,  # 热备会话保活间隔（秒）
+        device_tracker=None,  # ADB设备跟踪器（adb_device_tracker.DeviceTracker）
+        device_serial: Optional[str] = None,  # 跟踪的设备序列号（默认取driver的udid）
+        adb_shell: Optional[Callable[[str], str]] = None,  # 执行adb shell命令并返回输出（用于记录掉线前页面）
+        navigate_fallback: Optional[Callable[[webdriver.Remote, ActivityState], bool]] = None  # 页面恢复失败时的导航
     ):
         """
         初始化健康监控器
@@ -73,14 +203,24 @@ class WebDriverHealthMonitor:
         Args:
             driver_factory: 创建WebDriver的工厂函数
             logger: 日志记录器
-            health_check_interval: 健康检查间隔（秒）
+            health_check_interval: 健康检查最大间隔（秒），设备正常且有抢票命令成功时使用
+            min_check_interval: 健康检查最小间隔（秒），出错或可疑后使用，之后逐次加倍
+            device_probe_max_age: 设备往返证据的最长有效期（秒）
             max_reconnect_attempts: 最大重连尝试次数
-            reconnect_timeout: 单次重连超时时间（秒）
+            reconnect_timeout: 整个重连流程（含重试和退避）的时限（秒）
             auto_monitor: 是否自动启动后台监控
+            standby_factory: 创建备用会话的工厂函数（None表示不启用热备）
+            standby_keepalive_interval: 备用会话保活间隔（秒），需小于newCommandTimeout
+            device_tracker: ADB设备跟踪器，提供后设备离线/恢复立即触发检查，设备离线期间不做无效重连
+            device_serial: 跟踪的设备序列号（None时取driver capabilities中的udid）
+            adb_shell: 执行adb shell命令的函数，提供后通过dumpsys记录掉线前的Activity和Intent（会话已断开也能记录）
+            navigate_fallback: 重新打开原Activity失败时的导航函数 (driver, state) -> 是否到达
         """
         self.driver_factory = driver_factory
         self.logger = logger
         self.health_check_interval = health_check_interval
+        self.min_check_interval = min_check_interval
+        self.device_probe_max_age = device_probe_max_age
         self.max_reconnect_attempts = max_reconnect_attempts
         self.reconnect_timeout = reconnect_timeout
 
@@ -88,8 +228,40 @@ class WebDriverHealthMonitor:
         self.state = SessionState()
         self._monitor_thread: Optional[threading.Thread] = None
         self._stop_monitor = threading.Event()
+        self._wake_monitor = threading.Event()
         self._reconnect_lock = threading.Lock()
 
+        # 分层探测
+        self.probe_series = ProbeSeries()
+        self.current_interval = float(health_check_interval)
+        self.suspicion: str = ""  # 最近一次升级到设备探测的原因
+        self._last_device_ok = time.time()  # 最近一次设备往返成功（包括其他线程的driver命令）
+        self._trend_warned = False
+        self._http = requests.Session()
+
+        # 热备会话
+        self.standby_factory = standby_factory
+        self.standby_keepalive_interval = standby_keepalive_interval
+        self.standby_driver: Optional[webdriver.Remote] = None
+        self.standby_stats = StandbyStats()
+        self._standby_lock = threading.Lock()
+        self._standby_spawning = False
+        self._last_standby_keepalive = time.time()
+
+        # ADB设备状态推送
+        self.device_tracker = device_tracker
+        self.device_serial = device_serial
+        if device_tracker is not None:
+            device_tracker.add_listener(self._on_device_event)
+
+        # 掉线后页面恢复
+        self.adb_shell = adb_shell
+        self.navigate_fallback = navigate_fallback
+        self.last_activity_state: Optional[ActivityState] = None  # 最近一次重连前记录的页面
+        self.last_restore: Optional[RestoreResult] = None
+        self.restore_history: deque = deque(maxlen=50)
+        self._drop_time: Optional[float] = None  # 本次掉线首次检测到的时刻
+
         if auto_monitor:
             self.start_monitoring()
 
@@ -117,58 +289,193 @@ class WebDriverHealthMonitor:
             self.state.mark_alive()
             self.state.reset_reconnect()
             self._log("✓ WebDriver初始化成功", "SUCCESS")
+            self.prepare_standby()
             return True
         except Exception as e:
             self._log(f"✗ WebDriver初始化失败: {e}", "ERROR")
             self.state.mark_failed(e)
             return False
 
-    def check_health(self, quick: bool = False) -> bool:
+    # ========== 分层探测 ==========
+
+    def _server_url(self) -> Optional[str]:
+        """当前会话所在的Appium服务器地址"""
+        executor = getattr(self.driver, 'command_executor', None)
+        url = getattr(executor, '_url', None)
+        if url is None and executor is not None:
+            client_config = getattr(executor, '_client_config', None)
+            url = getattr(client_config, 'remote_server_addr', None)
+        return url.rstrip('/') if url else None
+
+    def _probe_server(self) -> Optional[bool]:
+        """
+        第2层：请求Appium /status（不经过driver命令通道，不与抢票命令排队）
+
+        Returns:
+            是否正常，无法确定服务器地址时返回None
+        """
+        url = self._server_url()
+        if url is None:
+            return None
+        start = time.perf_counter()
+        try:
+            response = self._http.get(f"{url}/status", timeout=3)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        self.probe_series.add(ProbeTier.SERVER, time.perf_counter() - start, ok)
+        return ok
+
+    def _command_activity(self):
+        """driver命令调度器记录的最近成功/失败时间（未接入调度器时为0）"""
+        scheduler = getattr(self.driver, '_command_scheduler', None)
+        if scheduler is None:
+            return 0.0, 0.0
+        return scheduler.last_success_time, scheduler.last_error_time
+
+    def _suspicion_reason(self, server_ok: Optional[bool]) -> str:
+        """判断是否需要设备往返探测，返回原因（空字符串表示不需要）"""
+        if not self.state.is_alive:
+            return "上次检查失败"
+        if server_ok is False:
+            return "Appium服务无响应"
+
+        last_success, last_error = self._command_activity()
+        if last_error > last_success and time.time() - last_error < self.health_check_interval:
+            return "driver命令最近出错"
+
+        trend = self.probe_series.trend(ProbeTier.SERVER)
+        if trend and trend["warning"]:
+            if not self._trend_warned:
+                self._trend_warned = True
+                self._log(f"⚠️ 探测延迟上升: 近期{trend['recent'] * 1000:.0f}ms, "
+                          f"基线{trend['baseline'] * 1000:.0f}ms ({trend['ratio']:.1f}倍)", "WARNING")
+            return "探测延迟上升"
+        self._trend_warned = False
+
+        self._last_device_ok = max(self._last_device_ok, last_success)
+        if time.time() - self._last_device_ok > self.device_probe_max_age:
+            return "长时间没有设备往返"
+        return ""
+
+    def _update_interval(self, healthy: bool, suspicious: bool):
+        """出错或可疑时密集探测，正常后逐次加倍；有抢票命令持续成功时直接稀疏"""
+        if not healthy or suspicious:
+            self.current_interval = self.min_check_interval
+            return
+        last_success, _ = self._command_activity()
+        if time.time() - last_success < self.current_interval:
+            self.current_interval = float(self.health_check_interval)
+        else:
+            self.current_interval = min(float(self.health_check_interval), self.current_interval * 2)
+
+    def _tracked_serial(self) -> Optional[str]:
+        if self.device_serial:
+            return self.device_serial
+        try:
+            return self.driver.capabilities.get('udid') if self.driver else None
+        except Exception:
+            return None
+
+    def _device_unavailable(self) -> Optional[str]:
+        """设备跟踪器报告的不可用状态（设备正常、未接入跟踪器或跟踪器未同步时返回None）"""
+        if self.device_tracker is None or not self.device_tracker.is_live:
+            return None
+        serial = self._tracked_serial()
+        if not serial:
+            return None
+        state = self.device_tracker.state(serial)
+        return None if state == "device" else (state or "已断开")
+
+    def _on_device_event(self, event):
+        """设备跟踪线程回调：设备离线或恢复时立即唤醒监控循环"""
+        if event.serial != self._tracked_serial():
+            return
+        if event.went_offline:
+            self._log(f"⚠️ ADB设备状态变化: {event.serial} -> {event.new_state or '已断开'}", "WARNING")
+        elif event.came_online:
+            self._log(f"ADB设备已恢复在线: {event.serial}", "INFO")
+        else:
+            return
+        self.current_interval = self.min_check_interval
+        self._wake_monitor.set()
+
+    def _mark_failed(self, error: Exception):
+        """标记会话失败，并记录本次掉线的起始时刻（用于统计恢复耗时）"""
+        if self._drop_time is None:
+            self._drop_time = time.time()
+        self.state.mark_failed(error)
+
+    def check_health(self, quick: bool = False, deep: bool = False) -> bool:
         """
-        检查WebDriver健康状态
+        检查WebDriver健康状态（分层探测）
+
+        第1层检查session_id；第2层请求Appium /status；
+        只有可疑时（服务器无响应、命令出错、延迟上升、长时间无设备往返）才做第3层设备往返。
 
         Args:
             quick: 是否快速检查（仅检查session_id）
+            deep: 强制做设备往返探测
 
         Returns:
             是否健康
         """
         if self.driver is None:
-            self.state.mark_failed(Exception("Driver未初始化"))
+            self._mark_failed(Exception("Driver未初始化"))
             return False
 
         try:
-            # 快速检查：检查session_id
+            # 第1层：检查session_id
             if self.driver.session_id is None:
-                self.state.mark_failed(Exception("Session ID为空"))
+                self._mark_failed(Exception("Session ID为空"))
+                return False
+            self.probe_series.add(ProbeTier.SESSION, 0.0, True)
+
+            # 设备跟踪器已报告设备不可用，无需再经过Appium探测
+            device_state = self._device_unavailable()
+            if device_state:
+                self._mark_failed(Exception(f"ADB设备不可用: {device_state}"))
                 return False
 
             if not quick:
-                # 完整检查：尝试获取当前Activity（仅Android）
-                _ = self.driver.current_activity
+                # 第2层：Appium服务状态
+                server_ok = None if deep else self._probe_server()
+                self.suspicion = "强制设备探测" if deep else self._suspicion_reason(server_ok)
+
+                if self.suspicion:
+                    # 第3层：设备往返（获取当前Activity，仅Android）
+                    self._log(f"升级为设备探测: {self.suspicion}", "DEBUG")
+                    start = time.perf_counter()
+                    try:
+                        _ = self.driver.current_activity
+                    except Exception:
+                        self.probe_series.add(ProbeTier.DEVICE, time.perf_counter() - start, False)
+                        raise
+                    self.probe_series.add(ProbeTier.DEVICE, time.perf_counter() - start, True)
+                    self._last_device_ok = time.time()
 
             self.state.mark_alive()
             return True
 
         except InvalidSessionIdException as e:
             self._log("检测到无效的Session ID", "WARNING")
-            self.state.mark_failed(e)
+            self._mark_failed(e)
             return False
 
         except NoSuchWindowException as e:
             self._log("检测到窗口已关闭", "WARNING")
-            self.state.mark_failed(e)
+            self._mark_failed(e)
             return False
 
         except WebDriverException as e:
             error_msg = str(e).lower()
             if "invalid session id" in error_msg or "session not found" in error_msg:
                 self._log("检测到会话已失效", "WARNING")
-                self.state.mark_failed(e)
+                self._mark_failed(e)
                 return False
             elif "timeout" in error_msg:
                 self._log("检测到通信超时", "WARNING")
-                self.state.mark_failed(e)
+                self._mark_failed(e)
                 return False
             else:
                 # 其他WebDriver异常，可能是临时性问题
@@ -195,14 +502,22 @@ class WebDriverHealthMonitor:
             self._log("🔄 开始WebDriver重连流程", "WARNING")
             self._log("="*60, "INFO")
 
-            # 保存当前状态
-            previous_activity = None
-            if preserve_state and self.driver:
-                try:
-                    previous_activity = self.driver.current_activity
-                    self._log(f"保存当前Activity: {previous_activity}", "INFO")
-                except:
-                    pass
+            # 保存当前状态（dumpsys不依赖会话，旧会话已失效时也能记录）
+            previous_state = None
+            if self._drop_time is None:
+                self._drop_time = time.time()
+            if preserve_state:
+                previous_state = capture_activity_state(self.driver, self.adb_shell)
+                if previous_state:
+                    self.last_activity_state = previous_state
+                    extras = f", {len(previous_state.extras)}个extras" if previous_state.extras else ""
+                    self._log(f"保存当前Activity: {previous_state.activity} "
+                              f"(来源: {previous_state.source}{extras})", "INFO")
+
+            # 优先切换到热备会话（指针替换，无需等待重建）
+            if self._failover_to_standby(previous_state):
+                self._log("="*60, "INFO")
+                return True
 
             # 关闭旧连接
             if self.driver:
@@ -213,66 +528,300 @@ class WebDriverHealthMonitor:
                 except:
                     self._log("旧会话关闭失败（可能已断开）", "WARNING")
 
-            # 重连重试
-            for attempt in range(1, self.max_reconnect_attempts + 1):
-                self._log(f"", "INFO")
-                self._log(f"[尝试 {attempt}/{self.max_reconnect_attempts}] 正在重新连接...", "INFO")
+            # 重连重试（退避带抖动，整个重连不超过reconnect_timeout和调用方剩余时间）
+            policy = get_retry_policy("reconnect", log_func=lambda msg: self._log(msg, "INFO"))
+            policy.default = RetryRule(max_attempts=self.max_reconnect_attempts, base_delay=1, backoff=2, max_delay=10)
+            for rule in policy.rules.values():
+                rule.max_attempts = self.max_reconnect_attempts
+            with policy.session("webdriver_reconnect", timeout=self.reconnect_timeout) as retry:
+                while True:
+                    self._log(f"", "INFO")
+                    self._log(f"[尝试 {retry.attempt}/{self.max_reconnect_attempts}] 正在重新连接...", "INFO")
+
+                    try:
+                        # 创建新连接
+                        start_time = time.time()
+                        self.driver = self.driver_factory()
+                        connect_time = time.time() - start_time
+
+                        # 验证连接
+                        if not self.check_health(quick=True):
+                            raise WebDriverException("连接成功但健康检查失败")
 
-                try:
-                    # 指数退避
-                    if attempt > 1:
-                        wait_time = min(2 ** (attempt - 1), 10)  # 最多等待10秒
-                        self._log(f"等待 {wait_time} 秒后重试...", "INFO")
-                        time.sleep(wait_time)
-
-                    # 创建新连接
-                    start_time = time.time()
-                    self.driver = self.driver_factory()
-                    connect_time = time.time() - start_time
-
-                    # 验证连接
-                    if self.check_health(quick=True):
                         self.state.mark_alive()
                         self.state.reconnect_count += 1
                         self._log(f"✓ WebDriver重连成功! (耗时: {connect_time:.2f}秒)", "SUCCESS")
 
-                        # 尝试恢复状态
-                        if preserve_state and previous_activity:
-                            self._log(f"尝试恢复到之前的Activity: {previous_activity}", "INFO")
-                            # 注意：这里只是记录，实际恢复需要应用层逻辑
+                        # 恢复到掉线前的页面
+                        self._restore_page(previous_state)
 
+                        self.prepare_standby()
                         self._log("="*60, "INFO")
                         return True
-                    else:
-                        self._log(f"✗ 连接成功但健康检查失败", "ERROR")
 
-                except Exception as e:
-                    self._log(f"✗ 重连失败: {e}", "ERROR")
-                    if attempt < self.max_reconnect_attempts:
-                        self._log(f"将进行第 {attempt + 1} 次尝试...", "WARNING")
+                    except Exception as e:
+                        self._log(f"✗ 重连失败: {e}", "ERROR")
+                        if not retry.backoff(e):
+                            break
 
             # 所有重试失败
             self._log("", "ERROR")
             self._log("="*60, "ERROR")
-            self._log(f"❌ WebDriver重连失败（已尝试{self.max_reconnect_attempts}次）", "ERROR")
+            self._log(f"❌ WebDriver重连失败（已尝试{retry.attempt}次）", "ERROR")
             self._log("="*60, "ERROR")
             self.state.mark_failed(Exception("重连失败"))
             return False
 
+    # ========== 热备会话 ==========
+
+    def _validate_standby(self, driver: webdriver.Remote) -> bool:
+        """验证备用会话可用（同时起到保活作用，刷新newCommandTimeout）"""
+        try:
+            if driver.session_id is None:
+                return False
+            _ = driver.current_package
+            return True
+        except Exception:
+            return False
+
+    def _quit_quietly(self, driver: Optional[webdriver.Remote]):
+        """后台关闭会话，不阻塞调用方"""
+        if driver is None:
+            return
+
+        def _quit():
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+        threading.Thread(target=_quit, daemon=True, name="WebDriverQuit").start()
+
+    def _spawn_standby(self):
+        """创建并验证备用会话（在后台线程中执行）"""
+        try:
+            start_time = time.time()
+            driver = self.standby_factory()
+            spawn_time = time.time() - start_time
+
+            if not self._validate_standby(driver):
+                self.standby_stats.spawn_failures += 1
+                self._log("✗ 备用会话创建成功但验证失败，已丢弃", "WARNING")
+                self._quit_quietly(driver)
+                return
+
+            with self._standby_lock:
+                old_standby = self.standby_driver
+                self.standby_driver = driver
+                self.standby_stats.record_spawn(spawn_time)
+                self._last_standby_keepalive = time.time()
+            self._quit_quietly(old_standby)
+            self._log(f"✓ 热备会话已就绪 (创建耗时: {spawn_time:.2f}秒)", "SUCCESS")
+
+        except Exception as e:
+            self.standby_stats.spawn_failures += 1
+            self._log(f"✗ 热备会话创建失败: {e}", "WARNING")
+
+        finally:
+            self._standby_spawning = False
+
+    def prepare_standby(self, wait: bool = False) -> bool:
+        """
+        预备热备会话（未启用热备或已有备用会话时直接返回）
+
+        Args:
+            wait: 是否同步等待创建完成
+
+        Returns:
+            当前是否有可用的备用会话（异步创建时返回调用前的状态）
+        """
+        if self.standby_factory is None:
+            return False
+
+        with self._standby_lock:
+            if self.standby_driver is not None or self._standby_spawning:
+                return self.standby_driver is not None
+            self._standby_spawning = True
+
+        if wait:
+            self._spawn_standby()
+        else:
+            threading.Thread(
+                target=self._spawn_standby,
+                daemon=True,
+                name="WebDriverStandbySpawner"
+            ).start()
+
+        return self.standby_driver is not None
+
+    def _keepalive_standby(self):
+        """保活备用会话，失效则丢弃并重新创建"""
+        if self.standby_factory is None:
+            return
+        if time.time() - self._last_standby_keepalive < self.standby_keepalive_interval:
+            return
+
+        with self._standby_lock:
+            driver = self.standby_driver
+        if driver is None:
+            self.prepare_standby()
+            return
+
+        self._last_standby_keepalive = time.time()
+        self.standby_stats.keepalive_count += 1
+        if not self._validate_standby(driver):
+            self.standby_stats.keepalive_failures += 1
+            self._log("⚠️ 热备会话已失效，重新创建", "WARNING")
+            with self._standby_lock:
+                if self.standby_driver is driver:
+                    self.standby_driver = None
+                    self.standby_stats.record_release()
+            self._quit_quietly(driver)
+            self.prepare_standby()
+
+    def _restore_page(self, previous_state: Optional[ActivityState]) -> Optional[RestoreResult]:
+        """
+        新会话建立后回到掉线前的页面
+
+        先重新打开记录的Activity并用快照验证，失败时才调用 navigate_fallback 导航。
+        无论是否恢复页面，都记录从掉线到恢复的总耗时。
+        """
+        drop_time = self._drop_time or time.time()
+        self._drop_time = None
+        if previous_state is None:
+            self._log(f"会话已恢复，未记录掉线前页面 (掉线到恢复: {time.time() - drop_time:.2f}秒)", "INFO")
+            return None
+
+        self._log(f"尝试恢复到之前的Activity: {previous_state.activity}", "INFO")
+        result = restore_activity_state(self.driver, previous_state, drop_time=drop_time,
+                                        log_func=lambda msg: self._log(msg, "DEBUG"))
+        if not result.success and self.navigate_fallback is not None:
+            self._log(f"重新打开Activity失败（{result.detail}），改为导航", "WARNING")
+            started = time.time()
+            try:
+                navigated = bool(self.navigate_fallback(self.driver, previous_state))
+            except Exception as e:
+                navigated = False
+                self._log(f"导航失败: {e}", "WARNING")
+            now = time.time()
+            result = RestoreResult(navigated, "navigation" if navigated else "none",
+                                   result.restore_seconds + now - started, now - drop_time,
+                                   "导航到达" if navigated else result.detail)
+
+        self.last_restore = result
+        self.restore_history.append(result)
+        if result.success:
+            self._log(f"✓ 已回到之前的页面 (方式: {result.method}, 恢复: {result.restore_seconds:.2f}秒, "
+                      f"掉线到恢复: {result.time_to_resume:.2f}秒)", "SUCCESS")
+        else:
+            self._log(f"✗ 未能回到之前的页面 (掉线到恢复会话: {result.time_to_resume:.2f}秒)", "WARNING")
+        return result
+
+    def _failover_to_standby(self, previous_state: Optional[ActivityState] = None) -> bool:
+        """
+        切换到热备会话
+
+        Returns:
+            是否切换成功（无备用会话或备用会话不可用时返回False）
+        """
+        with self._standby_lock:
+            standby = self.standby_driver
+            self.standby_driver = None
+        if standby is None:
+            return False
+
+        self.standby_stats.record_release()
+        start_time = time.time()
+        if not self._validate_standby(standby):
+            self._log("✗ 热备会话不可用，回退到常规重连", "WARNING")
+            self._quit_quietly(standby)
+            self.prepare_standby()
+            return False
+
+        old_driver = self.driver
+        self.driver = standby
+        failover_time = time.time() - start_time
+
+        self.state.mark_alive()
+        self.state.reconnect_count += 1
+        self.standby_stats.failover_count += 1
+        self.standby_stats.total_failover_seconds += failover_time
+        self._log(f"✓ 已切换到热备会话 (耗时: {failover_time:.3f}秒)", "SUCCESS")
+
+        # 旧会话在后台关闭，并立即补充新的备用会话
+        self._quit_quietly(old_driver)
+        self.prepare_standby()
+        self._restore_page(previous_state)
+        return True
+
+    def get_standby_report(self) -> dict:
+        """
+        获取热备成本报告
+
+        成本 = 创建备用会话耗时 + 保活探测次数 + 持有时长；
+        收益 = 每次切换相对于重新创建会话节省的时间。
+
+        Returns:
+            包含热备成本和收益的字典
+        """
+        stats = self.standby_stats
+        held_seconds = stats.total_held_seconds
+        if stats.ready_since is not None:
+            held_seconds += time.time() - stats.ready_since
+
+        saved_seconds = max(
+            0.0,
+            (stats.avg_spawn_seconds - stats.avg_failover_seconds) * stats.failover_count
+        )
+
+        return {
+            "enabled": self.standby_factory is not None,
+            "ready": self.standby_driver is not None,
+            "spawn_count": stats.spawn_count,
+            "spawn_failures": stats.spawn_failures,
+            "total_spawn_seconds": stats.total_spawn_seconds,
+            "avg_spawn_seconds": stats.avg_spawn_seconds,
+            "keepalive_count": stats.keepalive_count,
+            "keepalive_failures": stats.keepalive_failures,
+            "held_seconds": held_seconds,
+            "failover_count": stats.failover_count,
+            "avg_failover_seconds": stats.avg_failover_seconds,
+            "estimated_saved_seconds": saved_seconds
+        }
+
     def _monitor_loop(self):
         """后台监控循环"""
+        set_thread_priority(CommandPriority.BACKGROUND)
         self._log("✓ WebDriver健康监控已启动", "INFO")
-        self._log(f"  - 检查间隔: {self.health_check_interval}秒", "INFO")
+        self._log(f"  - 检查间隔: {self.min_check_interval}~{self.health_check_interval}秒（自适应）", "INFO")
         self._log(f"  - 自动重连: 已启用（最多{self.max_reconnect_attempts}次）", "INFO")
+        if self.standby_factory is not None:
+            self._log(f"  - 热备会话: 已启用（保活间隔{self.standby_keepalive_interval}秒）", "INFO")
 
         while not self._stop_monitor.is_set():
             try:
-                # 等待指定间隔
-                if self._stop_monitor.wait(self.health_check_interval):
+                # 等待自适应间隔（启用热备时按保活间隔唤醒）
+                wait_interval = self.current_interval
+                if self.standby_factory is not None:
+                    wait_interval = min(wait_interval, self.standby_keepalive_interval)
+                # 设备状态变化时提前唤醒
+                self._wake_monitor.wait(wait_interval)
+                self._wake_monitor.clear()
+                if self._stop_monitor.is_set():
                     break  # 收到停止信号
 
+                self._keepalive_standby()
+
                 # 执行健康检查
-                if not self.check_health():
+                healthy = self.check_health()
+                self._update_interval(healthy, bool(self.suspicion))
+                device_state = None if healthy else self._device_unavailable()
+                if device_state:
+                    # 设备离线时重连必然失败，等设备恢复在线的推送再重连
+                    self._log(f"ADB设备不可用({device_state})，等待设备恢复", "WARNING")
+                    self.current_interval = float(self.health_check_interval)
+                    continue
+                if not healthy:
                     self._log("⚠️ 检测到WebDriver会话异常", "WARNING")
                     self._log(f"上次错误: {self.state.last_error}", "WARNING")
 
@@ -310,6 +859,7 @@ class WebDriverHealthMonitor:
         if self._monitor_thread and self._monitor_thread.is_alive():
             self._log("正在停止健康监控...", "INFO")
             self._stop_monitor.set()
+            self._wake_monitor.set()
             self._monitor_thread.join(timeout=5)
             self._log("✓ 健康监控已停止", "SUCCESS")
 
@@ -333,9 +883,27 @@ class WebDriverHealthMonitor:
             "last_error": self.state.last_error,
             "session_uptime_seconds": session_uptime,
             "session_uptime_formatted": self._format_uptime(session_uptime),
-            "monitoring_active": self._monitor_thread and self._monitor_thread.is_alive()
+            "monitoring_active": self._monitor_thread and self._monitor_thread.is_alive(),
+            "probe_interval": self.current_interval,
+            "last_suspicion": self.suspicion,
+            "probe_counts": {tier.name: sum(1 for s in self.probe_series.samples if s.tier == tier)
+                             for tier in ProbeTier},
+            "server_latency_trend": self.probe_series.trend(ProbeTier.SERVER),
+            "last_restore": asdict(self.last_restore) if self.last_restore else None,
+            "device_state": (self.device_tracker.state(self._tracked_serial() or "")
+                             if self.device_tracker is not None and self.device_tracker.is_live else None),
+            "standby": self.get_standby_report()
         }
 
+    def get_probe_series(self, tier: Optional[ProbeTier] = None) -> List[Dict[str, Any]]:
+        """
+        探测延迟时间序列（用于趋势预警和绘图）
+
+        Args:
+            tier: 只返回该层级，None为全部
+        """
+        return self.probe_series.to_list(tier)
+
     def _format_uptime(self, seconds: float) -> str:
         """格式化运行时间"""
         hours = int(seconds // 3600)
@@ -355,6 +923,8 @@ class WebDriverHealthMonitor:
 
         # 停止监控
         self.stop_monitoring()
+        if self.device_tracker is not None:
+            self.device_tracker.remove_listener(self._on_device_event)
 
         # 关闭WebDriver
         if self.driver:
@@ -364,6 +934,18 @@ class WebDriverHealthMonitor:
             except:
                 self._log("WebDriver关闭失败（可能已断开）", "WARNING")
 
+        # 关闭热备会话
+        with self._standby_lock:
+            standby = self.standby_driver
+            self.standby_driver = None
+        if standby:
+            self.standby_stats.record_release()
+            try:
+                standby.quit()
+                self._log("✓ 热备会话已关闭", "SUCCESS")
+            except:
+                self._log("热备会话关闭失败（可能已断开）", "WARNING")
+
         self._log("✓ 健康监控器已关闭", "SUCCESS")
 
     def __enter__(self):
@@ -382,6 +964,8 @@ def create_health_monitor(
     server_url: str,
     capabilities: dict,
     logger=None,
+    standby_server_url: Optional[str] = None,
+    standby_capabilities: Optional[dict] = None,
     **monitor_kwargs
 ) -> WebDriverHealthMonitor:
     """
@@ -391,18 +975,36 @@ def create_health_monitor(
         server_url: Appium服务器URL
         capabilities: WebDriver capabilities
         logger: 日志记录器
+        standby_server_url: 热备会话的Appium服务器URL（提供后启用热备）
+        standby_capabilities: 热备会话的capabilities（默认与主会话相同）
         **monitor_kwargs: 传递给WebDriverHealthMonitor的其他参数
+            （未提供device_tracker时使用全局ADB设备跟踪器，传None可关闭）
 
     Returns:
         WebDriverHealthMonitor实例
     """
+    if "device_tracker" not in monitor_kwargs:
+        try:
+            from adb_device_tracker import get_device_tracker
+            monitor_kwargs["device_tracker"] = get_device_tracker()
+        except ImportError:
+            pass
+
     def driver_factory():
         options = AppiumOptions()
         options.load_capabilities(capabilities)
         return webdriver.Remote(server_url, options=options)
 
+    standby_factory = None
+    if standby_server_url:
+        def standby_factory():
+            options = AppiumOptions()
+            options.load_capabilities(standby_capabilities or capabilities)
+            return webdriver.Remote(standby_server_url, options=options)
+
     return WebDriverHealthMonitor(
         driver_factory=driver_factory,
         logger=logger,
+        standby_factory=standby_factory,
         **monitor_kwargs
     )
@@ -33,10 +33,25 @@ if ADB_PATH.exists():
 
 from damai_appium.damai_app_v2 import DamaiBot, BotLogger
 from damai_appium.fast_grabber import FastGrabber, GrabConfig
-from environment_checker import EnvironmentChecker, EnvironmentFixer, CheckResult
-from smart_wait import SmartWait, ParallelPopupHandler, PerformanceMonitor
+from damai_appium.async_driver import gather_state_sync
+from damai_appium.snapshot_service import get_snapshot_service
+from damai_appium.command_scheduler import CommandPriority, set_thread_priority, get_command_scheduler
+from damai_appium.sleep_accounting import accounted_sleep, get_sleep_accountant
+from damai_appium.trace_events import get_trace_recorder
+from damai_appium.clock_sync import DeviceClockCalibrator
+from damai_appium.countdown_timer import (
+    CountdownManager, CountdownTimer, CountdownState, parse_datetime, format_time_delta
+)
+from damai_appium.activity_restore import capture_activity_state, restore_activity_state
+from damai_appium.retry_policy import get_retry_policy, get_retry_stats, clamp_timeout, remaining_time
+from damai_appium.recovery_planner import (RecoveryPlanner, RecoveryAction, ErrorClass, classify_error,
+                                           ALL_ERROR_CLASSES, SESSION_ERROR_CLASSES)
+from environment_checker import EnvironmentChecker, EnvironmentFixer, CheckResult, get_check_cache
+from smart_wait import SmartWait, ParallelPopupHandler, PerformanceMonitor, TimingStore
 from connection_auto_fixer import ConnectionAutoFixer
 from connection_first_aid import ConnectionFirstAid
+from adb_client import get_adb_client
+from adb_device_tracker import get_device_tracker, current_device_states
 
 # 安全的print函数 - 避免Windows GBK编码错误
 def safe_print(msg):
@@ -219,30 +234,29 @@ class SmartAI:
         wait_time = wait if wait is not None else self.retry_config['click_wait']
         max_retries = max_retries if max_retries is not None else self.retry_config['max_click_retries']
 
-        for attempt in range(max_retries):
-            try:
-                if attempt > 0 and log_func:
-                    log_func(f"重试点击 {coord_name} (第 {attempt + 1}/{max_retries} 次)", "RETRY")
-                else:
-                    if log_func:
-                        log_func(f"点击稳定坐标: {coord_name} ({x}, {y})", "INFO")
+        policy = get_retry_policy("click", log_func=(lambda msg: log_func(msg, "RETRY")) if log_func else None)
+        policy.default.max_attempts = max_retries
+        with policy.session(f"click_stable_coord.{coord_name}") as retry:
+            while True:
+                try:
+                    if retry.attempt > 1 and log_func:
+                        log_func(f"重试点击 {coord_name} (第 {retry.attempt}/{max_retries} 次)", "RETRY")
+                    else:
+                        if log_func:
+                            log_func(f"点击稳定坐标: {coord_name} ({x}, {y})", "INFO")
 
-                driver.tap([(x, y)])
-                time.sleep(wait_time)
-                return True
+                    driver.tap([(x, y)])
+                    # 点击后的等待不超过调用方剩余时间
+                    accounted_sleep(clamp_timeout(wait_time))
+                    return True
 
-            except Exception as e:
-                if log_func:
-                    log_func(f"点击失败: {e}", "WARNING")
-                if attempt < max_retries - 1:
-                    time.sleep(1)  # 重试前等待1秒
-                    continue
-                else:
+                except Exception as e:
                     if log_func:
-                        log_func(f"点击 {coord_name} 最终失败", "ERROR")
-                    return False
-
-        return False
+                        log_func(f"点击失败: {e}", "WARNING")
+                    if not retry.backoff(e):
+                        if log_func:
+                            log_func(f"点击 {coord_name} 最终失败", "ERROR")
+                        return False
 
     def input_text_safe(self, driver, text: str, wait: float = 1, log_func=None) -> bool:
         """安全输入文本 (来自 DamaiTicketBot)
@@ -265,7 +279,7 @@ class SmartAI:
             if active:
                 active.clear()  # 先清空
                 active.send_keys(text)
-                time.sleep(wait)
+                accounted_sleep(wait)
                 if log_func:
                     log_func(f"文本输入成功: {text}", "SUCCESS")
                 return True
@@ -295,7 +309,8 @@ class SmartAI:
                 return []
 
             safe_print(f"[OCR] 开始识别图像 ({img_array.shape})...")
-            result = ocr.predict(img_array)
+            with get_trace_recorder().span("OCR识别", "ocr", shape=str(img_array.shape)):
+                result = ocr.predict(img_array)
             safe_print(f"[OCR] 识别完成,结果类型: {type(result)}")
 
             # 提取文字和位置 (适配新版API) - 增强错误处理
@@ -560,9 +575,21 @@ class SmartAIGUI:
         self.coordinates = {}  # 坐标配置
 
         # 智能优化模块
-        self.smart_wait = SmartWait()
-        self.performance_monitor = PerformanceMonitor(log_func=self.log)
+        # 步骤耗时持久化,连接设备后按设备/网络环境加载历史数据
+        self.timing_store = TimingStore()
+        self.smart_wait = SmartWait(timing_store=self.timing_store)
+        self.performance_monitor = PerformanceMonitor(log_func=self.log, timing_store=self.timing_store,
+                                                      smart_wait=self.smart_wait)
         self.popup_handler = None  # 弹窗处理器(连接后初始化)
+        self.clock_calibrator = None  # 设备时钟校准(连接后初始化,倒计时目标按其偏差修正)
+        # 定时抢票倒计时(跟随设备时钟校准结果修正目标时刻)
+        self.countdown_manager = CountdownManager(
+            max_updates_per_second=2,
+            on_countdown_update=lambda values: self.root.after(0, self._update_countdown_label, values))
+        self.watched_serial = None  # 已连接设备的序列号(ADB设备跟踪推送其状态变化)
+        self.recovery_planner = self._build_recovery_planner()  # 错误恢复动作按实测成本排序
+        self.last_recovery = None  # 最近一次会话恢复结果
+        self._recovery_page_state = None  # 本次恢复中记录的掉线前页面
 
         # 设备管理器
         from damai_appium.device_manager import DeviceManager
@@ -601,6 +628,7 @@ class SmartAIGUI:
         self.click_interval = tk.DoubleVar(value=0.1)
         self.max_clicks = tk.IntVar(value=100)
         self.page_check_interval = tk.IntVar(value=5)
+        self.open_time_var = tk.StringVar(value="")  # 定时抢票的开票时间(设备时钟)
 
         # 坐标选择模式
         self.coord_picking_mode = None  # 当前正在选择的坐标类型
@@ -810,6 +838,10 @@ class SmartAIGUI:
         self.status_label = tk.Label(conn_frame, text="● 未连接", fg="gray", font=("微软雅黑", 9, "bold"))
         self.status_label.grid(row=4, column=0, columnspan=4, pady=(8, 0))
 
+        # 设备时钟偏差
+        self.clock_offset_label = ttk.Label(conn_frame, text="设备时钟: 未校准", foreground="gray", font=("微软雅黑", 8))
+        self.clock_offset_label.grid(row=5, column=0, columnspan=4)
+
         # AI配置
         ai_frame = ttk.LabelFrame(middle_frame, text="AI配置", padding="10")
         ai_frame.pack(fill=tk.X, pady=(0, 10))
@@ -930,6 +962,15 @@ class SmartAIGUI:
         ttk.Label(param_row, text="最大:", width=5).pack(side=tk.LEFT, padx=(5,0))
         ttk.Entry(param_row, textvariable=self.max_clicks, width=5).pack(side=tk.LEFT, padx=2)
 
+        # 定时抢票: 到开票时间自动开始阶段二
+        timer_row = ttk.Frame(coords_frame)
+        timer_row.pack(fill=tk.X, pady=2)
+        ttk.Label(timer_row, text="开票:", width=6).pack(side=tk.LEFT)
+        ttk.Entry(timer_row, textvariable=self.open_time_var, width=16).pack(side=tk.LEFT, padx=2)
+        ttk.Button(timer_row, text="⏰定时", command=self.schedule_fast_grab, width=6).pack(side=tk.LEFT, padx=2)
+        self.countdown_label = ttk.Label(coords_frame, text="", foreground="blue")
+        self.countdown_label.pack(fill=tk.X)
+
         # 保存/加载按钮
         save_load_row = ttk.Frame(coords_frame)
         save_load_row.pack(fill=tk.X, pady=2)
@@ -1561,8 +1602,74 @@ class SmartAIGUI:
                     self.start_btn.config(state=tk.NORMAL)
                     self.stop_btn.config(state=tk.DISABLED)
 
+    def _bind_timing_profile(self):
+        """按当前设备和网络环境加载历史步骤耗时"""
+        try:
+            udid = self.bot.driver.capabilities.get('udid', '') or f"127.0.0.1:{self.bot.config.adb_port}"
+            server_url = self.bot.config.server_url
+            location = "local" if ("127.0.0.1" in server_url or "localhost" in server_url) else "remote"
+            transport = "tcp" if ":" in udid else "usb"
+            network = f"{location}-{transport}"
+            self.smart_wait.bind_device(udid, network)
+            self.performance_monitor.bind_device(udid, network)
+        except Exception as e:
+            self.log(f"加载历史耗时失败: {e}", "DEBUG")
+
+    def _start_clock_calibration(self):
+        """后台校准设备时钟偏差，每5分钟刷新"""
+        self._stop_clock_calibration()
+        try:
+            udid = self.bot.driver.capabilities.get('udid', '') or f"127.0.0.1:{self.bot.config.adb_port}"
+        except Exception:
+            return
+        self.clock_calibrator = DeviceClockCalibrator(udid, get_adb_client(ADB_EXE),
+                                                      log_func=lambda msg: self.log(msg, "DEBUG"))
+        self.clock_calibrator.listeners.append(
+            lambda estimate: self.root.after(0, self._update_clock_offset_label, estimate))
+        self.countdown_manager.follow_clock(self.clock_calibrator)
+        self.clock_calibrator.start_auto_refresh(interval=300)
+
+    def _stop_clock_calibration(self):
+        """停止设备时钟校准"""
+        if self.clock_calibrator:
+            self.clock_calibrator.stop()
+            self.clock_calibrator = None
+        self.clock_offset_label.config(text="设备时钟: 未校准", foreground="gray")
+
+    def _watch_device(self):
+        """订阅已连接设备的ADB状态变化（离线/恢复时立即提示）"""
+        try:
+            self.watched_serial = self.bot.driver.capabilities.get('udid', '') or f"127.0.0.1:{self.bot.config.adb_port}"
+        except Exception:
+            return
+        get_device_tracker(get_adb_client(ADB_EXE)).add_listener(self._on_device_event)
+
+    def _unwatch_device(self):
+        """取消设备状态订阅"""
+        self.watched_serial = None
+        get_device_tracker(get_adb_client(ADB_EXE)).remove_listener(self._on_device_event)
+
+    def _on_device_event(self, event):
+        """设备跟踪线程回调，切到主线程写日志"""
+        if event.serial != self.watched_serial:
+            return
+        if event.went_offline:
+            state = event.new_state or "已断开"
+            self.root.after(0, self.log, f"⚠️ ADB设备状态变化: {event.serial} -> {state}", "WARN")
+        elif event.came_online:
+            self.root.after(0, self.log, f"ADB设备已恢复在线: {event.serial}", "OK")
+
+    def _update_clock_offset_label(self, estimate):
+        """显示设备时钟偏差（超过误差范围且大于0.5秒时标红）"""
+        color = "red" if abs(estimate.offset) > max(0.5, estimate.uncertainty) else "green"
+        self.clock_offset_label.config(
+            text=f"设备时钟: {estimate.describe()} ({estimate.measured_at.strftime('%H:%M:%S')})",
+            foreground=color)
+
     def monitor_loop(self):
         """监控循环 - 优化的错误处理"""
+        # 截图监控属于后台命令，抢票阶段暂停
+        set_thread_priority(CommandPriority.BACKGROUND)
         consecutive_errors = 0
         max_consecutive_errors = 5
 
@@ -1580,7 +1687,7 @@ class SmartAIGUI:
                     self.cleanup_memory()
 
                 interval = float(self.interval_var.get())
-                time.sleep(interval)
+                accounted_sleep(interval)
 
             except Exception as e:
                 error_msg = str(e)
@@ -1589,7 +1696,7 @@ class SmartAIGUI:
                 # 忽略临时性错误
                 if "Invalid argument" in error_msg or "Errno 22" in error_msg:
                     # 临时错误,等待后重试
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
                     continue
 
                 self.log(f"监控错误 ({consecutive_errors}/{max_consecutive_errors}): {error_msg}", "WARN")
@@ -1602,7 +1709,7 @@ class SmartAIGUI:
                     self.stop_btn.config(state=tk.DISABLED)
                     break
 
-                time.sleep(1)
+                accounted_sleep(1)
 
     def show_environment_check(self):
         """显示环境检测窗口"""
@@ -1645,8 +1752,8 @@ class SmartAIGUI:
 
         check_btn = ttk.Button(
             btn_frame,
-            text="开始检测",
-            command=lambda: self.run_environment_check(result_text),
+            text="重新检测",
+            command=lambda: self.run_environment_check(result_text, use_cache=False),
             width=15
         )
         check_btn.pack(side=tk.LEFT, padx=(0, 10))
@@ -1667,48 +1774,55 @@ class SmartAIGUI:
         )
         close_btn.pack(side=tk.RIGHT)
 
-        # 自动开始检测
-        env_window.after(500, lambda: self.run_environment_check(result_text))
+        # 自动开始检测（有缓存时立即显示）
+        env_window.after(0, lambda: self.run_environment_check(result_text))
 
-    def run_environment_check(self, result_text):
-        """执行环境检测"""
+    def run_environment_check(self, result_text, use_cache=True):
+        """执行环境检测（结果逐项显示，未过期的检测项直接使用缓存）"""
         result_text.delete(1.0, tk.END)
         result_text.insert(tk.END, "=" * 70 + "\n")
-        result_text.insert(tk.END, "开始环境检测...\n")
+        result_text.insert(tk.END, "开始环境检测...\n" if use_cache else "重新检测全部项目...\n")
         result_text.insert(tk.END, "=" * 70 + "\n\n")
 
-        def do_check():
-            try:
-                checker = EnvironmentChecker()
-                results = checker.check_all()
+        # 状态映射
+        status_symbols = {
+            'ok': '[OK]',
+            'warning': '[WARN]',
+            'error': '[ERROR]'
+        }
 
-                # 状态映射
-                status_symbols = {
-                    'ok': '[OK]',
-                    'warning': '[WARN]',
-                    'error': '[ERROR]'
-                }
+        def show_result(name, result, cached):
+            symbol = status_symbols.get(result.status, '[?]')
+            source = " (缓存)" if cached else ""
+            result_text.insert(tk.END, f"\n{symbol} [{name.upper()}]{source}\n")
+            result_text.insert(tk.END, f"  状态: {result.status.upper()}\n")
+            result_text.insert(tk.END, f"  信息: {result.message}\n")
 
-                def update_ui():
-                    for name, result in results.items():
-                        symbol = status_symbols.get(result.status, '[?]')
-                        result_text.insert(tk.END, f"\n{symbol} [{name.upper()}]\n")
-                        result_text.insert(tk.END, f"  状态: {result.status.upper()}\n")
-                        result_text.insert(tk.END, f"  信息: {result.message}\n")
+            if result.details:
+                result_text.insert(tk.END, f"  详情:\n")
+                for line in result.details.split('\n'):
+                    result_text.insert(tk.END, f"    {line}\n")
 
-                        if result.details:
-                            result_text.insert(tk.END, f"  详情:\n")
-                            for line in result.details.split('\n'):
-                                result_text.insert(tk.END, f"    {line}\n")
+            if result.fix_available:
+                result_text.insert(tk.END, f"  修复建议: {result.fix_action}\n")
 
-                        if result.fix_available:
-                            result_text.insert(tk.END, f"  修复建议: {result.fix_action}\n")
+            result_text.insert(tk.END, "\n")
 
-                        result_text.insert(tk.END, "\n")
+        def do_check():
+            try:
+                checker = EnvironmentChecker()
+                started = time.time()
+                results = checker.check_all(
+                    use_cache=use_cache,
+                    on_result=lambda name, result, cached: self.root.after(
+                        0, lambda: show_result(name, result, cached))
+                )
+                elapsed = time.time() - started
 
+                def show_summary():
                     # 总结
                     result_text.insert(tk.END, "=" * 70 + "\n")
-                    result_text.insert(tk.END, "检测完成！\n")
+                    result_text.insert(tk.END, f"检测完成！耗时 {elapsed:.1f}秒\n")
 
                     error_count = sum(1 for r in results.values() if r.status == 'error')
                     warning_count = sum(1 for r in results.values() if r.status == 'warning')
@@ -1720,8 +1834,8 @@ class SmartAIGUI:
                     # 滚动到顶部
                     result_text.see(1.0)
 
-                # 使用after在主线程中更新UI
-                self.root.after(0, update_ui)
+                # 使用after在主线程中更新UI（排在各项结果之后）
+                self.root.after(0, show_summary)
 
             except Exception as e:
                 def show_error():
@@ -1786,6 +1900,9 @@ class SmartAIGUI:
                     else:
                         result_text.insert(tk.END, "  [OK] UiAutomator2已安装\n")
 
+                # 修复可能改变了环境状态，下次检测全部重新执行
+                get_check_cache().invalidate()
+
                 result_text.insert(tk.END, "\n" + "=" * 70 + "\n")
                 result_text.insert(tk.END, "修复完成！\n")
                 result_text.insert(tk.END, "建议重新运行环境检测确认状态\n")
@@ -1809,6 +1926,7 @@ class SmartAIGUI:
                 # 使用新的自动修复WebDriver功能
                 self.log("[自动修复] 执行完整的环境诊断和修复...", "STEP")
                 success, msg, results = fixer.auto_fix_webdriver()
+                get_check_cache().invalidate()
 
                 # 显示详细结果
                 self.log("="*60, "STEP")
@@ -1933,22 +2051,13 @@ class SmartAIGUI:
 
         def do_detect():
             try:
-                import subprocess
-
                 # 获取所有已连接的ADB设备
-                result = subprocess.run(f'"{ADB_EXE}" devices', capture_output=True, text=True, shell=True, timeout=5)
-                lines = result.stdout.strip().split('\n')[1:]  # 跳过第一行标题
-
                 detected_devices = []
-                for line in lines:
-                    if line.strip() and '\t' in line:
-                        device_id = line.split('\t')[0].strip()
-                        status = line.split('\t')[1].strip()
-
-                        # 只记录正常连接的设备
-                        if status == "device" and "127.0.0.1:" in device_id:
-                            port = device_id.split(':')[1]
-                            detected_devices.append(port)
+                for device_id, status in current_device_states(get_adb_client(ADB_EXE), timeout=5).items():
+                    # 只记录正常连接的设备
+                    if status == "device" and "127.0.0.1:" in device_id:
+                        port = device_id.split(':')[1]
+                        detected_devices.append(port)
 
                 if detected_devices:
                     # 使用第一个检测到的端口
@@ -1989,7 +2098,7 @@ class SmartAIGUI:
                         self.log("检测到旧连接,正在清理...", "INFO")
                         self.bot.driver.quit()
                         self.log("旧连接已清理", "OK")
-                        time.sleep(1)  # 等待完全释放
+                        accounted_sleep(1)  # 等待完全释放
                     except Exception as e:
                         self.log(f"清理旧连接警告: {e}", "WARN")
                 self.bot = None
@@ -2076,22 +2185,11 @@ class SmartAIGUI:
                 for verify_attempt in range(3):
                     if verify_attempt > 0:
                         self.log(f"  - 设备验证重试 {verify_attempt + 1}/3...", "DEBUG")
-                        time.sleep(1)
+                        accounted_sleep(1)
 
                     try:
-                        verify_result = subprocess.run(
-                            f'"{ADB_EXE}" devices',
-                            capture_output=True,
-                            text=True,
-                            shell=True,
-                            timeout=5
-                        )
-
-                        if verify_result.returncode == 0 and verify_result.stdout:
-                            for line in verify_result.stdout.splitlines():
-                                if device_address in line and "device" in line and "offline" not in line:
-                                    device_found = True
-                                    break
+                        states = current_device_states(get_adb_client(ADB_EXE), timeout=5)
+                        device_found = states.get(device_address) == "device"
 
                         if device_found:
                             break
@@ -2114,7 +2212,7 @@ class SmartAIGUI:
                 for retry_count in range(max_retries):
                     if retry_count > 0:
                         self.log(f"  第 {retry_count + 1}/{max_retries} 次尝试...", "INFO")
-                        time.sleep(retry_delay)
+                        accounted_sleep(retry_delay)
 
                     bot_creation_result = [None, None]  # [bot实例, 错误信息]
 
@@ -2167,6 +2265,9 @@ class SmartAIGUI:
 
                     # 成功创建
                     self.bot = bot_creation_result[0]
+                    self._bind_timing_profile()
+                    self._start_clock_calibration()
+                    self._watch_device()
                     break
 
                 connect_time = time.time() - start_time
@@ -2245,7 +2346,7 @@ class SmartAIGUI:
 
                     try:
                         # DamaiBot已经清理了服务器，等待一下
-                        time.sleep(1)
+                        accounted_sleep(1)
                         self.log("UiAutomator2服务器已清理完成", "OK")
                         self.log("提示: 请再次点击'连接设备'按钮重试", "INFO")
                         self.log("如果持续失败，请尝试:", "INFO")
@@ -2277,7 +2378,7 @@ class SmartAIGUI:
         # 停止监控
         if self.running:
             self.running = False
-            time.sleep(0.5)
+            accounted_sleep(0.5)
 
         # 停止弹窗处理器
         if self.popup_handler:
@@ -2288,6 +2389,10 @@ class SmartAIGUI:
                 self.log(f"停止弹窗处理器失败: {e}", "WARN")
             self.popup_handler = None
 
+        # 停止时钟校准和设备状态订阅
+        self._stop_clock_calibration()
+        self._unwatch_device()
+
         # 关闭连接 - 强化清理逻辑
         if self.bot and self.bot.driver:
             try:
@@ -2437,6 +2542,12 @@ class SmartAIGUI:
     def stop_grab_ticket(self):
         """停止抢票"""
         self.grabbing = False
+        timer = self.countdown_manager.get_timer(self.FAST_GRAB_TIMER)
+        if timer:
+            pending = timer.state in (CountdownState.WAITING, CountdownState.PREPARING)
+            self.countdown_manager.remove_timer(self.FAST_GRAB_TIMER)
+            if pending:
+                self.countdown_label.config(text="定时抢票已取消")
         self.grab_btn.config(state=tk.NORMAL)
         self.stop_grab_btn.config(state=tk.DISABLED)
         self.log("="*60, "WARN")
@@ -2459,6 +2570,16 @@ class SmartAIGUI:
         self.grabbing = True
 
         def do_grab():
+            # 导航阶段后台弹窗检测照常运行；从点击购票开始进入抢票阶段(本线程命令优先，后台轮询暂停)
+            scheduler = get_command_scheduler()
+            in_grab_phase = False
+            # 统计本次抢票流程中的固定等待
+            sleep_accountant = get_sleep_accountant()
+            sleep_accountant.begin_run("抢票流程")
+            # 时间线从本次抢票开始记录，结束后导出
+            trace_recorder = get_trace_recorder()
+            trace_recorder.reset()
+            grab_started = time.perf_counter()
             try:
                 city = self.city_var.get()
                 show_name = self.show_name_var.get()
@@ -2479,7 +2600,7 @@ class SmartAIGUI:
                 try:
                     driver.terminate_app("cn.damai")
                     self.log("  √ 大麦App已关闭", "SUCCESS")
-                    time.sleep(1)  # 等待App完全关闭
+                    accounted_sleep(1)  # 等待App完全关闭
                 except Exception as e:
                     self.log(f"  ! 关闭App失败(可能未运行): {e}", "DEBUG")
 
@@ -2497,7 +2618,9 @@ class SmartAIGUI:
 
                 # 第三步: 等待App完全加载
                 self.log("[3/3] 等待大麦App完全加载...", "INFO")
-                time.sleep(5)
+                accounted_sleep(5, "等待大麦App完全加载", condition=lambda: any(
+                    kw in get_snapshot_service(driver).peek(max_age=0.5).page_source for kw in ('首页', 'tab_home')
+                ), probe_interval=0.5)
                 self.log("[OK] 大麦App重启完成,已进入首页", "SUCCESS")
                 self.performance_monitor.end_step("启动App", step0_start, success=True)
 
@@ -2529,7 +2652,7 @@ class SmartAIGUI:
                         try:
                             driver.execute_script("mobile: clickGesture", {"x": 650, "y": 120})
                             self.log("[OK] 使用坐标关闭弹窗成功: (650, 120)", "SUCCESS")
-                            time.sleep(1)
+                            accounted_sleep(1)
                         except Exception as e:
                             self.log(f"坐标关闭失败,尝试其他方式: {e}", "DEBUG")
                             # 方式2: 调用通用弹窗处理
@@ -2564,7 +2687,7 @@ class SmartAIGUI:
 
                 # 验证: 城市切换后检查弹窗
                 self._check_and_handle_popup(driver)
-                time.sleep(0.5)
+                accounted_sleep(0.5)
                 self.performance_monitor.end_step("城市切换", step2_start, success=city_success)
 
                 # 检查是否被停止
@@ -2598,7 +2721,7 @@ class SmartAIGUI:
                 self._input_and_search(driver, keyword)
 
                 # ✨ 优化: 等待搜索结果加载 (2秒 → 1秒)
-                time.sleep(1)
+                accounted_sleep(1)
                 self.log("[OK] 搜索完成,等待结果加载", "OK")
                 self.performance_monitor.end_step("搜索演出", step4_start, success=True)
 
@@ -2616,7 +2739,7 @@ class SmartAIGUI:
                 self._click_first_search_result(driver)
 
                 # ✨ 优化: 等待页面加载 (2秒 → 1秒)
-                time.sleep(1)
+                accounted_sleep(1)
                 self._check_and_handle_popup(driver)
                 self.performance_monitor.end_step("进入列表页", step5_start, success=True)
 
@@ -2634,7 +2757,7 @@ class SmartAIGUI:
                 self._click_first_show_in_list(driver, show_name)
 
                 # ✨ 优化: 等待详情页加载 (2秒 → 1秒)
-                time.sleep(1)
+                accounted_sleep(1)
                 self._check_and_handle_popup(driver)
                 self.log("[OK] 已进入演出详情页", "OK")
                 self.performance_monitor.end_step("进入详情页", step6_start, success=True)
@@ -2651,7 +2774,7 @@ class SmartAIGUI:
                 self.log("[步骤6.5] 点击票档和场次选择入口", "STEP")
                 step6_5_start = self.performance_monitor.start_step("进入票档选择")
                 self._click_ticket_entry(driver)
-                time.sleep(1)
+                accounted_sleep(1)
                 self._check_and_handle_popup(driver)
                 self.log("[OK] 已进入票档和场次选择页面", "OK")
                 self.performance_monitor.end_step("进入票档选择", step6_5_start, success=True)
@@ -2666,12 +2789,15 @@ class SmartAIGUI:
                 # 步骤7: 点击立即购票
                 self.log("="*60, "STEP")
                 self.log("[步骤7] 点击立即购票", "STEP")
+                scheduler.begin_grab()
+                in_grab_phase = True
+                set_thread_priority(CommandPriority.GRAB_CRITICAL)
                 step7_start = self.performance_monitor.start_step("点击购票")
                 self._click_buy_button(driver)
 
                 # ✨ 优化: 等待进入场次/票档页面 (3秒 → 1.5秒)
                 self.log("提示: 如果出现滑块验证,请手动完成", "WARNING")
-                time.sleep(3)  # 等待滑块验证 + 页面加载
+                accounted_sleep(3)  # 等待滑块验证 + 页面加载
 
                 # 检查弹窗（滑块验证后可能出现弹窗）
                 self._check_and_handle_popup(driver)
@@ -2707,7 +2833,7 @@ class SmartAIGUI:
                     step9_start = self.performance_monitor.start_step("排队重试")
 
                     # ✨ 优化: 等待页面加载 (2秒 → 1秒)
-                    time.sleep(1)
+                    accounted_sleep(1)
 
                     # 调用优化后的排队重试方法
                     retry_success = self._handle_queue_retry(driver, max_retries=200)
@@ -2750,6 +2876,19 @@ class SmartAIGUI:
                 return  # 不恢复按钮
 
             finally:
+                if in_grab_phase:
+                    scheduler.end_grab()
+                    set_thread_priority(CommandPriority.INTERACTIVE)
+                scheduler.log_report(lambda msg: self.log(msg, "INFO"))
+                sleep_accountant.print_report(lambda msg: self.log(msg, "INFO"),
+                                              thread=threading.current_thread().name)
+                trace_recorder.complete("抢票流程", "step", grab_started, time.perf_counter() - grab_started)
+                try:
+                    trace_file = Path(__file__).parent / "traces" / f"grab_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+                    self.log(f"时间线已导出: {trace_recorder.export(trace_file)} (可用 ui.perfetto.dev 打开)", "INFO")
+                except Exception as e:
+                    self.log(f"时间线导出失败: {e}", "DEBUG")
+
                 # 恢复按钮状态
                 self.grabbing = False
                 self.grab_btn.config(state=tk.NORMAL)
@@ -2862,6 +3001,30 @@ class SmartAIGUI:
 
         threading.Thread(target=navigate_task, daemon=True).start()
 
+    FAST_GRAB_TIMER = "定时抢票"
+    GRAB_PREPARE_SECONDS = 30  # 开票前多少秒开始预热
+    GRAB_PREPARE_MARGIN = 3  # 预热须在开票前至少留出的余量（秒）
+
+    def _build_grab_config(self):
+        """按界面上的坐标和参数创建抢票配置"""
+        return GrabConfig(
+            session_x=self.grab_coords["session_x"].get(),
+            session_y=self.grab_coords["session_y"].get(),
+            price_x=self.grab_coords["price_x"].get(),
+            price_y=self.grab_coords["price_y"].get(),
+            buy_x=self.grab_coords["buy_x"].get(),
+            buy_y=self.grab_coords["buy_y"].get(),
+            click_interval=self.click_interval.get(),
+            max_clicks=self.max_clicks.get(),
+            page_check_interval=self.page_check_interval.get()
+        )
+
+    def _ensure_fast_grabber(self):
+        """FastGrabber与当前driver绑定(会话重建后重新创建)"""
+        if not self.fast_grabber or self.fast_grabber.driver is not self.bot.driver:
+            self.fast_grabber = FastGrabber(self.bot.driver, logger=BotLogger)
+        return self.fast_grabber
+
     def start_fast_grab(self):
         """阶段二：开始快速抢票"""
         if not self.bot or not self.bot.driver:
@@ -2872,65 +3035,107 @@ class SmartAIGUI:
             self.log("正在执行任务，请等待完成", "WARNING")
             return
 
+        config = self._build_grab_config()
+        threading.Thread(target=self._run_fast_grab, args=(config,), daemon=True).start()
+
+    def schedule_fast_grab(self):
+        """定时抢票：开票时间(设备时钟)到达时自动执行阶段二"""
+        if not self.bot or not self.bot.driver:
+            self.log("请先连接设备!", "ERROR")
+            return
+
+        target = parse_datetime(self.open_time_var.get().strip())
+        if target is None:
+            self.log("开票时间格式错误(如 2025-12-31 20:00:00 或 20:00)", "ERROR")
+            return
+
+        config = self._build_grab_config()
+        timer = CountdownTimer(
+            target,
+            prepare_seconds=self.GRAB_PREPARE_SECONDS,
+            on_prepare=lambda: self._prepare_fast_grab(config, timer),
+            on_start=lambda: self._run_fast_grab(config),
+            on_complete=lambda: self.root.after(0, self.countdown_label.config, {"text": ""})
+        )
+        # 加入管理器时按最近一次设备时钟校准结果修正目标时刻
+        self.countdown_manager.add_timer(self.FAST_GRAB_TIMER, timer)
+        if timer.start():
+            self.stop_grab_btn.config(state=tk.NORMAL)
+            self.log(f"已设定定时抢票: {target.strftime('%Y-%m-%d %H:%M:%S')} "
+                     f"(设备时钟偏差 {timer.clock_offset * 1000:+.0f}ms)", "OK")
+
+    def _prepare_fast_grab(self, config, timer):
+        """准备阶段：预热页面、坐标、动作计划和OCR，开票时start_grab直接使用"""
+        if self.grabbing:
+            return
+        budget = timer.get_remaining_time().total_seconds() - self.GRAB_PREPARE_MARGIN
+        if budget <= 0:
+            self.log("距开票不足，跳过预热", "WARNING")
+            return
+        try:
+            report = self._ensure_fast_grabber().prepare(config, ocr_loader=get_ocr, budget=budget)
+        except Exception as e:
+            self.log(f"预热出错: {e}", "WARNING")
+            return
+        level = "OK" if report.go else "WARNING"
+        for line in report.lines():
+            self.log(line, level)
+
+    def _update_countdown_label(self, values):
+        """显示定时抢票剩余时间"""
+        remaining = values.get(self.FAST_GRAB_TIMER)
+        if remaining is not None:
+            self.countdown_label.config(text=f"距开票: {format_time_delta(remaining)}")
+
+    def _run_fast_grab(self, config):
+        """执行阶段二快速抢票(手动开始或定时触发)"""
+        if self.grabbing:
+            self.log("正在执行任务，跳过本次抢票", "WARNING")
+            return
+
         self.grabbing = True
         self.grab_btn.config(state=tk.DISABLED)
         self.stop_grab_btn.config(state=tk.NORMAL)
         self.navigate_btn.config(state=tk.DISABLED)
 
-        def grab_task():
-            try:
-                # 初始化FastGrabber
-                if not self.fast_grabber:
-                    self.fast_grabber = FastGrabber(self.bot.driver, logger=BotLogger)
-
-                # 创建配置
-                config = GrabConfig(
-                    session_x=self.grab_coords["session_x"].get(),
-                    session_y=self.grab_coords["session_y"].get(),
-                    price_x=self.grab_coords["price_x"].get(),
-                    price_y=self.grab_coords["price_y"].get(),
-                    buy_x=self.grab_coords["buy_x"].get(),
-                    buy_y=self.grab_coords["buy_y"].get(),
-                    click_interval=self.click_interval.get(),
-                    max_clicks=self.max_clicks.get(),
-                    page_check_interval=self.page_check_interval.get()
-                )
-
-                self.log("=" * 60, "STEP")
-                self.log("阶段二：快速抢票", "STEP")
-                self.log("=" * 60, "STEP")
+        try:
+            grabber = self._ensure_fast_grabber()
 
-                # 执行快速抢票
-                success, message = self.fast_grabber.start_grab(
-                    config,
-                    on_progress=lambda msg: self.log(msg, "INFO")
-                )
+            self.log("=" * 60, "STEP")
+            self.log("阶段二：快速抢票", "STEP")
+            self.log("=" * 60, "STEP")
 
-                if success:
-                    self.log("=" * 60, "SUCCESS")
-                    self.log("🎉 抢票成功！页面已变化", "SUCCESS")
-                    self.log(message, "SUCCESS")
-                    self.log("=" * 60, "SUCCESS")
-                else:
-                    self.log("=" * 60, "WARNING")
-                    self.log("⚠ 抢票未完成", "WARNING")
-                    self.log(message, "WARNING")
-                    self.log("=" * 60, "WARNING")
+            # 执行快速抢票
+            success, message = grabber.start_grab(
+                config,
+                on_progress=lambda msg: self.log(msg, "INFO")
+            )
 
-                # 打印统计
-                self.fast_grabber.print_statistics()
+            if success:
+                self.log("=" * 60, "SUCCESS")
+                self.log("🎉 抢票成功！页面已变化", "SUCCESS")
+                self.log(message, "SUCCESS")
+                self.log("=" * 60, "SUCCESS")
+            else:
+                self.log("=" * 60, "WARNING")
+                self.log("⚠ 抢票未完成", "WARNING")
+                self.log(message, "WARNING")
+                self.log("=" * 60, "WARNING")
 
-            except Exception as e:
-                self.log(f"✗ 抢票出错: {e}", "ERROR")
-                import traceback
-                self.log(traceback.format_exc(), "ERROR")
-            finally:
-                self.grabbing = False
-                self.grab_btn.config(state=tk.NORMAL)
-                self.stop_grab_btn.config(state=tk.DISABLED)
-                self.navigate_btn.config(state=tk.NORMAL)
+            # 打印统计
+            grabber.print_statistics()
+            if get_retry_stats().sites:
+                get_retry_stats().print_report(lambda msg: self.log(msg, "INFO"))
 
-        threading.Thread(target=grab_task, daemon=True).start()
+        except Exception as e:
+            self.log(f"✗ 抢票出错: {e}", "ERROR")
+            import traceback
+            self.log(traceback.format_exc(), "ERROR")
+        finally:
+            self.grabbing = False
+            self.grab_btn.config(state=tk.NORMAL)
+            self.stop_grab_btn.config(state=tk.DISABLED)
+            self.navigate_btn.config(state=tk.NORMAL)
 
     # ========== 会话管理和错误恢复 ==========
 
@@ -2938,6 +3143,11 @@ class SmartAIGUI:
         """
         通用错误处理包装器 - 为所有操作提供统一的错误处理、重试和超时控制
 
+        会话级错误走_recover_session后重试原操作;页面级错误每次由恢复规划器执行一个尚未试过的恢复动作,
+        再回到循环重新执行原操作作为验证(计入重试次数,不占用规划器的恢复锁),结果反馈给规划器。
+        恢复动作用完后按普通重试继续,直到重试次数或时间用完。
+        timeout作为截止时间向内传递:func内部的重试、等待和恢复动作都不会超出剩余时间
+
         Args:
             func: 要执行的函数
             func_name: 操作名称(用于日志)
@@ -2948,238 +3158,320 @@ class SmartAIGUI:
         Returns:
             函数执行结果,或None(如果allow_fail=True且失败)
         """
-        start_time = time.time()
-        retry_count = 0
-        last_error = None
-
-        while retry_count < max_retries:
-            try:
-                # 检查超时
-                elapsed = time.time() - start_time
-                if elapsed > timeout:
-                    raise TimeoutError(f"{func_name}超时({timeout}秒)")
-
-                # 执行函数
-                result = func()
-
-                # 成功
-                if retry_count > 0:
-                    self.log(f"  [OK] {func_name}成功 (重试{retry_count}次后)", "OK")
+        outcome = None  # 上一次恢复的结果,重试后反馈给规划器
+        tried_actions = set()  # 本次操作已执行过的页面级恢复动作
+        policy = get_retry_policy("operation", log_func=lambda msg: self.log(f"  {msg}", "DEBUG"))
+        policy.default.max_attempts = max_retries
 
-                return result
-
-            except Exception as e:
-                last_error = e
-                error_msg = str(e)
-                retry_count += 1
+        with policy.session(f"with_error_handling.{func_name}", timeout=timeout) as retry:
+            while True:
+                try:
+                    # 执行函数
+                    result = func()
+                    if outcome:
+                        self.recovery_planner.confirm(outcome, True)
 
-                # 记录错误
-                self.log(f"  {func_name}失败 (尝试 {retry_count}/{max_retries}): {error_msg[:150]}", "WARN")
+                    # 成功
+                    if retry.attempt > 1:
+                        self.log(f"  [OK] {func_name}成功 (重试{retry.attempt - 1}次后)", "OK")
 
-                # 判断是否需要会话恢复
-                need_session_recovery = (
-                    "instrumentation process is not running" in error_msg or
-                    "probably crashed" in error_msg or
-                    "Session" in error_msg
-                )
+                    return result
 
-                if need_session_recovery:
-                    self.log(f"  检测到会话错误,尝试恢复...", "WARN")
-                    if self._recover_session(error_msg):
-                        self.log(f"  会话恢复成功,继续重试{func_name}", "OK")
-                        time.sleep(1)
-                        continue
-                    else:
+                except Exception as e:
+                    error_msg = str(e)
+                    if outcome:
+                        self.recovery_planner.confirm(outcome, False)
+                        outcome = None
+
+                    # 记录错误
+                    self.log(f"  {func_name}失败 (尝试 {retry.attempt}/{max_retries}): {error_msg[:150]}", "WARN")
+
+                    if not retry.backoff(e):
+                        # 达到最大重试次数或超时
+                        reason = f"超时({timeout}秒)" if retry.exhausted == "budget" else f"重试{retry.attempt}次"
+                        if allow_fail:
+                            self.log(f"  {func_name}失败({reason}),跳过", "ERROR")
+                            return None
+                        raise Exception(f"{func_name}失败({reason}): {error_msg}")
+
+                    error_class = classify_error(e)
+                    if error_class in SESSION_ERROR_CLASSES:
+                        self.log(f"  检测到会话错误,尝试恢复...", "WARN")
+                        if self._recover_session(error_msg):
+                            outcome = self.last_recovery
+                            self.log(f"  已恢复,继续重试{func_name}", "OK")
+                            continue
                         if not allow_fail:
                             raise Exception(f"{func_name}失败: 会话恢复失败")
-                        else:
-                            self.log(f"  会话恢复失败,跳过{func_name}", "ERROR")
-                            return None
-
-                # 普通错误重试
-                if retry_count < max_retries:
-                    wait_time = min(retry_count * 2, 5)  # 指数退避,最多5秒
-                    self.log(f"  等待{wait_time}秒后重试...", "INFO")
-                    time.sleep(wait_time)
-                else:
-                    # 达到最大重试次数
-                    if allow_fail:
-                        self.log(f"  {func_name}失败,已达最大重试次数,跳过", "ERROR")
+                        self.log(f"  会话恢复失败,跳过{func_name}", "ERROR")
                         return None
-                    else:
-                        raise Exception(f"{func_name}失败(重试{max_retries}次): {error_msg}")
 
-        # 不应该到这里,但保险起见
-        if not allow_fail:
-            raise last_error if last_error else Exception(f"{func_name}失败")
-        return None
+                    # 页面级错误:执行下一个恢复动作,回到循环开头重新执行原操作作为验证
+                    recovery = self.recovery_planner.recover(error_msg, error_class=error_class,
+                                                             budget=retry.remaining(), exclude=tried_actions)
+                    tried_actions.update(name for name, _, _ in recovery.steps)
+                    if recovery.success:
+                        outcome = recovery
+                        self.log(f"  已执行恢复动作({self.recovery_planner.actions[recovery.action].label}),"
+                                 f"重试{func_name}", "INFO")
+                    elif recovery.steps:
+                        self.log(f"  恢复动作均无效,继续重试{func_name}", "WARN")
 
     def _recover_session(self, error_msg=""):
-        """会话恢复机制 - 检测错误并尝试自动恢复（增强版 - 支持ADB重连）"""
+        """
+        会话恢复机制 - 检测错误并按成本从低到高逐级恢复
+
+        恢复动作及其顺序由恢复规划器决定(重新探测、重连ADB、重建会话、重启UiAutomator2、重启App等),
+        顺序随各动作在该类错误下的实测耗时和成功率自动调整
+        """
+        drop_time = time.time()
         self.log("="*60, "WARN")
         self.log("检测到会话错误,尝试自动恢复...", "WARN")
 
-        # 检测错误类型
-        is_instrumentation_crash = "instrumentation process is not running" in error_msg or "probably crashed" in error_msg
-        is_session_error = "WebDriver" in error_msg or "Session" in error_msg
-        is_connection_error = "connection" in error_msg.lower() or "timeout" in error_msg.lower()
-        is_device_not_found = "Could not find a connected Android device" in error_msg
-
-        if is_device_not_found:
-            self.log("错误类型: ADB设备未找到或断开连接", "WARN")
-        elif is_instrumentation_crash:
-            self.log("错误类型: UiAutomator2进程崩溃", "WARN")
-        elif is_session_error:
-            self.log("错误类型: WebDriver会话错误", "WARN")
-        elif is_connection_error:
-            self.log("错误类型: 连接超时或断开", "WARN")
-        else:
-            self.log(f"错误类型: 未知 - {error_msg[:100]}", "WARN")
+        error_class = classify_error(error_msg)
+        labels = {
+            ErrorClass.DEVICE_OFFLINE: "ADB设备未找到或断开连接",
+            ErrorClass.UIA2_CRASH: "UiAutomator2进程崩溃",
+            ErrorClass.SESSION_LOST: "WebDriver会话错误",
+            ErrorClass.CONNECTION: "连接超时或断开",
+        }
+        self.log(f"错误类型: {labels.get(error_class, '未知 - ' + error_msg[:100])}", "WARN")
+
+        self._recovery_page_state = None
+        outcome = self.recovery_planner.recover(error_msg, verify=self._probe_session, error_class=error_class,
+                                                budget=remaining_time())
+        self.last_recovery = outcome
+
+        if not outcome.success:
+            self.log("="*60, "ERROR")
+            self.log(f"[FAIL] 会话恢复失败: 已尝试 {len(outcome.steps)} 个恢复动作 "
+                     f"({outcome.elapsed:.1f}秒)", "ERROR")
+            self.log("="*60, "ERROR")
 
+            # 更新GUI状态为断开
+            self.status_label.config(text="● 连接断开", fg="red")
+            self.reconnect_btn.config(state=tk.NORMAL)
+            return False
+
+        # 更新GUI状态
+        self.status_label.config(text="● 已连接", fg="green")
+        self.reconnect_btn.config(state=tk.DISABLED)
+
+        # 重启截图监控
+        self.log("重启截图监控...", "INFO")
         try:
-            # 步骤0: 如果是设备未找到错误，先尝试重新连接ADB
-            if is_device_not_found:
-                self.log("步骤0/4: 检测到ADB设备断开，尝试重新连接...", "INFO")
-                import subprocess
-                port = self.port_var.get()
-                device_address = f"127.0.0.1:{port}"
+            # 先停止旧的监控
+            if self.running:
+                self.running = False
+                accounted_sleep(0.5)
+
+            # 启动新的监控
+            self.running = True
+            self.start_btn.config(state=tk.DISABLED)
+            self.stop_btn.config(state=tk.NORMAL)
+            self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
+            self.monitor_thread.start()
+            self.log("  [OK] 截图监控已重启", "OK")
+        except Exception as monitor_err:
+            self.log(f"  [WARN] 截图监控重启失败: {monitor_err}", "WARN")
+            # 监控失败不影响会话恢复
+
+        mttr = self.recovery_planner.mean_time_to_recover(error_class)
+        self.log("="*60, "OK")
+        self.log(f"[OK] 会话恢复成功! 动作: {self.recovery_planner.actions[outcome.action].label}, "
+                 f"掉线到恢复: {time.time() - drop_time:.2f}秒"
+                 + (f", 该类错误平均恢复: {mttr:.2f}秒" if mttr is not None else ""), "OK")
+        self.log("="*60, "OK")
+        return True
 
-                try:
-                    # 尝试重新连接ADB
-                    connect_result = subprocess.run(
-                        f'"{ADB_EXE}" connect {device_address}',
-                        capture_output=True,
-                        text=True,
-                        shell=True,
-                        timeout=10
-                    )
+    # ---------- 恢复动作(由恢复规划器按成本排序调用) ----------
 
-                    if "connected" in connect_result.stdout.lower() or "already connected" in connect_result.stdout.lower():
-                        self.log(f"  [OK] ADB重新连接成功: {device_address}", "OK")
-                        time.sleep(2)  # 等待设备稳定
-                    else:
-                        self.log(f"  [WARN] ADB连接失败: {connect_result.stdout.strip()}", "WARN")
-                        self.log("  尝试继续恢复流程...", "INFO")
+    def _build_recovery_planner(self):
+        """
+        注册恢复动作目录,预估耗时和成功率只在没有历史数据时使用
 
-                except Exception as adb_err:
-                    self.log(f"  [WARN] ADB重连异常: {adb_err}", "WARN")
-                    self.log("  尝试继续恢复流程...", "INFO")
+        页面级错误(元素未找到等)只用不破坏当前流程的动作;重启App只用于遮挡和未知错误,且抢票进行中不使用
+        """
+        planner = RecoveryPlanner(log_func=lambda msg: self.log(f"  {msg}", "INFO"))
+        page_classes = (ErrorClass.TRANSIENT, ErrorClass.OBSTRUCTED, ErrorClass.UNKNOWN)
+        for action in (
+            RecoveryAction("re_probe", "重新探测", lambda msg: self._probe_session(),
+                           ALL_ERROR_CLASSES, cost=0.3, prior_success=0.3),
+            RecoveryAction("re_query", "重新获取页面", self._recovery_requery,
+                           page_classes, cost=0.5, prior_success=0.5),
+            RecoveryAction("back_key", "返回键", self._recovery_back_key,
+                           (ErrorClass.OBSTRUCTED,), cost=0.5, prior_success=0.3),
+            RecoveryAction("dismiss_popup", "关闭弹窗", self._recovery_dismiss_popup,
+                           page_classes, cost=2.0, prior_success=0.4),
+            RecoveryAction("reconnect_adb", "重连ADB", self._recovery_reconnect_adb,
+                           (ErrorClass.DEVICE_OFFLINE, ErrorClass.CONNECTION), cost=3.0, prior_success=0.4),
+            RecoveryAction("reattach_session", "重建会话", self._recovery_reattach_session,
+                           SESSION_ERROR_CLASSES, cost=15.0, prior_success=0.7),
+            RecoveryAction("restart_uiautomator2", "重启UiAutomator2", self._recovery_restart_uiautomator2,
+                           SESSION_ERROR_CLASSES, cost=20.0, prior_success=0.6),
+            RecoveryAction("restart_app", "重启App", self._recovery_restart_app,
+                           (ErrorClass.OBSTRUCTED, ErrorClass.UNKNOWN), cost=10.0, prior_success=0.5,
+                           enabled=lambda: not (self.grabbing or get_command_scheduler().grab_active)),
+        ):
+            planner.register(action)
+        return planner
+
+    def _probe_session(self):
+        """会话是否可用(会话ID存在且能与设备往返)"""
+        try:
+            driver = self.bot.driver if self.bot else None
+            return bool(driver and driver.session_id and driver.current_activity)
+        except Exception:
+            return False
 
-            # 步骤1: 清理损坏的会话
-            if self.bot and self.bot.driver:
-                self.log("步骤1/4: 清理损坏的会话...", "INFO")
-                try:
-                    self.bot.driver.quit()
-                    self.log("  旧会话已关闭", "OK")
-                except:
-                    self.log("  旧会话已失效,跳过关闭", "INFO")
+    def _recovery_requery(self, error_msg):
+        """丢弃旧快照,重新获取页面,使后续查找基于最新页面"""
+        get_snapshot_service(self.bot.driver).get(max_age=0)
+        return True
 
-                self.bot = None
-                time.sleep(2)  # 等待资源释放
+    def _recovery_back_key(self, error_msg):
+        """按返回键关闭遮挡的浮层"""
+        self.bot.driver.press_keycode(4)  # KEYCODE_BACK
+        return True
 
-            # 步骤2: 重新创建会话
-            self.log("步骤2/4: 重新创建Appium会话...", "INFO")
-            from damai_appium.damai_app_v2 import DamaiBot
+    def _recovery_dismiss_popup(self, error_msg):
+        return bool(self._dismiss_popups(self.bot.driver))
 
-            retry_count = 0
-            max_retries = 3
+    def _recovery_serial(self):
+        return self.watched_serial or f"127.0.0.1:{self.port_var.get()}"
 
-            while retry_count < max_retries:
-                try:
-                    self.bot = DamaiBot()
-                    self.log(f"  [OK] 会话创建成功 (尝试 {retry_count + 1}/{max_retries})", "OK")
-                    break
-                except Exception as retry_err:
-                    retry_count += 1
-                    self.log(f"  尝试 {retry_count}/{max_retries} 失败: {retry_err}", "WARN")
-                    if retry_count < max_retries:
-                        self.log(f"  等待3秒后重试...", "INFO")
-                        time.sleep(3)
-                    else:
-                        raise Exception(f"重试{max_retries}次后仍然失败: {retry_err}")
+    def _recovery_reconnect_adb(self, error_msg):
+        """重新连接ADB设备,等待设备上线(ADB恢复后原会话通常仍可用)"""
+        device_address = self._recovery_serial()
+        adb = get_adb_client(ADB_EXE)
+        connect_result = adb.run(["connect", device_address], timeout=10)
+        if "connected" not in connect_result.stdout.lower():
+            self.log(f"  [WARN] ADB连接失败: {connect_result.stdout.strip()}", "WARN")
+            return False
+        tracker = get_device_tracker(adb)
+        if tracker.is_live:
+            return tracker.wait_for_state(device_address, timeout=5)
+        return current_device_states(adb).get(device_address) == "device"
+
+    def _recovery_reattach_session(self, error_msg):
+        """关闭旧会话,重新创建Appium会话,并回到掉线前的页面"""
+        # 设备不在线时先重连ADB,否则新建会话必然失败
+        try:
+            if current_device_states(get_adb_client(ADB_EXE)).get(self._recovery_serial()) != "device":
+                self._recovery_reconnect_adb(error_msg)
+        except Exception as adb_err:
+            self.log(f"  [WARN] 检查ADB设备失败: {adb_err}", "WARN")
 
-            # 步骤3: 验证会话
-            self.log("步骤3/4: 验证会话状态...", "INFO")
-            if self.bot and self.bot.driver:
-                # 尝试获取一次截图来验证会话是否正常
-                try:
-                    _ = self.bot.driver.get_screenshot_as_png()
-                    self.log("  [OK] 会话验证成功", "OK")
-                except Exception as verify_err:
-                    self.log(f"  [FAIL] 会话验证失败: {verify_err}", "ERROR")
-                    raise Exception(f"会话创建成功但验证失败: {verify_err}")
-
-            # 更新GUI状态
-            self.status_label.config(text="● 已连接", fg="green")
-            self.reconnect_btn.config(state=tk.DISABLED)
-
-            # 步骤4: 重启截图监控
-            self.log("步骤4/4: 重启截图监控...", "INFO")
+        # 记录掉线前的页面(dumpsys不依赖会话,旧会话已失效时也能记录)
+        if self._recovery_page_state is None:
+            self._recovery_page_state = self._capture_page_state()
+        previous_state = self._recovery_page_state
+
+        # 清理损坏的会话
+        if self.bot and self.bot.driver:
             try:
-                # 先停止旧的监控
-                if self.running:
-                    self.running = False
-                    time.sleep(0.5)
+                self.bot.driver.quit()
+                self.log("  旧会话已关闭", "OK")
+            except:
+                self.log("  旧会话已失效,跳过关闭", "INFO")
+        self.bot = None
 
-                # 启动新的监控
-                self.running = True
-                self.start_btn.config(state=tk.DISABLED)
-                self.stop_btn.config(state=tk.NORMAL)
-                self.monitor_thread = threading.Thread(target=self.monitor_loop, daemon=True)
-                self.monitor_thread.start()
-                self.log("  [OK] 截图监控已重启", "OK")
-            except Exception as monitor_err:
-                self.log(f"  [WARN] 截图监控重启失败: {monitor_err}", "WARN")
-                # 监控失败不影响会话恢复
+        # 重新创建会话(失败时由规划器升级到重启UiAutomator2)
+        self.bot = DamaiBot()
+        self.log("  [OK] 会话创建成功", "OK")
 
-            self.log("="*60, "OK")
-            self.log("[OK] 会话恢复成功!", "OK")
-            self.log("="*60, "OK")
+        # 验证会话
+        _ = self.bot.driver.get_screenshot_as_png()
 
-            return True
+        # 弹窗处理器跟随新会话(旧driver的快照服务已不会再有新快照)
+        self._restart_popup_handler()
 
-        except Exception as recover_err:
-            self.log("="*60, "ERROR")
-            self.log(f"[FAIL] 会话恢复失败: {recover_err}", "ERROR")
-            self.log("="*60, "ERROR")
+        # 新会话从首页启动,先尝试直接回到掉线前的页面
+        if previous_state:
+            result = restore_activity_state(self.bot.driver, previous_state,
+                                            log_func=lambda msg: self.log(f"  {msg}", "INFO"))
+            if result.success:
+                self.log(f"  [OK] 已回到掉线前页面 {previous_state.activity} "
+                         f"(恢复 {result.restore_seconds:.2f}秒)", "OK")
+            else:
+                self.log(f"  [WARN] 未能回到掉线前页面({result.detail}),由抢票流程从首页导航", "WARN")
+        return True
 
-            # 更新GUI状态为断开
-            self.status_label.config(text="● 连接断开", fg="red")
-            self.reconnect_btn.config(state=tk.NORMAL)
+    def _restart_popup_handler(self):
+        """会话重建后,用新driver重启已启用的后台弹窗处理器"""
+        if not self.popup_handler:
+            return
+        try:
+            self.popup_handler.stop()
+            self.popup_handler = ParallelPopupHandler(self.bot.driver, log_func=self.log)
+            self.popup_handler.start(check_interval=2.0)
+        except Exception as e:
+            self.log(f"  [WARN] 弹窗处理器重启失败: {e}", "WARN")
+            self.popup_handler = None
 
-            import traceback
-            traceback.print_exc()
+    def _recovery_restart_uiautomator2(self, error_msg):
+        """强制停止设备上的UiAutomator2服务,再重建会话(Appium会重新安装并启动服务)"""
+        if self._recovery_page_state is None:
+            self._recovery_page_state = self._capture_page_state()
+        adb = get_adb_client(ADB_EXE)
+        serial = self._recovery_serial()
+        for package in ("io.appium.uiautomator2.server", "io.appium.uiautomator2.server.test"):
+            adb.shell(serial, f"am force-stop {package}", timeout=5)
+        return self._recovery_reattach_session(error_msg)
+
+    def _recovery_restart_app(self, error_msg):
+        """重启大麦App,再回到之前的页面"""
+        driver = self.bot.driver
+        previous_state = self._capture_page_state()
+        driver.terminate_app("cn.damai")
+        driver.activate_app("cn.damai")
+        if previous_state:
+            # App刚重启,必然不在原页面,不做启动前确认
+            result = restore_activity_state(driver, previous_state, precheck_timeout=0,
+                                            log_func=lambda msg: self.log(f"  {msg}", "INFO"))
+            return result.success
+        return True
 
-            return False
+    def _capture_page_state(self):
+        """记录当前前台页面(Activity、Intent和页面文字),用于会话重建后恢复"""
+        serial = self._recovery_serial()
+        adb = get_adb_client(ADB_EXE)
+        driver = self.bot.driver if self.bot else None
+        state = capture_activity_state(driver, lambda cmd: adb.shell(serial, cmd, timeout=5).stdout)
+        if state:
+            extras = f", {len(state.extras)}个extras" if state.extras else ""
+            self.log(f"已记录当前页面: {state.activity} (来源: {state.source}{extras})", "INFO")
+        return state
 
     def _safe_driver_operation(self, operation_func, operation_name="操作", max_retries=2):
         """安全的driver操作包装器 - 自动处理会话崩溃和重试"""
         retry_count = 0
+        outcome = None
 
         while retry_count <= max_retries:
             try:
                 # 执行操作
                 result = operation_func()
+                if outcome:
+                    self.recovery_planner.confirm(outcome, True)
                 return result
 
             except Exception as e:
                 error_msg = str(e)
                 self.log(f"{operation_name}失败 (尝试 {retry_count + 1}/{max_retries + 1}): {error_msg[:100]}", "WARN")
+                if outcome:
+                    self.recovery_planner.confirm(outcome, False)
+                    outcome = None
 
                 # 检查是否需要恢复会话
-                need_recovery = (
-                    "instrumentation process is not running" in error_msg or
-                    "probably crashed" in error_msg or
-                    "Session" in error_msg or
-                    "WebDriver" in error_msg
-                )
+                need_recovery = classify_error(e) in SESSION_ERROR_CLASSES
 
                 if need_recovery and retry_count < max_retries:
                     # 尝试恢复会话
                     self.log(f"尝试恢复会话并重试{operation_name}...", "INFO")
                     if self._recover_session(error_msg):
                         retry_count += 1
-                        time.sleep(1)  # 恢复后等待1秒再重试
+                        outcome = self.last_recovery
                         continue
                     else:
                         raise Exception(f"会话恢复失败,无法继续{operation_name}")
@@ -3222,7 +3514,7 @@ class SmartAIGUI:
         # 策略1: 处理各种弹窗
         if self._check_and_handle_dialogs(driver, texts):
             self.log("√ 检测并处理了弹窗", "OK")
-            time.sleep(1)
+            accounted_sleep(1)
             new_state, new_texts = self._get_current_page_state(driver)
             return True, new_state, "已处理弹窗"
 
@@ -3230,7 +3522,7 @@ class SmartAIGUI:
         if current_state == PageState.ERROR_PAGE:
             self.log("  检测到错误页面,尝试返回...", "INFO")
             if self._try_go_back(driver):
-                time.sleep(2)
+                accounted_sleep(2)
                 new_state, new_texts = self._get_current_page_state(driver)
                 return True, new_state, "从错误页返回"
 
@@ -3240,7 +3532,7 @@ class SmartAIGUI:
             if current_package != "cn.damai":
                 self.log(f"  不在大麦App(当前:{current_package}),重新启动...", "INFO")
                 driver.activate_app("cn.damai")
-                time.sleep(3)
+                accounted_sleep(3)
                 new_state, new_texts = self._get_current_page_state(driver)
                 return True, new_state, "重新启动App"
         except:
@@ -3251,7 +3543,7 @@ class SmartAIGUI:
         if recovery_action:
             self.log(f"  执行恢复操作: {recovery_action['description']}", "INFO")
             if self._execute_recovery_action(driver, recovery_action):
-                time.sleep(2)
+                accounted_sleep(2)
                 new_state, new_texts = self._get_current_page_state(driver)
                 return True, new_state, recovery_action['description']
 
@@ -3259,7 +3551,7 @@ class SmartAIGUI:
         if current_state not in [PageState.HOME, expected_state]:
             self.log("  尝试返回首页...", "INFO")
             if self._navigate_to_home(driver):
-                time.sleep(2)
+                accounted_sleep(2)
                 new_state, new_texts = self._get_current_page_state(driver)
                 return True, new_state, "导航回首页"
 
@@ -3315,7 +3607,7 @@ class SmartAIGUI:
             # 方法1: 多次返回
             for _ in range(3):
                 driver.back()
-                time.sleep(0.5)
+                accounted_sleep(0.5)
 
             # 方法2: 点击首页按钮（底部导航栏）
             page_source = driver.page_source
@@ -3323,7 +3615,7 @@ class SmartAIGUI:
                 self.log("点击底部首页按钮", "INFO")
                 # 点击底部导航栏的首页按钮
                 driver.execute_script("mobile: clickGesture", {"x": 72, "y": 1240})
-                time.sleep(1)
+                accounted_sleep(1)
 
             self.log("[OK] 已返回首页", "OK")
             return True
@@ -3353,7 +3645,7 @@ class SmartAIGUI:
                 if popup_result is True:
                     # 成功关闭弹窗
                     self.log("[OK] 弹窗已关闭", "OK")
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
                     return True  # 需要重新验证页面状态
                 elif popup_result is False:
                     # 在功能页面，跳过了弹窗检测
@@ -3385,7 +3677,7 @@ class SmartAIGUI:
             # 首先检查是否有弹窗
             if self._check_and_handle_popup(driver):
                 self.log(f"[尝试 {attempt+1}/{max_attempts}] 处理弹窗后重新验证", "INFO")
-                time.sleep(1)
+                accounted_sleep(1)
 
             # 验证页面状态
             if validation_func():
@@ -3398,16 +3690,16 @@ class SmartAIGUI:
             # 恢复策略
             if expected_page == "homepage":
                 self._navigate_to_home(driver)
-                time.sleep(1)
+                accounted_sleep(1)
             elif expected_page == "search":
                 self._navigate_to_home(driver)
-                time.sleep(1)
+                accounted_sleep(1)
                 driver.execute_script("mobile: clickGesture", {"x": 326, "y": 99})  # 搜索框
-                time.sleep(1)
+                accounted_sleep(1)
             elif expected_page == "detail":
                 # 如果不在详情页，返回首页重新搜索
                 self._navigate_to_home(driver)
-                time.sleep(1)
+                accounted_sleep(1)
                 return False  # 需要重新开始整个流程
             else:
                 self.log(f"! 未知页面类型: {expected_page}", "ERROR")
@@ -3465,7 +3757,7 @@ class SmartAIGUI:
                 times = action.get('times', 1)
                 for _ in range(times):
                     driver.back()
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
                 return True
 
             elif action_type == 'click_search_icon':
@@ -3580,7 +3872,7 @@ class SmartAIGUI:
             # 如果是加载中,继续等待
             if page_state == PageState.LOADING:
                 self.log(f"  页面加载中,等待...", "INFO")
-                time.sleep(0.5)
+                accounted_sleep(0.5)
                 continue
 
             # 如果是错误页面或状态不对,尝试智能恢复(仅尝试一次)
@@ -3601,7 +3893,7 @@ class SmartAIGUI:
 
             # 继续等待
             self.log(f"  当前: {page_state}, 期望: {', '.join(expected_states)}, 等待...", "DEBUG")
-            time.sleep(0.5)
+            accounted_sleep(0.5)
 
         # 超时 - 最后再尝试一次恢复
         page_state, texts = self._get_current_page_state(driver)
@@ -3640,7 +3932,7 @@ class SmartAIGUI:
                 self.log("  尝试启动大麦App...", "INFO")
                 try:
                     driver.activate_app(expected_package)
-                    time.sleep(3)
+                    accounted_sleep(3)
 
                     # 再次检查
                     current_package = driver.current_package
@@ -3663,7 +3955,7 @@ class SmartAIGUI:
             else:
                 # 尝试等待一下
                 self.log("  未检测到页面内容,等待2秒后重试...", "INFO")
-                time.sleep(2)
+                accounted_sleep(2)
                 page_state, texts = self._get_current_page_state(driver)
                 if texts and len(texts) > 0:
                     self.log(f"√ 重试成功,当前页面: {page_state}", "OK")
@@ -3746,7 +4038,7 @@ class SmartAIGUI:
                                     if is_displayed and is_enabled:
                                         el.click()
                                         self.log(f"    [OK] 成功点击: {name} (第{i+1}个元素)", "OK")
-                                        time.sleep(0.8)
+                                        accounted_sleep(0.8)
                                         popup_closed = True
                                         break
                                     else:
@@ -3777,7 +4069,7 @@ class SmartAIGUI:
                         try:
                             driver.execute_script("mobile: clickGesture", {"x": x, "y": y})
                             self.log(f"    尝试点击坐标: ({x}, {y})", "DEBUG")
-                            time.sleep(0.5)
+                            accounted_sleep(0.5)
 
                             # 验证点击是否有效(检查弹窗是否还在)
                             verification_failed = False
@@ -3811,7 +4103,7 @@ class SmartAIGUI:
                 retry_count += 1
                 if retry_count < max_retries:
                     self.log(f"  未找到弹窗,等待1秒后重试...", "INFO")
-                    time.sleep(1)
+                    accounted_sleep(1)
 
         # 最终结果
         if popup_closed:
@@ -3837,7 +4129,7 @@ class SmartAIGUI:
 
         try:
             # 等待首页加载
-            time.sleep(2)
+            accounted_sleep(2)
 
             # 多种方式查找城市控件
             city_patterns = [
@@ -3898,7 +4190,7 @@ class SmartAIGUI:
                     self.log(f"坐标点击失败: {e}", "ERROR")
                     return False
 
-            time.sleep(1)  # 等待城市选择页面弹出
+            accounted_sleep(1)  # 等待城市选择页面弹出
 
             # === 步骤2: 点击搜索框激活 (148, 192) [WARN] 关键步骤! ===
             self.log(f"[步骤2/4] 点击搜索框激活 {CITY_SEARCH_BOX_COORD} (关键!)", "STEP")
@@ -3907,7 +4199,7 @@ class SmartAIGUI:
             try:
                 driver.tap([CITY_SEARCH_BOX_COORD])
                 self.log(f"[OK] 使用坐标 {CITY_SEARCH_BOX_COORD} 激活搜索框", "OK")
-                time.sleep(0.5)
+                accounted_sleep(0.5)
             except Exception as e:
                 self.log(f"搜索框激活失败,尝试元素查找: {e}", "WARN")
 
@@ -3926,7 +4218,7 @@ class SmartAIGUI:
                             search_el = els[0]
                             search_el.click()  # 激活搜索框
                             self.log(f"[OK] 使用元素方式激活搜索框", "OK")
-                            time.sleep(0.5)
+                            accounted_sleep(0.5)
                             break
                     except:
                         continue
@@ -3935,27 +4227,24 @@ class SmartAIGUI:
             self.log(f"[步骤3/4] 输入城市名称: {target_city}", "STEP")
 
             input_success = False
-            time.sleep(0.5)  # 等待搜索框完全激活
+            accounted_sleep(0.5)  # 等待搜索框完全激活
 
             # 方法1: 使用ADBKeyboard broadcast (最可靠) - 手动教学验证
             try:
-                import subprocess
+                adb = get_adb_client(ADB_EXE)
                 udid = driver.capabilities.get('udid', '')
 
                 # 切换到ADBKeyboard
-                subprocess.run([
-                    'adb', '-s', udid, 'shell', 'ime', 'set', 'com.android.adbkeyboard/.AdbIME'
-                ], check=True, capture_output=True)
+                result = adb.run(['-s', udid, 'shell', 'ime', 'set', 'com.android.adbkeyboard/.AdbIME'], timeout=5)
+                if result.returncode != 0:
+                    raise RuntimeError(f"切换ADBKeyboard失败: {result.stderr.strip()}")
 
-                time.sleep(0.3)
+                accounted_sleep(0.3)
 
                 # 使用broadcast发送文本
-                subprocess.run([
-                    'adb', '-s', udid, 'shell',
-                    'am', 'broadcast',
-                    '-a', 'ADB_INPUT_TEXT',
-                    '--es', 'msg', target_city
-                ], check=True, capture_output=True)
+                result = adb.run(['-s', udid, 'shell', 'am', 'broadcast', '-a', 'ADB_INPUT_TEXT', '--es', 'msg', target_city], timeout=5)
+                if result.returncode != 0:
+                    raise RuntimeError(f"ADBKeyboard广播失败: {result.stderr.strip()}")
 
                 self.log(f"[OK] 已使用ADBKeyboard输入: {target_city}", "OK")
                 input_success = True
@@ -3968,7 +4257,7 @@ class SmartAIGUI:
                     if els:
                         input_el = els[0]
                         input_el.clear()
-                        time.sleep(0.2)
+                        accounted_sleep(0.2)
                         input_el.send_keys(target_city)
                         self.log(f"[OK] 备用方案成功输入: {target_city}", "OK")
                         input_success = True
@@ -3980,7 +4269,7 @@ class SmartAIGUI:
                 driver.press_keycode(4)  # 返回键
                 return False
 
-            time.sleep(1)  # 等待搜索结果
+            accounted_sleep(1)  # 等待搜索结果
 
             # === 步骤4: 点击城市选项 (99, 328) ===
             self.log(f"[步骤4/4] 点击城市选项 {CITY_ITEM_COORD}", "STEP")
@@ -3995,7 +4284,7 @@ class SmartAIGUI:
                         if target_city in text:
                             tv.click()
                             self.log(f"[OK] 选择城市: {text} (文本匹配)", "OK")
-                            time.sleep(1)
+                            accounted_sleep(1)
                             clicked = True
                             break
                     except:
@@ -4008,7 +4297,7 @@ class SmartAIGUI:
                 try:
                     driver.tap([CITY_ITEM_COORD])
                     self.log(f"[OK] 使用坐标 {CITY_ITEM_COORD} 点击城市选项", "OK")
-                    time.sleep(1)
+                    accounted_sleep(1)
                     clicked = True
                 except Exception as e:
                     self.log(f"坐标点击失败: {e}", "ERROR")
@@ -4055,7 +4344,7 @@ class SmartAIGUI:
         for attempt in range(3):
             if attempt > 0:
                 self.log(f"第{attempt + 1}次尝试点击搜索框...", "INFO")
-                time.sleep(0.5)
+                accounted_sleep(0.5)
 
             for by, selector, desc in search_patterns:
                 try:
@@ -4065,7 +4354,7 @@ class SmartAIGUI:
                         if els[0].is_displayed() and els[0].is_enabled():
                             els[0].click()
                             self.log(f"[OK] 点击搜索框成功 (方式: {desc})", "OK")
-                            time.sleep(1.5)  # 增加等待时间,确保键盘弹出
+                            accounted_sleep(1.5)  # 增加等待时间,确保键盘弹出
                             return True
                         else:
                             self.log(f"元素不可见或不可点击: {desc}", "DEBUG")
@@ -4080,7 +4369,7 @@ class SmartAIGUI:
                 try:
                     driver.tap([SEARCH_ENTRY_COORD])
                     self.log(f"[OK] 使用坐标 {SEARCH_ENTRY_COORD} 点击搜索框", "OK")
-                    time.sleep(1.5)
+                    accounted_sleep(1.5)
                     return True
                 except Exception as e:
                     self.log(f"坐标点击失败: {str(e)[:30]}", "DEBUG")
@@ -4095,7 +4384,7 @@ class SmartAIGUI:
         from appium.webdriver.common.appiumby import AppiumBy
 
         # 等待输入框出现(点击搜索框后需要时间)
-        time.sleep(0.8)
+        accounted_sleep(0.8)
 
         # 查找输入框(多种方式,增加重试)
         input_patterns = [
@@ -4113,7 +4402,7 @@ class SmartAIGUI:
         for attempt in range(3):
             if attempt > 0:
                 self.log(f"第{attempt + 1}次尝试查找输入框...", "INFO")
-                time.sleep(0.5)
+                accounted_sleep(0.5)
 
             for by, selector, desc in input_patterns:
                 try:
@@ -4135,23 +4424,20 @@ class SmartAIGUI:
 
         # 方法1: 使用ADBKeyboard broadcast (最可靠) - 2025-11-16验证
         try:
-            import subprocess
+            adb = get_adb_client(ADB_EXE)
             udid = driver.capabilities.get('udid', '')
 
             # 切换到ADBKeyboard
-            subprocess.run([
-                'adb', '-s', udid, 'shell', 'ime', 'set', 'com.android.adbkeyboard/.AdbIME'
-            ], check=True, capture_output=True, timeout=5)
+            result = adb.run(['-s', udid, 'shell', 'ime', 'set', 'com.android.adbkeyboard/.AdbIME'], timeout=5)
+            if result.returncode != 0:
+                raise RuntimeError(f"切换ADBKeyboard失败: {result.stderr.strip()}")
 
-            time.sleep(0.3)
+            accounted_sleep(0.3)
 
             # 使用broadcast发送文本
-            subprocess.run([
-                'adb', '-s', udid, 'shell',
-                'am', 'broadcast',
-                '-a', 'ADB_INPUT_TEXT',
-                '--es', 'msg', keyword
-            ], check=True, capture_output=True, timeout=5)
+            result = adb.run(['-s', udid, 'shell', 'am', 'broadcast', '-a', 'ADB_INPUT_TEXT', '--es', 'msg', keyword], timeout=5)
+            if result.returncode != 0:
+                raise RuntimeError(f"ADBKeyboard广播失败: {result.stderr.strip()}")
 
             self.log(f"[OK] 已使用ADBKeyboard输入: {keyword}", "OK")
             input_success = True
@@ -4164,10 +4450,10 @@ class SmartAIGUI:
                     # 确保输入框获得焦点
                     if not input_el.is_focused():
                         input_el.click()
-                        time.sleep(0.5)
+                        accounted_sleep(0.5)
 
                     input_el.clear()
-                    time.sleep(0.2)
+                    accounted_sleep(0.2)
                     input_el.send_keys(keyword)
                     self.log(f"[OK] 备用方案send_keys输入成功: {keyword}", "OK")
                     input_success = True
@@ -4178,14 +4464,14 @@ class SmartAIGUI:
             self.log("未找到输入框,尝试坐标点击", "WARN")
             try:
                 driver.tap([(326, 99)])
-                time.sleep(0.5)
+                accounted_sleep(0.5)
 
                 # 重新查找输入框
                 els = driver.find_elements(AppiumBy.CLASS_NAME, "android.widget.EditText")
                 if els:
                     els[0].send_keys(keyword)
                     # 验证输入是否成功
-                    time.sleep(0.3)
+                    accounted_sleep(0.3)
                     actual_text = els[0].text or els[0].get_attribute('text') or ""
                     if keyword in actual_text or actual_text in keyword:
                         self.log(f"[OK] 使用坐标 (326, 99) 点击后输入成功,已验证: '{actual_text}'", "OK")
@@ -4199,13 +4485,13 @@ class SmartAIGUI:
             self.log("X 所有输入方式都失败", "ERROR")
             return False
 
-        time.sleep(0.8)
+        accounted_sleep(0.8)
 
         # 执行搜索(回车键)
         try:
             driver.press_keycode(66)  # KEYCODE_ENTER
             self.log("[OK] 执行搜索 (回车)", "OK")
-            time.sleep(2.5)  # 增加等待时间,确保搜索结果加载
+            accounted_sleep(2.5)  # 增加等待时间,确保搜索结果加载
         except Exception as e:
             self.log(f"搜索执行失败: {e}", "ERROR")
             # 尝试点击搜索按钮作为备用
@@ -4217,7 +4503,7 @@ class SmartAIGUI:
                 if search_btns:
                     search_btns[0].click()
                     self.log("[OK] 点击搜索按钮", "OK")
-                    time.sleep(2.5)
+                    accounted_sleep(2.5)
                 else:
                     return False
             except:
@@ -4226,7 +4512,7 @@ class SmartAIGUI:
         # 关闭键盘
         try:
             driver.hide_keyboard()
-            time.sleep(0.3)
+            accounted_sleep(0.3)
             self.log("关闭键盘", "DEBUG")
         except:
             pass
@@ -4244,7 +4530,7 @@ class SmartAIGUI:
 
         # 等待搜索结果加载
         self.log("等待搜索结果加载...", "INFO")
-        time.sleep(2)
+        accounted_sleep(2)
 
         # 尝试多种方式点击第一个搜索结果
         clicked = False
@@ -4273,7 +4559,7 @@ class SmartAIGUI:
                     tv.click()
                     self.log("[OK] 点击成功", "OK")
                     clicked = True
-                    time.sleep(2)
+                    accounted_sleep(2)
                     break
 
                 except Exception as e:
@@ -4293,7 +4579,7 @@ class SmartAIGUI:
                 driver.tap([SEARCH_RESULT_COORD])
                 self.log(f"[OK] 使用手动教学坐标 {SEARCH_RESULT_COORD} 点击成功", "OK")
                 clicked = True
-                time.sleep(2)
+                accounted_sleep(2)
             except Exception as e:
                 self.log(f"手动教学坐标失败,尝试备用坐标: {str(e)[:50]}", "DEBUG")
                 # 备用坐标
@@ -4301,7 +4587,7 @@ class SmartAIGUI:
                     driver.tap([(540, 350)])  # 备用坐标
                     self.log("[OK] 备用坐标点击成功", "OK")
                     clicked = True
-                    time.sleep(2)
+                    accounted_sleep(2)
                 except Exception as e2:
                     self.log(f"方法2失败: {str(e2)[:50]}", "DEBUG")
 
@@ -4324,7 +4610,7 @@ class SmartAIGUI:
 
         # 等待列表页加载
         self.log("等待演出列表加载...", "INFO")
-        time.sleep(2)
+        accounted_sleep(2)
 
         clicked = False
 
@@ -4350,7 +4636,7 @@ class SmartAIGUI:
                         tv.click()
                         self.log("[OK] 点击成功", "OK")
                         clicked = True
-                        time.sleep(2)
+                        accounted_sleep(2)
                         break
 
                 except Exception as e:
@@ -4383,7 +4669,7 @@ class SmartAIGUI:
                         tv.click()
                         self.log("[OK] 点击成功", "OK")
                         clicked = True
-                        time.sleep(2)
+                        accounted_sleep(2)
                         break
 
                     except Exception as e:
@@ -4403,7 +4689,7 @@ class SmartAIGUI:
                 driver.tap([SHOW_ITEM_COORD])
                 self.log(f"[OK] 使用手动教学坐标 {SHOW_ITEM_COORD} 点击成功", "OK")
                 clicked = True
-                time.sleep(2)
+                accounted_sleep(2)
             except Exception as e:
                 self.log(f"手动教学坐标失败,尝试备用坐标: {str(e)[:50]}", "DEBUG")
                 # 备用坐标
@@ -4411,7 +4697,7 @@ class SmartAIGUI:
                     driver.tap([(540, 400)])  # 备用坐标
                     self.log("[OK] 备用坐标点击成功", "OK")
                     clicked = True
-                    time.sleep(2)
+                    accounted_sleep(2)
                 except Exception as e2:
                     self.log(f"方法3失败: {str(e2)[:50]}", "DEBUG")
 
@@ -4437,7 +4723,7 @@ class SmartAIGUI:
 
         # 等待搜索结果加载完成
         self.log("等待搜索结果加载...", "INFO")
-        time.sleep(2)  # 从1.5秒增加到2秒
+        accounted_sleep(2)  # 从1.5秒增加到2秒
 
         # 尝试3次查找和点击
         for attempt in range(3):
@@ -4451,7 +4737,7 @@ class SmartAIGUI:
                         "percent": 0.5
                     })
                     self.log("向下滚动查找更多结果", "DEBUG")
-                    time.sleep(1)
+                    accounted_sleep(1)
                 except Exception as e:
                     self.log(f"滚动失败: {str(e)[:30]}", "DEBUG")
 
@@ -4585,7 +4871,7 @@ class SmartAIGUI:
                         try:
                             element.click()
                             self.log(f"[OK] 元素点击成功", "OK")
-                            time.sleep(2.5)  # 增加等待时间确保页面跳转
+                            accounted_sleep(2.5)  # 增加等待时间确保页面跳转
                             return True
                         except Exception as e1:
                             self.log(f"元素点击失败: {str(e1)[:30]}", "DEBUG")
@@ -4599,7 +4885,7 @@ class SmartAIGUI:
 
                                 driver.execute_script("mobile: clickGesture", {"x": x, "y": y})
                                 self.log(f"[OK] 坐标点击成功 ({x}, {y})", "OK")
-                                time.sleep(2.5)
+                                accounted_sleep(2.5)
                                 return True
                             except Exception as e2:
                                 self.log(f"坐标点击失败: {str(e2)[:30]}", "DEBUG")
@@ -4621,11 +4907,11 @@ class SmartAIGUI:
             x, y = 337, 329
             self.log(f"使用坐标点击搜索结果: ({x}, {y})", "INFO")
             driver.execute_script("mobile: clickGesture", {"x": x, "y": y})
-            time.sleep(2.5)
+            accounted_sleep(2.5)
 
             # 验证是否跳转成功(检测是否不在搜索结果页)
             try:
-                time.sleep(0.5)
+                accounted_sleep(0.5)
                 # 简单验证:搜索结果页特征消失
                 search_indicator = driver.find_elements(
                     AppiumBy.ANDROID_UIAUTOMATOR,
@@ -4673,7 +4959,7 @@ class SmartAIGUI:
                         return True
                 except:
                     continue
-            time.sleep(0.5)
+            accounted_sleep(0.5)
 
         self.log("详情页未加载,可能在演出列表页", "WARN")
         return False
@@ -4730,7 +5016,7 @@ class SmartAIGUI:
                             if x1 > 300 and y1 < 200:
                                 el.click()
                                 self.log(f"[OK] 点击关闭按钮 (坐标约: {x1}, {y1})", "OK")
-                                time.sleep(1)
+                                accounted_sleep(1)
                                 return True
                     except:
                         continue
@@ -4751,7 +5037,7 @@ class SmartAIGUI:
             try:
                 driver.execute_script("mobile: clickGesture", {"x": x, "y": y})
                 self.log(f"点击坐标 ({x}, {y})", "DEBUG")
-                time.sleep(0.8)
+                accounted_sleep(0.8)
 
                 # 检查弹窗是否还在
                 still_has_popup = False
@@ -4783,7 +5069,7 @@ class SmartAIGUI:
         try:
             # 先关闭可能的弹窗
             self._dismiss_detail_popups(driver)
-            time.sleep(0.5)
+            accounted_sleep(0.5)
 
             # 使用坐标点击
             self.log(f"点击坐标 {DETAIL_PAGE_TICKET_ENTRY_COORD} (票档和场次选择入口)", "INFO")
@@ -4795,7 +5081,7 @@ class SmartAIGUI:
             self.log(f"点击票档入口失败: {e}", "ERROR")
             # 尝试重试一次
             try:
-                time.sleep(1)
+                accounted_sleep(1)
                 driver.tap([DETAIL_PAGE_TICKET_ENTRY_COORD])
                 self.log("[OK] 重试成功", "OK")
                 return True
@@ -4811,7 +5097,7 @@ class SmartAIGUI:
 
         # 先关闭可能的弹窗
         self._dismiss_detail_popups(driver)
-        time.sleep(0.5)
+        accounted_sleep(0.5)
 
         # 扩展的购买按钮匹配模式
         buy_patterns = [
@@ -4840,7 +5126,7 @@ class SmartAIGUI:
                             if clickable == "true" or not clickable:  # 可点击或未知
                                 el.click()
                                 self.log(f"[OK] 点击按钮: {name} (第{i+1}个)", "OK")
-                                time.sleep(2)
+                                accounted_sleep(2)
                                 return True
                         except Exception as e:
                             self.log(f"点击{name}第{i+1}个失败: {e}", "DEBUG")
@@ -4866,7 +5152,7 @@ class SmartAIGUI:
             try:
                 driver.execute_script("mobile: clickGesture", {"x": x, "y": y})
                 self.log(f"点击坐标: ({x}, {y})", "INFO")
-                time.sleep(2)
+                accounted_sleep(2)
 
                 # 简单检查:是否进入了下一步
                 # 可以通过检查页面是否有变化来判断
@@ -4894,7 +5180,7 @@ class SmartAIGUI:
         # 最后尝试:如果所有都失败,至少点击一次最常用的位置
         self.log("使用最后兜底坐标: (513, 1208)", "WARN")
         driver.execute_script("mobile: clickGesture", {"x": 513, "y": 1208})
-        time.sleep(2)
+        accounted_sleep(2)
         return True
 
     def _select_session_and_price(self, driver, max_retries=3):
@@ -4925,7 +5211,7 @@ class SmartAIGUI:
             for retry in range(max_retries):
                 try:
                     if retry > 0:
-                        time.sleep(0.3)  # ✨ 优化: 1秒 → 0.3秒
+                        accounted_sleep(0.3)  # ✨ 优化: 1秒 → 0.3秒
 
                     # ✨ 优化: 使用mobile:clickGesture代替tap
                     driver.execute_script("mobile: clickGesture", {
@@ -4945,19 +5231,19 @@ class SmartAIGUI:
         self.log(f"[1/3] 选择场次 {SESSION_SELECTOR_COORD}", "STEP")
         if not fast_click(SESSION_SELECTOR_COORD, "场次"):
             return False
-        time.sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
+        accounted_sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
 
         # 步骤2: 选择票档 (快速点击)
         self.log(f"[2/3] 选择票档 {PRICE_SELECTOR_COORD}", "STEP")
         if not fast_click(PRICE_SELECTOR_COORD, "票档"):
             return False
-        time.sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
+        accounted_sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
 
         # 步骤3: 点击确认按钮 (快速点击)
         self.log(f"[3/3] 点击确认 {CONFIRM_BUTTON_COORD}", "STEP")
         if not fast_click(CONFIRM_BUTTON_COORD, "确认按钮"):
             return False
-        time.sleep(1.5)  # ✨ 优化: 2秒 → 1.5秒
+        accounted_sleep(1.5)  # ✨ 优化: 2秒 → 1.5秒
 
         self.log("[OK] 场次和票档选择完成! (总耗时: ~2.5秒)", "SUCCESS")
         return True
@@ -4988,7 +5274,7 @@ class SmartAIGUI:
         # 1. 快速检测是否有排队消息
         def check_queue():
             try:
-                page_source = driver.page_source
+                page_source = get_snapshot_service(driver).get(max_age=0.3).page_source
                 for keyword in queue_keywords:
                     if keyword in page_source:
                         return True, keyword
@@ -4997,7 +5283,7 @@ class SmartAIGUI:
                 return None, None
 
         self.log("检测页面是否显示排队消息...", "INFO")
-        time.sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
+        accounted_sleep(0.5)  # ✨ 优化: 1秒 → 0.5秒
 
         queue_detected, detected_keyword = check_queue()
 
@@ -5042,12 +5328,12 @@ class SmartAIGUI:
                         "x": RETRY_BUTTON_COORD[0],
                         "y": RETRY_BUTTON_COORD[1]
                     })
-                    time.sleep(0.05)  # ✨ 优化: 0.1秒 → 0.05秒 (更快!)
+                    accounted_sleep(0.05)  # ✨ 优化: 0.1秒 → 0.05秒 (更快!)
 
                 except Exception as e:
                     # 静默失败,继续重试
                     pass
-                    time.sleep(0.3)
+                    accounted_sleep(0.3)
 
             if success:
                 self.log("[OK] 成功突破排队!", "SUCCESS")
@@ -5076,7 +5362,7 @@ class SmartAIGUI:
         for attempt in range(max_attempts):
             if attempt > 0:
                 self.log(f"第{attempt + 1}次恢复尝试...", "INFO")
-                time.sleep(1)
+                accounted_sleep(1)
 
             # 检测当前页面状态
             try:
@@ -5103,7 +5389,7 @@ class SmartAIGUI:
                     for _ in range(3):
                         try:
                             driver.press_keycode(4)  # KEYCODE_BACK
-                            time.sleep(0.5)
+                            accounted_sleep(0.5)
                         except:
                             pass
 
@@ -5119,7 +5405,7 @@ class SmartAIGUI:
                             if els and els[0].is_displayed():
                                 els[0].click()
                                 self.log("点击首页标签", "INFO")
-                                time.sleep(1)
+                                accounted_sleep(1)
                                 break
                     except Exception as e:
                         self.log(f"点击首页失败: {str(e)[:30]}", "DEBUG")
@@ -5132,7 +5418,7 @@ class SmartAIGUI:
 
                     # 先回到首页
                     driver.press_keycode(4)  # KEYCODE_BACK
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
 
                     # 点击搜索框
                     try:
@@ -5154,7 +5440,7 @@ class SmartAIGUI:
 
                     if not enable_popup:
                         self.log("[INFO] ⚠️ 弹窗检测已禁用，跳过弹窗/错误处理", "INFO")
-                        time.sleep(1)
+                        accounted_sleep(1)
                         continue
 
                     self.log("检测到弹窗/错误,尝试关闭...", "INFO")
@@ -5166,15 +5452,15 @@ class SmartAIGUI:
                         # 检测到是功能页面，不是弹窗，不应该关闭
                         self.log("[INFO] ⚠️ 检测到功能页面(非弹窗)，跳过关闭操作", "INFO")
                         # 等待一下，可能页面状态会改变
-                        time.sleep(1)
+                        accounted_sleep(1)
                         continue
 
                     # 确实是弹窗才执行后续操作
-                    time.sleep(1)
+                    accounted_sleep(1)
 
                     # 如果还是不对,按返回键
                     driver.press_keycode(4)
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
 
                     continue
 
@@ -5185,7 +5471,7 @@ class SmartAIGUI:
                     # 多次返回
                     for _ in range(5):
                         driver.press_keycode(4)
-                        time.sleep(0.3)
+                        accounted_sleep(0.3)
 
                     # 点击首页标签
                     try:
@@ -5195,7 +5481,7 @@ class SmartAIGUI:
                         )
                         if home_tab:
                             home_tab[0].click()
-                            time.sleep(1)
+                            accounted_sleep(1)
                     except:
                         pass
 
@@ -5233,7 +5519,7 @@ class SmartAIGUI:
                 # 停止监控
                 if self.running:
                     self.running = False
-                    time.sleep(0.5)
+                    accounted_sleep(0.5)
 
                 # 关闭旧连接
                 if self.bot and self.bot.driver:
@@ -5244,27 +5530,20 @@ class SmartAIGUI:
                 self.bot = None
 
                 # 等待清理
-                time.sleep(1)
+                accounted_sleep(1)
 
                 # 步骤1: 检查ADB连接
                 port = self.port_var.get()
                 self.log(f"[步骤1/2] 检查ADB连接 (端口: {port})...", "INFO")
 
-                result = subprocess.run(f'"{ADB_EXE}" devices', capture_output=True, text=True, shell=True, timeout=5)
                 device_address = f"127.0.0.1:{port}"
-                is_connected = device_address in result.stdout and "offline" not in result.stdout
+                is_connected = current_device_states(get_adb_client(ADB_EXE), timeout=5).get(device_address) == "device"
 
                 if is_connected:
                     self.log(f"ADB设备已连接: {device_address}", "OK")
                 else:
                     self.log(f"正在连接到 {device_address}...", "INFO")
-                    connect_result = subprocess.run(
-                        f'"{ADB_EXE}" connect {device_address}',
-                        capture_output=True,
-                        text=True,
-                        shell=True,
-                        timeout=10
-                    )
+                    connect_result = get_adb_client(ADB_EXE).run(["connect", device_address], timeout=10)
 
                     if "connected" in connect_result.stdout.lower() or "already connected" in connect_result.stdout.lower():
                         self.log(f"ADB连接成功", "OK")
@@ -5272,20 +5551,12 @@ class SmartAIGUI:
                         raise Exception(f"ADB连接失败: {connect_result.stdout.strip()}")
 
                 # 验证连接（等待设备完全就绪）
-                time.sleep(2)
-                verify_result = subprocess.run(f'"{ADB_EXE}" devices', capture_output=True, text=True, shell=True, timeout=5)
+                accounted_sleep(2)
+                state = current_device_states(get_adb_client(ADB_EXE), timeout=5).get(device_address)
 
                 # 检查目标设备的状态（避免被其他offline设备影响）
-                device_found = False
-                device_offline = False
-                for line in verify_result.stdout.splitlines():
-                    if device_address in line:
-                        device_found = True
-                        if "offline" in line:
-                            device_offline = True
-                        elif "device" in line:
-                            device_offline = False
-                        break
+                device_found = state is not None
+                device_offline = state == "offline"
 
                 if not device_found:
                     raise Exception(f"ADB设备 {device_address} 未找到")
@@ -5546,6 +5817,7 @@ class SmartAIGUI:
 
     def _diagnose_monitor_loop(self):
         """诊断监控循环(增强健壮度)"""
+        set_thread_priority(CommandPriority.BACKGROUND)
         try:
             interval = float(self.diag_interval_var.get())
             last_state = None
@@ -5576,7 +5848,7 @@ class SmartAIGUI:
 
                     # 重置错误计数
                     error_count = 0
-                    time.sleep(interval)
+                    accounted_sleep(interval)
 
                 except Exception as e:
                     error_count += 1
@@ -5593,7 +5865,7 @@ class SmartAIGUI:
                             self.root.after(0, lambda: self.diag_stop_btn.config(state=tk.DISABLED))
                         break
 
-                    time.sleep(interval)
+                    accounted_sleep(interval)
 
         except Exception as e:
             self.diag_add_history(f"X 监控线程异常: {str(e)[:100]}")
@@ -5620,24 +5892,56 @@ class SmartAIGUI:
 
         driver = self.bot.driver
 
+        # 抢票阶段不向设备发诊断查询(异步门面的Activity/Package查询不经过调度器暂停)
+        if get_command_scheduler().grab_active:
+            return "抢票中(暂停诊断)", "-", "-", 0
+
         try:
             # 设置超时 (红手指云设备需要更长时间)
             driver.implicitly_wait(2)  # 从0.5秒增加到2秒
 
-            # 获取Activity和Package (快速操作)
+            # 并发获取Activity、Package和page_source (三者互不依赖)
             activity = "未知"
             package = "未知"
+            page_source = None
+            snapshot_service = get_snapshot_service(driver)
+            # 监控间隔内其他线程已获取的快照直接复用
+            cached = snapshot_service.peek(max_age=float(self.diag_interval_var.get()))
+            if cached is not None:
+                page_source = cached.page_source
             try:
-                activity = driver.current_activity or "未知"
-                package = driver.current_package or "未知"
+                self.diag_add_history(f"获取page_source...")
+                start_time = time.time()
+                state = gather_state_sync(driver, include_source=cached is None)
+                elapsed = time.time() - start_time
+
+                if not isinstance(state['activity'], Exception):
+                    activity = state['activity'] or "未知"
+                if not isinstance(state['package'], Exception):
+                    package = state['package'] or "未知"
+                if isinstance(state['activity'], Exception) or isinstance(state['package'], Exception):
+                    safe_print(f"[诊断] 获取Activity/Package失败: {state['activity']!r} / {state['package']!r}")
+                    self.diag_add_history(f"获取Activity/Package失败")
+
+                if cached is not None:
+                    safe_print(f"[诊断] 复用{cached.age:.1f}秒前的页面快照")
+                    self.diag_add_history(f"OK 复用快照({cached.age:.1f}秒前)")
+                elif not isinstance(state['page_source'], Exception) and state['page_source']:
+                    page_source = state['page_source']
+                    snapshot_service.publish(page_source, elapsed)
+                    safe_print(f"[诊断] 并发获取成功! 耗时{elapsed:.2f}秒, XML长度{len(page_source)}字符")
+                    self.diag_add_history(f"OK 获取成功({elapsed:.1f}秒)")
             except Exception as e:
-                error_msg = f"[诊断] 获取Activity/Package失败: {e}"
-                safe_print(error_msg)
-                self.diag_add_history(f"获取Activity/Package失败")
+                safe_print(f"[诊断] 并发查询失败,回退到串行获取: {e}")
+                try:
+                    activity = driver.current_activity or "未知"
+                    package = driver.current_package or "未知"
+                except Exception as e:
+                    safe_print(f"[诊断] 获取Activity/Package失败: {e}")
+                    self.diag_add_history(f"获取Activity/Package失败")
 
-            # 获取page_source (可能慢，添加重试)
-            page_source = None
-            for retry in range(3):  # 从2次增加到3次
+            # 并发获取失败时串行重试page_source (可能慢，添加重试)
+            for retry in range(3 if page_source is None else 0):  # 从2次增加到3次
                 try:
                     msg = f"[诊断] 尝试获取page_source (第{retry+1}/3次)..."
                     safe_print(msg)
@@ -5645,7 +5949,7 @@ class SmartAIGUI:
                         self.diag_add_history(f"获取page_source...")
 
                     start_time = time.time()
-                    page_source = driver.page_source
+                    page_source = snapshot_service.get(max_age=0).page_source
                     elapsed = time.time() - start_time
 
                     if page_source:
@@ -5662,7 +5966,7 @@ class SmartAIGUI:
                         msg = f"[诊断] 第{retry+1}次失败: {error_msg}, 等待后重试..."
                         safe_print(msg)
                         self.diag_add_history(f"第{retry+1}次失败,重试...")
-                        time.sleep(1)  # 从0.3秒增加到1秒
+                        accounted_sleep(1)  # 从0.3秒增加到1秒
                     else:
                         msg = f"[诊断] 第{retry+1}次失败: {error_msg}, 放弃"
                         safe_print(msg)
@@ -5859,6 +6163,7 @@ def main():
 
     def on_closing():
         app.running = False
+        app.countdown_manager.shutdown()
         if app.bot and app.bot.driver:
             try:
                 app.bot.driver.quit()
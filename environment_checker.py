@@ -10,11 +10,16 @@ import os
 import sys
 import json
 import time
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Tuple, Optional, List
+from typing import Any, Callable, Dict, Tuple, Optional, List
 from dataclasses import dataclass, asdict
 
+from adb_client import get_adb_client
+from adb_discovery import AdbPortDiscovery
+
 
 @dataclass
 class CheckResult:
@@ -27,12 +32,118 @@ class CheckResult:
     fix_action: Optional[str] = None
 
 
+# 检测项顺序（也是结果展示顺序）
+CHECK_ORDER = ['adb_tool', 'adb_device', 'appium', 'damai_app', 'uiautomator2', 'python_deps']
+
+# 各检测项缓存有效期（秒）：工具/依赖/已装App很少变化，设备和服务状态变化快
+CHECK_TTLS = {
+    'adb_tool': 3600,
+    'adb_device': 10,
+    'appium': 15,
+    'damai_app': 600,
+    'uiautomator2': 600,
+    'python_deps': 3600,
+}
+
+# 非ok结果的缓存有效期（秒），修复后能尽快看到新状态
+PROBLEM_TTL = 5
+
+# 失效关系：某项结果变化时，依赖它的检测项一并失效
+CHECK_DEPENDENTS = {
+    'adb_tool': ['adb_device', 'damai_app', 'uiautomator2'],
+    'adb_device': ['damai_app', 'uiautomator2'],
+}
+
+
+@dataclass
+class CachedCheck:
+    """缓存的检测结果"""
+    result: CheckResult
+    checked_at: float
+    ttl: float
+    key: str = ""  # 结果依赖的上下文（如设备ID），不一致时视为失效
+    extra: Any = None  # 附带数据（如设备列表）
+    duration: float = 0.0
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.checked_at
+
+    def is_fresh(self, key: str = "") -> bool:
+        return self.key == key and self.age < self.ttl
+
+
+class CheckCache:
+    """
+    检测结果缓存（进程内共享）
+
+    GUI每次打开环境窗口都会新建EnvironmentChecker，缓存放在模块级，
+    健康的机器上再次打开窗口时直接使用缓存结果。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, CachedCheck] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, key: str = "") -> Optional[CachedCheck]:
+        """获取未过期的缓存项"""
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry and entry.is_fresh(key):
+            return entry
+        return None
+
+    def put(self, name: str, result: CheckResult, key: str = "", extra: Any = None,
+            duration: float = 0.0) -> CachedCheck:
+        """写入缓存，结果有变化时使依赖项失效"""
+        ttl = CHECK_TTLS.get(name, 30)
+        if result.status != 'ok':
+            ttl = min(ttl, PROBLEM_TTL)
+        entry = CachedCheck(result=result, checked_at=time.time(), ttl=ttl,
+                            key=key, extra=extra, duration=duration)
+        with self._lock:
+            previous = self._entries.get(name)
+            self._entries[name] = entry
+        if previous is not None and (previous.result.status != result.status or previous.extra != extra):
+            for dependent in CHECK_DEPENDENTS.get(name, []):
+                self.invalidate(dependent)
+        return entry
+
+    def invalidate(self, *names: str):
+        """使指定检测项失效（不传参数则全部失效），依赖项一并失效"""
+        with self._lock:
+            targets = list(names) if names else list(self._entries)
+            pending = list(targets)
+            while pending:
+                name = pending.pop()
+                self._entries.pop(name, None)
+                pending.extend(CHECK_DEPENDENTS.get(name, []))
+
+    def snapshot(self) -> Dict[str, CachedCheck]:
+        """当前所有缓存项（含过期项）"""
+        with self._lock:
+            return dict(self._entries)
+
+
+_check_cache_instance = None
+
+
+def get_check_cache() -> CheckCache:
+    """获取全局检测结果缓存"""
+    global _check_cache_instance
+    if _check_cache_instance is None:
+        _check_cache_instance = CheckCache()
+    return _check_cache_instance
+
+
 class EnvironmentChecker:
     """环境检测器 - 检测所有必需的环境组件"""
 
     def __init__(self):
         self.adb_path = self._find_adb()
+        self.adb = get_adb_client(self.adb_path)
         self.results = {}
+        self.cache = get_check_cache()
 
     def _find_adb(self) -> Path:
         """查找ADB工具路径"""
@@ -56,13 +167,7 @@ class EnvironmentChecker:
     def check_adb_tool(self) -> CheckResult:
         """检测ADB工具是否可用"""
         try:
-            result = subprocess.run(
-                f'"{self.adb_path}" version',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=5
-            )
+            result = self.adb.run(["version"], timeout=5)
 
             if result.returncode == 0:
                 version = result.stdout.split('\n')[0] if result.stdout else "未知版本"
@@ -109,13 +214,7 @@ class EnvironmentChecker:
     def check_adb_device(self) -> Tuple[CheckResult, List[str]]:
         """检测ADB设备连接状态"""
         try:
-            result = subprocess.run(
-                f'"{self.adb_path}" devices',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
+            result = self.adb.run(["devices"], timeout=10)
 
             if result.returncode != 0:
                 return CheckResult(
@@ -241,23 +340,11 @@ class EnvironmentChecker:
 
         try:
             # 检查cn.damai包是否存在
-            result = subprocess.run(
-                f'"{self.adb_path}" -s {device_id} shell pm list packages cn.damai',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
+            result = self.adb.run(["-s", device_id, "shell", "pm", "list", "packages", "cn.damai"], timeout=10)
 
             if result.returncode == 0 and 'cn.damai' in result.stdout:
                 # 获取App版本信息
-                version_result = subprocess.run(
-                    f'"{self.adb_path}" -s {device_id} shell dumpsys package cn.damai | grep versionName',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=10
-                )
+                version_result = self.adb.run(["-s", device_id, "shell", "dumpsys", "package", "cn.damai", "|", "grep", "versionName"], timeout=10)
 
                 version = "未知版本"
                 if version_result.returncode == 0 and version_result.stdout:
@@ -313,13 +400,7 @@ class EnvironmentChecker:
 
         try:
             # 检查io.appium.uiautomator2.server
-            result = subprocess.run(
-                f'"{self.adb_path}" -s {device_id} shell pm list packages io.appium.uiautomator2',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
+            result = self.adb.run(["-s", device_id, "shell", "pm", "list", "packages", "io.appium.uiautomator2"], timeout=10)
 
             packages = result.stdout.strip().split('\n') if result.stdout else []
             has_server = any('io.appium.uiautomator2.server' in pkg for pkg in packages)
@@ -411,43 +492,85 @@ class EnvironmentChecker:
                 fix_action=f'pip install {" ".join(missing)}'
             )
 
-    def check_all(self) -> Dict[str, CheckResult]:
-        """执行所有检测项"""
-        results = {}
+    def _cached_check(self, name: str, func: Callable, key: str = "", use_cache: bool = True,
+                      on_result: Optional[Callable] = None) -> CachedCheck:
+        """执行单项检测（优先使用缓存），完成后回调 on_result(name, result, cached)"""
+        entry = self.cache.get(name, key) if use_cache else None
+        cached = entry is not None
+        if entry is None:
+            started = time.time()
+            try:
+                output = func()
+            except Exception as e:
+                output = CheckResult(status='error', message=f'{name}检测异常', details=str(e))
+            extra = None
+            if isinstance(output, tuple):
+                output, extra = output
+            entry = self.cache.put(name, output, key=key, extra=extra, duration=time.time() - started)
+
+        self.results[name] = entry.result
+        if on_result:
+            try:
+                on_result(name, entry.result, cached)
+            except Exception:
+                pass
+        return entry
+
+    def check_all(self, use_cache: bool = True,
+                  on_result: Optional[Callable[[str, CheckResult, bool], None]] = None) -> Dict[str, CheckResult]:
+        """
+        执行所有检测项
+
+        相互独立的检测并行执行；大麦App和UiAutomator2依赖设备列表，在设备检测完成后执行。
+        每项结果按各自的有效期缓存，设备列表变化时App相关检测自动失效。
 
-        # 1. 检测ADB工具
-        results['adb_tool'] = self.check_adb_tool()
+        Args:
+            use_cache: 是否使用缓存结果（False则全部重新检测）
+            on_result: 每项检测完成时的回调 (name, result, cached)，在工作线程中调用
 
-        # 2. 检测ADB设备
-        device_result, devices = self.check_adb_device()
-        results['adb_device'] = device_result
+        Returns:
+            按CHECK_ORDER排列的检测结果
+        """
+        self.results = {}
 
-        # 3. 检测Appium服务
-        results['appium'] = self.check_appium_service()
+        with ThreadPoolExecutor(max_workers=len(CHECK_ORDER), thread_name_prefix="EnvCheck") as executor:
+            futures = [
+                executor.submit(self._cached_check, 'adb_tool', self.check_adb_tool, "", use_cache, on_result),
+                executor.submit(self._cached_check, 'appium', self.check_appium_service, "", use_cache, on_result),
+                executor.submit(self._cached_check, 'python_deps', self.check_python_deps, "", use_cache, on_result),
+            ]
 
-        # 4. 检测大麦App（如果有设备）
-        if devices:
-            results['damai_app'] = self.check_damai_app(devices[0])
-            results['uiautomator2'] = self.check_uiautomator2(devices[0])
-        else:
-            results['damai_app'] = CheckResult(
-                status='warning',
-                message='跳过大麦App检测',
-                details='无可用设备',
-                fix_available=False
-            )
-            results['uiautomator2'] = CheckResult(
-                status='warning',
-                message='跳过UiAutomator2检测',
-                details='无可用设备',
-                fix_available=False
-            )
+            # 设备检测决定了后续检测的目标设备
+            devices = self._cached_check('adb_device', self.check_adb_device, "", use_cache, on_result).extra or []
 
-        # 5. 检测Python依赖
-        results['python_deps'] = self.check_python_deps()
+            if devices:
+                device_id = devices[0]
+                futures.append(executor.submit(self._cached_check, 'damai_app',
+                                               lambda: self.check_damai_app(device_id),
+                                               device_id, use_cache, on_result))
+                futures.append(executor.submit(self._cached_check, 'uiautomator2',
+                                               lambda: self.check_uiautomator2(device_id),
+                                               device_id, use_cache, on_result))
+            else:
+                for name, label in (('damai_app', '大麦App'), ('uiautomator2', 'UiAutomator2')):
+                    skipped = CheckResult(
+                        status='warning',
+                        message=f'跳过{label}检测',
+                        details='无可用设备',
+                        fix_available=False
+                    )
+                    self.results[name] = skipped
+                    if on_result:
+                        try:
+                            on_result(name, skipped, False)
+                        except Exception:
+                            pass
 
-        self.results = results
-        return results
+            for future in futures:
+                future.result()
+
+        self.results = {name: self.results[name] for name in CHECK_ORDER if name in self.results}
+        return self.results
 
 
 class EnvironmentFixer:
@@ -455,45 +578,22 @@ class EnvironmentFixer:
 
     def __init__(self, adb_path: Path):
         self.adb_path = adb_path
+        self.adb = get_adb_client(adb_path)
 
-    def scan_common_ports(self) -> List[str]:
-        """扫描常用的ADB端口"""
-        common_ports = [
-            # 红手指常用端口
-            59700, 59701, 59702,
-            # MuMu模拟器
-            16384, 16416, 16448,
-            # 夜神模拟器
-            62001, 62025, 62026,
-            # 雷电模拟器
-            5555, 5557, 5559,
-            # 其他常见端口
-            52056, 50366, 51527, 58526, 56644
-        ]
-
-        connected_devices = []
-        for port in common_ports:
-            try:
-                device_address = f"127.0.0.1:{port}"
-                result = subprocess.run(
-                    f'"{self.adb_path}" connect {device_address}',
-                    capture_output=True,
-                    text=True,
-                    shell=True,
-                    timeout=5
-                )
-
-                # 检查输出，忽略编码
-                output = (result.stdout + result.stderr).lower()
-                if "connected" in output or "已连接" in output:
-                    connected_devices.append(device_address)
-                    # 找到一个就可以停止
-                    break
+    def scan_common_ports(self, port_ranges: Optional[List[Tuple[int, int]]] = None) -> List[str]:
+        """
+        扫描常用的ADB端口
 
-            except:
-                continue
+        Args:
+            port_ranges: 额外扫描的端口范围 [(起始, 结束)]
 
-        return connected_devices
+        Returns:
+            所有可用设备地址（按排名）
+        """
+        devices = AdbPortDiscovery(self.adb, port_ranges=port_ranges, log_func=lambda msg: None).discover()
+        if devices:
+            get_check_cache().invalidate('adb_device')
+        return [d.address for d in devices]
 
     def start_appium(self, port: int = 4723, background: bool = True) -> Tuple[bool, str]:
         """启动Appium服务"""
@@ -532,6 +632,7 @@ class EnvironmentFixer:
                 # 验证是否启动成功
                 try:
                     response = requests.get(f'http://127.0.0.1:{port}/status', timeout=5)
+                    get_check_cache().invalidate('appium')
                     if response.status_code == 200:
                         return True, f'Appium服务已启动在端口 {port}'
                     else:
@@ -637,6 +738,9 @@ class EnvironmentFixer:
             # 关闭连接
             driver.quit()
 
+            # 连接过程可能自动安装了UiAutomator2
+            get_check_cache().invalidate('uiautomator2')
+
             return True, f"WebDriver连接成功\n设备: 127.0.0.1:{adb_port}\n当前应用: {package}\n当前Activity: {activity}"
 
         except Exception as e:
@@ -674,13 +778,7 @@ class EnvironmentFixer:
 
         # 步骤1: 检测ADB设备
         try:
-            result = subprocess.run(
-                f'"{self.adb_path}" devices',
-                capture_output=True,
-                text=True,
-                shell=True,
-                timeout=10
-            )
+            result = self.adb.run(["devices"], timeout=10)
 
             # 解析设备列表
             devices = []
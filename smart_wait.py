@@ -5,11 +5,21 @@
 提供页面加载检测、并行弹窗处理、自动调优等功能
 """
 
+import os
+import re
+import json
 import time
+import hashlib
 import threading
-from typing import Callable, Optional, Dict, List
-from dataclasses import dataclass
+import xml.etree.ElementTree as ET
+from typing import Callable, Optional, Dict, List, Tuple
+from dataclasses import dataclass, field
 from collections import deque
+from pathlib import Path
+
+from damai_appium.snapshot_service import get_snapshot_service
+from damai_appium.command_scheduler import CommandPriority, set_thread_priority
+from damai_appium.trace_events import get_trace_recorder
 
 
 @dataclass
@@ -22,55 +32,464 @@ class StepTiming:
     success: bool
 
 
+@dataclass
+class StabilityMask:
+    """页面稳定性检测的忽略规则（易变区域不参与比较）"""
+    resource_ids: List[str] = field(default_factory=list)  # resource-id包含这些字符串的节点及其子树忽略
+    regions: List[Tuple[int, int, int, int]] = field(default_factory=list)  # 完全落在这些区域(x1,y1,x2,y2)内的节点忽略
+    text_patterns: List[str] = field(default_factory=lambda: [r'\d+'])  # 文字中匹配的部分视为相同(默认忽略数字,如倒计时)
+    ignore_text: bool = False  # 完全不比较文字，只比较结构
+
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+
+def structural_fingerprint(page_source: str, mask: Optional[StabilityMask] = None) -> str:
+    """计算页面结构指纹
+
+    只取节点的类名、resource-id、位置和（归一化后的）文字，
+    忽略掩码中的易变区域，计数器跳动等变化不影响指纹
+
+    Args:
+        page_source: 页面XML
+        mask: 忽略规则,None时使用默认规则
+
+    Returns:
+        str: 指纹(MD5),XML无法解析时退化为原文MD5
+    """
+    mask = mask or StabilityMask()
+    try:
+        root = ET.fromstring(page_source)
+    except ET.ParseError:
+        return hashlib.md5(page_source.encode()).hexdigest()
+
+    text_res = [re.compile(p) for p in mask.text_patterns]
+    digest = hashlib.md5()
+
+    def in_masked_region(bounds):
+        match = _BOUNDS_PATTERN.match(bounds)
+        if not match or not mask.regions:
+            return False
+        x1, y1, x2, y2 = (int(v) for v in match.groups())
+        return any(rx1 <= x1 and ry1 <= y1 and x2 <= rx2 and y2 <= ry2
+                   for rx1, ry1, rx2, ry2 in mask.regions)
+
+    def visit(node, depth):
+        resource_id = node.get('resource-id', '')
+        if resource_id and any(rid in resource_id for rid in mask.resource_ids):
+            return
+        bounds = node.get('bounds', '')
+        if in_masked_region(bounds):
+            return
+
+        text = ''
+        if not mask.ignore_text:
+            text = node.get('text', '') + '|' + node.get('content-desc', '')
+            for pattern in text_res:
+                text = pattern.sub('#', text)
+
+        digest.update(f"{depth}:{node.get('class', node.tag)}:{resource_id}:{bounds}:{text}\n".encode())
+        for child in node:
+            visit(child, depth + 1)
+
+    visit(root, 0)
+    return digest.hexdigest()
+
+
+class TimingStore:
+    """步骤耗时持久化存储 - 追加写入JSONL,按(步骤, 设备, 网络环境)分组
+
+    每次运行启动时加载,使smart_sleep和get_recommended_wait从第一步起就使用历史数据;
+    文件行数超过阈值时压缩,每组只保留最近的记录
+    """
+
+    def __init__(self, path=None, max_per_key=50, max_age_days=180, compact_factor=4):
+        """
+        Args:
+            path: 存储文件路径,默认为程序目录下的step_timings.jsonl
+            max_per_key: 每组保留的最近记录数
+            max_age_days: 超过该天数的记录在压缩时删除
+            compact_factor: 行数超过 组数*max_per_key*compact_factor 时压缩
+        """
+        self.path = Path(path) if path else Path(__file__).parent / "step_timings.jsonl"
+        self.max_per_key = max_per_key
+        self.max_age_days = max_age_days
+        self.compact_factor = compact_factor
+        self._lock = threading.Lock()
+        self._line_count = 0
+
+    def record(self, step_name, duration, success=True, device="", network=""):
+        """追加一条耗时记录"""
+        entry = {
+            "step": step_name,
+            "device": device,
+            "network": network,
+            "duration": round(duration, 4),
+            "success": success,
+            "ts": round(time.time(), 1)
+        }
+        try:
+            with self._lock:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._line_count += 1
+        except OSError:
+            pass
+
+    def _read_entries(self) -> List[Dict]:
+        entries = []
+        if not self.path.exists():
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue  # 跳过写入中断的残行
+        return entries
+
+    def _group(self, entries) -> Dict[Tuple[str, str, str], List[Dict]]:
+        cutoff = time.time() - self.max_age_days * 86400
+        groups: Dict[Tuple[str, str, str], List[Dict]] = {}
+        for entry in entries:
+            if entry.get("ts", 0) < cutoff:
+                continue
+            key = (entry.get("step", ""), entry.get("device", ""), entry.get("network", ""))
+            groups.setdefault(key, []).append(entry)
+        for key in groups:
+            groups[key] = groups[key][-self.max_per_key:]
+        return groups
+
+    def load(self, device="", network="", successful_only=True) -> Dict[str, List[float]]:
+        """加载指定设备和网络环境下各步骤的历史耗时
+
+        没有该设备/网络环境的记录时,退回到该步骤在所有环境下的记录
+
+        Returns:
+            {步骤名称: [耗时, ...]} (按时间顺序)
+        """
+        try:
+            with self._lock:
+                entries = self._read_entries()
+                self._line_count = len(entries)
+                groups = self._group(entries)
+                if len(entries) > max(len(groups), 1) * self.max_per_key * self.compact_factor:
+                    self._write(groups)
+        except OSError:
+            return {}
+
+        exact: Dict[str, List[float]] = {}
+        fallback: Dict[str, List[Tuple[float, float]]] = {}
+        for (step, dev, net), group in groups.items():
+            group = [e for e in group if e.get("success", True) or not successful_only]
+            if dev == device and net == network:
+                exact[step] = [e["duration"] for e in group]
+            else:
+                fallback.setdefault(step, []).extend((e.get("ts", 0), e["duration"]) for e in group)
+
+        result = {step: [d for _, d in sorted(items)][-self.max_per_key:] for step, items in fallback.items()}
+        result.update(exact)
+        return {step: durations for step, durations in result.items() if durations}
+
+    def compact(self):
+        """压缩存储文件:删除过期记录,每组只保留最近max_per_key条"""
+        try:
+            with self._lock:
+                self._write(self._group(self._read_entries()))
+        except OSError:
+            pass
+
+    def _write(self, groups):
+        """原子地重写文件(需持有锁)"""
+        entries = sorted((e for group in groups.values() for e in group), key=lambda e: e.get("ts", 0))
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._line_count = len(entries)
+
+
+class P2Quantile:
+    """P²流式分位数估计 (Jain & Chlamtac, 1985) - 固定5个标记,内存恒定"""
+
+    def __init__(self, p: float):
+        """
+        Args:
+            p: 目标分位数 (0~1)
+        """
+        self.p = p
+        self.count = 0
+        self._heights: List[float] = []  # 标记高度
+        self._positions = [1, 2, 3, 4, 5]  # 标记实际位置
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]  # 标记期望位置
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        """加入一个观测值"""
+        self.count += 1
+        q = self._heights
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # 找到x所在区间并更新极值
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        n = self._positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # 调整中间三个标记
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        q, n = self._heights, self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> Optional[float]:
+        """当前估计值,无数据时为None"""
+        if self.count == 0:
+            return None
+        if self.count <= 5:
+            # 样本不足时使用精确分位数(线性插值)
+            q = self._heights
+            pos = self.p * (len(q) - 1)
+            low = int(pos)
+            high = min(low + 1, len(q) - 1)
+            return q[low] + (q[high] - q[low]) * (pos - low)
+        return self._heights[2]
+
+
+class QuantileWaitPolicy:
+    """基于分位数的等待策略 - 等待时间 = 该步骤耗时的指定分位数 + 抖动余量
+
+    相比"平均值*1.2",单个慢样本不会抬高之后所有等待,长尾分布也不会导致过早操作
+    """
+
+    def __init__(self, percentile: float = 0.9, jitter_margin: float = 0.05):
+        """
+        Args:
+            percentile: 等待时间覆盖的耗时分位数
+            jitter_margin: 额外余量(秒)
+        """
+        self.percentile = percentile
+        self.jitter_margin = jitter_margin
+        self.estimators: Dict[str, P2Quantile] = {}
+
+    def observe(self, step_name: str, duration: float):
+        """记录一次步骤耗时"""
+        estimator = self.estimators.get(step_name)
+        if estimator is None:
+            estimator = self.estimators[step_name] = P2Quantile(self.percentile)
+        estimator.add(duration)
+
+    def reset(self):
+        """清空所有估计器"""
+        self.estimators = {}
+
+    def recommend(self, step_name: str, default: float, min_duration: float = 0.0,
+                  max_duration: float = 3.0) -> float:
+        """推荐等待时间,没有数据时返回default"""
+        estimator = self.estimators.get(step_name)
+        value = estimator.value() if estimator else None
+        if value is None:
+            return default
+        return min(max(value + self.jitter_margin, min_duration), max_duration)
+
+
+def compare_wait_policies(durations: List[float], percentile: float = 0.9, jitter_margin: float = 0.05,
+                          max_duration: float = 3.0, window: int = 10) -> Dict[str, Dict[str, float]]:
+    """在耗时记录上回放,对比平均值策略与分位数策略
+
+    每一步只使用之前的记录预测等待时间,再与实际耗时比较
+
+    Args:
+        durations: 按时间顺序的步骤耗时
+        percentile: 分位数策略的分位数
+        jitter_margin: 分位数策略的余量
+        max_duration: 两种策略共同的上限
+        window: 平均值策略使用的最近记录数
+
+    Returns:
+        {'mean': {...}, 'quantile': {...}},每项包含 premature_rate(等待短于实际耗时的比例)、
+        idle_seconds(等待长于实际耗时的总空等时间)、avg_error(平均绝对误差)
+    """
+    policy = QuantileWaitPolicy(percentile, jitter_margin)
+    recent: deque = deque(maxlen=window)
+    results = {name: {"premature": 0, "idle_seconds": 0.0, "abs_error": 0.0} for name in ("mean", "quantile")}
+    evaluated = 0
+
+    for actual in durations:
+        if recent:
+            evaluated += 1
+            predictions = {
+                "mean": min(sum(recent) / len(recent) * 1.2, max_duration),
+                "quantile": policy.recommend("trace", 0.0, 0.0, max_duration)
+            }
+            for name, wait in predictions.items():
+                stats = results[name]
+                stats["abs_error"] += abs(wait - actual)
+                if wait < actual:
+                    stats["premature"] += 1
+                else:
+                    stats["idle_seconds"] += wait - actual
+        recent.append(actual)
+        policy.observe("trace", actual)
+
+    report = {}
+    for name, stats in results.items():
+        report[name] = {
+            "samples": evaluated,
+            "premature_rate": stats["premature"] / evaluated if evaluated else 0.0,
+            "idle_seconds": stats["idle_seconds"],
+            "avg_error": stats["abs_error"] / evaluated if evaluated else 0.0
+        }
+    return report
+
+
 class SmartWait:
     """智能等待管理器"""
 
-    def __init__(self):
+    def __init__(self, timing_store: Optional[TimingStore] = None, device="", network="",
+                 wait_percentile: float = 0.9, jitter_margin: float = 0.05):
         self.timings: List[StepTiming] = []
         self.timing_history: Dict[str, deque] = {}  # 每个步骤的历史耗时
         self.max_history = 10  # 保留最近10次记录
+        self.wait_policy = QuantileWaitPolicy(wait_percentile, jitter_margin)
+        self.page_load_history: deque = deque(maxlen=50)  # 每次页面加载等待的统计
+        self.timing_store = timing_store
+        self.device = device
+        self.network = network
+        if timing_store:
+            self.bind_device(device, network)
+
+    def bind_device(self, device, network):
+        """切换设备/网络环境,并从持久化存储加载对应的历史耗时"""
+        self.device = device
+        self.network = network
+        if not self.timing_store:
+            return
+        loaded = self.timing_store.load(device, network)
+        self.timing_history = {
+            step: deque(durations[-self.max_history:], maxlen=self.max_history)
+            for step, durations in loaded.items()
+        }
+        self.wait_policy.reset()
+        for step, durations in loaded.items():
+            for duration in durations:
+                self.wait_policy.observe(step, duration)
 
-    def wait_for_page_load(self, driver, timeout=5, check_interval=0.2):
-        """等待页面加载完成 - 智能检测
+    def record_timing(self, step_name, duration, success=True, persist=True):
+        """记录步骤实际耗时,用于之后的smart_sleep(persist=False时不写入持久化存储,由调用方负责)"""
+        if success:
+            history = self.timing_history.setdefault(step_name, deque(maxlen=self.max_history))
+            history.append(duration)
+            self.wait_policy.observe(step_name, duration)
+        if persist and self.timing_store:
+            self.timing_store.record(step_name, duration, success, self.device, self.network)
 
-        替代固定sleep,通过检测页面稳定性判断加载完成
+    def wait_for_page_load(self, driver, timeout=5, check_interval=0.1, max_interval=0.8,
+                           backoff=1.6, required_stable=1, mask: Optional[StabilityMask] = None):
+        """等待页面加载完成 - 结构指纹稳定性检测
+
+        替代固定sleep,通过比较页面结构指纹判断加载完成。
+        检查间隔从check_interval开始按backoff倍数递增到max_interval,
+        快速加载的页面很快返回,慢页面不会频繁获取;掩码中的易变区域(如倒计时)不影响判断
 
         Args:
             driver: Appium driver
             timeout: 最大等待时间
-            check_interval: 检查间隔
+            check_interval: 初始检查间隔
+            max_interval: 最大检查间隔
+            backoff: 间隔递增倍数
+            required_stable: 需要连续几次指纹相同才认为稳定
+            mask: 易变区域忽略规则
 
         Returns:
-            bool: 是否加载完成
+            (bool, float): 是否加载完成, 耗时
         """
         start_time = time.time()
-        previous_source = None
+        service = get_snapshot_service(driver)
+        previous_fingerprint = None
+        previous_seq = 0
         stable_count = 0
-        required_stable = 2  # 需要连续2次page_source相同才认为稳定
+        interval = check_interval
+        snapshots_used = 0
+        fetches_before = service.stats["fetches"]
+
+        def finish(loaded, elapsed):
+            self.page_load_history.append({
+                "loaded": loaded,
+                "elapsed": elapsed,
+                "snapshots": snapshots_used,
+                # 包含同期其他线程的获取,近似值
+                "fetches": service.stats["fetches"] - fetches_before
+            })
+            return loaded, elapsed
 
         while time.time() - start_time < timeout:
             try:
-                current_source = driver.page_source
-
-                if previous_source == current_source:
-                    stable_count += 1
-                    if stable_count >= required_stable:
-                        # 页面稳定,加载完成
-                        elapsed = time.time() - start_time
-                        return True, elapsed
-                else:
-                    stable_count = 0
-
-                previous_source = current_source
-                time.sleep(check_interval)
+                # 复用其他线程在检查间隔内获取的快照,但只接受本次等待开始之后的快照
+                # (首次必然重新获取,避免用跳转前的旧页面判定"已稳定")
+                snapshot = service.get(max_age=min(interval, time.time() - start_time))
+
+                if snapshot.seq != previous_seq:
+                    snapshots_used += 1
+                    fingerprint = structural_fingerprint(snapshot.page_source, mask)
+                    if previous_fingerprint == fingerprint:
+                        stable_count += 1
+                        if stable_count >= required_stable:
+                            # 页面稳定,加载完成
+                            return finish(True, time.time() - start_time)
+                    else:
+                        stable_count = 0
+
+                    previous_fingerprint = fingerprint
+                    previous_seq = snapshot.seq
+                    interval = min(interval * backoff, max_interval)
 
             except Exception as e:
                 # 获取page_source失败,继续等待
-                time.sleep(check_interval)
-                continue
+                interval = min(interval * backoff, max_interval)
+
+            time.sleep(min(interval, max(0, timeout - (time.time() - start_time))))
 
         # 超时
-        return False, timeout
+        return finish(False, timeout)
+
+    def get_page_load_stats(self) -> Dict:
+        """页面加载等待统计(平均每次等待使用的快照数和耗时)"""
+        history = list(self.page_load_history)
+        if not history:
+            return {"waits": 0, "avg_snapshots": 0.0, "avg_elapsed": 0.0, "timeouts": 0}
+        return {
+            "waits": len(history),
+            "avg_snapshots": sum(h["snapshots"] for h in history) / len(history),
+            "avg_elapsed": sum(h["elapsed"] for h in history) / len(history),
+            "timeouts": sum(1 for h in history if not h["loaded"])
+        }
 
     def wait_for_element(self, driver, finder_func, timeout=5, check_interval=0.2):
         """等待元素出现
@@ -101,7 +520,7 @@ class SmartWait:
     def smart_sleep(self, step_name, default_duration=1.0, min_duration=0.3, max_duration=3.0):
         """智能等待 - 基于历史数据自动调优
 
-        根据该步骤的历史平均耗时,动态调整等待时间
+        根据该步骤历史耗时的分位数(默认P90)加抖动余量,动态调整等待时间
 
         Args:
             step_name: 步骤名称
@@ -112,15 +531,7 @@ class SmartWait:
         Returns:
             float: 实际等待时间
         """
-        if step_name in self.timing_history and len(self.timing_history[step_name]) > 0:
-            # 计算历史平均耗时
-            history = list(self.timing_history[step_name])
-            avg_duration = sum(history) / len(history)
-
-            # 使用平均值的1.2倍作为等待时间(留20%余量)
-            wait_time = min(max(avg_duration * 1.2, min_duration), max_duration)
-        else:
-            wait_time = default_duration
+        wait_time = self.wait_policy.recommend(step_name, default_duration, min_duration, max_duration)
 
         time.sleep(wait_time)
         return wait_time
@@ -134,6 +545,8 @@ class ParallelPopupHandler:
         self.log = log_func if log_func else print
         self.running = False
         self.check_thread = None
+        self._snapshot_event = threading.Event()
+        self._pending_snapshot = None
         self.popup_keywords = [
             '关闭', '取消', '知道了', '确定',
             '跳过', '稍后', '不了', '开启'
@@ -160,25 +573,42 @@ class ParallelPopupHandler:
     def stop(self):
         """停止后台检查"""
         self.running = False
+        self._snapshot_event.set()
         if self.check_thread:
             self.check_thread.join(timeout=1)
         self.log("后台弹窗检查已停止")
 
-    def _check_loop(self, interval):
-        """后台检查循环"""
-        while self.running:
-            try:
-                self._check_and_dismiss_popup()
-            except Exception as e:
-                # 静默失败,不影响主流程
-                pass
+    def _on_snapshot(self, snapshot):
+        """快照回调 - 只记录，由检查线程处理，避免在获取快照的线程中点击"""
+        self._pending_snapshot = snapshot
+        self._snapshot_event.set()
 
-            time.sleep(interval)
-
-    def _check_and_dismiss_popup(self):
+    def _check_loop(self, interval):
+        """后台检查循环 - 订阅快照服务，复用其他线程获取的页面"""
+        set_thread_priority(CommandPriority.BACKGROUND)
+        service = get_snapshot_service(self.driver)
+        token = service.subscribe(self._on_snapshot, poll_interval=interval)
+        try:
+            while self.running:
+                if not self._snapshot_event.wait(interval * 2):
+                    continue
+                self._snapshot_event.clear()
+                snapshot = self._pending_snapshot
+                if snapshot is None or not self.running:
+                    continue
+                try:
+                    self._check_and_dismiss_popup(snapshot.page_source)
+                except Exception as e:
+                    # 静默失败,不影响主流程
+                    pass
+        finally:
+            service.unsubscribe(token)
+
+    def _check_and_dismiss_popup(self, page_source=None):
         """检查并关闭弹窗"""
         try:
-            page_source = self.driver.page_source
+            if page_source is None:
+                page_source = get_snapshot_service(self.driver).get().page_source
 
             # ⚠️ 先检查是否在正常功能页面，避免误关闭
             functional_pages = [
@@ -240,10 +670,34 @@ class ParallelPopupHandler:
 class PerformanceMonitor:
     """性能监控器 - 记录每步耗时并自动调优"""
 
-    def __init__(self, log_func=None):
+    def __init__(self, log_func=None, timing_store: Optional[TimingStore] = None, device="", network="",
+                 wait_percentile: float = 0.9, jitter_margin: float = 0.05,
+                 smart_wait: Optional[SmartWait] = None):
         self.log = log_func if log_func else print
+        self.smart_wait = smart_wait  # 每步实际耗时同步给智能等待,用于smart_sleep
+        self.wait_policy = QuantileWaitPolicy(wait_percentile, jitter_margin)
         self.timings: List[StepTiming] = []
         self.step_stats: Dict[str, Dict] = {}  # 步骤统计信息
+        self.timing_store = timing_store
+        self.device = device
+        self.network = network
+        self.seed_durations: Dict[str, List[float]] = {}  # 历史运行的耗时(启动时加载)
+        if timing_store:
+            self.bind_device(device, network)
+
+    def bind_device(self, device, network):
+        """切换设备/网络环境,并从持久化存储加载对应的历史耗时"""
+        self.device = device
+        self.network = network
+        if self.timing_store:
+            loaded = self.timing_store.load(device, network)
+            self.seed_durations = {step: durations[-10:] for step, durations in loaded.items()}
+            self.wait_policy.reset()
+            for step, durations in loaded.items():
+                for duration in durations:
+                    self.wait_policy.observe(step, duration)
+            if self.seed_durations:
+                self.log(f"[性能] 已加载{len(self.seed_durations)}个步骤的历史耗时 ({device or '默认设备'})")
 
     def start_step(self, step_name):
         """开始记录步骤
@@ -266,6 +720,8 @@ class PerformanceMonitor:
         """
         end_time = time.time()
         duration = end_time - start_time
+        get_trace_recorder().complete(step_name, "step", time.perf_counter() - duration, duration,
+                                      {"success": success})
 
         # 记录本次耗时
         timing = StepTiming(
@@ -283,7 +739,7 @@ class PerformanceMonitor:
                 'count': 0,
                 'total_duration': 0,
                 'success_count': 0,
-                'durations': deque(maxlen=10)  # 最近10次
+                'durations': deque(self.seed_durations.get(step_name, []), maxlen=10)  # 最近10次(含历史运行)
             }
 
         stats = self.step_stats[step_name]
@@ -292,6 +748,13 @@ class PerformanceMonitor:
         stats['durations'].append(duration)
         if success:
             stats['success_count'] += 1
+            self.wait_policy.observe(step_name, duration)
+
+        if self.timing_store:
+            self.timing_store.record(step_name, duration, success, self.device, self.network)
+        if self.smart_wait is not None:
+            self.smart_wait.record_timing(step_name, duration, success,
+                                          persist=self.smart_wait.timing_store is not self.timing_store)
 
         # 输出日志
         avg_duration = stats['total_duration'] / stats['count']
@@ -305,7 +768,7 @@ class PerformanceMonitor:
     def get_recommended_wait(self, step_name, default=1.0):
         """获取推荐的等待时间
 
-        基于历史数据计算最优等待时间
+        基于历史耗时的分位数(默认P90)加抖动余量
 
         Args:
             step_name: 步骤名称
@@ -314,19 +777,18 @@ class PerformanceMonitor:
         Returns:
             float: 推荐等待时间
         """
-        if step_name not in self.step_stats:
-            return default
-
-        stats = self.step_stats[step_name]
-        if len(stats['durations']) == 0:
-            return default
-
-        # 取最近10次的平均值
-        recent_durations = list(stats['durations'])
-        avg = sum(recent_durations) / len(recent_durations)
-
-        # 返回平均值的1.2倍(留余量)
-        return min(avg * 1.2, 3.0)  # 最大3秒
+        return self.wait_policy.recommend(step_name, default, 0.0, 3.0)  # 最大3秒
+
+    def compare_wait_policies(self, step_name) -> Optional[Dict[str, Dict[str, float]]]:
+        """在该步骤的历史耗时上对比平均值策略与分位数策略(见compare_wait_policies)"""
+        durations = []
+        if self.timing_store:
+            durations = self.timing_store.load(self.device, self.network).get(step_name, [])
+        if not durations and step_name in self.step_stats:
+            durations = list(self.step_stats[step_name]['durations'])
+        if len(durations) < 2:
+            return None
+        return compare_wait_policies(durations, self.wait_policy.percentile, self.wait_policy.jitter_margin)
 
     def get_report(self):
         """生成性能报告
@@ -390,3 +852,15 @@ if __name__ == "__main__":
 
     # 打印报告
     monitor.print_report()
+
+    # 示例: 在已记录的耗时上对比等待策略
+    store = TimingStore()
+    for step_name, durations in store.load().items():
+        if len(durations) < 2:
+            continue
+        report = compare_wait_policies(durations)
+        print(f"{step_name} ({report['mean']['samples']}次):")
+        for name, label in (("mean", "平均值*1.2"), ("quantile", "P90+余量")):
+            stats = report[name]
+            print(f"  {label}: 过早率 {stats['premature_rate']:.0%}, "
+                  f"空等 {stats['idle_seconds']:.2f}秒, 平均误差 {stats['avg_error']:.3f}秒")
@@ -0,0 +1,14 @@
+# -*- coding: UTF-8 -*-
+"""
+测试公共配置
+
+damai_appium/__init__.py 会导入appium，单元测试直接从模块目录导入不依赖appium的模块；
+根目录的模块（smart_wait、connection_auto_fixer等）从程序目录导入
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "damai_appium"))
@@ -0,0 +1,52 @@
+# -*- coding: UTF-8 -*-
+"""W3C动作计划：发送失败时区分是否已执行，观演人勾选状态"""
+
+import pytest
+
+pytest.importorskip("selenium")
+
+from action_plan import ActionPlan, checked_state  # noqa: E402
+
+
+ATTENDEES = """<hierarchy>
+  <node class="android.widget.LinearLayout" bounds="[0,0][720,400]">
+    <node class="android.widget.RelativeLayout" bounds="[0,0][720,100]">
+      <node class="android.widget.TextView" text="张三" bounds="[40,20][200,80]"/>
+      <node class="android.widget.CheckBox" checkable="true" checked="true" bounds="[600,20][680,80]"/>
+    </node>
+    <node class="android.widget.RelativeLayout" bounds="[0,100][720,200]">
+      <node class="android.widget.TextView" text="李四" bounds="[40,120][200,180]"/>
+      <node class="android.widget.CheckBox" checkable="true" checked="false" bounds="[600,120][680,180]"/>
+    </node>
+    <node class="android.widget.TextView" text="王五" bounds="[40,220][200,280]"/>
+  </node>
+</hierarchy>"""
+
+
+class _Driver:
+    def __init__(self, error):
+        self.error = error
+
+    def execute(self, command, params=None):
+        if command == "actions" and self.error:
+            raise self.error
+
+
+def test_checked_state():
+    assert checked_state(ATTENDEES, "张三") is True
+    assert checked_state(ATTENDEES, "李四") is False
+    assert checked_state(ATTENDEES, "王五") is None
+    assert checked_state("<not xml", "张三") is None
+
+
+@pytest.mark.parametrize("error, rejected", [
+    (Exception("invalid argument: Unsupported pointer type"), True),
+    (Exception("unknown command: The requested resource could not be found"), True),
+    (Exception("HTTPConnectionPool(host='127.0.0.1', port=4723): Read timed out. (read timeout=120)"), False),
+    (None, False),
+])
+def test_dispatch_reports_rejection(error, rejected):
+    plan = ActionPlan().tap(100, 100, "张三")
+    success, _ = plan.dispatch(_Driver(error))
+    assert success is (error is None)
+    assert plan.rejected is rejected
@@ -0,0 +1,46 @@
+# -*- coding: UTF-8 -*-
+"""Activity级状态恢复：已在原页面时不重新启动，extras按字符串重放"""
+
+from activity_restore import ActivityState, parse_resumed_activity, restore_activity_state
+
+
+class _Driver:
+    def __init__(self, activity):
+        self.current_activity = activity
+        self.scripts = []
+
+    def execute_script(self, script, params):
+        self.scripts.append((script, params))
+        self.current_activity = params["intent"].split("/", 1)[1]
+
+
+def _state():
+    return ActivityState(package="cn.damai", activity=".projectdetail.ui.ProjectDetailActivity")
+
+
+def test_skips_launch_when_already_on_page():
+    driver = _Driver("cn.damai.projectdetail.ui.ProjectDetailActivity")
+    result = restore_activity_state(driver, _state(), log_func=lambda msg: None)
+    assert result.success and result.method == "current"
+    assert driver.scripts == []
+
+
+def test_launches_when_on_other_page():
+    driver = _Driver(".homepage.MainActivity")
+    result = restore_activity_state(driver, _state(), log_func=lambda msg: None, precheck_timeout=0.1)
+    assert result.success and result.method == "activity"
+    assert driver.scripts[0][0] == "mobile: startActivity"
+
+
+DUMPSYS = """
+  ResumedActivity: ActivityRecord{5f3a2c1 u0 cn.damai/.projectdetail.ui.ProjectDetailActivity t42}
+    * Hist #0: ActivityRecord{5f3a2c1 u0 cn.damai/.projectdetail.ui.ProjectDetailActivity t42}
+      Intent { flg=0x10000000 cmp=cn.damai/.projectdetail.ui.ProjectDetailActivity (has extras) }
+      extras=Bundle[{projectId=723451908821, from=search, isPreSale=true}]
+"""
+
+
+def test_dumped_extras_are_replayed_as_strings():
+    state = parse_resumed_activity(DUMPSYS)
+    assert state.extras == [("s", "projectId", "723451908821"), ("s", "from", "search"),
+                            ("s", "isPreSale", "true")]
@@ -0,0 +1,50 @@
+# -*- coding: UTF-8 -*-
+"""ADB客户端：只在连不上服务器时改用adb进程，全局实例不随路径重建"""
+
+import socket
+
+import pytest
+
+import adb_client
+from adb_client import AdbClient, AdbResult
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = AdbClient("adb", log_func=lambda msg: None)
+    client.subprocess_calls = []
+    monkeypatch.setattr(client, "_run_subprocess",
+                        lambda args, timeout: client.subprocess_calls.append(args) or AdbResult(args, 0))
+    return client
+
+
+def test_falls_back_when_server_unreachable(client, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise ConnectionRefusedError("refused")
+
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setattr(client, "start_server", lambda: False)
+    client.run(["-s", "127.0.0.1:59700", "shell", "input tap 1 1"])
+    assert client.subprocess_calls == [["-s", "127.0.0.1:59700", "shell", "input tap 1 1"]]
+
+
+@pytest.mark.parametrize("error", [ConnectionResetError("reset"), BrokenPipeError("pipe")])
+def test_does_not_rerun_after_connection_drops(client, monkeypatch, error):
+    def drop(serial, command, timeout=None):
+        raise error
+
+    monkeypatch.setattr(client, "shell", drop)
+    result = client.run(["-s", "127.0.0.1:59700", "shell", "input tap 1 1"])
+    assert result.returncode == 1 and "连接中断" in result.stderr
+    assert client.subprocess_calls == []
+
+
+def test_global_client_is_not_rebuilt_for_another_path(monkeypatch):
+    monkeypatch.setattr(adb_client, "_adb_client_instance", None)
+    monkeypatch.setattr(adb_client, "_adb_path_given", False)
+
+    default = adb_client.get_adb_client()
+    first = adb_client.get_adb_client("/opt/platform-tools/adb")
+    second = adb_client.get_adb_client("C:/tools/adb.exe")
+    assert default is first is second
+    assert second.adb_path == "/opt/platform-tools/adb"
@@ -0,0 +1,41 @@
+# -*- coding: UTF-8 -*-
+"""设备时钟校准：经ADB客户端采样"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from clock_sync import DeviceClockCalibrator
+
+
+class _Adb:
+    def __init__(self, offset, fail_every=0):
+        self.offset = offset
+        self.fail_every = fail_every
+        self.calls = 0
+
+    def shell(self, serial, command, timeout=None):
+        self.calls += 1
+        if self.fail_every and self.calls % self.fail_every == 0:
+            raise TimeoutError("read timed out")
+        return SimpleNamespace(returncode=0, stdout=f"{time.time() + self.offset:.9f}\n")
+
+
+def test_calibrate_estimates_offset_through_adb_client():
+    adb = _Adb(offset=2.5, fail_every=3)
+    calibrator = DeviceClockCalibrator("127.0.0.1:59700", adb, samples=6, log_func=lambda msg: None)
+    received = []
+    calibrator.listeners.append(received.append)
+
+    estimate = calibrator.calibrate()
+
+    assert adb.calls == 6 and estimate.samples == 4
+    assert estimate.offset == pytest.approx(2.5, abs=0.01)
+    assert received == [estimate] and calibrator.latest is estimate
+
+
+def test_calibrate_returns_none_without_samples():
+    calibrator = DeviceClockCalibrator("127.0.0.1:59700", _Adb(0, fail_every=1), samples=3,
+                                       log_func=lambda msg: None)
+    assert calibrator.calibrate() is None
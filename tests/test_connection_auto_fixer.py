@@ -0,0 +1,76 @@
+# -*- coding: UTF-8 -*-
+"""僵尸连接分级修复：ADB命令超时时记录失败而不是抛出，未授权设备只报告"""
+
+import subprocess
+from pathlib import Path
+
+import connection_auto_fixer
+from connection_auto_fixer import ConnectionAutoFixer, RepairRung, ZombieRepairReport
+
+
+class _HangingAdb:
+    def __init__(self, hang_on):
+        self.hang_on = hang_on
+        self.commands = []
+
+    def run(self, args, timeout=None):
+        self.commands.append(args[0])
+        if args[0] == self.hang_on:
+            raise subprocess.TimeoutExpired(["adb"] + args, timeout)
+
+
+def _fixer(monkeypatch, adb):
+    monkeypatch.setattr(ConnectionAutoFixer, "_find_adb", lambda self: Path("adb"))
+    fixer = ConnectionAutoFixer()
+    fixer.adb = adb
+    fixer._log = lambda message, level="INFO": None
+    return fixer
+
+
+def test_restart_rung_records_kill_server_timeout(monkeypatch):
+    adb = _HangingAdb("kill-server")
+    fixer = _fixer(monkeypatch, adb)
+
+    rung = fixer._repair_rung_restart(["127.0.0.1:59700"], ["127.0.0.1:59701"], verify_timeout=0.1)
+
+    assert not rung.success
+    assert "kill-server" in rung.error
+    assert rung.failed == ["127.0.0.1:59700", "127.0.0.1:59701"]
+    assert adb.commands == ["kill-server"]
+    report = ZombieRepairReport(targets=["127.0.0.1:59700"], rungs=[rung])
+    assert not report.success and "超时" in report.lines()[0]
+
+
+def test_restart_rung_without_devices_still_fails_on_timeout(monkeypatch):
+    fixer = _fixer(monkeypatch, _HangingAdb("start-server"))
+    rung = fixer._repair_rung_restart([], [], verify_timeout=0.1)
+    assert not rung.success and "start-server" in rung.error
+
+
+def test_unauthorized_devices_are_reported_not_repaired(monkeypatch):
+    fixer = _fixer(monkeypatch, _HangingAdb(None))
+    monkeypatch.setattr(connection_auto_fixer, "current_device_states", lambda adb, timeout=10: {
+        "127.0.0.1:59700": "offline", "127.0.0.1:59701": "unauthorized", "127.0.0.1:59702": "device"})
+    reconnected, restarted = [], []
+
+    def reconnect(serials, verify_timeout):
+        reconnected.extend(serials)
+        return RepairRung(name="重连异常设备", targets=list(serials), failed=list(serials))
+
+    def restart(serials, healthy, verify_timeout):
+        restarted.extend(serials)
+        return RepairRung(name="重启ADB服务器", targets=list(serials), recovered=list(serials),
+                          downtime={s: 1.0 for s in serials})
+
+    monkeypatch.setattr(fixer, "_repair_rung_reconnect", reconnect)
+    monkeypatch.setattr(fixer, "_repair_rung_restart", restart)
+
+    report = fixer.repair_zombie_connections(max_restarts=1)
+    assert reconnected == restarted == ["127.0.0.1:59700"]
+    assert report.unauthorized == ["127.0.0.1:59701"]
+    assert not report.success
+    assert "127.0.0.1:59701" in report.lines()[0]
+
+    reconnected.clear()
+    report = fixer.repair_zombie_connections(serials=["127.0.0.1:59701"])
+    assert reconnected == [] and report.rungs == []
@@ -0,0 +1,30 @@
+# -*- coding: UTF-8 -*-
+"""体检阶段调度：顺序模式下时限从阶段实际开始时计算"""
+
+import threading
+import time
+
+from connection_first_aid import ConnectionFirstAid, DiagnosticPhase, DiagnosticReport
+
+
+def _first_aid():
+    # 不查找adb、不创建修复器，只测试阶段调度
+    first_aid = ConnectionFirstAid.__new__(ConnectionFirstAid)
+    first_aid.logger = None
+    first_aid._log = lambda message, level="INFO": None
+    first_aid._log_buffer = threading.local()
+    first_aid._log_lock = threading.Lock()
+    return first_aid
+
+
+def test_sequential_phase_queued_behind_timeout_gets_full_deadline():
+    report = DiagnosticReport()
+    phases = [
+        DiagnosticPhase("Slow", lambda r: time.sleep(0.6), 'system_status', deadline=0.2),
+        DiagnosticPhase("Quick", lambda r: time.sleep(0.05), 'network_status', deadline=0.3),
+    ]
+    _first_aid()._run_phases(phases, report, parallel=False)
+
+    assert report.phase_timings["Slow"]["status"] == "timeout"
+    assert report.phase_timings["Quick"]["status"] == "ok"
+    assert report.phase_timings["Quick"]["start"] >= 0.55
@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+"""倒计时：设备时钟偏差和调度"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from countdown_timer import CountdownManager, CountdownTimer
+
+
+@pytest.fixture
+def manager():
+    manager = CountdownManager()
+    yield manager
+    manager.shutdown()
+
+
+def test_new_timers_take_calibrated_offset(manager):
+    calibrator = SimpleNamespace(latest=SimpleNamespace(offset=0.8), listeners=[])
+    manager.follow_clock(calibrator)
+
+    timer = CountdownTimer(datetime.now() + timedelta(hours=1))
+    manager.add_timer("grab", timer)
+    assert timer.clock_offset == pytest.approx(0.8)
+
+
+def test_recalibration_shifts_running_timer(manager):
+    calibrator = SimpleNamespace(latest=None, listeners=[])
+    manager.follow_clock(calibrator)
+    timer = CountdownTimer(datetime.now() + timedelta(hours=1))
+    manager.add_timer("grab", timer)
+    timer.start()
+    deadline = timer._deadline
+
+    for listener in calibrator.listeners:
+        listener(SimpleNamespace(offset=0.25))
+    assert timer.clock_offset == pytest.approx(0.25)
+    assert timer._deadline == pytest.approx(deadline - 0.25)
+
+
+def test_start_does_not_wait_for_slow_prepare(manager):
+    order = []
+    prepared = threading.Event()
+
+    def on_prepare():
+        order.append("prepare")
+        time.sleep(0.8)  # 开始时刻到达时准备回调仍在执行
+        order.append("prepared")
+        prepared.set()
+
+    done = threading.Event()
+    timer = CountdownTimer(datetime.now() + timedelta(seconds=0.6), prepare_seconds=0.5,
+                           on_prepare=on_prepare, on_start=lambda: order.append("start"),
+                           on_complete=done.set)
+    manager.add_timer("grab", timer)
+    timer.start()
+
+    assert done.wait(3)
+    assert order == ["prepare", "start"]
+    assert abs(timer.get_trigger_stats()["last_error_ms"]) < 100
+    assert id(timer) not in manager.scheduler._last_values
+    assert prepared.wait(3)
+
+
+def test_fire_error_is_recorded_when_start_callback_begins(manager):
+    timer = CountdownTimer(datetime.now() + timedelta(seconds=0.2), prepare_seconds=0,
+                           on_start=lambda: None)
+    manager.add_timer("grab", timer)
+    # 开始回调线程池被占满，回调排队
+    busy = threading.Event()
+    for _ in range(4):
+        manager.scheduler._start_pool.submit(busy.wait, 2)
+    timer.start()
+    time.sleep(0.5)
+    assert timer.get_trigger_stats()["fires"] == 0
+    busy.set()
+    time.sleep(0.2)
+    assert timer.get_trigger_stats()["last_error_ms"] > 200
@@ -0,0 +1,63 @@
+# -*- coding: UTF-8 -*-
+"""快速抢票：预热计划在发送前按当前页面重新校验"""
+
+import pytest
+
+pytest.importorskip("selenium")
+
+from action_plan import ActionPlan  # noqa: E402
+from fast_grabber import FastGrabber, GrabConfig  # noqa: E402
+
+
+PAGE = """<hierarchy width="720" height="1280">
+  <node class="android.widget.FrameLayout" bounds="[0,0][720,1280]">
+    <node class="android.widget.TextView" text="{session}" clickable="true" bounds="[0,300][720,500]"/>
+    <node class="android.widget.TextView" text="680元" clickable="true" bounds="[0,500][720,700]"/>
+  </node>
+</hierarchy>"""
+
+# 预热后页面已换成只有底部弹窗的界面
+STALE_PAGE = """<hierarchy width="720" height="1280">
+  <node class="android.widget.FrameLayout" bounds="[0,900][720,1280]">
+    <node class="android.widget.TextView" text="网络异常，请重试" bounds="[40,950][680,1050]"/>
+  </node>
+</hierarchy>"""
+
+
+class _Driver:
+    def __init__(self, page_source):
+        self.page_source = page_source
+        self.sent = []
+
+    def execute(self, command, params=None):
+        if command == "actions":
+            self.sent.append(params)
+
+
+def _config():
+    return GrabConfig(session_x=360, session_y=400, price_x=360, price_y=600, buy_x=360, buy_y=1100)
+
+
+def _plan(config):
+    return (ActionPlan()
+            .tap(config.session_x, config.session_y, "场次")
+            .tap(config.price_x, config.price_y, "票档"))
+
+
+def test_cached_plan_is_sent_when_page_still_matches():
+    driver = _Driver(PAGE.format(session="2025-12-31 周三 19:30"))
+    config = _config()
+    success, _ = FastGrabber(driver).select_session_and_price(config, _plan(config))
+    assert success
+    assert len(driver.sent) == 1
+
+
+def test_cached_plan_is_rejected_when_page_has_changed():
+    driver = _Driver(STALE_PAGE)
+    config = _config()
+    plan = _plan(config)
+    success, message = FastGrabber(driver).select_session_and_price(config, plan)
+    assert not success
+    assert plan.rejected
+    assert driver.sent == []
+    assert "未命中" in message
@@ -0,0 +1,123 @@
+# -*- coding: UTF-8 -*-
+"""恢复动作规划：错误分类和排序"""
+
+import pytest
+
+from recovery_planner import (ErrorClass, RecoveryAction, RecoveryPlanner, SESSION_ERROR_CLASSES,
+                              classify_error)
+
+
+# selenium>=4.18 的 str(exception) 格式：Message + 文档链接 + Appium堆栈
+NO_SUCH_ELEMENT = (
+    "Message: An element could not be located on the page using the given search parameters.; "
+    "For documentation on this error, please visit: "
+    "https://www.selenium.dev/documentation/webdriver/troubleshooting/errors#no-such-element-exception\n"
+    "Stacktrace:\n"
+    "NoSuchElementError: An element could not be located on the page using the given search parameters.\n"
+    "    at AndroidUiautomator2Driver.findElOrEls "
+    "(/usr/lib/node_modules/appium-uiautomator2-driver/lib/commands/find.js:75:11)\n"
+    "    at process.processTicksAndRejections (node:internal/process/task_queues:95:5)\n"
+)
+STALE_ELEMENT = (
+    "Message: The element 'By.id: cn.damai:id/btn_buy' does not exist in DOM anymore; "
+    "For documentation on this error, please visit: "
+    "https://www.selenium.dev/documentation/webdriver/troubleshooting/errors#stale-element-reference-exception\n"
+    "Stacktrace:\n"
+    "StaleElementReferenceError: The element 'By.id: cn.damai:id/btn_buy' does not exist in DOM anymore\n"
+    "    at AndroidUiautomator2Driver.click (/usr/lib/node_modules/appium/lib/session.js:120:9)\n"
+)
+INVALID_SELECTOR = (
+    "Message: Could not parse selector expression `new UiSelector().text(\"立即购买`; "
+    "For documentation on this error, please visit: "
+    "https://www.selenium.dev/documentation/webdriver/troubleshooting/errors#invalid-selector-exception\n"
+)
+SESSION_TERMINATED = (
+    "Message: A session is either terminated or not started\n"
+    "Stacktrace:\n"
+    "NoSuchDriverError: A session is either terminated or not started\n"
+)
+UIA2_CRASH = (
+    "Message: An unknown server-side error occurred while processing the command. Original error: "
+    "'GET /source' cannot be proxied to UiAutomator2 server because the instrumentation process "
+    "is not running (probably crashed). Check the server log and/or the logcat output for more details\n"
+)
+
+
+@pytest.mark.parametrize("message", [NO_SUCH_ELEMENT, STALE_ELEMENT, INVALID_SELECTOR])
+def test_element_errors_are_transient(message):
+    assert classify_error(message) is ErrorClass.TRANSIENT
+    assert classify_error(message) not in SESSION_ERROR_CLASSES
+
+
+def test_session_and_crash_errors():
+    assert classify_error(SESSION_TERMINATED) is ErrorClass.SESSION_LOST
+    assert classify_error("Message: invalid session id") is ErrorClass.SESSION_LOST
+    assert classify_error(UIA2_CRASH) is ErrorClass.UIA2_CRASH
+    assert classify_error("Could not find a connected Android device in 20000ms") is ErrorClass.DEVICE_OFFLINE
+
+
+def test_bare_words_in_links_and_stacks_do_not_match():
+    text = "Message: something odd; see https://www.selenium.dev/documentation/webdriver/session\n" \
+           "Stacktrace:\n    at Session.execute (/lib/session.js:1:1)"
+    assert classify_error(text) is ErrorClass.UNKNOWN
+
+
+def test_exception_type_takes_precedence():
+    class NoSuchElementException(Exception):
+        pass
+
+    class InvalidSessionIdException(Exception):
+        pass
+
+    assert classify_error(NoSuchElementException("session")) is ErrorClass.TRANSIENT
+    assert classify_error(InvalidSessionIdException("")) is ErrorClass.SESSION_LOST
+
+
+def test_selenium_exception_types():
+    exceptions = pytest.importorskip("selenium.common.exceptions")
+    assert classify_error(exceptions.NoSuchElementException("An element could not be located")) \
+        is ErrorClass.TRANSIENT
+    assert classify_error(exceptions.StaleElementReferenceException("stale")) is ErrorClass.TRANSIENT
+    assert classify_error(exceptions.InvalidSessionIdException("invalid session id")) is ErrorClass.SESSION_LOST
+
+
+def test_ladder_learns_ordering(tmp_path):
+    planner = RecoveryPlanner(store_path=tmp_path / "stats.json", log_func=lambda msg: None)
+    planner.register(RecoveryAction("cheap", "便宜", lambda msg: False, (ErrorClass.TRANSIENT,), cost=0.1))
+    planner.register(RecoveryAction("steady", "稳定", lambda msg: True, (ErrorClass.TRANSIENT,), cost=1.0))
+
+    outcome = planner.recover(NO_SUCH_ELEMENT)
+    assert outcome.success and outcome.action == "steady"
+    assert [a.name for a in planner.plan(ErrorClass.TRANSIENT)] == ["steady", "cheap"]
+
+    reloaded = RecoveryPlanner(store_path=tmp_path / "stats.json", log_func=lambda msg: None)
+    assert reloaded.stats[(ErrorClass.TRANSIENT, "cheap")].attempts == 1
+
+
+def test_verify_failure_counts_as_failure(tmp_path):
+    planner = RecoveryPlanner(store_path=tmp_path / "stats.json", log_func=lambda msg: None)
+    planner.register(RecoveryAction("probe", "探测", lambda msg: True, (ErrorClass.TRANSIENT,), cost=0.1))
+    outcome = planner.recover(NO_SUCH_ELEMENT, verify=lambda: False)
+    assert not outcome.success
+    assert planner.stats[(ErrorClass.TRANSIENT, "probe")].successes == 0
+
+
+def test_disabled_actions_are_skipped(tmp_path):
+    planner = RecoveryPlanner(store_path=tmp_path / "stats.json", log_func=lambda msg: None)
+    planner.register(RecoveryAction("restart_app", "重启App", lambda msg: True, (ErrorClass.UNKNOWN,),
+                                    cost=10, enabled=lambda: False))
+    outcome = planner.recover("something odd")
+    assert not outcome.success and outcome.steps == []
+    assert (ErrorClass.UNKNOWN, "restart_app") not in planner.stats
+
+
+def test_excluded_actions_are_skipped(tmp_path):
+    planner = RecoveryPlanner(store_path=tmp_path / "stats.json", log_func=lambda msg: None)
+    planner.register(RecoveryAction("first", "第一步", lambda msg: True, (ErrorClass.TRANSIENT,), cost=0.1))
+    planner.register(RecoveryAction("second", "第二步", lambda msg: True, (ErrorClass.TRANSIENT,), cost=1.0))
+
+    tried = set()
+    for expected in ("first", "second", ""):
+        outcome = planner.recover(NO_SUCH_ELEMENT, exclude=tried)
+        tried.update(name for name, _, _ in outcome.steps)
+        assert outcome.action == expected
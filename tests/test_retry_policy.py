@@ -0,0 +1,59 @@
+# -*- coding: UTF-8 -*-
+"""统一重试策略：按错误类型重试和截止时间"""
+
+import pytest
+
+import retry_policy
+from retry_policy import deadline_scope, get_retry_policy, remaining_time
+from test_recovery_planner import NO_SUCH_ELEMENT, SESSION_TERMINATED
+
+
+@pytest.fixture(autouse=True)
+def no_backoff_wait(monkeypatch):
+    monkeypatch.setattr(retry_policy, "accounted_sleep", lambda seconds, reason="": None)
+
+
+def _failing(messages):
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) <= len(messages):
+            raise Exception(messages[len(calls) - 1])
+        return "ok"
+    return func, calls
+
+
+def test_strategy_retries_missing_element():
+    func, calls = _failing([NO_SUCH_ELEMENT, NO_SUCH_ELEMENT])
+    assert get_retry_policy("strategy").call(func, "test.strategy") == "ok"
+    assert len(calls) == 3
+
+
+def test_strategy_retries_missing_element_exception_type():
+    exceptions = pytest.importorskip("selenium.common.exceptions")
+    calls = []
+
+    def func():
+        calls.append(1)
+        if len(calls) == 1:
+            raise exceptions.NoSuchElementException(NO_SUCH_ELEMENT)
+        return "ok"
+    assert get_retry_policy("strategy").call(func, "test.strategy_type") == "ok"
+    assert len(calls) == 2
+
+
+def test_strategy_does_not_retry_lost_session():
+    func, calls = _failing([SESSION_TERMINATED])
+    with pytest.raises(Exception):
+        get_retry_policy("strategy").call(func, "test.session_lost")
+    assert len(calls) == 1
+
+
+def test_nested_deadline_never_exceeds_outer():
+    with deadline_scope(1.0, "outer"):
+        with deadline_scope(30, "inner") as inner:
+            assert inner.remaining() <= 1.0
+            assert inner.site == "outer"
+        assert remaining_time() <= 1.0
+    assert remaining_time() is None
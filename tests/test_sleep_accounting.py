@@ -0,0 +1,30 @@
+# -*- coding: UTF-8 -*-
+"""等待统计：条件探测不拖长等待"""
+
+import time
+
+from sleep_accounting import SleepAccountant
+
+
+def test_slow_probe_is_not_repeated_past_deadline():
+    accountant = SleepAccountant()
+    probes = []
+
+    def slow_condition():
+        probes.append(time.perf_counter())
+        time.sleep(0.3)
+        return False
+
+    actual = accountant.sleep(0.5, "慢探测", condition=slow_condition, probe_interval=0.05)
+    assert len(probes) == 1
+    assert actual < 0.6
+
+
+def test_condition_met_time_is_recorded():
+    accountant = SleepAccountant()
+    started = time.perf_counter()
+    accountant.sleep(0.3, "条件等待", condition=lambda: time.perf_counter() - started > 0.1,
+                     probe_interval=0.02, stop_early=True)
+    record = accountant.records[-1]
+    assert 0.1 <= record.condition_met_at < 0.2
+    assert record.actual < 0.25
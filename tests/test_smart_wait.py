@@ -0,0 +1,42 @@
+# -*- coding: UTF-8 -*-
+"""性能监控：步骤耗时同步给智能等待"""
+
+import pytest
+
+pytest.importorskip("appium")
+
+from smart_wait import PerformanceMonitor, SmartWait, TimingStore  # noqa: E402
+
+
+def test_end_step_feeds_smart_wait_once(tmp_path):
+    store = TimingStore(path=tmp_path / "step_timings.jsonl")
+    smart_wait = SmartWait(timing_store=store)
+    monitor = PerformanceMonitor(log_func=lambda msg: None, timing_store=store, smart_wait=smart_wait)
+
+    start = monitor.start_step("进入详情页")
+    monitor.end_step("进入详情页", start - 1.2)
+
+    assert list(smart_wait.timing_history["进入详情页"]) == [pytest.approx(1.2, abs=0.05)]
+    assert len(store.load("", "")["进入详情页"]) == 1
+
+
+
+def test_page_load_ignores_snapshots_from_before_the_wait():
+    from damai_appium.snapshot_service import get_snapshot_service
+
+    class _Driver:
+        reads = 0
+
+        @property
+        def page_source(self):
+            self.reads += 1
+            return "<hierarchy><node text='首页'/></hierarchy>"
+
+    driver = _Driver()
+    get_snapshot_service(driver).get(max_age=0)  # 点击跳转前的快照
+    driver.reads = 0
+
+    loaded, _ = SmartWait().wait_for_page_load(driver, timeout=2)
+    # 稳定判断只用等待开始后获取的两份快照
+    assert loaded
+    assert driver.reads == 2
@@ -0,0 +1,34 @@
+# -*- coding: UTF-8 -*-
+"""快照服务：每个driver一个服务，会话重建不影响旧服务上的订阅"""
+
+import gc
+
+from snapshot_service import get_snapshot_service
+
+
+class _Driver:
+    def __init__(self, page_source):
+        self.page_source = page_source
+
+
+def test_new_driver_does_not_stop_old_subscribers():
+    old, new = _Driver("<old/>"), _Driver("<new/>")
+    received = []
+    old_service = get_snapshot_service(old)
+    old_service.subscribe(received.append)
+
+    new_service = get_snapshot_service(new)
+    assert new_service is not old_service
+    assert get_snapshot_service(old) is old_service
+
+    old_service.get(max_age=0)
+    assert [s.page_source for s in received] == ["<old/>"]
+    assert new_service.get(max_age=0).page_source == "<new/>"
+
+
+def test_service_does_not_keep_driver_alive():
+    driver = _Driver("<page/>")
+    service = get_snapshot_service(driver)
+    del driver
+    gc.collect()
+    assert service.driver is None
@@ -0,0 +1,52 @@
+# -*- coding: UTF-8 -*-
+"""策略熔断：冷却中的策略不参与，只有半开探测失败才重新熔断"""
+
+import time
+
+import pytest
+
+pytest.importorskip("selenium")
+
+from ticket_strategy import StrategyStatsStore, TicketStrategy  # noqa: E402
+
+
+@pytest.fixture
+def store(tmp_path):
+    return StrategyStatsStore(path=tmp_path / "stats.json", breaker_threshold=2, breaker_cooldown=60)
+
+
+def _trip(store, key, label):
+    for _ in range(store.breaker_threshold):
+        store.record(key, label, False, 0.1)
+    assert store.breaker_state(store.get(key, label)) == "open"
+
+
+def test_open_strategies_are_left_out_of_plan(store):
+    _trip(store, "buy", "b")
+    strategy = TicketStrategy(None, stats_store=store, probe_rate=0)
+    assert strategy.plan("buy", ["a", "b", "c"]) == [(0, "closed"), (2, "closed")]
+
+
+def test_all_open_strategies_still_get_one_attempt(store):
+    for label in ("a", "b"):
+        _trip(store, "buy", label)
+    strategy = TicketStrategy(None, stats_store=store, probe_rate=0)
+    assert strategy.plan("buy", ["a", "b"]) == [(0, "open"), (1, "open")]
+
+
+def test_failure_while_open_does_not_retrip(store):
+    _trip(store, "buy", "a")
+    record = store.get("buy", "a")
+    opened_at, trips = record.opened_at, record.trips
+    store.record("buy", "a", False, 0.1)
+    assert (record.opened_at, record.trips) == (opened_at, trips)
+
+
+def test_failed_half_open_probe_retrips(store):
+    _trip(store, "buy", "a")
+    record = store.get("buy", "a")
+    record.opened_at = time.time() - 61
+    assert store.breaker_state(record) == "half_open"
+    store.record("buy", "a", False, 0.1)
+    assert record.trips == 2
+    assert store.cooldown(record) == 120